@@ -102,11 +102,14 @@ class Cabina:
     def __init__(self):
         pass
     
-    def generar_matricula(self):
-        """Genera una matrícula aleatoria española"""
-        numeros = ''.join(random.choices(string.digits, k=4))
-        letras = ''.join(random.choices(string.ascii_uppercase, k=3))
-        return f"{numeros}{letras}"
+    def generar_matricula(self, parking=None):
+        """Genera una matrícula aleatoria española (sin repetir las que ya están dentro)"""
+        while True:
+            numeros = ''.join(random.choices(string.digits, k=4))
+            letras = ''.join(random.choices(string.ascii_uppercase, k=3))
+            matricula = f"{numeros}{letras}"
+            if parking is None or parking.buscar_por_matricula(matricula) is None:
+                return matricula
     
     def detectar_minusvalido(self):
         """Simula la detección de si el vehículo tiene ocupantes minusválidos"""
@@ -129,7 +132,7 @@ class Cabina:
     
     def procesar_entrada(self, parking):
         """Procesa la entrada de un vehículo al parking"""
-        matricula = self.generar_matricula()
+        matricula = self.generar_matricula(parking)
         es_minusvalido = self.detectar_minusvalido()
         coche = Coche(matricula, es_minusvalido)
         
@@ -143,6 +146,7 @@ class Cabina:
             
             if aparcamiento.puede_ocupar(coche):
                 aparcamiento.ocupar(coche)
+                parking.matriculas[matricula] = aparcamiento
                 aparcamiento_asignado = aparcamiento
                 logging.info(f"ENTRADA EXITOSA - Vehículo {matricula} estacionado en plaza {aparcamiento.id} (intento {intento})")
                 return True, f"Vehículo {matricula} estacionado en {aparcamiento.id}"
@@ -167,6 +171,7 @@ class Cabina:
         
         if aparcamiento and aparcamiento.ocupado:
             coche, tiempo_estacionado = aparcamiento.liberar()
+            parking.matriculas.pop(coche.matricula, None)
             tarifa = self.calcular_tarifa(tiempo_estacionado)
             
             segundos = tiempo_estacionado.total_seconds() if tiempo_estacionado else 0
@@ -181,6 +186,7 @@ class Parking:
     """Clase principal que gestiona el parking"""
     def __init__(self, filas, columnas, porcentaje_minusvalidos=0.1):
         self.aparcamientos = []
+        self.matriculas = {}  # Índice matrícula -> aparcamiento
         self.cabina = Cabina()
         self.filas = filas
         self.columnas = columnas
@@ -218,6 +224,14 @@ class Parking:
                 return aparcamiento
         return None
     
+    def buscar_por_matricula(self, matricula):
+        """Busca el aparcamiento donde está un vehículo"""
+        return self.matriculas.get(matricula)
+    
+    def reconstruir_indice(self):
+        """Rehace el índice de matrículas a partir de los aparcamientos ocupados"""
+        self.matriculas = {a.coche.matricula: a for a in self.aparcamientos if a.ocupado and a.coche}
+    
     def obtener_ocupacion(self):
         """Retorna el porcentaje de ocupación"""
         ocupados = sum(1 for a in self.aparcamientos if a.ocupado)
@@ -244,6 +258,7 @@ class Parking:
             
             parking = Parking(datos['filas'], datos['columnas'], 0)
             parking.aparcamientos = [Aparcamiento.from_dict(a) for a in datos['aparcamientos']]
+            parking.reconstruir_indice()
             logging.info("Estado del parking cargado desde JSON")
             return parking
         except FileNotFoundError:
@@ -0,0 +1,677 @@
+"""Archivo comprimido de eventos e instantáneas de estado, particionado por tiempo
+
+Los eventos se agrupan en segmentos de un día como mucho (y como mucho MAX_FILAS
+filas), en una carpeta por mes. Cada segmento guarda sus columnas por separado y
+comprimidas: los tipos como códigos de un byte, los momentos como diferencias en
+varint, matrículas y plazas como diccionario más índices, el precio en céntimos y
+la duración en milisegundos. Delante va una cabecera sin comprimir que hace de
+índice: intervalo de tiempo, filas, eventos por tipo, un filtro de Bloom de las
+matrículas y dónde empieza cada columna. Una consulta por rango solo abre los
+segmentos que se solapan con él y solo descomprime las columnas que necesita; una
+por matrícula se salta los segmentos cuyo filtro dice que no está.
+
+Las instantáneas de estado son las binarias de Parking.guardar_instantanea
+comprimidas, una por archivo con el momento en el nombre.
+
+    archivo/
+        eventos/2026-01/2026-01-14.000.seg
+        eventos/abierto.jsonl              filas del segmento aún sin sellar
+        estados/2026-01/2026-01-14T175550.snap.z
+
+Cada fila del diario se vuelca al sistema al añadirla (con sincronizar, también a
+disco), así que un proceso que muere de golpe no pierde las filas sin sellar. Antes
+de sellar se apunta en el diario el segmento que se va a escribir: si el proceso
+muere entre escribir el segmento y vaciar el diario, al volver se ve que esas
+filas ya están selladas y no se duplican.
+
+Uso:
+    python archivado.py importar ../../S15/parking.log --rotar
+    python archivado.py importar-estado parking_estado.json
+    python archivado.py rotar-historico historico --dias 7
+    python archivado.py rango --desde 2026-01-14T17:00 --hasta 2026-01-14T18:00 --evento salida
+    python archivado.py estado --en 2026-01-14T18:00 --guardar recuperado.json
+    python archivado.py uso
+"""
+import argparse
+import base64
+import bisect
+import hashlib
+import json
+import lzma
+import os
+import re
+import shutil
+import struct
+import tempfile
+import threading
+import zlib
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from historico import (
+    Historico, RegistroHistorico, EVENTOS, CODIGOS_VEHICULO, CODIGOS_PARKING,
+    eventos_de_traza, _a_micros, _de_micros, _codigo, _valor
+)
+from parking_privado import Parking, hora_actual
+
+MAGIA = b"PKSEG1\n"
+MAX_FILAS = 65536
+INTERVALO_ESTADO_MINUTOS = 60
+BITS_POR_MATRICULA = 10  # Filtro de Bloom: ~1% de falsos positivos con 7 funciones
+FUNCIONES_BLOOM = 7
+COMPRESORES = {
+    "zlib": (lambda datos: zlib.compress(datos, 9), zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),  # Más lento, algo más pequeño
+}
+COLUMNAS = ("momento", "evento", "tipo_vehiculo", "tipo_parking", "plaza.tabla", "plaza",
+            "matricula.tabla", "matricula", "precio", "duracion", "ocupadas")
+
+_NOMBRE_SEGMENTO = re.compile(r"^(\d{4}-\d\d-\d\d)\.(\d{3})\.seg$")
+_NOMBRE_ESTADO = re.compile(r"^(\d{4}-\d\d-\d\dT\d{6})\.snap\.z$")
+
+# ======================================================
+# CODIFICACIÓN
+# ======================================================
+
+def _varints(valores):
+    """Enteros no negativos en 7 bits por byte (los pequeños ocupan un byte)"""
+    salida = bytearray()
+    for v in valores:
+        while v >= 0x80:
+            salida.append(v & 0x7F | 0x80)
+            v >>= 7
+        salida.append(v)
+    return bytes(salida)
+
+def _de_varints(datos):
+    valores, v, desplazamiento = [], 0, 0
+    for byte in datos:
+        v |= (byte & 0x7F) << desplazamiento
+        if byte & 0x80:
+            desplazamiento += 7
+        else:
+            valores.append(v)
+            v, desplazamiento = 0, 0
+    return valores
+
+def _zigzag(v):
+    return v * 2 if v >= 0 else -v * 2 - 1
+
+def _de_zigzag(v):
+    return v // 2 if not v & 1 else -(v + 1) // 2
+
+def _diferencias(valores, inicial=0):
+    anterior = inicial
+    for v in valores:
+        yield v - anterior
+        anterior = v
+
+def _diccionario(valores):
+    """(tabla, índices): 0 es vacío y el resto apunta a la tabla de textos distintos"""
+    tabla = {}
+    indices = [tabla.setdefault(v, len(tabla) + 1) if v else 0 for v in valores]
+    return "\n".join(tabla).encode("utf-8"), _varints(indices)
+
+def _bloom_posiciones(clave, bits):
+    resumen = hashlib.blake2b(clave.encode("utf-8"), digest_size=4 * FUNCIONES_BLOOM).digest()
+    return [int.from_bytes(resumen[i:i + 4], "little") % bits for i in range(0, len(resumen), 4)]
+
+def _bloom(claves):
+    filtro = bytearray(max(8, (len(claves) * BITS_POR_MATRICULA + 7) // 8))
+    bits = len(filtro) * 8  # Lo que verá Segmento.puede_contener al leerlo
+    for clave in claves:
+        for posicion in _bloom_posiciones(clave, bits):
+            filtro[posicion // 8] |= 1 << (posicion % 8)
+    return filtro
+
+# ======================================================
+# SEGMENTOS
+# ======================================================
+
+def escribir_segmento(ruta, filas, compresion="zlib"):
+    """Escribe filas (momento µs, evento, tipo_vehiculo, tipo_parking, plaza, matrícula,
+    precio, duración, ocupadas) ya ordenadas por momento; devuelve los bytes escritos"""
+    momentos, eventos, vehiculos, zonas, plazas, matriculas, precios, duraciones, ocupadas = zip(*filas)
+    tabla_plazas, indices_plazas = _diccionario(plazas)
+    tabla_matriculas, indices_matriculas = _diccionario(matriculas)
+    columnas = {
+        "momento": _varints(_diferencias(momentos, momentos[0])),
+        "evento": bytes(eventos),
+        "tipo_vehiculo": bytes(vehiculos),
+        "tipo_parking": bytes(zonas),
+        "plaza.tabla": tabla_plazas,
+        "plaza": indices_plazas,
+        "matricula.tabla": tabla_matriculas,
+        "matricula": indices_matriculas,
+        "precio": _varints(round(p * 100) for p in precios),
+        "duracion": _varints(round(d * 1000) for d in duraciones),
+        "ocupadas": _varints(map(_zigzag, _diferencias(ocupadas))),
+    }
+    comprimir = COMPRESORES[compresion][0]
+    cuerpo, posiciones = bytearray(), {}
+    for nombre in COLUMNAS:
+        datos = comprimir(columnas[nombre])
+        posiciones[nombre] = (len(cuerpo), len(datos))
+        cuerpo += datos
+
+    cabecera = json.dumps({
+        'desde': momentos[0],
+        'hasta': momentos[-1],
+        'filas': len(filas),
+        'compresion': compresion,
+        'eventos': {EVENTOS[c]: eventos.count(c) for c in set(eventos) if c < len(EVENTOS)},
+        'bloom': base64.b64encode(_bloom({m for m in matriculas if m})).decode("ascii"),
+        'columnas': posiciones,
+    }, separators=(",", ":")).encode("utf-8")
+
+    temporal = ruta + ".tmp"
+    with open(temporal, 'wb') as f:
+        f.write(MAGIA + struct.pack("<I", len(cabecera)) + cabecera)
+        f.write(cuerpo)
+        f.flush()
+        os.fsync(f.fileno())  # Completo en disco antes de que el diario lo dé por sellado
+    os.replace(temporal, ruta)
+    return os.path.getsize(ruta)
+
+class Segmento:
+    """Un segmento sellado: la cabecera se lee al abrir y cada columna al pedirla"""
+    def __init__(self, ruta):
+        self.ruta = ruta
+        with open(ruta, 'rb') as f:
+            if f.read(len(MAGIA)) != MAGIA:
+                raise ValueError(f"{ruta} no es un segmento del archivo")
+            (longitud,) = struct.unpack("<I", f.read(4))
+            self.cabecera = json.loads(f.read(longitud))
+            self._base = len(MAGIA) + 4 + longitud
+        self.desde = self.cabecera['desde']
+        self.hasta = self.cabecera['hasta']
+        self._bloom = None
+        self._columnas = {}
+
+    def __len__(self):
+        return self.cabecera['filas']
+
+    def puede_contener(self, matricula):
+        """False si la matrícula seguro que no está (filtro de Bloom de la cabecera)"""
+        if self._bloom is None:
+            self._bloom = base64.b64decode(self.cabecera['bloom'])
+        bits = len(self._bloom) * 8
+        return all(self._bloom[p // 8] >> (p % 8) & 1 for p in _bloom_posiciones(matricula, bits))
+
+    def _bytes(self, nombre):
+        desplazamiento, longitud = self.cabecera['columnas'][nombre]
+        with open(self.ruta, 'rb') as f:
+            f.seek(self._base + desplazamiento)
+            datos = f.read(longitud)
+        return COMPRESORES[self.cabecera['compresion']][1](datos)
+
+    def columna(self, nombre):
+        """Valores decodificados de una columna (se descomprime solo esa)"""
+        if nombre not in self._columnas:
+            datos = self._bytes(nombre)
+            if nombre == "momento":
+                valores = list(accumulate(_de_varints(datos), initial=self.desde))[1:]
+            elif nombre in ("evento", "tipo_vehiculo", "tipo_parking"):
+                valores = list(datos)
+            elif nombre in ("plaza", "matricula"):
+                tabla = [None] + self._bytes(f"{nombre}.tabla").decode("utf-8").split("\n")
+                valores = [tabla[i] for i in _de_varints(datos)]
+            elif nombre == "precio":
+                valores = [c / 100 for c in _de_varints(datos)]
+            elif nombre == "duracion":
+                valores = [ms / 1000 for ms in _de_varints(datos)]
+            else:
+                valores = list(accumulate(map(_de_zigzag, _de_varints(datos))))
+            self._columnas[nombre] = valores
+        return self._columnas[nombre]
+
+    def filas_en_rango(self, desde=None, hasta=None):
+        momentos = self.columna("momento")
+        ini = 0 if desde is None else bisect.bisect_left(momentos, desde)
+        fin = len(momentos) if hasta is None else bisect.bisect_left(momentos, hasta)
+        return ini, fin
+
+    def fila(self, i):
+        c = self.columna
+        return RegistroHistorico(
+            _de_micros(c("momento")[i]),
+            _valor(EVENTOS, c("evento")[i]),
+            c("matricula")[i],
+            _valor(CODIGOS_VEHICULO, c("tipo_vehiculo")[i]),
+            _valor(CODIGOS_PARKING, c("tipo_parking")[i]),
+            c("plaza")[i],
+            c("precio")[i],
+            c("duracion")[i],
+            c("ocupadas")[i],
+        )
+
+# ======================================================
+# ARCHIVO
+# ======================================================
+
+class Archivador:
+    """Rota eventos e instantáneas de estado a segmentos comprimidos por día y mes"""
+    def __init__(self, carpeta='archivo', compresion="zlib", max_filas=MAX_FILAS, sincronizar=False):
+        if compresion not in COMPRESORES:
+            raise ValueError(f"Compresión desconocida: {compresion}")
+        self.carpeta = carpeta
+        self.compresion = compresion
+        self.max_filas = max_filas
+        self.sincronizar = sincronizar  # fsync del diario en cada fila (sobrevive a un corte de luz)
+        self._eventos = os.path.join(carpeta, "eventos")
+        self._estados = os.path.join(carpeta, "estados")
+        os.makedirs(self._eventos, exist_ok=True)
+        os.makedirs(self._estados, exist_ok=True)
+        self._lock = threading.Lock()
+        self._filas = []
+        self._dia = None
+        self._ultimo = 0
+        self._suscripcion = None
+        self._parking = None
+        self._parar = threading.Event()
+        self._hilo = None
+
+        # Lo que no llegó a sellarse se recupera del diario y se sigue añadiendo a ello
+        self._ruta_diario = os.path.join(self._eventos, "abierto.jsonl")
+        self._recuperar_diario()
+        if self._filas:
+            self._ultimo = self._filas[-1][0]
+            self._dia = _de_micros(self._ultimo).strftime("%Y-%m-%d")
+        else:
+            segmentos = self.segmentos()
+            if segmentos:
+                self._ultimo = Segmento(segmentos[-1]).hasta
+        self._diario = open(self._ruta_diario, 'a', encoding='utf-8')
+
+    def _recuperar_diario(self):
+        """Lee las filas sin sellar del diario y lo deja limpio si no lo estaba"""
+        if not os.path.exists(self._ruta_diario):
+            return
+        sellando, limpio = None, True
+        with open(self._ruta_diario, 'r', encoding='utf-8') as f:
+            for linea in f:
+                try:
+                    dato = json.loads(linea)
+                except ValueError:
+                    limpio = False  # Última línea a medio escribir
+                    break
+                if isinstance(dato, dict):
+                    sellando = dato['sellando']
+                else:
+                    self._filas.append(tuple(dato))
+        if sellando is not None:
+            limpio = False
+            if os.path.exists(os.path.join(self._eventos, sellando)):
+                # El segmento llegó a escribirse; el diario no llegó a vaciarse
+                self._filas = []
+        if not limpio:
+            # Se reescribe sin la línea rota ni la marca para seguir añadiendo detrás
+            temporal = self._ruta_diario + ".tmp"
+            with open(temporal, 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps(fila, ensure_ascii=False) + "\n" for fila in self._filas)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporal, self._ruta_diario)
+
+    def _escribir_diario(self, dato, sincronizar=False):
+        """Añade una línea al diario y la vuelca (llamar con _lock)"""
+        self._diario.write(json.dumps(dato, ensure_ascii=False) + "\n")
+        self._diario.flush()
+        if sincronizar or self.sincronizar:
+            os.fsync(self._diario.fileno())
+
+    # --------------------------------------------------
+    # Escritura
+    # --------------------------------------------------
+
+    def añadir(self, evento):
+        """Añade un evento (diccionario como los que notifica Parking)"""
+        micros = _a_micros(evento['momento'])
+        with self._lock:
+            # Como en el histórico: los carriles notifican fuera del lock
+            micros = max(micros, self._ultimo)
+            self._ultimo = micros
+            dia = _de_micros(micros).strftime("%Y-%m-%d")
+            if dia != self._dia:
+                self._sellar()
+                self._dia = dia
+            fila = (
+                micros,
+                _codigo(EVENTOS, evento['evento']),
+                _codigo(CODIGOS_VEHICULO, evento.get('tipo_vehiculo')),
+                _codigo(CODIGOS_PARKING, evento.get('tipo_parking')),
+                evento.get('plaza') or "",
+                evento.get('matricula') or "",
+                evento.get('precio') or 0.0,
+                evento.get('duracion') or 0.0,
+                evento.get('ocupadas') or 0,
+            )
+            self._filas.append(fila)
+            self._escribir_diario(fila)
+            if len(self._filas) >= self.max_filas:
+                self._sellar()
+
+    def _sellar(self):
+        """Escribe las filas pendientes como un segmento nuevo y vacía el diario (llamar con _lock)"""
+        if not self._filas:
+            return None
+        dia = _de_micros(self._filas[0][0]).strftime("%Y-%m-%d")
+        carpeta = os.path.join(self._eventos, dia[:7])
+        os.makedirs(carpeta, exist_ok=True)
+        numero = sum(1 for n in os.listdir(carpeta) if n.startswith(dia) and n.endswith(".seg"))
+        ruta = os.path.join(carpeta, f"{dia}.{numero:03d}.seg")
+        # Si el proceso muere antes de vaciar el diario, la marca evita sellar dos veces
+        self._escribir_diario({'sellando': os.path.relpath(ruta, self._eventos)}, sincronizar=True)
+        escribir_segmento(ruta, self._filas, self.compresion)
+        self._filas = []
+        self._diario.seek(0)
+        self._diario.truncate()
+        return ruta
+
+    def sellar(self):
+        """Sella el segmento abierto aunque no haya cambiado el día"""
+        with self._lock:
+            return self._sellar()
+
+    def importar(self, eventos):
+        """Importa eventos de reproducir.leer_traza (parking.log de S15 o JSONL)"""
+        n = 0
+        for datos in eventos_de_traza(eventos):
+            self.añadir(datos)
+            n += 1
+        return n
+
+    def archivar_estado(self, parking, momento=None):
+        """Guarda una instantánea comprimida del estado del parking; devuelve su ruta"""
+        momento = momento or hora_actual()
+        carpeta = os.path.join(self._estados, momento.strftime("%Y-%m"))
+        os.makedirs(carpeta, exist_ok=True)
+        ruta = os.path.join(carpeta, f"{momento:%Y-%m-%dT%H%M%S}.snap.z")
+        descriptor, temporal = tempfile.mkstemp(suffix=".snap", dir=carpeta)
+        os.close(descriptor)
+        try:
+            parking.guardar_instantanea(temporal)
+            with open(temporal, 'rb') as f:
+                datos = COMPRESORES["zlib"][0](f.read())
+            with open(temporal, 'wb') as f:
+                f.write(datos)
+            os.replace(temporal, ruta)
+        finally:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+        return ruta
+
+    def rotar_historico(self, historico, antes):
+        """Pasa al archivo los días del histórico anteriores a antes y borra sus carpetas"""
+        # El día abierto del histórico (sin índice) se queda donde está
+        dias = [d for d in historico.particiones() if d < antes.strftime("%Y-%m-%d") and historico._cerrada(d)]
+        n = 0
+        for dia in dias:
+            inicio = datetime.fromisoformat(dia)
+            for r in historico.rango(inicio, inicio + timedelta(days=1)):
+                self.añadir(r._asdict())
+                n += 1
+            self.sellar()
+            shutil.rmtree(os.path.join(historico.carpeta, dia))
+        return len(dias), n
+
+    def conectar(self, parking, intervalo_estado=INTERVALO_ESTADO_MINUTOS):
+        """Archiva los eventos del parking y una instantánea cada intervalo_estado minutos"""
+        self._suscripcion = parking.bus.suscribir(self.añadir, tipos=EVENTOS, politica="bloquear")
+        self._parking = parking
+
+        def bucle():
+            while not self._parar.wait(intervalo_estado * 60):
+                parking = self._parking  # El de ahora: reconectar puede haberlo cambiado
+                if parking is not None:
+                    self.archivar_estado(parking)
+        self._hilo = threading.Thread(target=bucle, daemon=True, name="archivado-estados")
+        self._hilo.start()
+        return self
+
+    def reconectar(self, parking):
+        """Pasa a archivar otro parking (p. ej. tras cargar un estado)
+
+        Su estado se archiva en el acto: el salto no se deduce de los eventos.
+        """
+        if self._suscripcion is not None:
+            self._suscripcion.cancelar()  # Escribe antes los eventos pendientes del anterior
+        self._suscripcion = parking.bus.suscribir(self.añadir, tipos=EVENTOS, politica="bloquear")
+        self._parking = parking
+        self.archivar_estado(parking)
+
+    def cerrar(self):
+        if self._suscripcion is not None:
+            self._suscripcion.cancelar()  # Escribe antes los eventos pendientes
+            self._suscripcion = None
+        self._parar.set()
+        if self._parking is not None:
+            self.archivar_estado(self._parking)  # El estado al cerrar también queda archivado
+            self._parking = None
+        with self._lock:
+            self._diario.flush()
+            # El día en curso queda en el diario: se seguirá llenando al volver
+            self._diario.close()
+
+    # --------------------------------------------------
+    # Lectura
+    # --------------------------------------------------
+
+    def segmentos(self, desde=None, hasta=None):
+        """Rutas de los segmentos cuyo día se solapa con [desde, hasta), por orden"""
+        rutas = []
+        for mes in sorted(os.listdir(self._eventos)):
+            carpeta = os.path.join(self._eventos, mes)
+            if not os.path.isdir(carpeta):
+                continue
+            if desde is not None and mes < desde.strftime("%Y-%m"):
+                continue
+            if hasta is not None and mes > hasta.strftime("%Y-%m"):
+                continue
+            for nombre in sorted(os.listdir(carpeta)):
+                m = _NOMBRE_SEGMENTO.match(nombre)
+                if not m:
+                    continue
+                if desde is not None and m.group(1) < desde.strftime("%Y-%m-%d"):
+                    continue
+                if hasta is not None and m.group(1) > hasta.strftime("%Y-%m-%d"):
+                    continue
+                rutas.append(os.path.join(carpeta, nombre))
+        return rutas
+
+    def rango(self, desde=None, hasta=None, evento=None, matricula=None, tipo_vehiculo=None, plaza=None):
+        """Eventos con momento en [desde, hasta) que cumplen los filtros, sellados o no"""
+        inicio = _a_micros(desde) if desde else None
+        fin = _a_micros(hasta) if hasta else None
+        filtros = [(nombre, _codigo(tabla, valor)) for nombre, tabla, valor in (
+            ("evento", EVENTOS, evento), ("tipo_vehiculo", CODIGOS_VEHICULO, tipo_vehiculo)
+        ) if valor is not None]
+        textos = [(nombre, valor) for nombre, valor in (("matricula", matricula), ("plaza", plaza)) if valor]
+
+        for ruta in self.segmentos(desde, hasta):
+            segmento = Segmento(ruta)
+            # La cabecera basta para descartar el segmento sin descomprimir nada
+            if (inicio is not None and segmento.hasta < inicio) or (fin is not None and segmento.desde >= fin):
+                continue
+            if matricula and not segmento.puede_contener(matricula):
+                continue
+            ini, fin_filas = segmento.filas_en_rango(inicio, fin)
+            columnas = [(segmento.columna(n), v) for n, v in filtros + textos]
+            for i in range(ini, fin_filas):
+                if all(columna[i] == valor for columna, valor in columnas):
+                    yield segmento.fila(i)
+
+        with self._lock:
+            pendientes = list(self._filas)
+        for fila in pendientes:
+            if (inicio is not None and fila[0] < inicio) or (fin is not None and fila[0] >= fin):
+                continue
+            registro = RegistroHistorico(
+                _de_micros(fila[0]), _valor(EVENTOS, fila[1]), fila[5] or None,
+                _valor(CODIGOS_VEHICULO, fila[2]), _valor(CODIGOS_PARKING, fila[3]),
+                fila[4] or None, *fila[6:]
+            )
+            if all(getattr(registro, n) == valor for n, valor in textos) and \
+                    (evento is None or registro.evento == evento) and \
+                    (tipo_vehiculo is None or registro.tipo_vehiculo == tipo_vehiculo):
+                yield registro
+
+    def estados(self):
+        """[(momento, ruta)] de las instantáneas archivadas, por orden"""
+        resultado = []
+        for mes in sorted(os.listdir(self._estados)):
+            carpeta = os.path.join(self._estados, mes)
+            if not os.path.isdir(carpeta):
+                continue
+            for nombre in sorted(os.listdir(carpeta)):
+                m = _NOMBRE_ESTADO.match(nombre)
+                if m:
+                    resultado.append((datetime.strptime(m.group(1), "%Y-%m-%dT%H%M%S"), os.path.join(carpeta, nombre)))
+        return resultado
+
+    def estado_en(self, momento):
+        """(parking, momento de la instantánea) de la última instantánea no posterior a momento"""
+        estados = self.estados()
+        i = bisect.bisect_right([m for m, _ in estados], momento)
+        if not i:
+            return None, None
+        guardado, ruta = estados[i - 1]
+        descriptor, temporal = tempfile.mkstemp(suffix=".snap")
+        try:
+            with open(ruta, 'rb') as f, os.fdopen(descriptor, 'wb') as salida:
+                salida.write(COMPRESORES["zlib"][1](f.read()))
+            parking, mensaje = Parking.abrir_instantanea(temporal, calentar=False)
+            if parking:
+                # Las filas se leen del archivo según se usan: se leen ya para poder borrarlo
+                parking._plazas.estado().calentar()
+        finally:
+            os.remove(temporal)
+        if not parking:
+            raise ValueError(mensaje)
+        return parking, guardado
+
+    def podar(self, antes):
+        """Borra segmentos e instantáneas anteriores a antes; devuelve cuántos archivos"""
+        borrados = 0
+        for ruta in self.segmentos(None, antes):
+            if _de_micros(Segmento(ruta).hasta) < antes:
+                os.remove(ruta)
+                borrados += 1
+        for momento, ruta in self.estados():
+            if momento < antes:
+                os.remove(ruta)
+                borrados += 1
+        return borrados
+
+    def uso(self):
+        """Bytes y filas en disco por tipo de archivo"""
+        segmentos = self.segmentos()
+        filas = sum(len(Segmento(r)) for r in segmentos)
+        estados = self.estados()
+        return {
+            'segmentos': len(segmentos),
+            'filas': filas,
+            'bytes_eventos': sum(os.path.getsize(r) for r in segmentos),
+            'filas_abiertas': len(self._filas),
+            'bytes_diario': os.path.getsize(self._ruta_diario),
+            'instantaneas': len(estados),
+            'bytes_estados': sum(os.path.getsize(r) for _, r in estados),
+        }
+
+def _fecha(texto):
+    return datetime.fromisoformat(texto)
+
+def _tamaño(n):
+    return f"{n / 1024:.1f} KiB" if n < 1024 * 1024 else f"{n / 1024 / 1024:.1f} MiB"
+
+def main():
+    parser = argparse.ArgumentParser(description="Archivo comprimido de eventos y estados del parking")
+    parser.add_argument("--carpeta", default="archivo", help="Carpeta del archivo")
+    parser.add_argument("--compresion", choices=list(COMPRESORES), default="zlib")
+    sub = parser.add_subparsers(dest="orden", required=True)
+
+    p = sub.add_parser("importar", help="Archiva un parking.log de S15 o una traza JSONL")
+    p.add_argument("traza")
+    p.add_argument("--rotar", action="store_true", help="Vacía el log una vez archivado")
+
+    p = sub.add_parser("importar-estado", help="Archiva un estado guardado (JSON o .snap)")
+    p.add_argument("estado")
+
+    p = sub.add_parser("rotar-historico", help="Archiva y borra los días antiguos de un histórico")
+    p.add_argument("historico")
+    p.add_argument("--dias", type=int, default=7, help="Días recientes que se quedan en el histórico")
+
+    p = sub.add_parser("rango", help="Eventos en un intervalo con filtros")
+    p.add_argument("--desde", type=_fecha)
+    p.add_argument("--hasta", type=_fecha)
+    p.add_argument("--evento", choices=EVENTOS)
+    p.add_argument("--matricula")
+    p.add_argument("--plaza")
+
+    p = sub.add_parser("estado", help="Estado del parking en un momento (última instantánea anterior)")
+    p.add_argument("--en", type=_fecha, required=True)
+    p.add_argument("--guardar", metavar="ARCHIVO", help="Lo guarda como JSON")
+
+    p = sub.add_parser("podar", help="Borra lo archivado antes de una fecha")
+    p.add_argument("--antes", type=_fecha, required=True)
+
+    sub.add_parser("uso", help="Espacio ocupado")
+    args = parser.parse_args()
+
+    archivador = Archivador(args.carpeta, args.compresion)
+    try:
+        if args.orden == "importar":
+            from reproducir import leer_traza
+            n = archivador.importar(leer_traza(args.traza))
+            archivador.sellar()
+            origen = os.path.getsize(args.traza)
+            if args.rotar:
+                open(args.traza, 'w').close()
+            uso = archivador.uso()
+            print(f"🗜️ {n} eventos archivados: {_tamaño(origen)} de log → "
+                  f"{_tamaño(uso['bytes_eventos'])} en {uso['segmentos']} segmentos en total")
+        elif args.orden == "importar-estado":
+            parking, mensaje = Parking.cargar_estado(args.estado)
+            if not parking:
+                raise SystemExit(f"❌ {mensaje}")
+            # El nombre lleva el momento en que se guardó el estado, no el de ahora
+            momento = datetime.fromtimestamp(os.path.getmtime(args.estado))
+            with open(args.estado, 'rb') as f:
+                if f.read(1) == b"{":
+                    f.seek(0)
+                    momento = datetime.fromisoformat(json.load(f).get('timestamp') or momento.isoformat())
+            ruta = archivador.archivar_estado(parking, momento)
+            print(f"🗜️ {args.estado} ({_tamaño(os.path.getsize(args.estado))}) → {ruta} "
+                  f"({_tamaño(os.path.getsize(ruta))})")
+        elif args.orden == "rotar-historico":
+            historico = Historico(args.historico, solo_lectura=True)
+            try:
+                dias, n = archivador.rotar_historico(historico, datetime.now() - timedelta(days=args.dias))
+            finally:
+                historico.cerrar()
+            print(f"🗜️ {dias} días ({n} eventos) pasados del histórico al archivo")
+        elif args.orden == "rango":
+            for r in archivador.rango(args.desde, args.hasta, args.evento, args.matricula, plaza=args.plaza):
+                print(f"{r.momento:%Y-%m-%d %H:%M:%S} {r.evento:8} {r.matricula or '-':8} "
+                      f"{r.tipo_vehiculo or '-':11} {r.plaza or '-':5} {r.precio:.2f}€")
+        elif args.orden == "estado":
+            parking, momento = archivador.estado_en(args.en)
+            if not parking:
+                raise SystemExit(f"❌ No hay instantáneas anteriores a {args.en}")
+            stats = parking.obtener_estadisticas()
+            print(f"📸 Instantánea de {momento}: {parking._plazas.num_ocupadas()}/{len(parking.obtener_estado())} "
+                  f"plazas ocupadas, {stats['total_entradas']} entradas, {stats['recaudacion_total']:.2f}€")
+            if args.guardar:
+                print(parking.guardar_estado(args.guardar)[1])
+        elif args.orden == "podar":
+            print(f"🗑️ {archivador.podar(args.antes)} archivos borrados")
+        else:
+            uso = archivador.uso()
+            print(f"📦 Eventos: {uso['filas']} en {uso['segmentos']} segmentos ({_tamaño(uso['bytes_eventos'])}), "
+                  f"{uso['filas_abiertas']} sin sellar ({_tamaño(uso['bytes_diario'])})")
+            print(f"📦 Estados: {uso['instantaneas']} instantáneas ({_tamaño(uso['bytes_estados'])})")
+    finally:
+        archivador.cerrar()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""Banco de pruebas de rendimiento del parking (sin interfaz gráfica)
+
+Solo usa la interfaz pública de Parking; el paso del tiempo se simula con RELOJ.
+
+Uso:
+    python benchmark.py                      # ejecuta y guarda benchmark_resultados.json
+    python benchmark.py --rapido             # capacidades pequeñas, para comprobar rápido
+    python benchmark.py --base base.json     # compara con una ejecución anterior
+    python benchmark.py --guardar-base       # guarda los resultados como nueva base
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from parking_privado import Parking, RELOJ, TIEMPO_MINIMO_ESTANCIA
+
+SEMILLA = 1234
+REPETICIONES = 3
+INICIO = datetime(2026, 1, 5, 12)  # Hora simulada: los resultados no dependen de la hora real
+TIPOS = ["NORMAL", "MOTO", "ELECTRICO", "MINUSVALIDO"]
+
+CAPACIDADES = [56, 1000, 10000, 100000]
+CAPACIDADES_RAPIDO = [56, 1000]
+OCUPACIONES = [0.0, 0.5, 0.9]
+CARRILES = [1, 2, 4, 8, 16]
+
+ARCHIVO_RESULTADOS = "benchmark_resultados.json"
+ARCHIVO_BASE = "benchmark_base.json"
+
+# ======================================================
+# UTILIDADES
+# ======================================================
+
+def medir(funcion, repeticiones=REPETICIONES):
+    """Mediana de varios tiempos de ejecución (segundos)"""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos)
+
+def nuevo_parking(capacidad):
+    """Parking vacío con el reloj fijado en INICIO"""
+    RELOJ.fijar(INICIO)
+    return Parking(capacidad)
+
+def llenar(parking, ocupacion):
+    """Ocupa el parking hasta la fracción indicada (partiendo de vacío)"""
+    objetivo = int(len(parking.obtener_estado()) * ocupacion)
+    ocupadas = intentos = 0
+    while ocupadas < objetivo and intentos < objetivo * 3:
+        exito, _ = parking.entrada(tipo=random.choice(TIPOS))
+        ocupadas += exito
+        intentos += 1
+
+def avanzar(minutos):
+    """Adelanta el reloj simulado para que los coches aparcados puedan salir"""
+    RELOJ.fijar(RELOJ.ahora() + timedelta(minutes=minutos))
+
+def entrar_y_salir(parking, matricula, tipo):
+    """Una entrada y, si ha aparcado, la salida inmediata (estancia corta: no paga)"""
+    exito, _ = parking.entrada(matricula=matricula, tipo=tipo)
+    plaza = parking.localizar(matricula) if exito else None
+    if plaza:
+        parking.salida(plaza.id)
+
+def resultado(nombre, parametros, **valores):
+    return {'nombre': nombre, 'parametros': parametros, **valores}
+
+# ======================================================
+# BENCHMARKS
+# ======================================================
+
+def bench_entrada_salida(capacidad, ocupacion, operaciones=2000):
+    """Pares entrada + salida por segundo con el parking a una ocupación dada"""
+    random.seed(SEMILLA)
+    parking = nuevo_parking(capacidad)
+    llenar(parking, ocupacion)
+    coches = [(f"B{i:06d}", random.choice(TIPOS)) for i in range(operaciones)]
+
+    def ciclo():
+        for matricula, tipo in coches:
+            entrar_y_salir(parking, matricula, tipo)
+
+    segundos = medir(ciclo)
+    return resultado("entrada_salida", {'capacidad': capacidad, 'ocupacion': ocupacion},
+                     ops_por_segundo=operaciones / segundos)
+
+def bench_salida_aleatoria(capacidad, ocupacion=0.9, salidas=200):
+    """Coste de salida_aleatoria; cada salida se repone con una entrada"""
+    random.seed(SEMILLA)
+    parking = nuevo_parking(capacidad)
+    llenar(parking, ocupacion)
+
+    def ciclo():
+        # Todos los aparcados, también los que repusieron la vuelta anterior, pueden salir
+        avanzar(TIEMPO_MINIMO_ESTANCIA / 60 + 60)
+        for _ in range(salidas):
+            parking.salida_aleatoria()
+            parking.entrada(tipo="NORMAL")
+
+    segundos = medir(ciclo)
+    return resultado("salida_aleatoria", {'capacidad': capacidad, 'ocupacion': ocupacion},
+                     segundos_por_op=segundos / salidas)
+
+def bench_persistencia(capacidad, ocupacion=0.5):
+    """Tiempo de guardar / cargar en JSON y en instantánea binaria, y tamaño del archivo"""
+    random.seed(SEMILLA)
+    parking = nuevo_parking(capacidad)
+    llenar(parking, ocupacion)
+    with tempfile.TemporaryDirectory() as carpeta:
+        archivo = os.path.join(carpeta, "estado.json")
+        guardar = medir(lambda: parking.guardar_estado(archivo))
+        cargar = medir(lambda: Parking.cargar_estado(archivo))
+        tamaño = os.path.getsize(archivo)
+
+        instantanea = os.path.join(carpeta, "estado.snap")
+        guardar_snap = medir(lambda: parking.guardar_instantanea(instantanea))
+        # Sin calentar: mide el tiempo hasta poder atender tráfico
+        abrir_snap = medir(lambda: Parking.abrir_instantanea(instantanea, calentar=False))
+        tamaño_snap = os.path.getsize(instantanea)
+    return [
+        resultado("guardar_estado", {'capacidad': capacidad}, segundos=guardar, bytes=tamaño),
+        resultado("cargar_estado", {'capacidad': capacidad}, segundos=cargar, bytes=tamaño),
+        resultado("guardar_instantanea", {'capacidad': capacidad}, segundos=guardar_snap, bytes=tamaño_snap),
+        resultado("abrir_instantanea", {'capacidad': capacidad}, segundos=abrir_snap, bytes=tamaño_snap),
+    ]
+
+def bench_carriles(carriles, capacidad=1000, operaciones_por_carril=2000):
+    """Entradas + liberaciones por segundo con varios carriles en paralelo"""
+    random.seed(SEMILLA)
+    parking = nuevo_parking(capacidad)
+    llenar(parking, 0.5)
+
+    def carril(n):
+        for i in range(operaciones_por_carril):
+            # Se sale enseguida para mantener la ocupación estable
+            entrar_y_salir(parking, f"L{n:02d}{i:06d}", random.choice(TIPOS))
+
+    def ciclo():
+        hilos = [threading.Thread(target=carril, args=(n,)) for n in range(carriles)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+    segundos = medir(ciclo, repeticiones=1)
+    return resultado("carriles", {'carriles': carriles, 'capacidad': capacidad},
+                     ops_por_segundo=carriles * operaciones_por_carril / segundos)
+
+def cargar_s15():
+    """Importa el motor S15 con otro nombre de módulo y sin escribir en parking.log"""
+    ruta = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "S15", "parking_privado.py")
+    if not os.path.exists(ruta):
+        return None
+    # Con un handler ya instalado, logging.basicConfig de S15 no abre parking.log
+    logging.getLogger().addHandler(logging.NullHandler())
+    logging.disable(logging.CRITICAL)
+    spec = importlib.util.spec_from_file_location("parking_s15", ruta)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+def bench_cabina_s15(modulo, filas, ocupacion, entradas=2000):
+    """Bucle de sondeo aleatorio de Cabina.procesar_entrada en S15"""
+    random.seed(SEMILLA)
+    parking = modulo.Parking(filas, 10, 0.15)
+    cabina = parking.cabina
+    objetivo = int(len(parking.aparcamientos) * ocupacion)
+    libres = [a for a in parking.aparcamientos if not a.solo_minusvalidos]
+    for aparcamiento in random.sample(libres, min(objetivo, len(libres))):
+        coche = modulo.Coche(cabina.generar_matricula(parking))
+        aparcamiento.ocupar(coche)
+        parking.matriculas[coche.matricula] = aparcamiento
+
+    def ciclo():
+        for _ in range(entradas):
+            exito, _ = cabina.procesar_entrada(parking)
+            if exito:
+                # Deshacer la entrada para mantener la ocupación constante
+                cabina.procesar_salida(parking, next(reversed(parking.matriculas.values())).id)
+
+    segundos = medir(ciclo)
+    return resultado("cabina_s15", {'capacidad': filas * 10, 'ocupacion': ocupacion},
+                     ops_por_segundo=entradas / segundos)
+
+# ======================================================
+# EJECUCIÓN Y COMPARACIÓN
+# ======================================================
+
+def ejecutar(rapido=False):
+    capacidades = CAPACIDADES_RAPIDO if rapido else CAPACIDADES
+    resultados = []
+
+    for capacidad in capacidades:
+        for ocupacion in OCUPACIONES:
+            resultados.append(bench_entrada_salida(capacidad, ocupacion))
+            print(f"  entrada/salida {capacidad} plazas al {ocupacion:.0%}: "
+                  f"{resultados[-1]['ops_por_segundo']:.0f} ops/s")
+
+    for capacidad in capacidades:
+        resultados.append(bench_salida_aleatoria(capacidad))
+        print(f"  salida_aleatoria {capacidad} plazas: {resultados[-1]['segundos_por_op']*1e3:.3f} ms/op")
+
+    for capacidad in capacidades:
+        guardar, cargar, guardar_snap, abrir_snap = bench_persistencia(capacidad)
+        resultados += [guardar, cargar, guardar_snap, abrir_snap]
+        print(f"  persistencia {capacidad} plazas: guardar {guardar['segundos']:.3f}s, "
+              f"cargar {cargar['segundos']:.3f}s, {guardar['bytes']/1024:.0f} KiB | "
+              f"snap: guardar {guardar_snap['segundos']:.3f}s, abrir {abrir_snap['segundos']:.3f}s, "
+              f"{guardar_snap['bytes']/1024:.0f} KiB")
+
+    for carriles in CARRILES:
+        resultados.append(bench_carriles(carriles))
+        print(f"  {carriles} carriles: {resultados[-1]['ops_por_segundo']:.0f} ops/s")
+
+    modulo = cargar_s15()
+    if modulo:
+        for filas in (7, 26):
+            for ocupacion in OCUPACIONES:
+                resultados.append(bench_cabina_s15(modulo, filas, ocupacion))
+                print(f"  cabina S15 {filas*10} plazas al {ocupacion:.0%}: "
+                      f"{resultados[-1]['ops_por_segundo']:.0f} ops/s")
+    RELOJ.soltar()
+
+    return {
+        'fecha': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'rapido': rapido,
+        'resultados': resultados
+    }
+
+def _clave(r):
+    return r['nombre'] + json.dumps(r['parametros'], sort_keys=True)
+
+# Métricas donde más es mejor; en el resto (tiempos, bytes) menos es mejor
+MAYOR_ES_MEJOR = {'ops_por_segundo'}
+
+def comparar(actual, base, tolerancia):
+    """Lista de regresiones superiores a la tolerancia (fracción) respecto a la base"""
+    anteriores = {_clave(r): r for r in base['resultados']}
+    regresiones = []
+    for r in actual['resultados']:
+        anterior = anteriores.get(_clave(r))
+        if not anterior:
+            continue
+        for metrica, valor in r.items():
+            if metrica in ('nombre', 'parametros') or metrica not in anterior or not anterior[metrica]:
+                continue
+            cambio = (valor - anterior[metrica]) / anterior[metrica]
+            if metrica in MAYOR_ES_MEJOR:
+                cambio = -cambio
+            if cambio > tolerancia:
+                regresiones.append(f"{r['nombre']} {r['parametros']} {metrica}: "
+                                   f"{anterior[metrica]:.6g} → {valor:.6g} ({cambio:+.0%} peor)")
+    return regresiones
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del parking")
+    parser.add_argument("--rapido", action="store_true", help="Solo capacidades pequeñas")
+    parser.add_argument("--salida", default=ARCHIVO_RESULTADOS, help="Archivo JSON de resultados")
+    parser.add_argument("--base", default=None, help="Resultados de referencia con los que comparar")
+    parser.add_argument("--guardar-base", action="store_true", help=f"Guarda los resultados en {ARCHIVO_BASE}")
+    parser.add_argument("--tolerancia", type=float, default=0.25,
+                        help="Empeoramiento relativo permitido antes de marcar regresión")
+    args = parser.parse_args()
+
+    print("🏁 Ejecutando benchmarks...")
+    actual = ejecutar(args.rapido)
+
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(actual, f, indent=2, ensure_ascii=False)
+    print(f"💾 Resultados guardados en {args.salida}")
+
+    if args.guardar_base:
+        with open(ARCHIVO_BASE, 'w', encoding='utf-8') as f:
+            json.dump(actual, f, indent=2, ensure_ascii=False)
+        print(f"📌 Base actualizada en {ARCHIVO_BASE}")
+
+    ruta_base = args.base or (ARCHIVO_BASE if os.path.exists(ARCHIVO_BASE) and not args.guardar_base else None)
+    if ruta_base:
+        with open(ruta_base, encoding='utf-8') as f:
+            base = json.load(f)
+        regresiones = comparar(actual, base, args.tolerancia)
+        if regresiones:
+            print(f"❌ {len(regresiones)} regresiones respecto a {ruta_base}:")
+            for linea in regresiones:
+                print(f"   {linea}")
+            sys.exit(1)
+        print(f"✅ Sin regresiones respecto a {ruta_base}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Generador de carga para la API de barreras (servidor.py)
+
+Abre una conexión persistente por barrera y cada barrera envía lotes de
+peticiones encadenadas (sin esperar respuesta entre ellas): entradas con su
+propia matrícula, salidas de coches que metió antes, cotizaciones y estado.
+Mide la latencia de cada petición desde que se escribe hasta que llega su
+respuesta e informa de p50/p99 y peticiones por segundo.
+
+Uso:
+    python carga.py --lanzar --barreras 2000 --segundos 10
+    python carga.py --puerto 8765 --barreras 500 --profundidad 8 --pausa 50
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import time
+
+from parking_privado import Histograma, CAPACIDAD_MAXIMA
+from servidor import PUERTO, MAX_LINEA, ampliar_descriptores, servir
+
+OPERACIONES = ["entrada", "salida", "cotizar", "estado"]
+PESOS_OPERACIONES = [0.4, 0.3, 0.2, 0.1]
+TIPOS = ["NORMAL", "MINUSVALIDO", "MOTO", "ELECTRICO"]
+PESOS_TIPOS = [0.5, 0.2, 0.15, 0.15]
+
+class Barrera:
+    """Una barrera simulada con su conexión y los coches que ha dejado entrar"""
+    def __init__(self, numero, profundidad, pausa):
+        self.numero = numero
+        self.profundidad = profundidad
+        self.pausa = pausa
+        self.dentro = []
+        self._secuencia = 0
+        self.reader = None
+        self.writer = None
+
+    async def conectar(self, host, puerto):
+        self.reader, self.writer = await asyncio.open_connection(host, puerto, limit=MAX_LINEA)
+
+    def _peticion(self):
+        self._secuencia += 1
+        op = random.choices(OPERACIONES, weights=PESOS_OPERACIONES)[0]
+        peticion = {"id": self._secuencia, "op": op}
+        if op == "salida" and not self.dentro:
+            op = peticion["op"] = "entrada"
+        if op == "entrada":
+            peticion["matricula"] = f"B{self.numero:04d}{self._secuencia:06d}"
+            peticion["tipo"] = random.choices(TIPOS, weights=PESOS_TIPOS)[0]
+            peticion["carril"] = self.numero
+        elif op == "salida":
+            # Solo coches cuya entrada ya se confirmó en un lote anterior
+            peticion["matricula"] = self.dentro.pop(random.randrange(len(self.dentro)))
+        elif op == "cotizar":
+            peticion["tipo"] = random.choices(TIPOS, weights=PESOS_TIPOS)[0]
+        return peticion
+
+    async def trabajar(self, fin, latencias, resultado):
+        while time.perf_counter() < fin:
+            lote = [self._peticion() for _ in range(self.profundidad)]
+            enviado = time.perf_counter()
+            self.writer.write(b"".join(json.dumps(p).encode() + b"\n" for p in lote))
+            await self.writer.drain()
+            for peticion in lote:
+                linea = await self.reader.readline()
+                if not linea:
+                    resultado["errores"] += 1
+                    return
+                latencias[peticion["op"]].añadir((time.perf_counter() - enviado) * 1e6)
+                respuesta = json.loads(linea)
+                if respuesta.get("id") != peticion["id"]:
+                    resultado["desordenadas"] += 1
+                if respuesta.get("ok"):
+                    resultado["aceptadas"] += 1
+                    if peticion["op"] == "entrada":
+                        self.dentro.append(peticion["matricula"])
+                resultado["peticiones"] += 1
+            if self.pausa:
+                await asyncio.sleep(random.uniform(0, 2 * self.pausa) / 1000)
+
+    def cerrar(self):
+        if self.writer:
+            self.writer.close()
+
+async def ejecutar(host, puerto, barreras, segundos, profundidad, pausa):
+    """Conecta todas las barreras, las hace trabajar y devuelve el informe"""
+    puestas = [Barrera(n, profundidad, pausa) for n in range(barreras)]
+    inicio = time.perf_counter()
+    conexiones = await asyncio.gather(*(b.conectar(host, puerto) for b in puestas), return_exceptions=True)
+    fallidas = [c for c in conexiones if isinstance(c, Exception)]
+    activas = [b for b, c in zip(puestas, conexiones) if not isinstance(c, Exception)]
+    tiempo_conexion = time.perf_counter() - inicio
+
+    latencias = {op: Histograma() for op in OPERACIONES}
+    resultado = {"peticiones": 0, "aceptadas": 0, "errores": 0, "desordenadas": 0}
+    inicio = time.perf_counter()
+    await asyncio.gather(
+        *(b.trabajar(inicio + segundos, latencias, resultado) for b in activas), return_exceptions=True
+    )
+    duracion = time.perf_counter() - inicio
+    for b in activas:
+        b.cerrar()
+
+    total = Histograma()
+    for h in latencias.values():
+        total.fusionar(h)
+    resumen = lambda h: {
+        "cuenta": h.cuenta,
+        "p50_ms": (h.percentil(50) or 0) / 1000,
+        "p99_ms": (h.percentil(99) or 0) / 1000,
+        "max_ms": (h.maximo or 0) / 1000,
+    }
+    return {
+        "barreras": len(activas),
+        "conexiones_fallidas": len(fallidas),
+        "segundos_conexion": tiempo_conexion,
+        "duracion": duracion,
+        "peticiones_por_segundo": resultado["peticiones"] / duracion if duracion else 0.0,
+        **resultado,
+        "latencia": resumen(total),
+        "por_operacion": {op: resumen(h) for op, h in latencias.items()},
+    }
+
+def lanzar_servidor(host, puerto, capacidad):
+    """Arranca el servidor en otro proceso (su propio GIL) y espera a que escuche"""
+    listo = multiprocessing.Event()
+    proceso = multiprocessing.Process(
+        target=servir, args=(host, puerto, capacidad, False, listo), daemon=True, name="servidor-parking"
+    )
+    proceso.start()
+    if not listo.wait(30):
+        proceso.terminate()
+        raise SystemExit("❌ El servidor no arrancó")
+    return proceso
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga sobre la API de barreras")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=PUERTO)
+    parser.add_argument("--barreras", type=int, default=1000, help="Conexiones simultáneas")
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--profundidad", type=int, default=4, help="Peticiones encadenadas por lote")
+    parser.add_argument("--pausa", type=float, default=0, help="Pausa media entre lotes (ms)")
+    parser.add_argument("--lanzar", action="store_true", help="Arranca también el servidor")
+    parser.add_argument("--capacidad", type=int, default=CAPACIDAD_MAXIMA, help="Plazas del servidor lanzado")
+    parser.add_argument("--semilla", type=int, default=1234)
+    parser.add_argument("--json", action="store_true", help="Imprime el informe en JSON")
+    args = parser.parse_args()
+
+    random.seed(args.semilla)
+    limite = ampliar_descriptores()
+    if limite is not None and args.barreras + 16 > limite:
+        print(f"⚠️ Límite de {limite} descriptores: algunas barreras no podrán conectar")
+    proceso = lanzar_servidor(args.host, args.puerto, args.capacidad) if args.lanzar else None
+    try:
+        informe = asyncio.run(ejecutar(
+            args.host, args.puerto, args.barreras, args.segundos, args.profundidad, args.pausa
+        ))
+    finally:
+        if proceso:
+            proceso.terminate()
+
+    if args.json:
+        print(json.dumps(informe, indent=2, ensure_ascii=False))
+        return
+    lat = informe["latencia"]
+    print(f"🔌 {informe['barreras']} barreras conectadas en {informe['segundos_conexion']:.2f}s "
+          f"({informe['conexiones_fallidas']} fallidas)")
+    print(f"📊 {informe['peticiones']} peticiones en {informe['duracion']:.1f}s: "
+          f"{informe['peticiones_por_segundo']:.0f} pet/s | p50 {lat['p50_ms']:.2f}ms | "
+          f"p99 {lat['p99_ms']:.2f}ms | max {lat['max_ms']:.2f}ms")
+    for op, d in informe["por_operacion"].items():
+        print(f"   {op:<8} {d['cuenta']:>8} | p50 {d['p50_ms']:.2f}ms | p99 {d['p99_ms']:.2f}ms")
+    if informe["errores"] or informe["desordenadas"]:
+        print(f"⚠️ {informe['errores']} conexiones cortadas, {informe['desordenadas']} respuestas fuera de orden")
+
+if __name__ == "__main__":
+    main()
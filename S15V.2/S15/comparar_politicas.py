@@ -0,0 +1,159 @@
+"""Compara políticas de asignación, salida automática y tarifa sobre la misma traza
+
+Cada combinación de políticas (ver POLITICAS_ASIGNACION, POLITICAS_SALIDA y
+POLITICAS_TARIFA) reproduce la misma secuencia de llegadas y salidas, con el reloj
+de la traza y la misma semilla, sobre un Parking nuevo. Se mide la latencia de cada
+entrada y salida, la tasa de rechazo (rechazos por llegada) y la recaudación.
+
+La traza puede ser un parking.log de S15 o un JSONL (ver reproducir.py); sin archivo
+se genera una sintética. Las salidas sin matrícula las elige la política de salida,
+así que en la sintética todas las salidas son automáticas.
+
+Uso:
+    python comparar_politicas.py --dias 1 --capacidad 300
+    python comparar_politicas.py ../../S15/parking.log --asignacion sondeo,aleatoria --salida ponderada
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from parking_privado import (
+    Parking, Histograma, RELOJ, CAPACIDAD_MAXIMA, PLAZAS_POR_FILA, TARIFA_DINAMICA, PATRONES_TRAFICO,
+    POLITICAS_ASIGNACION, POLITICAS_SALIDA, POLITICAS_TARIFA
+)
+from reproducir import Evento, leer_traza
+
+PASO_SEGUNDOS = 30
+OCUPACION_OBJETIVO = 0.85  # Las salidas compensan las llegadas medias alrededor de esta ocupación
+ESTANCIA_MEDIA = 150       # Minutos
+TIPOS = ["NORMAL", "MINUSVALIDO", "MOTO", "ELECTRICO"]
+PESOS_TIPOS = [0.5, 0.2, 0.15, 0.15]
+
+def _multiplicador(hora):
+    for rango, mult in PATRONES_TRAFICO.items():
+        if hora in rango:
+            return mult
+    return 1.0
+
+def traza_sintetica(dias, capacidad, columnas, semilla, inicio):
+    """Llegadas según PATRONES_TRAFICO y salidas automáticas a ritmo constante"""
+    rng = random.Random(semilla)
+    por_paso = capacidad * OCUPACION_OBJETIVO / (ESTANCIA_MEDIA * 60 / PASO_SEGUNDOS)
+    eventos = [Evento(inicio, "inicio", capacidad=capacidad, columnas=columnas)]
+    llegadas = 0
+    for paso in range(int(dias * 86400 / PASO_SEGUNDOS)):
+        momento = inicio + timedelta(seconds=paso * PASO_SEGUNDOS)
+        esperadas = por_paso * _multiplicador(momento.hour)
+        for _ in range(int(esperadas) + (rng.random() < esperadas % 1)):
+            llegadas += 1
+            tipo = rng.choices(TIPOS, weights=PESOS_TIPOS)[0]
+            eventos.append(Evento(momento, "entrada", f"S{llegadas:07d}", tipo))
+        for _ in range(int(por_paso) + (rng.random() < por_paso % 1)):
+            eventos.append(Evento(momento, "salida"))
+    return eventos
+
+def ejecutar(eventos, asignacion, salida, tarifa, semilla, capacidad=None, columnas=None,
+             tarifa_dinamica=TARIFA_DINAMICA):
+    """Reproduce los eventos con una combinación de políticas y devuelve su informe"""
+    random.seed(semilla)  # La aleatoriedad del motor (y de las políticas) es la misma en cada ejecución
+    parking = None
+    latencias = {"entrada": Histograma(), "salida": Histograma()}
+    llegadas = 0
+    try:
+        for evento in eventos:
+            RELOJ.fijar(evento.momento)
+            if parking is None:
+                parking = Parking(
+                    capacidad or evento.capacidad or CAPACIDAD_MAXIMA, columnas or evento.columnas or PLAZAS_POR_FILA,
+                    tarifa_dinamica, asignacion, eleccion_salida=salida, tarifa=tarifa
+                )
+            if evento.evento in ("entrada", "rechazo"):
+                llegadas += 1
+                t = time.perf_counter()
+                parking.entrada(matricula=evento.matricula, tipo=evento.tipo_vehiculo)
+                latencias["entrada"].añadir((time.perf_counter() - t) * 1e6)
+            elif evento.evento == "salida":
+                t = time.perf_counter()
+                if evento.matricula is None:
+                    parking.salida_aleatoria()
+                else:
+                    plaza = parking.localizar(evento.matricula)
+                    if plaza:
+                        parking.salida(plaza.id)
+                latencias["salida"].añadir((time.perf_counter() - t) * 1e6)
+    finally:
+        RELOJ.soltar()
+
+    stats = parking.obtener_estadisticas() if parking else {
+        'total_entradas': 0, 'total_salidas': 0, 'rechazos': 0, 'recaudacion_total': 0.0
+    }
+    return {
+        'asignacion': asignacion,
+        'salida': salida,
+        'tarifa': tarifa,
+        'llegadas': llegadas,
+        'entradas': stats['total_entradas'],
+        'salidas': stats['total_salidas'],
+        'rechazos': stats['rechazos'],
+        'tasa_rechazo': stats['rechazos'] / llegadas if llegadas else 0.0,
+        'recaudacion': round(stats['recaudacion_total'], 2),
+        'latencia_us': {
+            op: {'p50': h.percentil(50) or 0.0, 'p99': h.percentil(99) or 0.0} for op, h in latencias.items()
+        },
+    }
+
+def _lista(texto, politicas):
+    nombres = texto.split(",") if texto else list(politicas)
+    for nombre in nombres:
+        if nombre not in politicas:
+            raise SystemExit(f"❌ Política desconocida: {nombre} (disponibles: {', '.join(politicas)})")
+    return nombres
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara políticas del parking sobre la misma traza")
+    parser.add_argument("traza", nargs="?", help="parking.log de S15 o traza JSONL (por defecto, sintética)")
+    parser.add_argument("--asignacion", help=f"Separadas por comas (por defecto: {','.join(POLITICAS_ASIGNACION)})")
+    parser.add_argument("--salida", help=f"Separadas por comas (por defecto: {','.join(POLITICAS_SALIDA)})")
+    parser.add_argument("--tarifa", help=f"Separadas por comas (por defecto: {','.join(POLITICAS_TARIFA)})")
+    parser.add_argument("--dias", type=float, default=1, help="Duración de la traza sintética")
+    parser.add_argument("--capacidad", type=int, default=None)
+    parser.add_argument("--columnas", type=int, default=None, help="Plazas por fila")
+    parser.add_argument("--tarifa-dinamica", action="store_true")
+    parser.add_argument("--semilla", type=int, default=1234)
+    parser.add_argument("--json", action="store_true", help="Imprime el informe en JSON")
+    args = parser.parse_args()
+
+    combinaciones = [
+        (a, s, t)
+        for a in _lista(args.asignacion, POLITICAS_ASIGNACION)
+        for s in _lista(args.salida, POLITICAS_SALIDA)
+        for t in _lista(args.tarifa, POLITICAS_TARIFA)
+    ]
+    if args.traza:
+        eventos = lambda: leer_traza(args.traza)
+    else:
+        sintetica = traza_sintetica(
+            args.dias, args.capacidad or 300, args.columnas or PLAZAS_POR_FILA, args.semilla,
+            datetime(2026, 1, 5)  # Un lunes a medianoche
+        )
+        eventos = lambda: sintetica
+    resultados = [
+        ejecutar(eventos(), a, s, t, args.semilla, args.capacidad, args.columnas, args.tarifa_dinamica)
+        for a, s, t in combinaciones
+    ]
+
+    if args.json:
+        print(json.dumps(resultados, indent=2, ensure_ascii=False))
+        return
+    print(f"{'asignación':<10} {'salida':<9} {'tarifa':<6} | {'llegadas':>8} {'rechazo':>7} {'recaudación':>12} | "
+          f"{'entrada p50/p99 µs':>19} | {'salida p50/p99 µs':>18}")
+    for r in resultados:
+        e, s = r['latencia_us']['entrada'], r['latencia_us']['salida']
+        print(f"{r['asignacion']:<10} {r['salida']:<9} {r['tarifa']:<6} | {r['llegadas']:>8} "
+              f"{r['tasa_rechazo']*100:>6.1f}% {r['recaudacion']:>11.2f}€ | "
+              f"{e['p50']:>8.1f} / {e['p99']:>8.1f} | {s['p50']:>7.1f} / {s['p99']:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""Federación de parkings: muchos sitios repartidos entre procesos trabajadores
+
+Cada trabajador aloja uno o varios Parking (cada uno con su capacidad, plano y
+tarifas) y, tras cada evento, publica los contadores de cada sitio en un bloque de
+memoria compartida. El proceso principal enruta cada llegada al sitio con más
+hueco para ese tipo de vehículo y agrega ocupación y estadísticas leyendo solo esos
+contadores: ni recorre plazas ni pregunta a los trabajadores.
+
+Contadores por sitio (64 bytes, CONTADORES):
+    secuencia, capacidad, ocupadas, libres GENERAL / MINUSVALIDO / ELECTRICA, cola,
+    entradas, salidas, rechazos, recaudación
+
+La secuencia funciona como un seqlock (ver motor_compartido.py): impar mientras el
+trabajador escribe los contadores; el valor par se escribe al final.
+
+Uso:
+    python federacion.py --sitios 8 --capacidad 500 --trabajadores 4 --llegadas 50000
+"""
+import argparse
+import multiprocessing as mp
+import os
+import random
+import struct
+import threading
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+from parking_privado import (
+    Parking, Coche, GestorPlazas, TIPOS_VEHICULO, CAPACIDAD_MAXIMA, PLAZAS_POR_FILA, TARIFA_DINAMICA, ASIGNACION
+)
+
+CONTADORES = struct.Struct("<QIIIIIIQQQd")
+TAM_CONTADORES = 64
+CATEGORIAS = ("GENERAL", "MINUSVALIDO", "ELECTRICA")
+OCUPACION_FLEXIBLE = 0.8  # Como en GestorPlazas.asignar: por encima se usan plazas eléctricas
+
+Sitio = namedtuple("Sitio", ["nombre", "capacidad", "columnas", "tarifa_dinamica", "asignacion", "precio_hora"],
+                   defaults=[CAPACIDAD_MAXIMA, PLAZAS_POR_FILA, TARIFA_DINAMICA, ASIGNACION, None])
+
+# Categorías de plaza que puede usar cada tipo de vehículo, sin y con flexibilidad
+COMPATIBLES = {
+    (tipo, flexible): tuple(CATEGORIAS.index(c) for c in GestorPlazas._categorias_compatibles(Coche("", tipo), flexible))
+    for tipo in TIPOS_VEHICULO for flexible in (False, True)
+}
+
+class ContadoresSitio:
+    """Vista sobre los contadores de un sitio en el bloque compartido"""
+    def __init__(self, buf, indice):
+        self._vista = buf[indice * TAM_CONTADORES:(indice + 1) * TAM_CONTADORES]
+        self._secuencia = 0
+
+    def publicar(self, parking):
+        """Escribe los contadores del parking (solo el trabajador que lo aloja)"""
+        plazas = parking._plazas
+        libres = plazas.libres_por_categoria()
+        stats = parking.obtener_estadisticas()
+        self._secuencia += 1  # impar: escritura en curso
+        struct.pack_into("<Q", self._vista, 0, self._secuencia)
+        CONTADORES.pack_into(
+            self._vista, 0, self._secuencia, len(plazas.estado()), plazas.num_ocupadas(),
+            *(libres.get(c, 0) for c in CATEGORIAS), parking.obtener_info_cola(),
+            stats['total_entradas'], stats['total_salidas'], stats['rechazos'], stats['recaudacion_total']
+        )
+        # La secuencia par se guarda lo último, cuando los contadores ya están completos
+        self._secuencia += 1
+        struct.pack_into("<Q", self._vista, 0, self._secuencia)
+
+    def leer(self):
+        """Contadores consistentes (reintenta si coincide con una escritura)"""
+        while True:
+            valores = CONTADORES.unpack_from(self._vista)
+            if valores[0] % 2 == 0 and struct.unpack_from("<Q", self._vista)[0] == valores[0]:
+                return valores
+            time.sleep(0)
+
+    def liberar(self):
+        self._vista.release()
+
+# ======================================================
+# PROCESOS TRABAJADORES
+# ======================================================
+
+def _salida_matricula(parking, matricula):
+    plaza = parking.localizar(matricula)
+    if not plaza:
+        return False, f"{matricula} no está en el parking"
+    return parking.salida(plaza.id)
+
+OPERACIONES = {
+    "entrada": Parking.entrada,
+    "salida": Parking.salida,
+    "salida_matricula": _salida_matricula,
+    "salida_aleatoria": Parking.salida_aleatoria,
+    "cotizar": Parking.cotizar,
+    "obtener_estadisticas": Parking.obtener_estadisticas,
+}
+
+def proceso_trabajador(sitios, primero, nombre_memoria, conexion):
+    """Aloja los sitios [primero, primero + len(sitios)) y atiende sus órdenes"""
+    memoria = shared_memory.SharedMemory(name=nombre_memoria)
+    parkings = []
+    contadores = []
+    for k, sitio in enumerate(sitios):
+        parking = Parking(sitio.capacidad, sitio.columnas, sitio.tarifa_dinamica, sitio.asignacion, sitio.precio_hora)
+        c = ContadoresSitio(memoria.buf, primero + k)
+        # Observador síncrono: los contadores están al día antes de responder
+        parking.añadir_observador(lambda evento, parking=parking, c=c: c.publicar(parking))
+        c.publicar(parking)
+        parkings.append(parking)
+        contadores.append(c)
+    conexion.send("listo")
+
+    try:
+        while True:
+            mensaje = conexion.recv()
+            if mensaje is None:
+                break
+            indice, operacion, kwargs = mensaje
+            try:
+                conexion.send(OPERACIONES[operacion](parkings[indice - primero], **kwargs))
+            except Exception as e:
+                conexion.send(e)
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        for c in contadores:
+            c.liberar()
+        memoria.close()
+
+# ======================================================
+# FEDERACIÓN
+# ======================================================
+
+class Federacion:
+    """Enruta llegadas entre sitios alojados en procesos trabajadores"""
+    def __init__(self, sitios, trabajadores=None):
+        self.sitios = list(sitios)
+        n = len(self.sitios)
+        trabajadores = max(1, min(trabajadores or os.cpu_count() or 1, n))
+        self._memoria = shared_memory.SharedMemory(create=True, size=n * TAM_CONTADORES)
+        self._memoria.buf[:n * TAM_CONTADORES] = bytes(n * TAM_CONTADORES)
+        self._contadores = [ContadoresSitio(self._memoria.buf, i) for i in range(n)]
+
+        # Sitios consecutivos por trabajador
+        self._conexiones = []
+        self._procesos = []
+        self._trabajador_de = []
+        por_trabajador = -(-n // trabajadores)
+        for t, primero in enumerate(range(0, n, por_trabajador)):
+            grupo = self.sitios[primero:primero + por_trabajador]
+            propia, remota = mp.Pipe()
+            proceso = mp.Process(
+                target=proceso_trabajador, args=(grupo, primero, self._memoria.name, remota),
+                daemon=True, name=f"sitios-{primero}"
+            )
+            proceso.start()
+            self._conexiones.append(propia)
+            self._procesos.append(proceso)
+            self._trabajador_de += [t] * len(grupo)
+        self._locks = [threading.Lock() for _ in self._conexiones]
+        for conexion in self._conexiones:
+            conexion.recv()  # "listo"
+
+    def _llamar(self, sitio, operacion, **kwargs):
+        t = self._trabajador_de[sitio]
+        with self._locks[t]:
+            self._conexiones[t].send((sitio, operacion, kwargs))
+            resultado = self._conexiones[t].recv()
+        if isinstance(resultado, Exception):
+            raise resultado
+        return resultado
+
+    # --------------------------------------------------
+    # Enrutado
+    # --------------------------------------------------
+
+    def libres_para(self, sitio, tipo_vehiculo):
+        """Plazas libres del sitio que puede usar ese tipo de vehículo"""
+        return self._libres_compatibles(self._contadores[sitio].leer(), tipo_vehiculo)
+
+    @staticmethod
+    def _libres_compatibles(valores, tipo_vehiculo):
+        _, capacidad, ocupadas, *libres = valores[:6]
+        flexible = ocupadas > capacidad * OCUPACION_FLEXIBLE
+        return sum(libres[k] for k in COMPATIBLES[(tipo_vehiculo, flexible)])
+
+    def elegir_sitio(self, tipo_vehiculo):
+        """Sitio con mayor proporción de plazas libres compatibles; si no hay, el de menos cola"""
+        lecturas = [c.leer() for c in self._contadores]
+        huecos = [self._libres_compatibles(v, tipo_vehiculo) / max(v[1], 1) for v in lecturas]
+        mejor = max(range(len(huecos)), key=huecos.__getitem__)
+        if huecos[mejor] > 0:
+            return mejor
+        colas = [v[6] / max(v[1], 1) for v in lecturas]
+        return colas.index(min(colas))
+
+    def entrada(self, tipo=None, **kwargs):
+        """Envía la llegada al mejor sitio; devuelve (sitio, éxito, mensaje)"""
+        if tipo is None:
+            tipo = random.choices(
+                ["NORMAL", "MINUSVALIDO", "MOTO", "ELECTRICO"],
+                weights=[0.5, 0.2, 0.15, 0.15]
+            )[0]
+        sitio = self.elegir_sitio(tipo)
+        exito, mensaje = self.entrada_en(sitio, tipo=tipo, **kwargs)
+        return sitio, exito, mensaje
+
+    def entrada_en(self, sitio, **kwargs):
+        """Entrada en un sitio concreto (mismos argumentos que Parking.entrada)"""
+        return self._llamar(sitio, "entrada", **kwargs)
+
+    def salida(self, sitio, pid=None, matricula=None):
+        if matricula is not None:
+            return self._llamar(sitio, "salida_matricula", matricula=matricula)
+        return self._llamar(sitio, "salida", pid=pid)
+
+    def salida_aleatoria(self, sitio):
+        return self._llamar(sitio, "salida_aleatoria")
+
+    def cotizar(self, sitio, tipo_vehiculo="NORMAL"):
+        return self._llamar(sitio, "cotizar", tipo_vehiculo=tipo_vehiculo)
+
+    # --------------------------------------------------
+    # Agregados (solo contadores)
+    # --------------------------------------------------
+
+    def ocupacion(self):
+        """Ocupación total y por sitio"""
+        por_sitio = []
+        for sitio, c in zip(self.sitios, self._contadores):
+            _, capacidad, ocupadas, *_, cola, _, _, _, _ = c.leer()
+            por_sitio.append({
+                'nombre': sitio.nombre, 'capacidad': capacidad, 'ocupadas': ocupadas,
+                'tasa': ocupadas / capacidad if capacidad else 0.0, 'cola': cola
+            })
+        capacidad = sum(s['capacidad'] for s in por_sitio)
+        ocupadas = sum(s['ocupadas'] for s in por_sitio)
+        return {
+            'capacidad': capacidad,
+            'ocupadas': ocupadas,
+            'tasa': ocupadas / capacidad if capacidad else 0.0,
+            'cola': sum(s['cola'] for s in por_sitio),
+            'sitios': por_sitio,
+        }
+
+    def obtener_estadisticas(self):
+        """Suma de las estadísticas de todos los sitios"""
+        total = {'total_entradas': 0, 'total_salidas': 0, 'rechazos': 0, 'recaudacion_total': 0.0}
+        for c in self._contadores:
+            *_, entradas, salidas, rechazos, recaudacion = c.leer()
+            total['total_entradas'] += entradas
+            total['total_salidas'] += salidas
+            total['rechazos'] += rechazos
+            total['recaudacion_total'] += recaudacion
+        return total
+
+    def cerrar(self):
+        for conexion in self._conexiones:
+            try:
+                conexion.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for proceso in self._procesos:
+            proceso.join(timeout=5)
+        for c in self._contadores:
+            c.liberar()
+        self._memoria.close()
+        self._memoria.unlink()
+
+def main():
+    parser = argparse.ArgumentParser(description="Federación de parkings con enrutado de llegadas")
+    parser.add_argument("--sitios", type=int, default=8)
+    parser.add_argument("--capacidad", type=int, default=500, help="Capacidad media por sitio")
+    parser.add_argument("--trabajadores", type=int, help="Procesos (por defecto, uno por CPU)")
+    parser.add_argument("--llegadas", type=int, default=20000)
+    parser.add_argument("--semilla", type=int, default=1234)
+    args = parser.parse_args()
+
+    rng = random.Random(args.semilla)
+    # Sitios distintos: capacidad, filas, tarifa base y política de asignación
+    sitios = [
+        Sitio(f"S{i + 1}", max(8, int(args.capacidad * rng.uniform(0.5, 1.5))), rng.choice([8, 10, 20]),
+              rng.random() < 0.7, rng.choice(["cercana", "aleatoria"]), rng.choice([None, 180, 240, 300]))
+        for i in range(args.sitios)
+    ]
+    federacion = Federacion(sitios, args.trabajadores)
+    try:
+        dentro = []
+        cortas = 0
+        inicio = time.perf_counter()
+        enrutado = 0.0
+        for n in range(args.llegadas):
+            tipo = rng.choices(["NORMAL", "MINUSVALIDO", "MOTO", "ELECTRICO"], weights=[0.5, 0.2, 0.15, 0.15])[0]
+            t = time.perf_counter()
+            sitio = federacion.elegir_sitio(tipo)
+            enrutado += time.perf_counter() - t
+            matricula = f"F{n:07d}"
+            exito, _ = federacion.entrada_en(sitio, tipo=tipo, matricula=matricula)
+            if exito:
+                dentro.append((sitio, matricula))
+            # Las salidas mantienen la federación alrededor del 85% de ocupación
+            while dentro and federacion.ocupacion()['tasa'] > 0.85:
+                i = rng.randrange(len(dentro))
+                dentro[i], dentro[-1] = dentro[-1], dentro[i]
+                sitio, matricula = dentro.pop()
+                # En tiempo real casi todas las estancias quedan por debajo del mínimo y no se cobran
+                cortas += not federacion.salida(sitio, matricula=matricula)[0]
+        duracion = time.perf_counter() - inicio
+    finally:
+        ocupacion = federacion.ocupacion()
+        stats = federacion.obtener_estadisticas()
+        federacion.cerrar()
+
+    print(f"🏙️ {len(sitios)} sitios, {ocupacion['capacidad']} plazas en {len(federacion._procesos)} procesos")
+    print(f"📊 {args.llegadas} llegadas en {duracion:.1f}s ({args.llegadas / duracion:.0f}/s) | "
+          f"enrutado {enrutado / args.llegadas * 1e6:.1f}µs por llegada")
+    print(f"🚗 Entradas {stats['total_entradas']} | 🚪 Salidas {stats['total_salidas']} | "
+          f"⏱️ Cortas {cortas} | ❌ Rechazos {stats['rechazos']} | 💰 {stats['recaudacion_total']:.2f}€ | "
+          f"Ocupación {ocupacion['tasa']*100:.1f}%")
+    for sitio, datos in zip(sitios, ocupacion['sitios']):
+        print(f"   {sitio.nombre}: {datos['ocupadas']}/{datos['capacidad']} ({datos['tasa']*100:.0f}%) | "
+              f"cola {datos['cola']} | {sitio.asignacion}, "
+              f"{'dinámica' if sitio.tarifa_dinamica else 'fija'}, base {sitio.precio_hora or 'por defecto'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,620 @@
+"""Histórico de entradas y salidas en formato columnar, particionado por día
+
+Cada día es una carpeta con un archivo binario por columna, de tamaño fijo por
+fila, al que solo se añade al final. Las consultas abren las columnas con mmap y
+leen solo las filas necesarias: por tiempo con búsqueda binaria sobre la columna
+momento y por matrícula con un índice ordenado que se escribe al cerrar el día.
+Matrículas y plazas se guardan como códigos de un diccionario del día, así que
+admiten cualquier longitud.
+
+    historico/
+        2026-01-14/
+            momento.col        int64   microsegundos desde epoch, no decreciente
+            evento.col         uint8   entrada / salida / rechazo / encolado
+            tipo_vehiculo.col  uint8
+            tipo_parking.col   uint8
+            plaza.col          uint32  código en plaza.dic (0 = sin plaza)
+            matricula.col      uint32  código en matricula.dic (0 = sin matrícula)
+            precio.col         float32
+            duracion.col       float32 segundos de estancia (salidas)
+            ocupadas.col       uint32  plazas ocupadas tras el evento
+            plaza.dic          un texto por línea; el código es su número de línea
+            matricula.dic
+            matricula.idx      (código, fila) ordenado; solo en días cerrados
+
+Si el proceso cae a mitad de una fila, al reabrir el día se recortan todas las
+columnas a las filas completas.
+
+Uso:
+    python historico.py importar ../../S15/parking.log
+    python historico.py matricula 2472YCF
+    python historico.py rango --desde 2026-01-14T17:00 --hasta 2026-01-14T18:00 --evento salida
+    python historico.py ocupacion --desde 2026-01-01 --hasta 2026-02-01
+"""
+import argparse
+import bisect
+from array import array
+import mmap
+import os
+import re
+import struct
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+from parking_privado import TIPOS_VEHICULO, TIPOS_PARKING
+
+EVENTOS = ["entrada", "salida", "rechazo", "encolado"]
+CODIGOS_VEHICULO = list(TIPOS_VEHICULO)
+CODIGOS_PARKING = list(TIPOS_PARKING)
+SIN_CODIGO = 255
+
+COLUMNAS = [
+    ("momento", "q"),
+    ("evento", "B"),
+    ("tipo_vehiculo", "B"),
+    ("tipo_parking", "B"),
+    ("plaza", "I"),
+    ("matricula", "I"),
+    ("precio", "f"),
+    ("duracion", "f"),
+    ("ocupadas", "I"),
+]
+TEXTOS = ("plaza", "matricula")  # Columnas codificadas con diccionario
+REGISTRO_INDICE = struct.Struct("II")
+
+RegistroHistorico = namedtuple("RegistroHistorico", [
+    "momento", "evento", "matricula", "tipo_vehiculo", "tipo_parking",
+    "plaza", "precio", "duracion", "ocupadas"
+])
+
+_NOMBRE_PARTICION = re.compile(r"^\d{4}-\d\d-\d\d$")
+
+def _a_micros(momento):
+    return int(momento.timestamp() * 1_000_000)
+
+def _de_micros(micros):
+    return datetime.fromtimestamp(micros / 1_000_000)
+
+def _codigo(tabla, valor):
+    return tabla.index(valor) if valor in tabla else SIN_CODIGO
+
+def _valor(tabla, codigo):
+    return tabla[codigo] if codigo < len(tabla) else None
+
+class _Diccionario:
+    """Textos distintos de una columna en un día: el código de cada uno es su línea (desde 1)"""
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.textos = [None]
+        self._codigos = {}
+        self._archivo = None
+        if os.path.exists(ruta):
+            with open(ruta, 'rb') as f:
+                datos = f.read()
+            # Una última línea sin terminar es de una escritura interrumpida
+            for linea in datos[:datos.rfind(b"\n") + 1].decode("utf-8").splitlines():
+                self._codigos[linea] = len(self.textos)
+                self.textos.append(linea)
+
+    def codigo(self, texto):
+        """Código de un texto ya visto (0 si es vacío, None si no está)"""
+        return self._codigos.get(texto) if texto else 0
+
+    def codificar(self, texto):
+        """Código del texto, añadiéndolo al archivo si es nuevo"""
+        if not texto:
+            return 0
+        texto = texto.replace("\n", " ")
+        codigo = self._codigos.get(texto)
+        if codigo is None:
+            if self._archivo is None:
+                self._archivo = open(self.ruta, 'ab')
+                self._archivo.truncate(len("".join(t + "\n" for t in self.textos[1:]).encode("utf-8")))
+            # Se escribe antes que la fila que lo usa: un código nunca queda sin texto
+            self._archivo.write(texto.encode("utf-8") + b"\n")
+            self._archivo.flush()
+            codigo = self._codigos[texto] = len(self.textos)
+            self.textos.append(texto)
+        return codigo
+
+    def cerrar(self):
+        if self._archivo is not None:
+            self._archivo.close()
+            self._archivo = None
+
+def _filas_completas(ruta):
+    """Filas de un día escritas enteras en todas las columnas, y el tamaño de cada columna"""
+    tamaños = {
+        nombre: os.path.getsize(os.path.join(ruta, f"{nombre}.col")) // struct.calcsize(formato)
+        if os.path.exists(os.path.join(ruta, f"{nombre}.col")) else 0
+        for nombre, formato in COLUMNAS
+    }
+    filas = min(tamaños.values())
+    # Una fila con un código sin texto en su diccionario tampoco llegó a escribirse entera
+    for nombre in TEXTOS:
+        textos = len(_Diccionario(os.path.join(ruta, f"{nombre}.dic")).textos)
+        columna = os.path.join(ruta, f"{nombre}.col")
+        if filas and os.path.exists(columna):
+            with open(columna, 'rb') as f:
+                codigos = array('I', f.read(filas * 4))
+            filas = next((i for i, codigo in enumerate(codigos) if codigo >= textos), filas)
+    return filas, tamaños
+
+def _reparar(ruta):
+    """Recorta todas las columnas de un día a las filas completas en todas (tras una caída)"""
+    filas, tamaños = _filas_completas(ruta)
+    for nombre, formato in COLUMNAS:
+        if tamaños[nombre] != filas:
+            with open(os.path.join(ruta, f"{nombre}.col"), 'ab') as f:
+                f.truncate(filas * struct.calcsize(formato))
+    return filas
+
+# ======================================================
+# LECTURA CON MMAP
+# ======================================================
+
+class _Columna:
+    """Columna de tamaño fijo mapeada en memoria"""
+    def __init__(self, ruta, formato):
+        self._formato = formato
+        self._tam = struct.calcsize(formato)
+        self._archivo = open(ruta, 'rb')
+        tamaño = os.fstat(self._archivo.fileno()).st_size
+        self._n = tamaño // self._tam
+        self._mm = mmap.mmap(self._archivo.fileno(), 0, access=mmap.ACCESS_READ) if self._n else None
+        # Las columnas numéricas se leen a través de una vista tipada, sin copiar
+        self._vista = None
+        if self._mm is not None:
+            self._vista = memoryview(self._mm)[:self._n * self._tam].cast(formato)
+
+    def __len__(self):
+        return self._n
+
+    def __getitem__(self, i):
+        return self._vista[i]
+
+    def valores(self, ini, fin):
+        """Lista con las filas [ini, fin) de la columna, copiadas de una vez"""
+        return self._vista[ini:fin].tolist() if self._vista is not None else []
+
+    def cerrar(self):
+        if self._vista is not None:
+            self._vista.release()
+        if self._mm is not None:
+            self._mm.close()
+        self._archivo.close()
+
+class _ColumnaTexto:
+    """Columna de códigos que devuelve el texto de cada fila"""
+    def __init__(self, codigos, diccionario):
+        self.codigos = codigos
+        self.diccionario = diccionario
+
+    def __len__(self):
+        return len(self.codigos)
+
+    def __getitem__(self, i):
+        return self.diccionario.textos[self.codigos[i]]
+
+class _Particion:
+    """Un día del histórico; abre las columnas bajo demanda
+
+    Con filas se ven solo las primeras: las de un día que otro proceso sigue escribiendo.
+    """
+    def __init__(self, ruta, filas=None):
+        self.ruta = ruta
+        self.filas = filas
+        self._columnas = {}
+        self._diccionarios = {}
+
+    def diccionario(self, nombre):
+        if nombre not in self._diccionarios:
+            self._diccionarios[nombre] = _Diccionario(os.path.join(self.ruta, f"{nombre}.dic"))
+        return self._diccionarios[nombre]
+
+    def codigos(self, nombre):
+        """Columna tal cual está en disco (para plaza y matrícula, los códigos)"""
+        if nombre not in self._columnas:
+            formato = dict(COLUMNAS)[nombre]
+            self._columnas[nombre] = _Columna(os.path.join(self.ruta, f"{nombre}.col"), formato)
+        return self._columnas[nombre]
+
+    def columna(self, nombre):
+        codigos = self.codigos(nombre)
+        return _ColumnaTexto(codigos, self.diccionario(nombre)) if nombre in TEXTOS else codigos
+
+    def __len__(self):
+        n = len(self.columna("momento"))
+        return n if self.filas is None else min(n, self.filas)
+
+    def filas_en_rango(self, desde, hasta):
+        """Filas [ini, fin) con momento en [desde, hasta) por búsqueda binaria"""
+        momentos = self.columna("momento")
+        n = len(self)
+        ini = 0 if desde is None else bisect.bisect_left(momentos, desde, 0, n)
+        fin = n if hasta is None else bisect.bisect_left(momentos, hasta, 0, n)
+        return ini, fin
+
+    def fila(self, i):
+        return RegistroHistorico(
+            _de_micros(self.columna("momento")[i]),
+            _valor(EVENTOS, self.columna("evento")[i]),
+            self.columna("matricula")[i],
+            _valor(CODIGOS_VEHICULO, self.columna("tipo_vehiculo")[i]),
+            _valor(CODIGOS_PARKING, self.columna("tipo_parking")[i]),
+            self.columna("plaza")[i],
+            self.columna("precio")[i],
+            self.columna("duracion")[i],
+            self.columna("ocupadas")[i],
+        )
+
+    def filas_de(self, matricula):
+        """Filas de una matrícula usando el índice ordenado del día"""
+        clave = self.diccionario("matricula").codigo(matricula)
+        if clave is None:
+            return []
+        ruta = os.path.join(self.ruta, "matricula.idx")
+        if not os.path.exists(ruta):
+            # Día aún abierto en otro proceso: sin índice, se recorre la columna
+            codigos = self.codigos("matricula")
+            return [i for i in range(len(self)) if codigos[i] == clave]
+        tam = REGISTRO_INDICE.size
+        with open(ruta, 'rb') as f:
+            if not os.fstat(f.fileno()).st_size:
+                return []
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                izq, der = 0, len(mm) // tam
+                while izq < der:
+                    medio = (izq + der) // 2
+                    if REGISTRO_INDICE.unpack_from(mm, medio * tam)[0] < clave:
+                        izq = medio + 1
+                    else:
+                        der = medio
+                filas = []
+                while izq * tam < len(mm):
+                    codigo, fila = REGISTRO_INDICE.unpack_from(mm, izq * tam)
+                    if codigo != clave:
+                        break
+                    filas.append(fila)
+                    izq += 1
+                return filas
+
+    def cerrar(self):
+        for columna in self._columnas.values():
+            columna.cerrar()
+        self._columnas = {}
+
+# ======================================================
+# HISTÓRICO
+# ======================================================
+
+class Historico:
+    """Almacén de eventos append-only con particiones diarias e índice de matrículas
+
+    Con solo_lectura no se toca nada en disco: sirve para consultar un histórico
+    que otro proceso (parking_privado.py --historico) sigue escribiendo. Su día
+    abierto se lee hasta la última fila completa en todas las columnas.
+    """
+    def __init__(self, carpeta='historico', solo_lectura=False):
+        self.carpeta = carpeta
+        self.solo_lectura = solo_lectura
+        if not solo_lectura:
+            os.makedirs(carpeta, exist_ok=True)
+        self._lock = threading.Lock()
+        self._dia = None
+        self._archivos = {}
+        self._diccionarios = {}
+        self._indice_activo = {}  # matrícula -> filas del día abierto
+        self._filas_activas = 0
+        self._ultimo = 0
+        self._suscripcion = None
+
+        if solo_lectura:
+            return
+        # El último día sin índice estaba abierto: se sigue escribiendo en él
+        particiones = self.particiones()
+        if particiones and not self._cerrada(particiones[-1]):
+            self._abrir(particiones[-1])
+        elif particiones:
+            particion = _Particion(self._ruta(particiones[-1]))
+            try:
+                if len(particion):
+                    self._ultimo = particion.columna("momento")[len(particion) - 1]
+            finally:
+                particion.cerrar()
+
+    def particiones(self):
+        if not os.path.isdir(self.carpeta):
+            return []
+        return sorted(n for n in os.listdir(self.carpeta) if _NOMBRE_PARTICION.match(n))
+
+    def _ruta(self, dia):
+        return os.path.join(self.carpeta, dia)
+
+    def _cerrada(self, dia):
+        return os.path.exists(os.path.join(self._ruta(dia), "matricula.idx"))
+
+    def _abrir(self, dia):
+        ruta = self._ruta(dia)
+        os.makedirs(ruta, exist_ok=True)
+        # Reabrir un día cerrado invalida su índice; se reconstruye en memoria
+        indice = os.path.join(ruta, "matricula.idx")
+        if os.path.exists(indice):
+            os.remove(indice)
+        self._indice_activo = {}
+        self._filas_activas = 0
+        if os.path.exists(os.path.join(ruta, "momento.col")):
+            _reparar(ruta)
+            particion = _Particion(ruta)
+            try:
+                matriculas = particion.columna("matricula")
+                self._filas_activas = len(particion)
+                for i in range(self._filas_activas):
+                    self._indice_activo.setdefault(matriculas[i] or "", []).append(i)
+                if self._filas_activas:
+                    self._ultimo = max(self._ultimo, particion.columna("momento")[self._filas_activas - 1])
+            finally:
+                particion.cerrar()
+        self._archivos = {nombre: open(os.path.join(ruta, f"{nombre}.col"), 'ab') for nombre, _ in COLUMNAS}
+        self._diccionarios = {nombre: _Diccionario(os.path.join(ruta, f"{nombre}.dic")) for nombre in TEXTOS}
+        self._dia = dia
+
+    def _sellar(self):
+        """Cierra el día abierto escribiendo su índice de matrículas"""
+        if self._dia is None:
+            return
+        for archivo in self._archivos.values():
+            archivo.close()
+        for diccionario in self._diccionarios.values():
+            diccionario.cerrar()
+        matriculas = self._diccionarios["matricula"]
+        entradas = sorted(
+            (matriculas.codigo(matricula), fila)
+            for matricula, filas in self._indice_activo.items() for fila in filas
+        )
+        with open(os.path.join(self._ruta(self._dia), "matricula.idx"), 'wb') as f:
+            for clave, fila in entradas:
+                f.write(REGISTRO_INDICE.pack(clave, fila))
+        self._archivos = {}
+        self._diccionarios = {}
+        self._indice_activo = {}
+        self._dia = None
+
+    def _vaciar_buffers(self):
+        for archivo in self._archivos.values():
+            archivo.flush()
+
+    def añadir(self, evento):
+        """Añade un evento (diccionario como los que notifica Parking)"""
+        if self.solo_lectura:
+            raise ValueError(f"{self.carpeta} está abierto en solo lectura")
+        # Los carriles notifican fuera del lock: se fuerza el orden no decreciente
+        micros = _a_micros(evento['momento'])
+        with self._lock:
+            micros = max(micros, self._ultimo)
+            self._ultimo = micros
+            dia = _de_micros(micros).strftime("%Y-%m-%d")
+            if dia != self._dia:
+                self._sellar()
+                self._abrir(dia)
+
+            valores = {
+                "momento": micros,
+                "evento": _codigo(EVENTOS, evento['evento']),
+                "tipo_vehiculo": _codigo(CODIGOS_VEHICULO, evento.get('tipo_vehiculo')),
+                "tipo_parking": _codigo(CODIGOS_PARKING, evento.get('tipo_parking')),
+                "plaza": self._diccionarios["plaza"].codificar(evento.get('plaza')),
+                "matricula": self._diccionarios["matricula"].codificar(evento.get('matricula')),
+                "precio": evento.get('precio') or 0.0,
+                "duracion": evento.get('duracion') or 0.0,
+                "ocupadas": evento.get('ocupadas') or 0,
+            }
+            for nombre, formato in COLUMNAS:
+                self._archivos[nombre].write(struct.pack(formato, valores[nombre]))
+            self._indice_activo.setdefault(evento.get('matricula') or "", []).append(self._filas_activas)
+            self._filas_activas += 1
+
+    def conectar(self, parking):
+        """Registra automáticamente los eventos de un Parking
+
+        Se escribe desde el hilo del bus, no desde los carriles; con la política
+        bloquear el histórico no pierde eventos aunque el disco vaya lento.
+        """
+        self._suscripcion = parking.bus.suscribir(self.añadir, tipos=EVENTOS, politica="bloquear")
+
+    def reconectar(self, parking):
+        """Deja el parking anterior (tras escribir sus eventos pendientes) y sigue con este"""
+        if self._suscripcion is not None:
+            self._suscripcion.cancelar()
+        self.conectar(parking)
+
+    def cerrar(self):
+        if self._suscripcion is not None:
+            self._suscripcion.cancelar()  # Escribe antes los eventos pendientes
+            self._suscripcion = None
+        with self._lock:
+            self._sellar()
+
+    # --------------------------------------------------
+    # Consultas
+    # --------------------------------------------------
+
+    def _recorrer(self, dias):
+        """Abre cada partición en orden; el día abierto se vacía a disco antes"""
+        with self._lock:
+            self._vaciar_buffers()
+            activo = self._dia
+            indice_activo = {m: list(f) for m, f in self._indice_activo.items()}
+        for dia in dias:
+            ruta = self._ruta(dia)
+            filas = None
+            if self.solo_lectura and not self._cerrada(dia):
+                filas, _ = _filas_completas(ruta)
+            particion = _Particion(ruta, filas)
+            try:
+                yield dia, particion, (indice_activo if dia == activo else None)
+            finally:
+                particion.cerrar()
+
+    def visitas(self, matricula):
+        """Todos los eventos de una matrícula"""
+        resultado = []
+        for dia, particion, indice_activo in self._recorrer(self.particiones()):
+            filas = indice_activo.get(matricula, []) if indice_activo is not None else particion.filas_de(matricula)
+            resultado.extend(particion.fila(i) for i in filas)
+        return resultado
+
+    def rango(self, desde=None, hasta=None, evento=None, tipo_vehiculo=None, tipo_parking=None, plaza=None):
+        """Eventos con momento en [desde, hasta) que cumplen los filtros"""
+        dias = self.particiones()
+        if desde is not None:
+            dias = [d for d in dias if d >= desde.strftime("%Y-%m-%d")]
+        if hasta is not None:
+            dias = [d for d in dias if d <= hasta.strftime("%Y-%m-%d")]
+        filtros = [
+            ("evento", EVENTOS, evento),
+            ("tipo_vehiculo", CODIGOS_VEHICULO, tipo_vehiculo),
+            ("tipo_parking", CODIGOS_PARKING, tipo_parking),
+        ]
+        filtros = [(nombre, _codigo(tabla, valor)) for nombre, tabla, valor in filtros if valor is not None]
+
+        for dia, particion, _ in self._recorrer(dias):
+            if not len(particion):
+                continue
+            ini, fin = particion.filas_en_rango(
+                _a_micros(desde) if desde else None,
+                _a_micros(hasta) if hasta else None
+            )
+            # Los filtros se comprueban sobre las columnas antes de materializar la fila
+            columnas = [(particion.columna(nombre), codigo) for nombre, codigo in filtros]
+            plazas = particion.columna("plaza") if plaza is not None else None
+            for i in range(ini, fin):
+                if all(columna[i] == codigo for columna, codigo in columnas) and (plazas is None or plazas[i] == plaza):
+                    yield particion.fila(i)
+
+    def columnas(self, nombres, desde=None, hasta=None):
+        """Por día, una lista de valores por columna numérica pedida, para filas en [desde, hasta)
+
+        Para análisis sobre muchas filas: no se crea un RegistroHistorico por fila.
+        """
+        dias = self.particiones()
+        if desde is not None:
+            dias = [d for d in dias if d >= desde.strftime("%Y-%m-%d")]
+        if hasta is not None:
+            dias = [d for d in dias if d <= hasta.strftime("%Y-%m-%d")]
+        for dia, particion, _ in self._recorrer(dias):
+            if not len(particion):
+                continue
+            ini, fin = particion.filas_en_rango(
+                _a_micros(desde) if desde else None,
+                _a_micros(hasta) if hasta else None
+            )
+            yield dia, [particion.columna(nombre).valores(ini, fin) for nombre in nombres]
+
+    def ocupacion_horaria(self, desde, hasta):
+        """Por hora: (hora, mínimo, máximo, media de ocupadas, entradas, salidas)"""
+        horas = {}
+        for dia, particion, _ in self._recorrer(self.particiones()):
+            if not (desde.strftime("%Y-%m-%d") <= dia <= hasta.strftime("%Y-%m-%d")) or not len(particion):
+                continue
+            ini, fin = particion.filas_en_rango(_a_micros(desde), _a_micros(hasta))
+            momentos = particion.columna("momento")
+            eventos = particion.columna("evento")
+            ocupadas = particion.columna("ocupadas")
+            for i in range(ini, fin):
+                hora = _de_micros(momentos[i]).replace(minute=0, second=0, microsecond=0)
+                h = horas.get(hora)
+                if h is None:
+                    h = horas[hora] = [ocupadas[i], ocupadas[i], 0, 0, 0, 0]
+                h[0] = min(h[0], ocupadas[i])
+                h[1] = max(h[1], ocupadas[i])
+                h[2] += ocupadas[i]
+                h[3] += 1
+                h[4] += eventos[i] == 0
+                h[5] += eventos[i] == 1
+        return [
+            (hora, h[0], h[1], h[2] / h[3], h[4], h[5])
+            for hora, h in sorted(horas.items())
+        ]
+
+    def importar(self, eventos):
+        """Importa eventos de reproducir.leer_traza (parking.log de S15 o JSONL)"""
+        n = 0
+        for datos in eventos_de_traza(eventos):
+            self.añadir(datos)
+            n += 1
+        return n
+
+def eventos_de_traza(eventos):
+    """Eventos de reproducir.leer_traza como los notifica Parking, con duración y ocupadas"""
+    dentro = {}
+    for evento in eventos:
+        if evento.evento == "inicio":
+            continue
+        datos = {
+            'evento': evento.evento,
+            'momento': evento.momento,
+            'matricula': evento.matricula,
+            'tipo_vehiculo': evento.tipo_vehiculo,
+            'plaza': evento.plaza,
+            'precio': evento.precio,
+        }
+        if evento.evento == "entrada":
+            dentro[evento.matricula] = evento.momento
+        elif evento.evento == "salida" and evento.matricula in dentro:
+            datos['duracion'] = (evento.momento - dentro.pop(evento.matricula)).total_seconds()
+        datos['ocupadas'] = len(dentro)
+        yield datos
+
+def _fecha(texto):
+    return datetime.fromisoformat(texto)
+
+def main():
+    parser = argparse.ArgumentParser(description="Consultas sobre el histórico del parking")
+    parser.add_argument("--carpeta", default="historico", help="Carpeta del histórico")
+    sub = parser.add_subparsers(dest="orden", required=True)
+
+    p = sub.add_parser("importar", help="Importa un parking.log o una traza JSONL")
+    p.add_argument("traza")
+
+    p = sub.add_parser("matricula", help="Todas las visitas de una matrícula")
+    p.add_argument("matricula")
+
+    p = sub.add_parser("rango", help="Eventos en un intervalo con filtros")
+    p.add_argument("--desde", type=_fecha)
+    p.add_argument("--hasta", type=_fecha)
+    p.add_argument("--evento", choices=EVENTOS)
+    p.add_argument("--tipo-vehiculo", choices=CODIGOS_VEHICULO)
+    p.add_argument("--tipo-parking", choices=CODIGOS_PARKING)
+    p.add_argument("--plaza")
+
+    p = sub.add_parser("ocupacion", help="Ocupación por hora")
+    p.add_argument("--desde", type=_fecha, required=True)
+    p.add_argument("--hasta", type=_fecha, required=True)
+
+    args = parser.parse_args()
+    # Las consultas no deben tocar un histórico que el parking puede estar escribiendo
+    historico = Historico(args.carpeta, solo_lectura=args.orden != "importar")
+    try:
+        if args.orden == "importar":
+            from reproducir import leer_traza
+            n = historico.importar(leer_traza(args.traza))
+            print(f"💾 {n} eventos importados en {args.carpeta}")
+        elif args.orden == "matricula":
+            for r in historico.visitas(args.matricula):
+                print(f"{r.momento:%Y-%m-%d %H:%M:%S} {r.evento:8} {r.plaza or '-':5} {r.precio:.2f}€")
+        elif args.orden == "rango":
+            for r in historico.rango(args.desde, args.hasta, args.evento, args.tipo_vehiculo,
+                                     args.tipo_parking, args.plaza):
+                print(f"{r.momento:%Y-%m-%d %H:%M:%S} {r.evento:8} {r.matricula or '-':8} "
+                      f"{r.tipo_vehiculo or '-':11} {r.plaza or '-':5} {r.precio:.2f}€")
+        elif args.orden == "ocupacion":
+            for hora, minimo, maximo, media, entradas, salidas in historico.ocupacion_horaria(args.desde, args.hasta):
+                print(f"{hora:%Y-%m-%d %H}h  ocupadas {minimo}-{maximo} (media {media:.1f})  "
+                      f"entradas {entradas}  salidas {salidas}")
+    finally:
+        historico.cerrar()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""Motor y pantalla en procesos separados, comunicados por memoria compartida
+
+El proceso motor ejecuta el Parking y la simulación de carriles y publica el
+estado de cada plaza en un bloque de multiprocessing.shared_memory. La interfaz
+Tk corre en el proceso principal, lee ese bloque sin copias a su propio ritmo de
+refresco y envía las órdenes (entrada, salida, pausa, velocidad) por una cola.
+
+Así un dibujado lento ya no frena a los carriles: cada proceso tiene su GIL.
+
+Distribución del bloque compartido:
+    cabecera (64 bytes)     secuencia, versión, nº plazas, contadores, recaudación, velocidad...
+    entrada   float64[n]    epoch de entrada (0 si libre)
+    estado    uint8[n]      0 libre, 1 ocupada
+    tipo      uint8[n]      código de tipo de vehículo (255 si libre)
+
+La secuencia funciona como un seqlock: impar mientras el motor escribe (también
+los contadores de la cabecera); el valor par se guarda lo último. Un lector que
+ve una secuencia impar o distinta al terminar descarta lo leído.
+
+Cada orden lleva un identificador que vuelve con su respuesta, así la interfaz
+no espera bloqueada y una respuesta tardía no se confunde con la de otra orden.
+
+Uso:
+    python motor_compartido.py [--capacidad 56] [--fps 10]
+"""
+import argparse
+import multiprocessing as mp
+import queue
+import struct
+import time
+from multiprocessing import shared_memory
+
+import tkinter as tk
+from tkinter import simpledialog, messagebox
+
+from parking_privado import Parking, SimulacionTrafico, TIPOS_VEHICULO, CAPACIDAD_MAXIMA
+
+CABECERA = struct.Struct("<QQIIIIIBxxxdd")
+TAM_CABECERA = 64
+CODIGOS_VEHICULO = list(TIPOS_VEHICULO)
+SIN_VEHICULO = 255
+INTERVALO_PUBLICACION = 0.05  # segundos
+ESPERA_RESPUESTA = 2  # segundos hasta dar por perdida la respuesta a una orden
+
+def tamaño_bloque(n):
+    return TAM_CABECERA + n * 8 + n + n
+
+class EstadoCompartido:
+    """Vistas tipadas sobre el bloque de memoria compartida (sin copias)"""
+    def __init__(self, memoria, n):
+        self.memoria = memoria
+        self.n = n
+        buf = memoria.buf
+        self.cabecera = buf[:TAM_CABECERA]
+        self.entrada = buf[TAM_CABECERA:TAM_CABECERA + n * 8].cast("d")
+        self.estado = buf[TAM_CABECERA + n * 8:TAM_CABECERA + n * 9]
+        self.tipo = buf[TAM_CABECERA + n * 9:TAM_CABECERA + n * 10]
+
+    @staticmethod
+    def crear(n):
+        memoria = shared_memory.SharedMemory(create=True, size=tamaño_bloque(n))
+        memoria.buf[:tamaño_bloque(n)] = bytes(tamaño_bloque(n))
+        return EstadoCompartido(memoria, n)
+
+    @staticmethod
+    def abrir(nombre, n):
+        return EstadoCompartido(shared_memory.SharedMemory(name=nombre), n)
+
+    def leer_cabecera(self):
+        (secuencia, version, n, entradas, salidas, rechazos, cola,
+         automatico, recaudacion, velocidad) = CABECERA.unpack_from(self.cabecera)
+        return {
+            'secuencia': secuencia, 'version': version, 'n': n, 'entradas': entradas,
+            'salidas': salidas, 'rechazos': rechazos, 'cola': cola,
+            'automatico': bool(automatico), 'recaudacion': recaudacion, 'velocidad': velocidad
+        }
+
+    def secuencia(self):
+        return struct.unpack_from("<Q", self.cabecera)[0]
+
+    def cerrar(self):
+        # Las vistas deben liberarse antes de cerrar el bloque
+        for vista in (self.entrada, self.estado, self.tipo, self.cabecera):
+            vista.release()
+        self.memoria.close()
+
+# ======================================================
+# PROCESO MOTOR
+# ======================================================
+
+class Publicador:
+    """Copia al bloque compartido solo las plazas que cambiaron desde la última publicación"""
+    def __init__(self, parking, compartido, simulacion):
+        self.parking = parking
+        self.compartido = compartido
+        self.simulacion = simulacion
+        self._posicion = {e.id: i for i, e in enumerate(parking.obtener_estado())}
+        self._version = -1
+        self._secuencia = 0
+
+    def publicar(self):
+        version, cambios = self.parking.cambios_desde(self._version)
+        c = self.compartido
+        self._secuencia += 1  # impar: escritura en curso
+        struct.pack_into("<Q", c.cabecera, 0, self._secuencia)
+        for plaza in cambios:
+            i = self._posicion[plaza.id]
+            c.estado[i] = 1 if plaza.ocupada else 0
+            c.tipo[i] = CODIGOS_VEHICULO.index(plaza.tipo_vehiculo) if plaza.tipo_vehiculo else SIN_VEHICULO
+            c.entrada[i] = plaza.entrada.timestamp() if plaza.entrada else 0.0
+        stats = self.parking.obtener_estadisticas()
+        # Los contadores se escriben aún con la secuencia impar...
+        CABECERA.pack_into(
+            c.cabecera, 0, self._secuencia, version, c.n,
+            stats['total_entradas'], stats['total_salidas'], stats['rechazos'],
+            self.parking.obtener_info_cola(), self.simulacion.automatico,
+            stats['recaudacion_total'], self.simulacion.velocidad
+        )
+        # ...y la secuencia par, lo último: nadie acepta una cabecera a medio escribir
+        self._secuencia += 1
+        struct.pack_into("<Q", c.cabecera, 0, self._secuencia)
+        self._version = version
+
+def proceso_motor(nombre_memoria, capacidad, comandos, respuestas, disposicion):
+    """Punto de entrada del proceso motor"""
+    parking = Parking(capacidad)
+    disposicion.put([
+        (e.id, e.tipo_parking, e.exclusiva_minusvalido, e.es_electrica)
+        for e in parking.obtener_estado()
+    ])
+    compartido = EstadoCompartido.abrir(nombre_memoria, capacidad)
+    simulacion = SimulacionTrafico(parking)
+    simulacion.iniciar()
+    publicador = Publicador(parking, compartido, simulacion)
+
+    try:
+        while True:
+            publicador.publicar()
+            try:
+                orden, *args = comandos.get(timeout=INTERVALO_PUBLICACION)
+            except queue.Empty:
+                continue
+            if orden == "salir":
+                break
+            elif orden == "entrada":
+                ident, reserva = args
+                respuestas.put((ident, parking.entrada(reserva=reserva)))
+            elif orden == "salida":
+                ident, pid = args
+                respuestas.put((ident, parking.salida(pid)))
+            elif orden == "pausa":
+                simulacion.automatico = not simulacion.automatico
+            elif orden == "velocidad":
+                simulacion.velocidad = args[0]
+    finally:
+        compartido.cerrar()
+
+# ======================================================
+# PROCESO INTERFAZ
+# ======================================================
+
+class VisorParking:
+    """Interfaz Tk que solo lee el bloque compartido y envía órdenes por la cola"""
+    COLORES = {
+        'ocupada': ("#ff4757", "#c23616"),
+        'minusvalido': ("#5bc0de", "#3498db"),
+        'electrica': ("#ffd700", "#f39c12"),
+        'libre': ("#2ecc71", "#27ae60"),
+    }
+
+    def __init__(self, compartido, disposicion, comandos, respuestas, fps=10):
+        self.compartido = compartido
+        self.disposicion = disposicion
+        self.comandos = comandos
+        self.respuestas = respuestas
+        self.intervalo_ms = int(1000 / fps)
+        self._siguiente_orden = 0
+        self._pendientes = {}  # id de orden -> (función con la respuesta, límite de espera)
+        self._version_dibujada = None
+        self._ultimo_dibujo = 0.0
+
+        self.root = tk.Tk()
+        self.root.title("🅿️ Sistema de Parking Inteligente (motor en proceso aparte)")
+        self.root.geometry("1400x800")
+        self.label_stats = tk.Label(self.root, text="Conectando con el motor...",
+                                    bg="#2c3e50", fg="white", font=("Arial", 11, "bold"), pady=10)
+        self.label_stats.pack(fill=tk.X)
+        self.canvas = tk.Canvas(self.root, bg="#ecf0f1")
+        self.canvas.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        controles = tk.Frame(self.root, bg="#34495e", pady=10)
+        controles.pack(fill=tk.X)
+        for texto, comando, color in (
+            ("🚗 Entrada Manual", self.entrada_manual, "#27ae60"),
+            ("🚪 Salida Manual", self.salida_manual, "#e74c3c"),
+            ("⏸️ Pausar/Reanudar", lambda: self.comandos.put(("pausa",)), "#9b59b6"),
+        ):
+            tk.Button(controles, text=texto, command=comando, bg=color, fg="white",
+                      font=("Arial", 10, "bold"), padx=15, pady=5).pack(side=tk.LEFT, padx=5)
+        self.speed_var = tk.StringVar(value="1x")
+        menu = tk.OptionMenu(controles, self.speed_var, "0.5x", "1x", "2x", "5x",
+                             command=lambda v: self.comandos.put(("velocidad", float(v.replace('x', '')))))
+        menu.config(bg="#16a085", fg="white", font=("Arial", 9))
+        menu.pack(side=tk.LEFT, padx=20)
+
+        self._crear_plazas()
+        self.root.after(self.intervalo_ms, self.refrescar)
+
+    def _crear_plazas(self):
+        """Crea los elementos del canvas una vez; en cada frame solo se cambian colores y textos"""
+        self._rectangulos = []
+        self._textos = []
+        x, y = 50, 50
+        for pid, tipo_parking, minus, electrica in self.disposicion:
+            self._rectangulos.append(self.canvas.create_rectangle(x, y, x + 120, y + 65, width=2))
+            self.canvas.create_text(x + 60, y + 12, text=pid, font=("Arial", 11, "bold"), fill="#2c3e50")
+            self._textos.append(self.canvas.create_text(x + 60, y + 42, font=("Arial", 9), fill="#555"))
+            x += 130
+            if x > 1200:
+                x = 50
+                y += 80
+
+    def refrescar(self):
+        self._recoger_respuestas()
+        c = self.compartido
+        cabecera = c.leer_cabecera()
+        ahora = time.time()
+        # Sin cambios desde el último frame solo se redibuja cada segundo (minutos de estancia)
+        cambiado = cabecera['version'] != self._version_dibujada or ahora - self._ultimo_dibujo >= 1
+        if cabecera['secuencia'] % 2 == 0 and cambiado:
+            estados = []
+            for i, (pid, tipo_parking, minus, electrica) in enumerate(self.disposicion):
+                if c.estado[i]:
+                    tipo = c.tipo[i]
+                    minutos = int((ahora - c.entrada[i]) / 60)
+                    estados.append(('ocupada', f"{CODIGOS_VEHICULO[tipo] if tipo < len(CODIGOS_VEHICULO) else '?'} {minutos}min"))
+                else:
+                    estados.append(('minusvalido' if minus else 'electrica' if electrica else 'libre',
+                                    "MINUS" if minus else "⚡ELEC" if electrica else "LIBRE"))
+            # Solo se pinta si el motor no escribió mientras se leía
+            if c.secuencia() == cabecera['secuencia']:
+                for i, (clase, texto) in enumerate(estados):
+                    relleno, borde = self.COLORES[clase]
+                    self.canvas.itemconfigure(self._rectangulos[i], fill=relleno, outline=borde)
+                    self.canvas.itemconfigure(self._textos[i], text=texto)
+                self._version_dibujada = cabecera['version']
+                self._ultimo_dibujo = ahora
+                ocupadas = sum(1 for e, _ in estados if e == 'ocupada')
+                self.label_stats.config(text=(
+                    f"📊 Ocupación: {ocupadas / max(c.n, 1) * 100:.1f}% | "
+                    f"🚗 Entradas: {cabecera['entradas']} | 🚪 Salidas: {cabecera['salidas']} | "
+                    f"❌ Rechazos: {cabecera['rechazos']} | 💰 Recaudación: {cabecera['recaudacion']:.2f}€ | "
+                    f"⏳ Cola: {cabecera['cola']} | {'▶️' if cabecera['automatico'] else '⏸️'}"
+                ))
+        self.root.after(self.intervalo_ms, self.refrescar)
+
+    def _enviar(self, orden, argumento, al_responder=None):
+        """Envía una orden con su id; al_responder((exito, mensaje)) se llama desde refrescar"""
+        self._siguiente_orden += 1
+        self._pendientes[self._siguiente_orden] = (al_responder, time.monotonic() + ESPERA_RESPUESTA)
+        self.comandos.put((orden, self._siguiente_orden, argumento))
+
+    def _recoger_respuestas(self):
+        """Entrega las respuestas que hayan llegado sin bloquear el hilo de Tk"""
+        while True:
+            try:
+                ident, respuesta = self.respuestas.get_nowait()
+            except queue.Empty:
+                break
+            # Sin pendiente: ya se dio por perdida y se descarta
+            al_responder, _ = self._pendientes.pop(ident, (None, None))
+            if al_responder:
+                al_responder(respuesta)
+        ahora = time.monotonic()
+        for ident, (al_responder, limite) in list(self._pendientes.items()):
+            if ahora > limite:
+                del self._pendientes[ident]
+                if al_responder:
+                    al_responder((False, "El motor no responde"))
+
+    def entrada_manual(self):
+        self._enviar("entrada", messagebox.askyesno("Reserva", "¿Tiene reserva?"))
+
+    def salida_manual(self):
+        pid = simpledialog.askstring("Salida", "ID de plaza (ej: A1):")
+        if pid:
+            self._enviar("salida", pid.upper(), lambda respuesta: messagebox.showinfo("Resultado", respuesta[1]))
+
+    def iniciar(self):
+        self.root.mainloop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Parking con motor y pantalla en procesos separados")
+    parser.add_argument("--capacidad", type=int, default=CAPACIDAD_MAXIMA)
+    parser.add_argument("--fps", type=float, default=10, help="Frames por segundo de la pantalla")
+    args = parser.parse_args()
+
+    compartido = EstadoCompartido.crear(args.capacidad)
+    comandos, respuestas, disposicion = mp.Queue(), mp.Queue(), mp.Queue()
+    motor = mp.Process(
+        target=proceso_motor,
+        args=(compartido.memoria.name, args.capacidad, comandos, respuestas, disposicion),
+        daemon=True
+    )
+    motor.start()
+    try:
+        VisorParking(compartido, disposicion.get(timeout=30), comandos, respuestas, args.fps).iniciar()
+    finally:
+        comandos.put(("salir",))
+        motor.join(timeout=5)
+        memoria = compartido.memoria
+        compartido.cerrar()
+        memoria.unlink()
+
+if __name__ == "__main__":
+    main()
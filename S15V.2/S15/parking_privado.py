@@ -1,12 +1,26 @@
 import random
 import string
+import argparse
+import functools
 import threading
 import time
+import heapq
+import gc
+import linecache
+import tracemalloc
 import json
+import math
+import mmap
+import os
+import signal
+import struct
+import sys
+from array import array
+from bisect import bisect_right
 from datetime import datetime, timedelta
 import tkinter as tk
 from tkinter import simpledialog, messagebox
-from collections import deque
+from collections import Counter, deque, namedtuple
 
 # ======================================================
 # CONFIGURACIÓN GENERAL
@@ -29,12 +43,48 @@ NUM_CARRILES_ENTRADA = 3
 PORCENTAJE_MINUSVALIDOS = 0.20
 PORCENTAJE_ELECTRICOS = 0.15
 CAPACIDAD_MAXIMA = 56  # Total de plazas 
+PLAZAS_POR_FILA = 8
 
 # COOLDOWNS REALISTAS (segundos)
 ENTRADA_MIN, ENTRADA_MAX = 8, 15
 SALIDA_MIN, SALIDA_MAX = 10, 20
 TIEMPO_MINIMO_ESTANCIA = 120  # 2 minutos mínimo
 
+# Duración estimada de las estancias (minutos) y su probabilidad
+DURACIONES_ESTANCIA = [30, 60, 120, 180, 240, 480]
+PESOS_ESTANCIA = [0.1, 0.3, 0.3, 0.15, 0.1, 0.05]
+
+# Políticas por defecto (ver POLITICAS_ASIGNACION, POLITICAS_SALIDA y POLITICAS_TARIFA)
+ASIGNACION = "cercana"       # La libre más cercana al carril de entrada
+ELECCION_SALIDA = "ponderada"  # Salen antes los coches que superan su estancia estimada
+TARIFA = "zonas"             # Por tipo de vehículo, zona y hora
+METROS_POR_PLAZA = 2.5  # A lo largo de una fila
+METROS_POR_FILA = 6.0   # De una fila (con su pasillo) a la siguiente
+
+# Carga de coches eléctricos: potencia total del parking y de cada cargador
+POTENCIA_MAXIMA_KW = 100
+POTENCIA_CARGADOR_KW = 22
+BATERIA_KWH = 60
+NIVEL_BATERIA_DEFECTO = 0.5  # Si no se conoce la carga con la que llega
+PRECIO_KWH = 0.35
+
+# Límites de la cola cuando se dimensiona con la previsión
+MIN_COLA, MAX_COLA = 2, 50
+
+# Tarifa dinámica: descuento en zonas vacías, recargo cerca del lleno y con cola.
+# Se activa por parking (tarifa_dinamica=True o --tarifa-dinamica); por defecto, fija
+TARIFA_DINAMICA = False
+OCUPACION_DESCUENTO = 0.3   # Por debajo, descuento lineal hasta DESCUENTO_MAXIMO con la zona vacía
+DESCUENTO_MAXIMO = 0.15
+OCUPACION_RECARGO = 0.8     # Por encima, recargo lineal hasta RECARGO_MAXIMO con la zona llena
+RECARGO_MAXIMO = 0.5
+RECARGO_POR_COCHE_EN_COLA = 0.02
+RECARGO_COLA_MAXIMO = 0.2
+
+# Reservas por franjas horarias
+MINUTOS_POR_FRANJA = 15
+HORIZONTE_RESERVAS_DIAS = 7
+
 # Patrones de tráfico realistas por hora
 PATRONES_TRAFICO = {
     range(0, 6): 0.1,    # Madrugada: muy bajo
@@ -46,6 +96,592 @@ PATRONES_TRAFICO = {
     range(20, 24): 0.5   # Noche: bajo
 }
 
+# ======================================================
+# INSTRUMENTACIÓN
+# ======================================================
+
+class _BloqueoMedido:
+    """Adquiere un lock registrando tiempo de espera y de retención"""
+    __slots__ = ("_lock", "_nombre", "_metricas", "_adquirido")
+
+    def __init__(self, lock, nombre, metricas):
+        self._lock = lock
+        self._nombre = nombre
+        self._metricas = metricas
+
+    def __enter__(self):
+        inicio = time.perf_counter()
+        self._lock.acquire()
+        self._adquirido = time.perf_counter()
+        self._metricas.observar(f"espera:{self._nombre}", (self._adquirido - inicio) * 1e6)
+        return self
+
+    def __exit__(self, *exc):
+        retencion = time.perf_counter() - self._adquirido
+        self._lock.release()
+        self._metricas.observar(f"retencion:{self._nombre}", retencion * 1e6)
+        return False
+
+class Metricas:
+    """Latencias, esperas de locks, niveles y eventos por segundo; casi sin coste si está desactivada"""
+    VENTANA_SEGUNDOS = 60
+
+    def __init__(self):
+        self.activo = False
+        self._lock = threading.Lock()
+        self._latencias = {}
+        self._niveles = {}
+        self._totales = {}
+        self._ventanas = {}
+
+    def activar(self, activo=True):
+        self.activo = activo
+
+    def reiniciar(self):
+        with self._lock:
+            self._latencias = {}
+            self._niveles = {}
+            self._totales = {}
+            self._ventanas = {}
+
+    def bloqueo(self, lock, nombre):
+        """Context manager para adquirir lock; si no hay métricas devuelve el propio lock"""
+        if not self.activo:
+            return lock
+        return _BloqueoMedido(lock, nombre, self)
+
+    def observar(self, nombre, microsegundos):
+        with self._lock:
+            histograma = self._latencias.get(nombre)
+            if histograma is None:
+                histograma = self._latencias[nombre] = Histograma()
+            histograma.añadir(microsegundos)
+
+    def nivel(self, nombre, valor):
+        if self.activo:
+            self._niveles[nombre] = valor
+
+    def contar(self, evento, n=1):
+        if not self.activo:
+            return
+        segundo = int(time.monotonic())
+        with self._lock:
+            self._totales[evento] = self._totales.get(evento, 0) + n
+            ventana = self._ventanas.setdefault(evento, deque())
+            if ventana and ventana[-1][0] == segundo:
+                ventana[-1][1] += n
+            else:
+                ventana.append([segundo, n])
+            while ventana[0][0] <= segundo - self.VENTANA_SEGUNDOS:
+                ventana.popleft()
+
+    def _por_segundo(self, evento):
+        limite = int(time.monotonic()) - self.VENTANA_SEGUNDOS
+        return sum(n for segundo, n in self._ventanas.get(evento, ()) if segundo > limite) / self.VENTANA_SEGUNDOS
+
+    def exportar_json(self):
+        """Volcado de todas las métricas como diccionario serializable"""
+        with self._lock:
+            return {
+                'latencias_us': {
+                    nombre: {
+                        'cuenta': h.cuenta,
+                        'media': h.media(),
+                        'p50': h.percentil(50),
+                        'p95': h.percentil(95),
+                        'p99': h.percentil(99),
+                        'max': h.maximo
+                    }
+                    for nombre, h in self._latencias.items()
+                },
+                'niveles': dict(self._niveles),
+                'eventos': {
+                    evento: {'total': total, 'por_segundo': self._por_segundo(evento)}
+                    for evento, total in self._totales.items()
+                }
+            }
+
+    def exportar_texto(self):
+        """Formato de exposición de texto de Prometheus"""
+        datos = self.exportar_json()
+        lineas = []
+        familias = {
+            'parking_operacion_us': ('operacion', lambda n: ':' not in n),
+            'parking_lock_espera_us': ('lock', lambda n: n.startswith('espera:')),
+            'parking_lock_retencion_us': ('lock', lambda n: n.startswith('retencion:'))
+        }
+        for familia, (etiqueta, filtro) in familias.items():
+            lineas.append(f"# TYPE {familia} summary")
+            for nombre, h in datos['latencias_us'].items():
+                if not filtro(nombre):
+                    continue
+                valor = nombre.split(':', 1)[-1]
+                for q in ('p50', 'p95', 'p99'):
+                    lineas.append(f'{familia}{{{etiqueta}="{valor}",quantile="0.{q[1:]}"}} {h[q]:.6f}')
+                lineas.append(f'{familia}_count{{{etiqueta}="{valor}"}} {h["cuenta"]}')
+        lineas.append("# TYPE parking_nivel gauge")
+        for nombre, valor in datos['niveles'].items():
+            lineas.append(f'parking_nivel{{medida="{nombre}"}} {valor}')
+        lineas.append("# TYPE parking_eventos_total counter")
+        for evento, d in datos['eventos'].items():
+            lineas.append(f'parking_eventos_total{{evento="{evento}"}} {d["total"]}')
+        lineas.append("# TYPE parking_eventos_por_segundo gauge")
+        for evento, d in datos['eventos'].items():
+            lineas.append(f'parking_eventos_por_segundo{{evento="{evento}"}} {d["por_segundo"]:.4f}')
+        return "\n".join(lineas) + "\n"
+
+    def exportar_periodicamente(self, archivo, intervalo=10):
+        """Reescribe el archivo de métricas cada intervalo segundos (hilo en segundo plano)"""
+        def bucle():
+            while True:
+                time.sleep(intervalo)
+                contenido = self.exportar_json() if archivo.endswith('.json') else self.exportar_texto()
+                with open(archivo, 'w', encoding='utf-8') as f:
+                    if isinstance(contenido, dict):
+                        json.dump(contenido, f, indent=2)
+                    else:
+                        f.write(contenido)
+        threading.Thread(target=bucle, daemon=True, name="exportador-metricas").start()
+
+METRICAS = Metricas()
+
+def medido(operacion):
+    """Decorador que registra la latencia de la operación cuando las métricas están activas"""
+    def decorador(func):
+        @functools.wraps(func)
+        def envoltorio(*args, **kwargs):
+            if not METRICAS.activo:
+                return func(*args, **kwargs)
+            inicio = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                METRICAS.observar(operacion, (time.perf_counter() - inicio) * 1e6)
+        return envoltorio
+    return decorador
+
+def _mib(n):
+    return f"{n / 2**20:+.2f} MiB"
+
+class PerfilMemoria:
+    """Instantáneas de tracemalloc atribuidas a subsistemas del motor y censo por clase
+
+    Cada bloque se atribuye al subsistema de la función más interna de su traza que
+    pertenece a alguno (ver SUBSISTEMAS): lo que reserva una Plaza al ocuparse cuenta
+    para la asignación o la salida según quién la ocupe. Con tracemalloc activo las
+    reservas son un orden de magnitud más lentas, así que es un modo de diagnóstico.
+    """
+    MARCOS = 12  # Suficientes para llegar de una reserva de memoria a la función del subsistema
+    MAX_MUESTRAS = 32
+    # Clase (todos sus métodos) o Clase.método
+    SUBSISTEMAS = {
+        "asignacion": ("Parking.entrada", "GestorPlazas.asignar", "GestorPlazas._candidatas",
+                       "GestorPlazas._mas_cercana", "GestorPlazas.indexar_cercania", "PoliticaAsignacion",
+                       "AsignacionAleatoria", "AsignacionCercana", "AsignacionSondeo", "GestorCola"),
+        "salida": ("Parking.salida", "Parking.salida_aleatoria", "GestorPlazas.liberar",
+                   "PoliticaSalida", "SalidaPonderada", "SalidaUniforme"),
+        "persistencia": ("Parking.guardar_estado", "Parking.cargar_estado", "Parking.guardar_instantanea",
+                         "Parking.abrir_instantanea", "PlazasDiferidas", "Coche.to_dict", "Coche.from_dict",
+                         "Plaza.to_dict", "Plaza.from_dict", "Reserva.to_dict", "Reserva.from_dict",
+                         "EstadisticasStream.to_dict", "EstadisticasStream.from_dict"),
+        "dibujo": ("InterfazParking", "MallaOcupacion"),
+        "estadisticas": ("Parking.muestrear", "SerieTemporal", "EstadisticasStream.registrar",
+                         "Histograma.añadir", "BusEventos", "Suscripcion"),
+    }
+    # Siempre aparecen en el censo, aunque no cambien
+    CLASES = ("Plaza", "EstadoPlaza", "Coche", "datetime", "list", "dict")
+
+    def __init__(self):
+        self.activo = False
+        self._muestras = []  # (etiqueta, momento, {traza: (bytes, bloques)}, censo)
+        self._rangos = {}    # archivo -> ([primera línea], [(última línea, subsistema)])
+        self._lock = threading.Lock()
+
+    def activar(self, marcos=MARCOS):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(marcos)
+        self._indexar_subsistemas()
+        self.activo = True
+
+    def desactivar(self):
+        self.activo = False
+        tracemalloc.stop()
+        with self._lock:
+            self._muestras = []
+
+    def _indexar_subsistemas(self):
+        """Rangos de líneas de cada función de SUBSISTEMAS, por archivo"""
+        rangos = {}
+        for subsistema, nombres in self.SUBSISTEMAS.items():
+            for nombre in nombres:
+                clase, _, metodo = nombre.partition(".")
+                clase = globals()[clase]
+                miembros = [clase.__dict__[metodo]] if metodo else list(clase.__dict__.values())
+                for miembro in miembros:
+                    if isinstance(miembro, (staticmethod, classmethod)):
+                        miembro = miembro.__func__
+                    elif isinstance(miembro, property):
+                        miembro = miembro.fget
+                    while hasattr(miembro, "__wrapped__"):  # @medido
+                        miembro = miembro.__wrapped__
+                    codigo = getattr(miembro, "__code__", None)
+                    if codigo is None:
+                        continue
+                    ultima = max(linea for _, _, linea in codigo.co_lines() if linea)
+                    rangos.setdefault(codigo.co_filename, []).append((codigo.co_firstlineno, ultima, subsistema))
+        self._rangos = {}
+        for archivo, lista in rangos.items():
+            lista.sort()
+            self._rangos[archivo] = ([r[0] for r in lista], [(r[1], r[2]) for r in lista])
+
+    def subsistema(self, traza):
+        """Subsistema de la función más interna de la traza que pertenezca a alguno"""
+        for marco in reversed(traza):
+            rangos = self._rangos.get(marco.filename)
+            if rangos:
+                i = bisect_right(rangos[0], marco.lineno) - 1
+                if i >= 0 and marco.lineno <= rangos[1][i][0]:
+                    return rangos[1][i][1]
+        return "otros"
+
+    @staticmethod
+    def censo():
+        """Objetos vivos por clase: (cuenta, bytes sin contar lo que referencian)
+
+        gc solo ve contenedores; los objetos atómicos (datetime, str...) se cuentan
+        a través de quien los referencia.
+        """
+        cuenta, tamaño = Counter(), Counter()
+        vistos = set()
+        for obj in gc.get_objects():
+            for o in (obj, *gc.get_referents(obj)):
+                if o is not obj and (gc.is_tracked(o) or id(o) in vistos):
+                    continue
+                if o is not obj:
+                    vistos.add(id(o))
+                nombre = type(o).__name__
+                cuenta[nombre] += 1
+                tamaño[nombre] += sys.getsizeof(o, 0)
+        return cuenta, tamaño
+
+    def muestrear(self, etiqueta=None, censo=True):
+        """Toma una instantánea (y el censo por clase); devuelve su índice"""
+        if not self.activo:
+            return None
+        datos = self.censo() if censo else None
+        instantanea = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+        # Solo se guardan los totales por traza: la instantánea completa ocupa tanto como lo
+        # medido y, al estar también trazada, haría crecer cada muestra siguiente
+        totales = {e.traceback: (e.size, e.count) for e in instantanea.statistics("traceback")}
+        del instantanea
+        with self._lock:
+            if len(self._muestras) >= self.MAX_MUESTRAS:
+                del self._muestras[1]  # Se conserva la primera como referencia
+            self._muestras.append((etiqueta or f"#{len(self._muestras)}", hora_actual(), totales, datos))
+            return len(self._muestras) - 1
+
+    def muestrear_periodicamente(self, intervalo=30, censo=False):
+        def bucle():
+            while self.activo:
+                time.sleep(intervalo)
+                self.muestrear(censo=censo)
+        threading.Thread(target=bucle, daemon=True, name="perfil-memoria").start()
+
+    def etiquetas(self):
+        with self._lock:
+            return [etiqueta for etiqueta, *_ in self._muestras]
+
+    def _buscar(self, muestra):
+        if isinstance(muestra, str):
+            return next(m for m in self._muestras if m[0] == muestra)
+        return self._muestras[muestra]
+
+    def comparar(self, desde=0, hasta=-1, top=10):
+        """Diferencias entre dos muestras (índice o etiqueta) como diccionario"""
+        with self._lock:
+            anterior, posterior = self._buscar(desde), self._buscar(hasta)
+        # Diferencias por traza completa; las líneas se agregan por su marco más interno
+        subsistemas = {}
+        por_linea = {}
+        anteriores, posteriores = anterior[2], posterior[2]
+        for traza in anteriores.keys() | posteriores.keys():
+            (b0, n0), (b1, n1) = anteriores.get(traza, (0, 0)), posteriores.get(traza, (0, 0))
+            if b0 == b1 and n0 == n1:
+                continue
+            nombre = self.subsistema(traza)
+            bytes_, bloques = subsistemas.get(nombre, (0, 0))
+            subsistemas[nombre] = (bytes_ + b1 - b0, bloques + n1 - n0)
+            marco = traza[-1]
+            linea = por_linea.setdefault((marco.filename, marco.lineno), [0, 0, Counter()])
+            linea[0] += b1 - b0
+            linea[1] += n1 - n0
+            linea[2][nombre] += abs(b1 - b0)
+
+        lineas = []
+        for (archivo, numero), (bytes_, bloques, donde) in sorted(
+                por_linea.items(), key=lambda x: -abs(x[1][0]))[:top]:
+            lineas.append({
+                'archivo': os.path.basename(archivo), 'linea': numero,
+                'codigo': linecache.getline(archivo, numero).strip(),
+                'bytes': bytes_, 'bloques': bloques, 'subsistema': donde.most_common(1)[0][0],
+            })
+
+        clases = []
+        if anterior[3] and posterior[3]:
+            (c0, t0), (c1, t1) = anterior[3], posterior[3]
+            nombres = sorted(set(c0) | set(c1), key=lambda n: abs(t1[n] - t0[n]), reverse=True)
+            destacados = [n for n in self.CLASES if n in c0 or n in c1]
+            for nombre in destacados + [n for n in nombres[:top] if n not in destacados]:
+                clases.append({'clase': nombre, 'objetos': c1[nombre] - c0[nombre], 'bytes': t1[nombre] - t0[nombre],
+                               'total_objetos': c1[nombre], 'total_bytes': t1[nombre]})
+        return {
+            'desde': anterior[0],
+            'hasta': posterior[0],
+            'segundos': (posterior[1] - anterior[1]).total_seconds(),
+            'bytes': sum(b for b, _ in subsistemas.values()),
+            'subsistemas': {
+                nombre: {'bytes': b, 'bloques': n}
+                for nombre, (b, n) in sorted(subsistemas.items(), key=lambda x: -abs(x[1][0]))
+            },
+            'lineas': lineas,
+            'clases': clases,
+        }
+
+    def informe(self, desde=0, hasta=-1, top=10):
+        """Informe de texto con el top N de lo que cambió entre dos muestras"""
+        d = self.comparar(desde, hasta, top)
+        texto = [f"🧠 Memoria «{d['desde']}» → «{d['hasta']}» ({d['segundos']:.0f}s): {_mib(d['bytes'])}",
+                 "Por subsistema:"]
+        texto += [f"   {nombre:<13} {_mib(s['bytes']):>13} {s['bloques']:>+10} bloques"
+                  for nombre, s in d['subsistemas'].items()]
+        texto.append(f"Top {top} líneas:")
+        texto += [f"   {_mib(l['bytes']):>13} {l['bloques']:>+9}  {l['archivo']}:{l['linea']} "
+                  f"[{l['subsistema']}] {l['codigo'][:60]}" for l in d['lineas']]
+        if d['clases']:
+            texto.append("Por clase (objetos vivos):")
+            texto += [f"   {c['clase']:<16} {c['objetos']:>+9} {_mib(c['bytes']):>13}  "
+                      f"(total {c['total_objetos']}, {c['total_bytes'] / 2**20:.2f} MiB)" for c in d['clases']]
+        return "\n".join(texto)
+
+MEMORIA = PerfilMemoria()
+
+class _Etiqueta:
+    """Pone una etiqueta al hilo actual mientras dura el bloque (ver PerfilMuestreo.etiqueta)"""
+    __slots__ = ("_etiquetas", "_texto", "_anterior", "_ident")
+
+    def __init__(self, etiquetas, texto):
+        self._etiquetas = etiquetas
+        self._texto = texto
+
+    def __enter__(self):
+        self._ident = threading.get_ident()
+        self._anterior = self._etiquetas.get(self._ident)
+        self._etiquetas[self._ident] = self._texto
+        return self
+
+    def __exit__(self, *exc):
+        if self._anterior is None:
+            self._etiquetas.pop(self._ident, None)
+        else:
+            self._etiquetas[self._ident] = self._anterior
+        return False
+
+class PerfilMuestreo:
+    """Perfilador por muestreo de las pilas de los hilos, en formato plegado de flamegraph
+
+    Un hilo propio lee sys._current_frames() hz veces por segundo y cuenta cada pila
+    con la etiqueta de su hilo: la que haya puesto con etiqueta()/etiquetar() (el
+    planificador marca qué carril o la salida atiende, la interfaz se llama
+    "interfaz") o su nombre. Los hilos muestreados no ejecutan nada; solo pierden
+    el GIL mientras se copian las pilas. Sin ociosos se descartan las muestras de
+    hilos esperando (cerrojos, colas, mainloop, time.sleep), que no gastan CPU: las
+    esperas en C no dejan marco propio, así que además de la función de la hoja se
+    mira la línea que está ejecutando.
+
+    plegado() sigue el formato de flamegraph.pl, inferno o speedscope:
+        interfaz;mainloop (__init__.py);refrescar (parking_privado.py) 42
+    """
+    HZ = 100
+    # Hojas (archivo, función) en las que el hilo está bloqueado y no trabajando
+    ESPERAS = {
+        ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"), ("__init__.py", "mainloop"),
+        ("selectors.py", "select"), ("connection.py", "_recv"), ("connection.py", "_poll"),
+    }
+    # Llamadas a C que bloquean: la hoja es quien llama, en la línea de la llamada
+    LLAMADAS_ESPERA = ("sleep(", ".wait(", ".acquire(", ".recv(", ".recv_bytes(", ".accept(", ".select(")
+
+    def __init__(self):
+        self.activo = False
+        self.hz = self.HZ
+        self.muestras = 0
+        self._etiquetas = {}  # ident del hilo -> etiqueta
+        self._pilas = Counter()
+        self._hilos = None
+        self._lineas = False
+        self._ociosos = False
+        self._espera = {}  # code o (code, línea) -> ¿hoja de espera? (caché)
+        self._hilo = None
+        self._lock = threading.Lock()
+
+    def etiqueta(self, texto):
+        """Context manager: las muestras del hilo actual llevan texto mientras dura el bloque"""
+        return _Etiqueta(self._etiquetas, texto)
+
+    def etiquetar(self, texto):
+        """Etiqueta el hilo actual para el resto de su vida"""
+        self._etiquetas[threading.get_ident()] = texto
+
+    def iniciar(self, hz=HZ, hilos=None, lineas=False, ociosos=False):
+        """Empieza a muestrear; hilos limita a las etiquetas que empiezan por alguno de esos prefijos"""
+        with self._lock:
+            if self.activo:
+                return
+            self.hz = hz
+            self._hilos = tuple(hilos) if hilos else None
+            self._lineas = lineas
+            self._ociosos = ociosos
+            self.activo = True
+            self._hilo = threading.Thread(target=self._muestrear, daemon=True, name="perfil-muestreo")
+            self._hilo.start()
+
+    def detener(self):
+        with self._lock:
+            self.activo = False
+            hilo, self._hilo = self._hilo, None
+        if hilo:
+            hilo.join()
+
+    def alternar(self, archivo=None):
+        """Inicia o detiene el muestreo; al detener, vuelca las pilas en archivo si se da"""
+        if not self.activo:
+            self.iniciar(self.hz, self._hilos, self._lineas, self._ociosos)
+            return True
+        self.detener()
+        if archivo:
+            self.volcar(archivo)
+        return False
+
+    def alternar_con_senal(self, archivo, senal="SIGUSR1"):
+        """kill -USR1 <pid> inicia o detiene el muestreo y vuelca al detener (solo POSIX)"""
+        if hasattr(signal, senal):
+            signal.signal(getattr(signal, senal), lambda *_: self.alternar(archivo))
+
+    def reiniciar(self):
+        with self._lock:
+            self._pilas = Counter()
+            self.muestras = 0
+
+    def _es_espera(self, marco):
+        codigo = marco.f_code
+        espera = self._espera.get(codigo)
+        if espera is None:
+            espera = self._espera[codigo] = (os.path.basename(codigo.co_filename), codigo.co_name) in self.ESPERAS
+        if espera:
+            return True
+        clave = (codigo, marco.f_lineno)
+        espera = self._espera.get(clave)
+        if espera is None:
+            texto = linecache.getline(codigo.co_filename, marco.f_lineno)
+            espera = self._espera[clave] = any(llamada in texto for llamada in self.LLAMADAS_ESPERA)
+        return espera
+
+    def _muestrear(self):
+        propio = threading.get_ident()
+        periodo = 1 / self.hz
+        siguiente = time.perf_counter()
+        while self.activo:
+            nombres = {h.ident: h.name for h in threading.enumerate()}
+            for ident, marco in sys._current_frames().items():
+                if ident == propio:
+                    continue
+                etiqueta = self._etiquetas.get(ident) or nombres.get(ident) or f"hilo-{ident}"
+                if self._hilos and not etiqueta.startswith(self._hilos):
+                    continue
+                if not self._ociosos and self._es_espera(marco):
+                    continue
+                pila = []
+                while marco is not None:
+                    pila.append((marco.f_code, marco.f_lineno) if self._lineas else marco.f_code)
+                    marco = marco.f_back
+                self._pilas[(etiqueta, tuple(pila))] += 1
+            self.muestras += 1
+            siguiente += periodo
+            espera = siguiente - time.perf_counter()
+            if espera > 0:
+                time.sleep(espera)
+            else:
+                siguiente = time.perf_counter()  # Atrasado: no se recuperan las muestras perdidas
+
+    @staticmethod
+    def _marco(marco):
+        codigo, linea = marco if isinstance(marco, tuple) else (marco, None)
+        archivo = os.path.basename(codigo.co_filename)
+        # co_qualname (clase.método) solo existe desde Python 3.11
+        nombre = getattr(codigo, "co_qualname", codigo.co_name)
+        texto = f"{nombre} ({archivo}{f':{linea}' if linea else ''})"
+        return texto.replace(";", ",")
+
+    def plegado(self):
+        """Líneas "etiqueta;raíz;...;hoja muestras" ordenadas"""
+        pilas = self._pilas.copy()
+        lineas = [
+            ";".join([etiqueta, *map(self._marco, reversed(pila))]) + f" {n}"
+            for (etiqueta, pila), n in pilas.items()
+        ]
+        return sorted(lineas)
+
+    def volcar(self, archivo):
+        with open(archivo, 'w', encoding='utf-8') as f:
+            f.write("\n".join(self.plegado()) + "\n")
+        return archivo
+
+    def resumen(self, top=10):
+        """Muestras por etiqueta y funciones con más tiempo propio (hoja) e incluido"""
+        pilas = self._pilas.copy()
+        total = sum(pilas.values()) or 1
+        por_etiqueta, propio, incluido = Counter(), Counter(), Counter()
+        for (etiqueta, pila), n in pilas.items():
+            por_etiqueta[etiqueta] += n
+            propio[self._marco(pila[0])] += n
+            for marco in set(map(self._marco, pila)):
+                incluido[marco] += n
+        lineas = [f"🔥 Perfil: {total} muestras de pila en {self.muestras} pasadas a {self.hz}Hz", "Por hilo:"]
+        lineas += [f"   {e:<24} {n:>7} {n / total * 100:6.1f}%" for e, n in por_etiqueta.most_common()]
+        lineas.append(f"Top {top} tiempo propio:")
+        lineas += [f"   {n / total * 100:6.1f}%  {m}" for m, n in propio.most_common(top)]
+        lineas.append(f"Top {top} tiempo incluido:")
+        lineas += [f"   {n / total * 100:6.1f}%  {m}" for m, n in incluido.most_common(top)]
+        return "\n".join(lineas)
+
+PERFIL = PerfilMuestreo()
+
+# ======================================================
+# RELOJ
+# ======================================================
+
+class Reloj:
+    """Hora del sistema; en simulaciones y reproducciones se fija a mano"""
+    def __init__(self):
+        self._fijada = None
+
+    def ahora(self):
+        return self._fijada if self._fijada is not None else datetime.now()
+
+    def fijar(self, momento):
+        self._fijada = momento
+
+    def soltar(self):
+        self._fijada = None
+
+RELOJ = Reloj()
+
+def hora_actual():
+    return RELOJ.ahora()
+
 # ======================================================
 # MODELOS
 # ======================================================
@@ -56,6 +692,10 @@ class Coche:
         self.tipo = tipo
         self.hora_entrada = None
         self.duracion_estimada = None  # En minutos
+        self.hora_cola = None  # Momento en que entró en la cola de espera
+        self.factor_tarifa = 1.0  # Factor de la tarifa dinámica, fijado al entrar
+        self.nivel_bateria = None  # Carga de la batería al llegar (0-1), solo eléctricos
+        self.reserva = False  # Llegó diciendo tener reserva (para cuando entre desde la cola)
 
     def to_dict(self):
         """Convierte el coche a diccionario para JSON"""
@@ -63,7 +703,9 @@ class Coche:
             'matricula': self.matricula,
             'tipo': self.tipo,
             'hora_entrada': self.hora_entrada.isoformat() if self.hora_entrada else None,
-            'duracion_estimada': self.duracion_estimada
+            'duracion_estimada': self.duracion_estimada,
+            'factor_tarifa': self.factor_tarifa,
+            'nivel_bateria': self.nivel_bateria
         }
     
     @staticmethod
@@ -73,6 +715,8 @@ class Coche:
         if data['hora_entrada']:
             coche.hora_entrada = datetime.fromisoformat(data['hora_entrada'])
         coche.duracion_estimada = data['duracion_estimada']
+        coche.factor_tarifa = data.get('factor_tarifa', 1.0)
+        coche.nivel_bateria = data.get('nivel_bateria')
         return coche
 
 class Plaza:
@@ -108,22 +752,34 @@ class Plaza:
     def ocupar(self, coche):
         self.ocupada = True
         self.coche = coche
-        self.entrada = datetime.now()
+        self.entrada = hora_actual()
         coche.hora_entrada = self.entrada
         # Duración estimada realista
-        coche.duracion_estimada = random.choices(
-            [30, 60, 120, 180, 240, 480],  # minutos
-            weights=[0.1, 0.3, 0.3, 0.15, 0.1, 0.05]
-        )[0]
+        coche.duracion_estimada = random.choices(DURACIONES_ESTANCIA, weights=PESOS_ESTANCIA)[0]
 
     def liberar(self):
-        tiempo = datetime.now() - self.entrada
+        tiempo = hora_actual() - self.entrada
         coche = self.coche
         self.ocupada = False
         self.coche = None
         self.entrada = None
         return coche, tiempo
 
+    def instantanea(self):
+        """Copia inmutable del estado actual de la plaza"""
+        return EstadoPlaza(
+            self.id,
+            self.tipo_parking,
+            self.exclusiva_minusvalido,
+            self.es_electrica,
+            self.ocupada,
+            self.coche.matricula if self.coche else None,
+            self.coche.tipo if self.coche else None,
+            self.entrada,
+            self.coche.duracion_estimada if self.coche else None,
+            self.coche.factor_tarifa if self.coche else 1.0
+        )
+
     def to_dict(self):
         """Convierte la plaza a diccionario para JSON"""
         return {
@@ -152,92 +808,1317 @@ class Plaza:
             plaza.entrada = datetime.fromisoformat(data['entrada'])
         return plaza
 
+    @staticmethod
+    def desde_estado(estado):
+        """Crea una plaza a partir de su EstadoPlaza"""
+        plaza = Plaza(
+            estado.id,
+            estado.tipo_parking,
+            estado.exclusiva_minusvalido,
+            estado.es_electrica
+        )
+        if estado.ocupada:
+            coche = Coche(estado.matricula, estado.tipo_vehiculo)
+            coche.hora_entrada = estado.entrada
+            coche.duracion_estimada = estado.duracion_estimada
+            coche.factor_tarifa = estado.factor_tarifa
+            plaza.ocupada = True
+            plaza.coche = coche
+            plaza.entrada = estado.entrada
+        return plaza
+
+EstadoPlaza = namedtuple("EstadoPlaza", [
+    "id", "tipo_parking", "exclusiva_minusvalido", "es_electrica",
+    "ocupada", "matricula", "tipo_vehiculo", "entrada", "duracion_estimada", "factor_tarifa"
+], defaults=[1.0])
+
+class ColumnasPlazas(namedtuple("ColumnasPlazas", ["ids", "tipos_parking", "flags", "matriculas", "tipos_vehiculo"])):
+    """Lo que necesitan los índices de cada plaza, por columnas y sin un objeto por plaza
+
+    flags como en PlazasDiferidas (1 minusválido, 2 eléctrica, 4 ocupada); matrículas
+    y tipos de vehículo son None en las libres.
+    """
+    MINUSVALIDO, ELECTRICA, OCUPADA = 1, 2, 4
+
+    @staticmethod
+    def desde_estados(estados):
+        return ColumnasPlazas(
+            [e.id for e in estados],
+            [e.tipo_parking for e in estados],
+            bytes(e.exclusiva_minusvalido | e.es_electrica << 1 | e.ocupada << 2 for e in estados),
+            [e.matricula for e in estados],
+            [e.tipo_vehiculo for e in estados],
+        )
+
+    @classmethod
+    def categoria(cls, flags):
+        """Categoría de plaza (ver GestorPlazas._categoria) a partir de sus flags"""
+        if flags & cls.MINUSVALIDO:
+            return "MINUSVALIDO"
+        if flags & cls.ELECTRICA:
+            return "ELECTRICA"
+        return "GENERAL"
+
+    def claves(self):
+        """(tipo_parking, categoría) de cada plaza, por orden"""
+        return zip(self.tipos_parking, map(self.categoria, self.flags))
+
+def celda_plaza(pid):
+    """(fila, columna) de un id como "B5" o "AA12" (filas A..Z, AA, ...); None si no sigue ese formato"""
+    letras = pid.rstrip("0123456789")
+    numero = pid[len(letras):]
+    if not numero or not (letras.isascii() and letras.isalpha() and letras.isupper()):
+        return None
+    fila = 0
+    for letra in letras:
+        fila = fila * 26 + ord(letra) - ord("A") + 1
+    return fila - 1, int(numero) - 1
+
+class InstantaneaPlazas:
+    """Vista inmutable y versionada de las plazas; las versiones comparten los bloques no modificados
+
+    Un bloque None aún no se ha leído: lo da fuente(número de bloque). Así una
+    instantánea abierta desde archivo (PlazasDiferidas) solo decodifica lo que se lee.
+    """
+    TAM_BLOQUE = 64
+
+    def __init__(self, version, bloques, total, fuente=None):
+        self.version = version
+        self._bloques = bloques
+        self._total = total
+        self._fuente = fuente
+
+    def _bloque(self, nb):
+        bloque = self._bloques[nb]
+        return self._fuente(nb) if bloque is None else bloque
+
+    @staticmethod
+    def desde_estados(estados):
+        t = InstantaneaPlazas.TAM_BLOQUE
+        bloques = tuple(tuple(estados[i:i + t]) for i in range(0, len(estados), t))
+        return InstantaneaPlazas(0, bloques, len(estados))
+
+    def con_cambio(self, posicion, estado):
+        """Nueva versión con una plaza sustituida (copia solo su bloque)"""
+        nb, desplazamiento = divmod(posicion, self.TAM_BLOQUE)
+        bloque = list(self._bloque(nb))
+        bloque[desplazamiento] = estado
+        bloques = list(self._bloques)
+        bloques[nb] = tuple(bloque)
+        return InstantaneaPlazas(self.version + 1, tuple(bloques), self._total, self._fuente)
+
+    def __getitem__(self, i):
+        return self._bloque(i // self.TAM_BLOQUE)[i % self.TAM_BLOQUE]
+
+    def __iter__(self):
+        for nb in range(len(self._bloques)):
+            yield from self._bloque(nb)
+
+    def __len__(self):
+        return self._total
+
+class PlazasDiferidas:
+    """Plazas de una instantánea binaria que se leen del archivo según se usan
+
+    El archivo queda mapeado en memoria. Al abrir solo se leen las columnas que
+    necesitan los índices de GestorPlazas (ids, zonas, flags, matrículas y tipos de
+    vehículo, ver ColumnasPlazas); el resto de cada fila (momento de entrada,
+    duración, factor) se decodifica por bloques de InstantaneaPlazas.TAM_BLOQUE
+    filas la primera vez que se lee uno, y cada Plaza se crea la primera vez que se
+    usa. Los estados leídos solo sirven para crear la plaza; a partir de ahí manda
+    el objeto. Cuando ya se ha leído todo, el mapa se cierra.
+
+    Formato: MAGIA, longitud (uint32) y cabecera JSON, y después las columnas alineadas a 8 bytes:
+        ids, matriculas     texto utf-8 separado por saltos de línea
+        tipo_parking        uint8, índice en cabecera['tipos_parking']
+        flags               uint8 (1 minusválido, 2 eléctrica, 4 ocupada)
+        tipo_vehiculo       uint8, índice en cabecera['tipos_vehiculo'] (255 si libre)
+        entrada             float64, epoch (0 si libre)
+        duracion            uint32, minutos estimados (0 si libre)
+        factor              float64, factor de la tarifa dinámica (1 si libre)
+    """
+    MAGIA = b"PKSNAP01"
+    SIN_VEHICULO = 255
+
+    def __init__(self, mapa, posiciones, columnas):
+        # posiciones: {columna: (inicio, longitud)} absolutas en el mapa
+        self.columnas = columnas
+        self._mapa = mapa
+        self._posiciones = posiciones
+        n = len(columnas.ids)
+        t = InstantaneaPlazas.TAM_BLOQUE
+        self._leidos = [None] * -(-n // t)
+        self._pendientes = len(self._leidos)
+        self.instantanea = InstantaneaPlazas(0, (None,) * len(self._leidos), n, self._bloque)
+        self._plazas = [None] * n
+        self._lock = threading.Lock()
+
+    def _numeros(self, nombre, codigo, desde, hasta, defecto):
+        if nombre not in self._posiciones:
+            return [defecto] * (hasta - desde)
+        inicio, _ = self._posiciones[nombre]
+        tam = array(codigo).itemsize
+        return array(codigo, self._mapa[inicio + desde * tam:inicio + hasta * tam])
+
+    def _bloque(self, nb):
+        """Estados de las filas del bloque nb, decodificados del mapa la primera vez"""
+        bloque = self._leidos[nb]
+        if bloque is not None:
+            return bloque
+        with self._lock:
+            bloque = self._leidos[nb]
+            if bloque is None:
+                t = InstantaneaPlazas.TAM_BLOQUE
+                bloque = self._leidos[nb] = self._filas(nb * t, min((nb + 1) * t, len(self._plazas)))
+                self._pendientes -= 1
+                if not self._pendientes:
+                    self._mapa.close()  # Todo leído: el archivo ya no hace falta
+        return bloque
+
+    def _filas(self, desde, hasta):
+        """Decodifica las filas [desde, hasta) (llamar con _lock y el mapa abierto)"""
+        c = self.columnas
+        return tuple(map(EstadoPlaza._make, zip(
+            c.ids[desde:hasta],
+            c.tipos_parking[desde:hasta],
+            [bool(f & ColumnasPlazas.MINUSVALIDO) for f in c.flags[desde:hasta]],
+            [bool(f & ColumnasPlazas.ELECTRICA) for f in c.flags[desde:hasta]],
+            [bool(f & ColumnasPlazas.OCUPADA) for f in c.flags[desde:hasta]],
+            c.matriculas[desde:hasta],
+            c.tipos_vehiculo[desde:hasta],
+            [datetime.fromtimestamp(e) if e else None for e in self._numeros('entrada', 'd', desde, hasta, 0)],
+            [d or None for d in self._numeros('duracion', 'I', desde, hasta, 0)],
+            self._numeros('factor', 'd', desde, hasta, 1.0),
+        )))
+
+    def estado(self, i):
+        """Estado de la fila i; si su bloque aún no se ha leído, se decodifica solo esa fila"""
+        nb, desplazamiento = divmod(i, InstantaneaPlazas.TAM_BLOQUE)
+        bloque = self._leidos[nb]
+        if bloque is not None:
+            return bloque[desplazamiento]
+        with self._lock:
+            if self._leidos[nb] is not None:
+                return self._leidos[nb][desplazamiento]
+            return self._filas(i, i + 1)[0]
+
+    def __getitem__(self, i):
+        plaza = self._plazas[i]
+        if plaza is None:
+            estado = self.estado(i)
+            with self._lock:
+                plaza = self._plazas[i]
+                if plaza is None:
+                    plaza = self._plazas[i] = Plaza.desde_estado(estado)
+        return plaza
+
+    def __iter__(self):
+        for i in range(len(self._plazas)):
+            yield self[i]
+
+    def __len__(self):
+        return len(self._plazas)
+
+    def calentar(self):
+        """Lee todos los bloques (y suelta el archivo) y crea las plazas pendientes
+
+        Pensado para un hilo en segundo plano.
+        """
+        for nb in range(len(self._leidos)):
+            self._bloque(nb)
+        for i in range(len(self._plazas)):
+            self[i]
+
+    @staticmethod
+    def _alinear(n):
+        return -(-n // 8) * 8
+
+    @staticmethod
+    def guardar(archivo, estados, cabecera):
+        """Escribe los estados y la cabecera; se escribe aparte y se renombra para no pisar una lectura"""
+        tipos_parking = list(TIPOS_PARKING)
+        tipos_vehiculo = list(TIPOS_VEHICULO)
+        columnas = {
+            'ids': "\n".join(e.id for e in estados).encode('utf-8'),
+            'matriculas': "\n".join(e.matricula or "" for e in estados).encode('utf-8'),
+            'tipo_parking': bytes(tipos_parking.index(e.tipo_parking) for e in estados),
+            'flags': bytes(
+                e.exclusiva_minusvalido | e.es_electrica << 1 | e.ocupada << 2 for e in estados
+            ),
+            'tipo_vehiculo': bytes(
+                tipos_vehiculo.index(e.tipo_vehiculo) if e.tipo_vehiculo else PlazasDiferidas.SIN_VEHICULO
+                for e in estados
+            ),
+            'entrada': array('d', (e.entrada.timestamp() if e.entrada else 0.0 for e in estados)).tobytes(),
+            'duracion': array('I', (e.duracion_estimada or 0 for e in estados)).tobytes(),
+            'factor': array('d', (e.factor_tarifa for e in estados)).tobytes(),
+        }
+        desplazamiento = 0
+        cabecera = dict(cabecera, n=len(estados), orden_bytes=sys.byteorder,
+                        tipos_parking=tipos_parking, tipos_vehiculo=tipos_vehiculo, columnas={})
+        for nombre, datos in columnas.items():
+            cabecera['columnas'][nombre] = [desplazamiento, len(datos)]
+            desplazamiento = PlazasDiferidas._alinear(desplazamiento + len(datos))
+        texto = json.dumps(cabecera, ensure_ascii=False).encode('utf-8')
+
+        temporal = archivo + ".tmp"
+        with open(temporal, 'wb') as f:
+            f.write(PlazasDiferidas.MAGIA + struct.pack("<I", len(texto)) + texto)
+            for datos in columnas.values():
+                f.write(b"\0" * (PlazasDiferidas._alinear(f.tell()) - f.tell()))
+                f.write(datos)
+        os.replace(temporal, archivo)
+
+    @staticmethod
+    def abrir(archivo):
+        """Devuelve (plazas diferidas, cabecera) de una instantánea binaria
+
+        Solo se decodifican las columnas de los índices; el mapa queda abierto.
+        """
+        with open(archivo, 'rb') as f:
+            mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if mapa[:len(PlazasDiferidas.MAGIA)] != PlazasDiferidas.MAGIA:
+                raise ValueError(f"{archivo} no es una instantánea binaria")
+            inicio = len(PlazasDiferidas.MAGIA)
+            (longitud,) = struct.unpack_from("<I", mapa, inicio)
+            cabecera = json.loads(mapa[inicio + 4:inicio + 4 + longitud])
+            if cabecera['orden_bytes'] != sys.byteorder:
+                raise ValueError("Instantánea escrita con otro orden de bytes")
+            base = PlazasDiferidas._alinear(inicio + 4 + longitud)
+            posiciones = {
+                nombre: (base + desplazamiento, longitud)
+                for nombre, (desplazamiento, longitud) in cabecera.pop('columnas').items()
+            }
+            if max(a + b for a, b in posiciones.values()) > len(mapa):
+                raise ValueError("Instantánea truncada")
+
+            def columna(nombre):
+                inicio, longitud = posiciones[nombre]
+                return mapa[inicio:inicio + longitud]
+
+            tipos_parking = cabecera['tipos_parking']
+            tipos_vehiculo = cabecera['tipos_vehiculo'] + [None] * (256 - len(cabecera['tipos_vehiculo']))
+            columnas = ColumnasPlazas(
+                str(columna('ids'), 'utf-8').split("\n"),
+                [tipos_parking[c] for c in columna('tipo_parking')],
+                columna('flags'),
+                [m or None for m in str(columna('matriculas'), 'utf-8').split("\n")],
+                [tipos_vehiculo[c] for c in columna('tipo_vehiculo')],
+            )
+            if any(len(c) != cabecera['n'] for c in columnas):
+                raise ValueError("Instantánea truncada")
+        except BaseException:
+            mapa.close()
+            raise
+        if not cabecera['n']:
+            mapa.close()
+        return PlazasDiferidas(mapa, posiciones, columnas), cabecera
+
+class Reserva:
+    """Reserva de una plaza de un tipo de parking y una categoría durante [inicio, fin)"""
+    def __init__(self, matricula, tipo_parking, inicio, fin, categoria="GENERAL"):
+        self.matricula = matricula
+        self.tipo_parking = tipo_parking
+        self.inicio = inicio
+        self.fin = fin
+        self.categoria = categoria
+
+    @property
+    def clave(self):
+        return self.tipo_parking, self.categoria
+
+    def to_dict(self):
+        return {
+            'matricula': self.matricula,
+            'tipo_parking': self.tipo_parking,
+            'inicio': self.inicio.isoformat(),
+            'fin': self.fin.isoformat(),
+            'categoria': self.categoria
+        }
+
+    @staticmethod
+    def from_dict(data):
+        return Reserva(
+            data['matricula'],
+            data['tipo_parking'],
+            datetime.fromisoformat(data['inicio']),
+            datetime.fromisoformat(data['fin']),
+            data.get('categoria', "GENERAL")
+        )
+
 # ======================================================
 # GESTORES
 # ======================================================
 
 class GestorTarifas:
+    """Tarifa por segundos con factores de vehículo, zona, hora y demanda (política "zonas")"""
     BASE_POR_SEGUNDO = 1.5 / 20
 
-    def calcular(self, tiempo, tipo_vehiculo, tipo_parking, reserva):
+    def __init__(self, dinamica=TARIFA_DINAMICA, base_por_segundo=None):
+        self.dinamica = dinamica
+        # Cada sitio de una federación puede tener su propia tarifa base
+        self.base_por_segundo = base_por_segundo or self.BASE_POR_SEGUNDO
+
+    @staticmethod
+    def _factor_horario(hora):
+        if 8 <= hora <= 10 or 18 <= hora <= 20:
+            return 1.3
+        elif 22 <= hora or hora <= 6:
+            return 0.8
+        return 1.0
+
+    def factor_demanda(self, ocupacion, cola=0):
+        """Multiplicador por ocupación de la zona y coches en cola (1.0 sin tarifa dinámica)"""
+        if not self.dinamica:
+            return 1.0
+        if ocupacion < OCUPACION_DESCUENTO:
+            return 1 - DESCUENTO_MAXIMO * (1 - ocupacion / OCUPACION_DESCUENTO)
+        factor = 1.0
+        if ocupacion > OCUPACION_RECARGO:
+            factor += RECARGO_MAXIMO * (ocupacion - OCUPACION_RECARGO) / (1 - OCUPACION_RECARGO)
+        return factor + min(cola * RECARGO_POR_COCHE_EN_COLA, RECARGO_COLA_MAXIMO)
+
+    def precio_hora(self, tipo_vehiculo, tipo_parking, factor=1.0):
+        """Precio de una hora empezando ahora (orientativo, para la barrera de entrada)"""
+        precio = 3600 * self.base_por_segundo
+        precio *= TIPOS_VEHICULO[tipo_vehiculo] * TIPOS_PARKING[tipo_parking]
+        precio *= self._factor_horario(hora_actual().hour) * factor
+        return round(precio, 2)
+
+    def calcular(self, tiempo, tipo_vehiculo, tipo_parking, reserva, factor=1.0):
         segundos = tiempo.total_seconds()
         if segundos <= 30:
             return 0
 
-        precio = (segundos - 30) * self.BASE_POR_SEGUNDO
+        precio = (segundos - 30) * self.base_por_segundo
         precio *= TIPOS_VEHICULO[tipo_vehiculo]
         precio *= TIPOS_PARKING[tipo_parking]
-
-        hora = datetime.now().hour
-        if 8 <= hora <= 10 or 18 <= hora <= 20:
-            precio *= 1.3
-        elif 22 <= hora or hora <= 6:
-            precio *= 0.8
+        precio *= self._factor_horario(hora_actual().hour)
+        precio *= factor
 
         if reserva:
             precio += 2.5
 
         return round(precio, 2)
 
-class GestorPlazas:
-    def __init__(self, plazas):
-        self._plazas = plazas
+    def precio_energia(self, kwh):
+        return round(kwh * PRECIO_KWH, 2)
+
+class RegistroMatriculas:
+    """Índice matrícula → posición de la plaza: localiza coches en O(1) y evita duplicados"""
+    def __init__(self, columnas=None):
+        # None indica una matrícula reclamada que aún no tiene plaza (entrando o en cola)
+        self._indice = {}
         self._lock = threading.Lock()
+        if columnas is not None:
+            self.reconstruir(columnas)
 
-    def asignar(self, coche):
+    def reconstruir(self, columnas):
+        """Rehace el índice a partir de las plazas ocupadas (ColumnasPlazas)"""
         with self._lock:
-            ocupacion = self.tasa_ocupacion()
-            ocupacion_alta = ocupacion > 0.8
-            
-            # Primero intenta asignación estricta
-            candidatas = [p for p in self._plazas if p.puede_entrar(coche)]
-            
-            # Si no hay y la ocupación es alta, permite flexibilidad en plazas eléctricas
-            if not candidatas and ocupacion_alta:
-                candidatas = [p for p in self._plazas if p.puede_entrar_flexible(coche, True)]
-            
-            if candidatas:
-                # Preferir plazas del mismo tipo de parking que el coche
-                if coche.tipo == "NORMAL":
-                    preferidas = [p for p in candidatas if p.tipo_parking == "EXTERIOR"]
-                    if preferidas:
-                        candidatas = preferidas
-                elif coche.tipo == "MOTO":
-                    preferidas = [p for p in candidatas if p.tipo_parking == "AREA_PRIVADA"]
-                    if preferidas:
-                        candidatas = preferidas
-                
-                plaza = random.choice(candidatas)
-                plaza.ocupar(coche)
-                return plaza
+            self._indice = {}
+            for posicion, (flags, matricula) in enumerate(zip(columnas.flags, columnas.matriculas)):
+                if flags & ColumnasPlazas.OCUPADA and matricula:
+                    self._indice.setdefault(matricula, posicion)
+
+    def reclamar(self, matricula):
+        """Marca la matrícula como en uso; False si ya está dentro"""
+        with self._lock:
+            if matricula in self._indice:
+                return False
+            self._indice[matricula] = None
+            return True
+
+    def vincular(self, matricula, posicion):
+        with self._lock:
+            self._indice[matricula] = posicion
+
+    def soltar(self, matricula):
+        with self._lock:
+            return self._indice.pop(matricula, None)
+
+    def emitir(self):
+        """Genera y reclama una matrícula que no esté en uso"""
+        while True:
+            matricula = f"{random.randint(1000,9999)}{''.join(random.choices(string.ascii_uppercase,k=3))}"
+            if self.reclamar(matricula):
+                return matricula
+
+    def buscar(self, matricula):
+        return self._indice.get(matricula)
+
+    def __contains__(self, matricula):
+        return matricula in self._indice
+
+    def __len__(self):
+        return len(self._indice)
+
+class ConjuntoLibres:
+    """Conjunto de posiciones de plazas con alta, baja y acceso por índice en O(1)"""
+    def __init__(self):
+        self._items = []
+        self._pos = {}
+
+    def añadir(self, posicion):
+        if posicion not in self._pos:
+            self._pos[posicion] = len(self._items)
+            self._items.append(posicion)
+
+    def quitar(self, posicion):
+        i = self._pos.pop(posicion, None)
+        if i is None:
+            return
+        ultima = self._items.pop()
+        if i < len(self._items):
+            self._items[i] = ultima
+            self._pos[ultima] = i
+
+    def __getitem__(self, i):
+        return self._items[i]
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, posicion):
+        return posicion in self._pos
+
+class ArbolFranjas:
+    """Árbol de segmentos sobre franjas: suma y máximo en rango en O(log n)"""
+    def __init__(self, n):
+        self.n = n
+        self._max = [0] * (4 * n)
+        self._pendiente = [0] * (4 * n)
+
+    def sumar(self, ini, fin, valor):
+        """Suma valor a las franjas [ini, fin)"""
+        if ini < fin:
+            self._sumar(1, 0, self.n, ini, fin, valor)
+
+    def _sumar(self, nodo, izq, der, ini, fin, valor):
+        if fin <= izq or der <= ini:
+            return
+        if ini <= izq and der <= fin:
+            self._max[nodo] += valor
+            self._pendiente[nodo] += valor
+            return
+        medio = (izq + der) // 2
+        self._sumar(2 * nodo, izq, medio, ini, fin, valor)
+        self._sumar(2 * nodo + 1, medio, der, ini, fin, valor)
+        self._max[nodo] = max(self._max[2 * nodo], self._max[2 * nodo + 1]) + self._pendiente[nodo]
+
+    def maximo(self, ini, fin):
+        """Máximo de las franjas [ini, fin)"""
+        if ini >= fin:
+            return 0
+        return self._maximo(1, 0, self.n, ini, fin)
+
+    def _maximo(self, nodo, izq, der, ini, fin):
+        if fin <= izq or der <= ini:
+            return 0
+        if ini <= izq and der <= fin:
+            return self._max[nodo]
+        medio = (izq + der) // 2
+        return max(
+            self._maximo(2 * nodo, izq, medio, ini, fin),
+            self._maximo(2 * nodo + 1, medio, der, ini, fin)
+        ) + self._pendiente[nodo]
+
+class GestorReservas:
+    """Reservas por franjas horarias con retención de plazas por tipo de parking y categoría
+
+    Una reserva retiene una plaza de su (tipo_parking, categoría): una de minusválidos
+    o eléctrica solo puede retenerse para un coche que pueda usarla.
+    """
+    SEGUNDOS_FRANJA = MINUTOS_POR_FRANJA * 60
+    NUM_FRANJAS = HORIZONTE_RESERVAS_DIAS * 24 * 60 // MINUTOS_POR_FRANJA
+    CATEGORIAS = {"MINUSVALIDO": "MINUSVALIDO", "ELECTRICO": "ELECTRICA"}  # Por tipo de vehículo
+
+    def __init__(self, capacidades, reservas=()):
+        # capacidades: {(tipo_parking, categoría): plazas}
+        self._capacidades = dict(capacidades)
+        self._por_matricula = {}
+        self._lock = threading.Lock()
+        self._rebasar(self._franja(hora_actual()))
+        for reserva in reservas:
+            if reserva.fin > hora_actual() and reserva.clave in self._capacidades:
+                self._alta(reserva)
+
+    @staticmethod
+    def desde_plazas(plazas, reservas=()):
+        """Crea la agenda con la capacidad de cada (tipo de parking, categoría)"""
+        if isinstance(plazas, PlazasDiferidas):
+            return GestorReservas(Counter(plazas.columnas.claves()), reservas)
+        capacidades = {}
+        for plaza in plazas:
+            clave = (plaza.tipo_parking, GestorPlazas._categoria(plaza))
+            capacidades[clave] = capacidades.get(clave, 0) + 1
+        return GestorReservas(capacidades, reservas)
+
+    @classmethod
+    def categoria(cls, tipo_vehiculo):
+        """Categoría de plaza que se retiene para un tipo de vehículo"""
+        return cls.CATEGORIAS.get(tipo_vehiculo, "GENERAL")
+
+    def _franja(self, momento):
+        return int(momento.timestamp() // self.SEGUNDOS_FRANJA)
+
+    def _rango(self, inicio, fin):
+        """Franjas relativas [ini, fin) que cubre el intervalo, recortadas al horizonte"""
+        ini = self._franja(inicio) - self._base
+        fin = -int(-fin.timestamp() // self.SEGUNDOS_FRANJA) - self._base
+        return max(ini, 0), min(fin, self.NUM_FRANJAS)
+
+    def _rebasar(self, franja):
+        """Reconstruye los árboles empezando en la franja actual"""
+        self._base = franja
+        self._arboles = {clave: ArbolFranjas(self.NUM_FRANJAS) for clave in self._capacidades}
+        ahora = hora_actual()
+        for matricula, reserva in list(self._por_matricula.items()):
+            if reserva.fin <= ahora:
+                del self._por_matricula[matricula]
+            else:
+                self._arboles[reserva.clave].sumar(*self._rango(reserva.inicio, reserva.fin), 1)
+
+    def _mantener(self, ahora):
+        # Al consumir medio horizonte se desplaza la base para seguir aceptando reservas
+        if self._franja(ahora) - self._base >= self.NUM_FRANJAS // 2:
+            self._rebasar(self._franja(ahora))
+
+    def _alta(self, reserva):
+        self._por_matricula[reserva.matricula] = reserva
+        self._arboles[reserva.clave].sumar(*self._rango(reserva.inicio, reserva.fin), 1)
+
+    def _baja(self, matricula):
+        reserva = self._por_matricula.pop(matricula, None)
+        if reserva:
+            self._arboles[reserva.clave].sumar(*self._rango(reserva.inicio, reserva.fin), -1)
+        return reserva
+
+    def reservar(self, matricula, tipo_parking, inicio, fin, categoria="GENERAL"):
+        with self._lock:
+            ahora = hora_actual()
+            self._mantener(ahora)
+            clave = (tipo_parking, categoria)
+            if not any(tipo == tipo_parking for tipo, _ in self._capacidades):
+                return False, f"Tipo de parking desconocido: {tipo_parking}"
+            if clave not in self._capacidades:
+                return False, f"No hay plazas {categoria} en {tipo_parking}"
+            if fin <= inicio or fin <= ahora:
+                return False, "Intervalo de reserva inválido"
+            if matricula in self._por_matricula:
+                return False, f"{matricula} ya tiene una reserva"
+            if self._franja(fin) - self._base > self.NUM_FRANJAS:
+                return False, f"Solo se admiten reservas a {HORIZONTE_RESERVAS_DIAS} días vista"
+
+            ini, fin_rel = self._rango(inicio, fin)
+            if self._arboles[clave].maximo(ini, fin_rel) >= self._capacidades[clave]:
+                return False, f"Sin plazas {tipo_parking} libres en ese horario"
+
+            self._alta(Reserva(matricula, tipo_parking, inicio, fin, categoria))
+            return True, f"📅 {matricula} reserva {tipo_parking} {inicio:%d/%m %H:%M}-{fin:%H:%M}"
+
+    def cancelar(self, matricula):
+        with self._lock:
+            return self._baja(matricula) is not None
+
+    def _vigente(self, matricula, momento):
+        reserva = self._por_matricula.get(matricula)
+        # Se admite llegar hasta una franja antes de la hora reservada
+        if reserva and reserva.inicio - timedelta(minutes=MINUTOS_POR_FRANJA) <= momento < reserva.fin:
+            return reserva
         return None
 
-    def liberar(self, pid):
+    def vigente(self, matricula, momento=None):
+        """La reserva de la matrícula si puede usarse ahora, sin consumirla"""
+        with self._lock:
+            return self._vigente(matricula, momento or hora_actual())
+
+    def consumir(self, matricula, momento=None):
+        """Da por usada la reserva si está vigente (el coche ya ha aparcado); la devuelve o None"""
         with self._lock:
-            for plaza in self._plazas:
-                if plaza.id == pid and plaza.ocupada:
-                    return plaza.liberar(), plaza
+            if self._vigente(matricula, momento or hora_actual()):
+                return self._baja(matricula)
+            return None
+
+    def comprometidas(self, tipo_parking, inicio, fin, categoria="GENERAL"):
+        """Máximo de plazas del tipo y la categoría comprometidas a la vez durante [inicio, fin)"""
+        with self._lock:
+            arbol = self._arboles.get((tipo_parking, categoria))
+            return arbol.maximo(*self._rango(inicio, fin)) if arbol else 0
+
+    def retenidas(self, momento=None):
+        """Plazas retenidas por (tipo de parking, categoría) en este momento"""
+        momento = momento or hora_actual()
+        with self._lock:
+            self._mantener(momento)
+            franja = self._franja(momento) - self._base
+            return {clave: arbol.maximo(franja, franja + 1) for clave, arbol in self._arboles.items()}
+
+    def pendientes(self):
+        with self._lock:
+            return list(self._por_matricula.values())
+
+class GestorPlazas:
+    MAX_CAMBIOS = 4096  # Versiones recordadas para cambios_desde
+
+    def __init__(self, plazas, agenda=None, asignacion=None, indexar=True):
+        # Los índices se construyen sobre columnas (ColumnasPlazas): unas PlazasDiferidas
+        # las leen tal cual del archivo, sin crear ninguna Plaza ni EstadoPlaza
+        self._plazas = plazas
+        if isinstance(plazas, PlazasDiferidas):
+            columnas = plazas.columnas
+            self._instantanea = plazas.instantanea
+        else:
+            estados = [p.instantanea() for p in plazas]
+            columnas = ColumnasPlazas.desde_estados(estados)
+            self._instantanea = InstantaneaPlazas.desde_estados(estados)
+        self._lock = threading.Lock()
+        self.registro = RegistroMatriculas(columnas)
+        self._agenda = agenda
+        self.asignacion = asignacion or AsignacionAleatoria()
+
+        # Instantáneas para lectores sin bloqueo: se publica una versión nueva en cada cambio
+        self._ids = columnas.ids
+        self._posicion = {pid: i for i, pid in enumerate(columnas.ids)}
+        self._cambios = deque(maxlen=self.MAX_CAMBIOS)
+        # Eléctricos aparcados en plaza eléctrica al crear el gestor: sus cargas se reanudan
+        self.cargas_iniciales = tuple(
+            i for i, (f, tipo) in enumerate(zip(columnas.flags, columnas.tipos_vehiculo))
+            if f & ColumnasPlazas.ELECTRICA and f & ColumnasPlazas.OCUPADA and tipo == "ELECTRICO"
+        )
+
+        # Índices de plazas libres por (tipo_parking, categoría) para asignar sin recorrer todo
+        self._libres = {}
+        self._libres_tipo = {}
+        self._capacidad_tipo = {}
+        self._ocupadas = 0
+        self._cercanas = None
+        for posicion, (clave, flags) in enumerate(zip(columnas.claves(), columnas.flags)):
+            tipo_parking = clave[0]
+            self._libres.setdefault(clave, ConjuntoLibres())
+            self._libres_tipo.setdefault(tipo_parking, 0)
+            self._capacidad_tipo[tipo_parking] = self._capacidad_tipo.get(tipo_parking, 0) + 1
+            if flags & ColumnasPlazas.OCUPADA:
+                self._ocupadas += 1
+            else:
+                self._marcar_libre_clave(posicion, clave)
+
+        # Plano: las barreras de los carriles están repartidas por el frente del parking
+        self.carriles = NUM_CARRILES_ENTRADA
+        self._celdas = None
+        if indexar and self.asignacion.indice_cercania:
+            self.indexar_cercania()
+
+    def _plano(self):
+        """(fila, columna) de cada posición; se calcula la primera vez que hace falta"""
+        if self._celdas is None:
+            celdas = [celda_plaza(pid) or divmod(i, PLAZAS_POR_FILA) for i, pid in enumerate(self._ids)]
+            self._columnas = max((c for _, c in celdas), default=0) + 1
+            self._celdas = celdas
+        return self._celdas
+
+    def indexar_cercania(self):
+        """Rango de distancia de cada plaza a cada carril y un montículo de libres por
+        (carril, tipo, categoría): desde entonces la libre más cercana sale en O(log n)
+
+        Los rangos se calculan sin bloquear, así que puede llamarse desde otro hilo
+        con el parking en marcha; hasta que termine se asigna al azar.
+        """
+        celdas = self._plano()
+        n = len(celdas)
+        rangos = []
+        for carril in range(self.carriles):
+            distancias = [self._distancia_celda(celda, carril) for celda in celdas]
+            rango = array('l', bytes(array('l').itemsize * n))
+            for r, posicion in enumerate(sorted(range(n), key=distancias.__getitem__)):
+                rango[posicion] = r
+            rangos.append(rango)
+        with METRICAS.bloqueo(self._lock, "plazas"):
+            cercanas = {}
+            for clave, conjunto in self._libres.items():
+                for carril, rango in enumerate(rangos):
+                    monticulo = [(rango[posicion], posicion) for posicion in conjunto]
+                    heapq.heapify(monticulo)
+                    cercanas[(carril, clave)] = monticulo
+            self._rangos = rangos
+            self._cercanas = cercanas
+
+    def _distancia_celda(self, celda, carril):
+        # Por el frente hasta la columna de la plaza y después por su pasillo
+        fila, columna = celda
+        frente = (carril + 0.5) / self.carriles * self._columnas - 0.5
+        return abs(columna - frente) * METROS_POR_PLAZA + (fila + 1) * METROS_POR_FILA
+
+    def distancia(self, pid, carril=0):
+        """Metros que recorre un coche desde la barrera del carril hasta la plaza"""
+        return self._distancia_celda(self._plano()[self._posicion[pid]], carril % self.carriles)
+
+    @staticmethod
+    def _categoria(plaza):
+        if plaza.exclusiva_minusvalido:
+            return "MINUSVALIDO"
+        if plaza.es_electrica:
+            return "ELECTRICA"
+        return "GENERAL"
+
+    @staticmethod
+    def _categorias_compatibles(coche, flexible):
+        """Equivalente a puede_entrar / puede_entrar_flexible por categoría de plaza"""
+        categorias = ["GENERAL"]
+        if coche.tipo == "MINUSVALIDO":
+            categorias.append("MINUSVALIDO")
+        if coche.tipo == "ELECTRICO" or flexible:
+            categorias.append("ELECTRICA")
+        return categorias
+
+    def _marcar_libre(self, posicion, plaza):
+        self._marcar_libre_clave(posicion, (plaza.tipo_parking, self._categoria(plaza)))
+
+    def _marcar_libre_clave(self, posicion, clave):
+        conjunto = self._libres[clave]
+        conjunto.añadir(posicion)
+        self._libres_tipo[clave[0]] += 1
+        if self._cercanas is not None:
+            # Al ocuparse no se quita de los montículos: se descarta al llegar a la cima
+            for carril, rango in enumerate(self._rangos):
+                monticulo = self._cercanas[(carril, clave)]
+                heapq.heappush(monticulo, (rango[posicion], posicion))
+                if len(monticulo) > 2 * len(conjunto) + 64:
+                    monticulo[:] = [(rango[p], p) for p in conjunto]
+                    heapq.heapify(monticulo)
+
+    def _marcar_ocupada(self, posicion, plaza):
+        self._libres[(plaza.tipo_parking, self._categoria(plaza))].quitar(posicion)
+        self._libres_tipo[plaza.tipo_parking] -= 1
+
+    def _publicar(self, plaza):
+        """Publica una versión nueva con el estado de la plaza (llamar con _lock)"""
+        instantanea = self._instantanea.con_cambio(self._posicion[plaza.id], plaza.instantanea())
+        self._cambios.append((instantanea.version, plaza.id))
+        self._instantanea = instantanea
+
+    def _candidatas(self, coche, retenidas, flexible):
+        categorias = self._categorias_compatibles(coche, flexible)
+        return [
+            (clave, conjunto) for clave, conjunto in self._libres.items()
+            if clave[1] in categorias and len(conjunto) > retenidas.get(clave, 0)
+        ]
+
+    def _mas_cercana(self, candidatas, carril):
+        """Posición libre de menor rango para el carril entre los conjuntos candidatos"""
+        mejor = None
+        for clave, conjunto in candidatas:
+            monticulo = self._cercanas[(carril, clave)]
+            while monticulo[0][1] not in conjunto:
+                heapq.heappop(monticulo)
+            if mejor is None or monticulo[0] < mejor:
+                mejor = monticulo[0]
+        return mejor[1]
+
+    def _opciones(self, coche, reserva):
+        """Candidatas y zona preferida del coche (llamar con _lock)"""
+        ocupacion_alta = self.tasa_ocupacion() > 0.8
+
+        # Cada (tipo, categoría) solo admite coches sin reserva si le quedan más libres
+        # que retenidas; la plaza retenida para este coche cuenta como libre para él
+        retenidas = self._agenda.retenidas() if self._agenda else {}
+        if reserva is not None and retenidas.get(reserva.clave):
+            retenidas[reserva.clave] -= 1
+
+        # Primero intenta asignación estricta
+        candidatas = self._candidatas(coche, retenidas, False)
+
+        # Si no hay y la ocupación es alta, permite flexibilidad en plazas eléctricas
+        if not candidatas and ocupacion_alta:
+            candidatas = self._candidatas(coche, retenidas, True)
+
+        # Preferir el tipo reservado o el tipo de parking habitual del coche
+        preferido = reserva.tipo_parking if reserva else {"NORMAL": "EXTERIOR", "MOTO": "AREA_PRIVADA"}.get(coche.tipo)
+        return candidatas, preferido
+
+    def zonas_posibles(self, coche, reserva=None, carril=None):
+        """Zonas en las que asignar() podría colocar ahora al coche (vacío si no hay plaza)"""
+        with METRICAS.bloqueo(self._lock, "plazas"):
+            candidatas, preferido = self._opciones(coche, reserva)
+            if not candidatas:
+                return set()
+            return self.asignacion.zonas(self, candidatas, preferido, carril)
+
+    @medido("asignar")
+    def asignar(self, coche, reserva=None, factores=None, carril=None):
+        """Ocupa una plaza libre compatible; factores fija la tarifa dinámica según la zona
+
+        La plaza concreta la elige la política de asignación; si no elige ninguna el
+        coche se queda sin plaza como si el parking estuviera lleno. La reserva
+        vigente del coche (ver GestorReservas.vigente) se consume solo si aparca.
+        """
+        with METRICAS.bloqueo(self._lock, "plazas"):
+            candidatas, preferido = self._opciones(coche, reserva)
+            if not candidatas:
+                return None
+            posicion = self.asignacion.elegir(self, candidatas, preferido, carril)
+            if posicion is None:
+                return None
+
+            plaza = self._plazas[posicion]
+            if factores:
+                coche.factor_tarifa = factores[plaza.tipo_parking]
+            plaza.ocupar(coche)
+            self._marcar_ocupada(posicion, plaza)
+            self._ocupadas += 1
+            self.registro.vincular(coche.matricula, posicion)
+            if reserva is not None:
+                self._agenda.consumir(coche.matricula)
+            self._publicar(plaza)
+            return plaza
+
+    @medido("liberar")
+    def liberar(self, pid):
+        with METRICAS.bloqueo(self._lock, "plazas"):
+            posicion = self._posicion.get(pid)
+            plaza = self._plazas[posicion] if posicion is not None else None
+            if plaza and plaza.ocupada:
+                resultado = plaza.liberar()
+                self._marcar_libre(posicion, plaza)
+                self._ocupadas -= 1
+                self.registro.soltar(resultado[0].matricula)
+                self._publicar(plaza)
+                return resultado, plaza
         return None, None
 
+    def aplicar(self, estados):
+        """Impone el estado de esas plazas (réplica): mantiene índices, registro y versiones
+
+        Primero se vacían todas y después se ocupan, porque un coche puede haber
+        cambiado de plaza entre dos lotes. Devuelve (anterior, nuevo) de las que cambian.
+        """
+        with METRICAS.bloqueo(self._lock, "plazas"):
+            cambiadas = []
+            for estado in estados:
+                posicion = self._posicion[estado.id]
+                plaza = self._plazas[posicion]
+                anterior = plaza.instantanea()
+                if anterior == estado:
+                    continue
+                cambiadas.append((posicion, anterior, estado))
+                if plaza.ocupada:
+                    coche, _ = plaza.liberar()
+                    self._marcar_libre(posicion, plaza)
+                    self._ocupadas -= 1
+                    self.registro.soltar(coche.matricula)
+            for posicion, _, estado in cambiadas:
+                plaza = self._plazas[posicion]
+                if estado.ocupada:
+                    copia = Plaza.desde_estado(estado)
+                    plaza.ocupada, plaza.coche, plaza.entrada = True, copia.coche, copia.entrada
+                    self._marcar_ocupada(posicion, plaza)
+                    self._ocupadas += 1
+                    self.registro.vincular(estado.matricula, posicion)
+                self._publicar(plaza)
+            return [(anterior, estado) for _, anterior, estado in cambiadas]
+
+    def localizar(self, matricula):
+        """Devuelve la plaza donde está aparcado el coche, o None"""
+        posicion = self.registro.buscar(matricula)
+        if posicion is None:
+            return None
+        plaza = self._plazas[posicion]
+        return plaza if plaza.ocupada else None
+
     def ocupadas_ids(self):
-        return [p.id for p in self._plazas if p.ocupada]
+        return [e.id for e in self._instantanea if e.ocupada]
 
     def tasa_ocupacion(self):
-        ocupadas = sum(1 for p in self._plazas if p.ocupada)
-        return ocupadas / len(self._plazas)
+        return self._ocupadas / len(self._plazas)
+
+    def num_ocupadas(self):
+        return self._ocupadas
+
+    def libres_por_tipo(self):
+        return dict(self._libres_tipo)
+
+    def libres_por_categoria(self):
+        """Libres por categoría de plaza (GENERAL, MINUSVALIDO, ELECTRICA) sumando las zonas"""
+        libres = {}
+        for (_, categoria), conjunto in self._libres.items():
+            libres[categoria] = libres.get(categoria, 0) + len(conjunto)
+        return libres
+
+    def ocupacion_tipo(self, tipo_parking):
+        """Ocupación de una zona en O(1) a partir de los contadores de libres"""
+        capacidad = self._capacidad_tipo.get(tipo_parking)
+        return 1 - self._libres_tipo[tipo_parking] / capacidad if capacidad else 1.0
 
     def estado(self):
         return self._plazas
 
+    def instantanea(self):
+        """Vista consistente de todas las plazas; no bloquea a los escritores"""
+        return self._instantanea
+
+    def cambios_desde(self, version, instantanea=None):
+        """Devuelve (versión actual, plazas cambiadas desde version)
+
+        Si la versión es demasiado antigua, o posterior a la actual (el lector la
+        obtuvo de otro parking, p. ej. antes de cargar un estado, que vuelve a
+        empezar en cero), se devuelven todas las plazas. Con una instantánea ya
+        leída, los cambios llegan justo hasta su versión.
+        """
+        instantanea = instantanea or self._instantanea
+        cambios = tuple(self._cambios)
+        if version > instantanea.version:
+            return instantanea.version, list(instantanea)
+        if version == instantanea.version:
+            return instantanea.version, []
+        if not cambios or cambios[0][0] > version + 1:
+            return instantanea.version, list(instantanea)
+        pids = dict.fromkeys(pid for v, pid in cambios if version < v <= instantanea.version)
+        return instantanea.version, [instantanea[self._posicion[pid]] for pid in pids]
+
+class SesionCarga:
+    """Carga de un coche en una plaza eléctrica: energía que le falta y la ya entregada"""
+    __slots__ = ("matricula", "plaza", "prioridad", "necesaria", "entregada",
+                 "potencia", "desde", "estado", "turno", "version")
+
+    def __init__(self, matricula, plaza, prioridad, necesaria, ahora):
+        self.matricula = matricula
+        self.plaza = plaza
+        self.prioridad = prioridad  # Cuanto menor, más urgente
+        self.necesaria = necesaria  # kWh
+        self.entregada = 0.0        # kWh
+        self.potencia = 0.0         # kW asignados ahora
+        self.desde = ahora          # Desde cuándo tiene esa potencia (timestamp)
+        self.estado = None          # "cargando", "esperando" o "completa"
+        self.turno = 0              # Entrada vigente en los montículos
+        self.version = 0            # Entrada vigente en el montículo de fines
+
+    def liquidar(self, ahora):
+        """Suma la energía entregada desde el último cambio de potencia"""
+        self.entregada = min(self.necesaria, self.entregada + self.potencia * (ahora - self.desde) / 3600)
+        self.desde = ahora
+
+    def to_dict(self):
+        return {
+            'matricula': self.matricula,
+            'plaza': self.plaza,
+            'estado': self.estado,
+            'potencia_kw': self.potencia,
+            'entregada_kwh': self.entregada,
+            'necesaria_kwh': self.necesaria
+        }
+
+class GestorCarga:
+    """Reparte la potencia del parking entre los coches eléctricos aparcados en plazas eléctricas
+
+    Prioridad: la hora límite para empezar a cargar (salida prevista menos lo que tarda
+    en cargar lo que le falta). Los más urgentes cargan a la potencia del cargador hasta
+    agotar la total y el último de ellos recibe el resto. Un montículo con los que cargan
+    (el menos urgente arriba), otro con los que esperan (el más urgente arriba) y otro
+    con la hora de fin de cada carga: cada entrada o salida cambia la potencia de O(1)
+    sesiones en O(log n). Las entradas obsoletas de los montículos se descartan al salir
+    a la cima.
+    """
+    def __init__(self, potencia_maxima=POTENCIA_MAXIMA_KW, potencia_cargador=POTENCIA_CARGADOR_KW):
+        self.potencia_maxima = potencia_maxima
+        self.potencia_cargador = potencia_cargador
+        self.max_cargando = math.ceil(potencia_maxima / potencia_cargador)
+        self._sesiones = {}
+        self._cargando = []   # (-prioridad, turno, matricula)
+        self._esperando = []  # (prioridad, turno, matricula)
+        self._fines = []      # (hora de fin, version, matricula)
+        self._num_cargando = 0
+        self._potencia_total = 0.0
+        self._marginal = None  # La que recibe el resto de la potencia
+        self._contador = 0
+        self.energia_entregada = 0.0  # kWh de las sesiones cerradas
+        self._lock = threading.Lock()
+
+    def _siguiente(self):
+        self._contador += 1
+        return self._contador
+
+    def _cima(self, monticulo, estado):
+        """Sesión vigente en la cima del montículo, descartando entradas obsoletas"""
+        while monticulo:
+            _, turno, matricula = monticulo[0]
+            sesion = self._sesiones.get(matricula)
+            if sesion and sesion.estado == estado and sesion.turno == turno:
+                return sesion
+            heapq.heappop(monticulo)
+        return None
+
+    def _fijar_potencia(self, sesion, potencia, ahora):
+        if potencia == sesion.potencia:
+            return
+        sesion.liquidar(ahora)
+        self._potencia_total += potencia - sesion.potencia
+        sesion.potencia = potencia
+        sesion.version = self._siguiente()
+        if potencia > 0:
+            fin = ahora + (sesion.necesaria - sesion.entregada) / potencia * 3600
+            heapq.heappush(self._fines, (fin, sesion.version, sesion.matricula))
+
+    def _mover(self, sesion, estado, ahora):
+        """Pasa la sesión a cargando, esperando, completa o fuera (None)"""
+        if sesion.estado == "cargando":
+            self._num_cargando -= 1
+        sesion.estado = estado
+        sesion.turno = self._siguiente()
+        potencia = 0.0
+        if estado == "cargando":
+            heapq.heappush(self._cargando, (-sesion.prioridad, sesion.turno, sesion.matricula))
+            self._num_cargando += 1
+            potencia = self.potencia_cargador
+        elif estado == "esperando":
+            heapq.heappush(self._esperando, (sesion.prioridad, sesion.turno, sesion.matricula))
+        self._fijar_potencia(sesion, potencia, ahora)
+
+    def _compactar(self):
+        """Rehace los montículos sin entradas obsoletas cuando estas dominan"""
+        vigentes = {(s.matricula, s.turno) for s in self._sesiones.values()}
+        for monticulo in (self._cargando, self._esperando):
+            monticulo[:] = [e for e in monticulo if (e[2], e[1]) in vigentes]
+            heapq.heapify(monticulo)
+        versiones = {(s.matricula, s.version) for s in self._sesiones.values() if s.potencia > 0}
+        self._fines[:] = [e for e in self._fines if (e[2], e[1]) in versiones]
+        heapq.heapify(self._fines)
+
+    def _equilibrar(self, ahora):
+        # Cargas terminadas: liberan su potencia
+        while self._fines and self._fines[0][0] <= ahora:
+            _, version, matricula = heapq.heappop(self._fines)
+            sesion = self._sesiones.get(matricula)
+            if sesion and sesion.version == version and sesion.potencia > 0:
+                self._mover(sesion, "completa", ahora)
+
+        # Huecos para los más urgentes de los que esperan
+        while self._num_cargando < self.max_cargando:
+            sesion = self._cima(self._esperando, "esperando")
+            if not sesion:
+                break
+            self._mover(sesion, "cargando", ahora)
+
+        # Intercambio mientras alguien que espera sea más urgente que el último que carga
+        while True:
+            espera = self._cima(self._esperando, "esperando")
+            carga = self._cima(self._cargando, "cargando")
+            if not espera or not carga or espera.prioridad >= carga.prioridad:
+                break
+            self._mover(carga, "esperando", ahora)
+            self._mover(espera, "cargando", ahora)
+
+        # El menos urgente de los que cargan se queda con lo que sobra
+        peor = self._cima(self._cargando, "cargando")
+        marginal = self._marginal
+        if marginal is not None and marginal is not peor and marginal.estado == "cargando":
+            self._fijar_potencia(marginal, self.potencia_cargador, ahora)
+        if peor:
+            resto = self.potencia_maxima - self.potencia_cargador * (self._num_cargando - 1)
+            self._fijar_potencia(peor, min(self.potencia_cargador, resto), ahora)
+        self._marginal = peor
+
+        entradas = len(self._cargando) + len(self._esperando) + len(self._fines)
+        if entradas > 4 * len(self._sesiones) + 64:
+            self._compactar()
+
+    def iniciar(self, matricula, plaza, salida_prevista, nivel_bateria, bateria=BATERIA_KWH):
+        """Empieza la sesión de un coche eléctrico que aparca en una plaza eléctrica"""
+        ahora = hora_actual().timestamp()
+        necesaria = max(0.0, (1 - nivel_bateria) * bateria)
+        prioridad = salida_prevista.timestamp() - necesaria / self.potencia_cargador * 3600
+        sesion = SesionCarga(matricula, plaza, prioridad, necesaria, ahora)
+        with self._lock:
+            self._sesiones[matricula] = sesion
+            self._mover(sesion, "esperando" if necesaria > 0 else "completa", ahora)
+            self._equilibrar(ahora)
+        return sesion
+
+    def finalizar(self, matricula):
+        """Cierra la sesión del coche que sale; devuelve los kWh entregados (None si no cargaba)"""
+        ahora = hora_actual().timestamp()
+        with self._lock:
+            sesion = self._sesiones.get(matricula)
+            if not sesion:
+                return None
+            self._mover(sesion, None, ahora)
+            del self._sesiones[matricula]
+            self.energia_entregada += sesion.entregada
+            self._equilibrar(ahora)
+        return sesion.entregada
+
+    def actualizar(self):
+        """Da por terminadas las cargas completas y reparte su potencia"""
+        with self._lock:
+            if self._fines and self._fines[0][0] <= hora_actual().timestamp():
+                self._equilibrar(hora_actual().timestamp())
+
+    def sesion(self, matricula):
+        with self._lock:
+            sesion = self._sesiones.get(matricula)
+            if not sesion:
+                return None
+            sesion.liquidar(hora_actual().timestamp())
+            return sesion.to_dict()
+
+    def resumen(self):
+        with self._lock:
+            return {
+                'potencia_kw': self._potencia_total,
+                'potencia_maxima_kw': self.potencia_maxima,
+                'sesiones': len(self._sesiones),
+                'cargando': self._num_cargando,
+                'energia_kwh': self.energia_entregada
+            }
+
+class Histograma:
+    """Histograma logarítmico de memoria acotada: percentiles aproximados y fusionable"""
+    FACTOR = 1.05  # Error relativo ~2.5%
+    MINIMO = 0.01
+    NUM_CUBETAS = 400  # Cubre hasta ~3 millones
+    _LOG_FACTOR = math.log(FACTOR)
+
+    def __init__(self):
+        self.cuenta = 0
+        self.suma = 0.0
+        self.minimo = None
+        self.maximo = None
+        self._ceros = 0
+        self._cubetas = {}
+
+    def añadir(self, valor):
+        self.cuenta += 1
+        self.suma += valor
+        self.minimo = valor if self.minimo is None else min(self.minimo, valor)
+        self.maximo = valor if self.maximo is None else max(self.maximo, valor)
+        if valor < self.MINIMO:
+            self._ceros += 1
+            return
+        i = min(int(math.log(valor / self.MINIMO) / self._LOG_FACTOR), self.NUM_CUBETAS - 1)
+        self._cubetas[i] = self._cubetas.get(i, 0) + 1
+
+    def percentil(self, p):
+        if not self.cuenta:
+            return None
+        objetivo = p / 100 * self.cuenta
+        acumulado = self._ceros
+        if acumulado >= objetivo:
+            return self.minimo
+        for i in sorted(self._cubetas):
+            acumulado += self._cubetas[i]
+            if acumulado >= objetivo:
+                # Centro geométrico de la cubeta, acotado por los extremos observados
+                valor = self.MINIMO * self.FACTOR ** (i + 0.5)
+                return min(max(valor, self.minimo), self.maximo)
+        return self.maximo
+
+    def media(self):
+        return self.suma / self.cuenta if self.cuenta else None
+
+    def fusionar(self, otro):
+        self.cuenta += otro.cuenta
+        self.suma += otro.suma
+        for extremo, elegir in (('minimo', min), ('maximo', max)):
+            valores = [v for v in (getattr(self, extremo), getattr(otro, extremo)) if v is not None]
+            setattr(self, extremo, elegir(valores) if valores else None)
+        self._ceros += otro._ceros
+        for i, n in otro._cubetas.items():
+            self._cubetas[i] = self._cubetas.get(i, 0) + n
+        return self
+
+    def to_dict(self):
+        return {
+            'cuenta': self.cuenta,
+            'suma': self.suma,
+            'minimo': self.minimo,
+            'maximo': self.maximo,
+            'ceros': self._ceros,
+            'cubetas': {str(i): n for i, n in self._cubetas.items()}
+        }
+
+    @staticmethod
+    def from_dict(data):
+        histograma = Histograma()
+        histograma.cuenta = data['cuenta']
+        histograma.suma = data['suma']
+        histograma.minimo = data['minimo']
+        histograma.maximo = data['maximo']
+        histograma._ceros = data['ceros']
+        histograma._cubetas = {int(i): n for i, n in data['cubetas'].items()}
+        return histograma
+
+class EstadisticasStream:
+    """Distribuciones por (métrica, tipo de vehículo, tipo de plaza, hora) actualizadas en O(1)"""
+    METRICAS = ("estancia", "precio", "espera_cola", "energia")  # minutos, euros, segundos, kWh
+
+    def __init__(self):
+        self._histogramas = {}
+
+    def registrar(self, metrica, valor, tipo_vehiculo, tipo_parking, hora):
+        clave = (metrica, tipo_vehiculo, tipo_parking, hora)
+        histograma = self._histogramas.get(clave)
+        if histograma is None:
+            histograma = self._histogramas[clave] = Histograma()
+        histograma.añadir(valor)
+
+    def consultar(self, metrica, tipo_vehiculo=None, tipo_parking=None, horas=None):
+        """Histograma combinado de las cubetas que cumplen los filtros (None = todas)"""
+        resultado = Histograma()
+        for (m, tv, tp, hora), histograma in self._histogramas.items():
+            if m != metrica:
+                continue
+            if tipo_vehiculo is not None and tv != tipo_vehiculo:
+                continue
+            if tipo_parking is not None and tp != tipo_parking:
+                continue
+            if horas is not None and hora not in horas:
+                continue
+            resultado.fusionar(histograma)
+        return resultado
+
+    def fusionar(self, otra):
+        """Combina las distribuciones de otro parking o proceso"""
+        for clave, histograma in otra._histogramas.items():
+            if clave in self._histogramas:
+                self._histogramas[clave].fusionar(histograma)
+            else:
+                self._histogramas[clave] = Histograma().fusionar(histograma)
+        return self
+
+    def to_dict(self):
+        return [
+            {
+                'metrica': m,
+                'tipo_vehiculo': tv,
+                'tipo_parking': tp,
+                'hora': hora,
+                'histograma': histograma.to_dict()
+            }
+            for (m, tv, tp, hora), histograma in self._histogramas.items()
+        ]
+
+    @staticmethod
+    def from_dict(data):
+        estadisticas = EstadisticasStream()
+        for d in data:
+            clave = (d['metrica'], d['tipo_vehiculo'], d['tipo_parking'], d['hora'])
+            estadisticas._histogramas[clave] = Histograma.from_dict(d['histograma'])
+        return estadisticas
+
 class GestorCola:
     """Gestiona una cola de espera cuando el parking está lleno"""
     def __init__(self, max_cola=10):
-        self._cola = deque(maxlen=max_cola)
+        self._cola = deque()
+        self.max_cola = max_cola
         self._lock = threading.Lock()
+
+    def redimensionar(self, max_cola):
+        """Cambia el límite; los coches que ya esperan no se expulsan"""
+        self.max_cola = max_cola
     
     def agregar(self, coche):
         with self._lock:
-            if len(self._cola) < self._cola.maxlen:
+            if len(self._cola) < self.max_cola:
                 self._cola.append(coche)
                 return True
             return False
@@ -247,18 +2128,388 @@ class GestorCola:
             if self._cola:
                 return self._cola.popleft()
             return None
+
+    def devolver(self, coche):
+        """Vuelve a poner en cabeza un coche sacado que no ha podido aparcar"""
+        with self._lock:
+            self._cola.appendleft(coche)
     
     def tamaño(self):
         return len(self._cola)
 
+class SerieTemporal:
+    """Serie de memoria fija a varias resoluciones con mínimo, máximo y media por intervalo
+
+    Cada resolución es un anillo de casillas indexado por número de intervalo; una
+    casilla que pertenece a un intervalo antiguo se reinicia al volver a escribirla.
+    """
+    RESOLUCIONES = {
+        "segundo": (1, 3600),    # Última hora
+        "minuto": (60, 1440),    # Último día
+        "hora": (3600, 720),     # Último mes
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._anillos = {}
+        for nombre, (segundos, casillas) in self.RESOLUCIONES.items():
+            self._anillos[nombre] = {
+                'intervalo': array('q', [-1]) * casillas,
+                'minimo': array('d', [0.0]) * casillas,
+                'maximo': array('d', [0.0]) * casillas,
+                'suma': array('d', [0.0]) * casillas,
+                'n': array('q', [0]) * casillas,
+            }
+
+    def registrar(self, momento, valor):
+        epoch = momento.timestamp()
+        with self._lock:
+            for nombre, (segundos, casillas) in self.RESOLUCIONES.items():
+                anillo = self._anillos[nombre]
+                intervalo = int(epoch // segundos)
+                i = intervalo % casillas
+                if anillo['intervalo'][i] != intervalo:
+                    anillo['intervalo'][i] = intervalo
+                    anillo['minimo'][i] = anillo['maximo'][i] = valor
+                    anillo['suma'][i] = 0.0
+                    anillo['n'][i] = 0
+                elif valor < anillo['minimo'][i]:
+                    anillo['minimo'][i] = valor
+                elif valor > anillo['maximo'][i]:
+                    anillo['maximo'][i] = valor
+                anillo['suma'][i] += valor
+                anillo['n'][i] += 1
+
+    def puntos(self, resolucion="segundo", hasta=None):
+        """Lista de (inicio, mínimo, máximo, media) de la ventana que acaba en hasta
+
+        Los intervalos sin muestras no aparecen.
+        """
+        segundos, casillas = self.RESOLUCIONES[resolucion]
+        anillo = self._anillos[resolucion]
+        ultimo = int((hasta or hora_actual()).timestamp() // segundos)
+        puntos = []
+        with self._lock:
+            for intervalo in range(ultimo - casillas + 1, ultimo + 1):
+                i = intervalo % casillas
+                if anillo['intervalo'][i] == intervalo:
+                    puntos.append((
+                        datetime.fromtimestamp(intervalo * segundos),
+                        anillo['minimo'][i],
+                        anillo['maximo'][i],
+                        anillo['suma'][i] / anillo['n'][i]
+                    ))
+        return puntos
+
+class Suscripcion:
+    """Cola acotada de eventos de un suscriptor del bus
+
+    Políticas cuando la cola está llena:
+        descartar   se pierde el evento más antiguo (el publicador nunca espera)
+        fusionar    un evento sustituye al pendiente con la misma clave (por defecto la
+                    plaza); si la clave es nueva se pierde el más antiguo
+        bloquear    el publicador espera a que el suscriptor haga sitio (no se pierde nada)
+    """
+    POLITICAS = ("descartar", "fusionar", "bloquear")
+
+    def __init__(self, bus, tipos, capacidad, politica, clave):
+        if politica not in self.POLITICAS:
+            raise ValueError(f"Política desconocida: {politica}")
+        self._bus = bus
+        self.tipos = frozenset(tipos)
+        self.capacidad = capacidad
+        self.politica = politica
+        self._clave = clave or (lambda evento: evento.get('plaza') or evento.get('matricula'))
+        self._pendientes = {}  # Orden de llegada; la clave permite fusionar
+        self._secuencia = 0
+        self._cond = threading.Condition()
+        self._activa = True
+        self._hilo = None
+        self.descartados = 0
+        self.fusionados = 0
+        self.errores = 0
+
+    def _entregar(self, evento):
+        with self._cond:
+            if not self._activa:
+                return
+            clave = None
+            if self.politica == "fusionar":
+                clave = self._clave(evento)
+                if clave is not None and clave in self._pendientes:
+                    self._pendientes[clave] = evento
+                    self.fusionados += 1
+                    return
+            if clave is None:
+                self._secuencia += 1
+                clave = ("#", self._secuencia)
+
+            while len(self._pendientes) >= self.capacidad:
+                if self.politica == "bloquear":
+                    self._cond.wait()
+                    if not self._activa:
+                        return
+                else:
+                    del self._pendientes[next(iter(self._pendientes))]
+                    self.descartados += 1
+            self._pendientes[clave] = evento
+            self._cond.notify_all()
+
+    def recibir(self, timeout=None):
+        """Siguiente evento; None si no llega a tiempo o la suscripción está cancelada y vacía"""
+        with self._cond:
+            if not self._pendientes and self._activa:
+                self._cond.wait(timeout)
+            if not self._pendientes:
+                return None
+            evento = self._pendientes.pop(next(iter(self._pendientes)))
+            self._cond.notify_all()
+            return evento
+
+    def vaciar(self):
+        """Todos los eventos pendientes, en orden de llegada"""
+        with self._cond:
+            eventos = list(self._pendientes.values())
+            self._pendientes.clear()
+            self._cond.notify_all()
+            return eventos
+
+    def _despachar(self, funcion):
+        while True:
+            evento = self.recibir()
+            if evento is None:
+                if not self._activa:
+                    return
+                continue
+            try:
+                funcion(evento)
+            except Exception:
+                # Un suscriptor roto no debe bloquear al resto ni al publicador
+                self.errores += 1
+
+    def cancelar(self, esperar=True):
+        """Deja de recibir eventos; con esperar, el hilo entrega antes los pendientes"""
+        self._bus._quitar(self)
+        with self._cond:
+            self._activa = False
+            self._cond.notify_all()
+        if esperar and self._hilo and self._hilo is not threading.current_thread():
+            self._hilo.join()
+
+    def __len__(self):
+        return len(self._pendientes)
+
+class BusEventos:
+    """Publicación/suscripción en proceso con una cola acotada por suscriptor
+
+    Los eventos son diccionarios como los de Parking._notificar y se comparten
+    entre suscriptores: no deben modificarse.
+    """
+    TIPOS = ("entrada", "salida", "rechazo", "encolado", "reserva")
+
+    def __init__(self):
+        self._suscripciones = ()  # Se sustituye entera: publicar no necesita lock
+        self._lock = threading.Lock()
+
+    def suscribir(self, funcion=None, tipos=TIPOS, capacidad=1024, politica="descartar", clave=None):
+        """Sin funcion se consume con recibir()/vaciar(); con funcion, un hilo propio la llama"""
+        desconocidos = set(tipos) - set(self.TIPOS)
+        if desconocidos:
+            raise ValueError(f"Tipos de evento desconocidos: {sorted(desconocidos)}")
+        suscripcion = Suscripcion(self, tipos, capacidad, politica, clave)
+        with self._lock:
+            self._suscripciones += (suscripcion,)
+        if funcion:
+            suscripcion._hilo = threading.Thread(target=suscripcion._despachar, args=(funcion,), daemon=True)
+            suscripcion._hilo.start()
+        return suscripcion
+
+    def _quitar(self, suscripcion):
+        with self._lock:
+            self._suscripciones = tuple(s for s in self._suscripciones if s is not suscripcion)
+
+    def publicar(self, evento):
+        for suscripcion in self._suscripciones:
+            if evento['evento'] in suscripcion.tipos:
+                suscripcion._entregar(evento)
+
+    def __len__(self):
+        return len(self._suscripciones)
+
+# ======================================================
+# POLÍTICAS (asignación, salida automática y tarifa)
+# ======================================================
+# El Parking recibe cada política por nombre (ver los diccionarios POLITICAS_*) o
+# como objeto ya creado. Las de S15 ("sondeo", "uniforme", "plana") reproducen su
+# comportamiento sobre este motor para poder compararlas (comparar_politicas.py).
+
+class PoliticaAsignacion:
+    """Elige la plaza de un coche entre las libres compatibles
+
+    elegir(gestor, candidatas, preferido, carril) recibe los conjuntos de libres
+    [((tipo_parking, categoría), ConjuntoLibres), ...] (nunca vacío), el tipo de
+    parking reservado o habitual del coche y el carril de entrada. Devuelve la
+    posición elegida o None si el coche no encuentra plaza. Se llama con el lock
+    de GestorPlazas tomado.
+    """
+    nombre = None
+    indice_cercania = False  # GestorPlazas construye el índice de distancias a los carriles
+
+    def elegir(self, gestor, candidatas, preferido, carril):
+        raise NotImplementedError
+
+    def zonas(self, gestor, candidatas, preferido, carril):
+        """Zonas en las que puede acabar el coche con estas candidatas (sin ocupar nada)"""
+        return {clave[0] for clave, _ in self.preferidas(candidatas, preferido)}
+
+    @staticmethod
+    def preferidas(candidatas, preferido):
+        return [c for c in candidatas if c[0][0] == preferido] or candidatas
+
+    @staticmethod
+    def al_azar(candidatas):
+        """Posición uniforme entre todas las plazas candidatas"""
+        i = random.randrange(sum(len(conjunto) for _, conjunto in candidatas))
+        for _, conjunto in candidatas:
+            if i < len(conjunto):
+                return conjunto[i]
+            i -= len(conjunto)
+
+class AsignacionAleatoria(PoliticaAsignacion):
+    """Una libre al azar, en la zona preferida si queda alguna"""
+    nombre = "aleatoria"
+
+    def elegir(self, gestor, candidatas, preferido, carril):
+        return self.al_azar(self.preferidas(candidatas, preferido))
+
+class AsignacionCercana(PoliticaAsignacion):
+    """La libre más cercana al carril en la zona preferida (al azar mientras se indexa)"""
+    nombre = "cercana"
+    indice_cercania = True
+
+    def elegir(self, gestor, candidatas, preferido, carril):
+        candidatas = self.preferidas(candidatas, preferido)
+        if gestor._cercanas is None:
+            return self.al_azar(candidatas)
+        return gestor._mas_cercana(candidatas, (carril or 0) % gestor.carriles)
+
+    def zonas(self, gestor, candidatas, preferido, carril):
+        if gestor._cercanas is None:
+            return super().zonas(gestor, candidatas, preferido, carril)
+        # Con el índice la elección es determinista: se sabe la zona exacta
+        return {gestor._plazas[self.elegir(gestor, candidatas, preferido, carril)].tipo_parking}
+
+class AsignacionSondeo(PoliticaAsignacion):
+    """S15: prueba plazas al azar de todo el parking y se va tras MAX_INTENTOS ocupadas o incompatibles"""
+    nombre = "sondeo"
+    MAX_INTENTOS = 5
+
+    def __init__(self, max_intentos=MAX_INTENTOS):
+        self.max_intentos = max_intentos
+
+    def elegir(self, gestor, candidatas, preferido, carril):
+        total = len(gestor._posicion)
+        for _ in range(self.max_intentos):
+            posicion = random.randrange(total)
+            if any(posicion in conjunto for _, conjunto in candidatas):
+                return posicion
+        return None
+
+    def zonas(self, gestor, candidatas, preferido, carril):
+        # Sondea todo el parking: no hay zona preferida
+        return {clave[0] for clave, _ in candidatas}
+
+class PoliticaSalida:
+    """Elige qué coche sale en una salida automática
+
+    elegir(ocupadas, ahora) recibe los EstadoPlaza ocupados de una instantánea y
+    devuelve uno de ellos, o None si ninguno está listo para salir.
+    """
+    nombre = None
+
+    def elegir(self, ocupadas, ahora):
+        raise NotImplementedError
+
+class SalidaPonderada(PoliticaSalida):
+    """Tras la estancia mínima; más probable cuanto más se acerca a su duración estimada"""
+    nombre = "ponderada"
+
+    def elegir(self, ocupadas, ahora):
+        candidatas = []
+        for plaza in ocupadas:
+            tiempo_estancia = (ahora - plaza.entrada).total_seconds()
+            if tiempo_estancia >= TIEMPO_MINIMO_ESTANCIA:
+                # Calcular probabilidad según tiempo estimado
+                tiempo_transcurrido = tiempo_estancia / 60
+                duracion_estimada = plaza.duracion_estimada
+
+                # Mayor probabilidad si ya pasó el tiempo estimado
+                if tiempo_transcurrido >= duracion_estimada:
+                    candidatas.extend([plaza] * 5)  # 5x más probable
+                elif tiempo_transcurrido >= duracion_estimada * 0.8:
+                    candidatas.extend([plaza] * 3)  # 3x más probable
+                else:
+                    candidatas.append(plaza)
+        return random.choice(candidatas) if candidatas else None
+
+class SalidaUniforme(PoliticaSalida):
+    """S15: cualquier coche, al azar (las estancias cortas salen sin pagar)"""
+    nombre = "uniforme"
+
+    def elegir(self, ocupadas, ahora):
+        return random.choice(ocupadas)
+
+class TarifaPlana(GestorTarifas):
+    """S15: mismo precio por segundo para todos, sin factores de vehículo, zona, hora ni demanda"""
+    def __init__(self, dinamica=False, base_por_segundo=None):
+        super().__init__(False, base_por_segundo)
+
+    def precio_hora(self, tipo_vehiculo, tipo_parking, factor=1.0):
+        return round(3600 * self.base_por_segundo, 2)
+
+    def calcular(self, tiempo, tipo_vehiculo, tipo_parking, reserva, factor=1.0):
+        segundos = tiempo.total_seconds()
+        if segundos <= 30:
+            return 0
+        precio = (segundos - 30) * self.base_por_segundo
+        if reserva:
+            precio += 2.5
+        return round(precio, 2)
+
+POLITICAS_ASIGNACION = {p.nombre: p for p in (AsignacionAleatoria, AsignacionCercana, AsignacionSondeo)}
+POLITICAS_SALIDA = {p.nombre: p for p in (SalidaPonderada, SalidaUniforme)}
+POLITICAS_TARIFA = {"zonas": GestorTarifas, "plana": TarifaPlana}
+
+def crear_politica(politicas, valor, *args):
+    """Instancia la política de nombre valor con args; un objeto ya creado se devuelve tal cual"""
+    if not isinstance(valor, str):
+        return valor
+    if valor not in politicas:
+        raise ValueError(f"Política desconocida: {valor} (disponibles: {', '.join(politicas)})")
+    return politicas[valor](*args)
+
 # ======================================================
 # PARKING (FACHADA)
 # ======================================================
 
 class Parking:
-    def __init__(self):
-        self._tarifas = GestorTarifas()
-        self._plazas = GestorPlazas(self._crear_plazas())
+    def __init__(self, capacidad=CAPACIDAD_MAXIMA, columnas=PLAZAS_POR_FILA, tarifa_dinamica=TARIFA_DINAMICA,
+                 asignacion=ASIGNACION, precio_hora=None, eleccion_salida=ELECCION_SALIDA, tarifa=TARIFA,
+                 plazas=None, reservas=()):
+        # precio_hora: tarifa base propia (€/h antes de factores); por defecto la de GestorTarifas
+        # plazas y reservas: las de un estado guardado (lista de Plaza o PlazasDiferidas)
+        # en lugar de crear capacidad plazas vacías
+        self._tarifas = crear_politica(
+            POLITICAS_TARIFA, tarifa, tarifa_dinamica, precio_hora / 3600 if precio_hora else None
+        )
+        self._asignacion = crear_politica(POLITICAS_ASIGNACION, asignacion)
+        self._eleccion_salida = crear_politica(POLITICAS_SALIDA, eleccion_salida)
+        if plazas is None:
+            plazas = self._crear_plazas(capacidad, columnas)
+        self._agenda = GestorReservas.desde_plazas(plazas, reservas)
+        # Con plazas diferidas el índice de cercanía se construye aparte (abrir_instantanea)
+        self._plazas = GestorPlazas(plazas, self._agenda, asignacion=self._asignacion,
+                                    indexar=not isinstance(plazas, PlazasDiferidas))
         self._reservas = set()
         self._cola = GestorCola()
         self._estadisticas = {
@@ -267,29 +2518,74 @@ class Parking:
             'rechazos': 0,
             'recaudacion_total': 0.0
         }
+        self._distribuciones = EstadisticasStream()
         self._lock_stats = threading.Lock()
+        self._series = {metrica: SerieTemporal() for metrica in ("ocupacion", "cola", "recaudacion")}
+        self._observadores = []
+        self.bus = BusEventos()
+        self._prevision = None
+        self._carga = GestorCarga()
+
+    def añadir_observador(self, funcion):
+        """Llama a funcion(evento) en el mismo hilo tras cada evento (ver BusEventos.TIPOS)
+
+        Para consumidores lentos es mejor self.bus.suscribir, que no frena los carriles.
+        """
+        self._observadores.append(funcion)
+
+    def quitar_observador(self, funcion):
+        if funcion in self._observadores:
+            self._observadores.remove(funcion)
+
+    def _notificar(self, evento, **datos):
+        self.muestrear()
+        if not self._observadores and not self.bus:
+            return
+        datos['evento'] = evento
+        datos['momento'] = hora_actual()
+        datos['instante'] = time.monotonic()  # Reloj real aunque RELOJ esté fijado (retrasos)
+        datos['ocupadas'] = self._plazas.num_ocupadas()
+        for funcion in list(self._observadores):
+            funcion(datos)
+        self.bus.publicar(datos)
+
+    @staticmethod
+    def _nombre_fila(i):
+        """A, B, ..., Z, AA, AB, ... para parkings con muchas filas"""
+        nombre = ""
+        i += 1
+        while i:
+            i, resto = divmod(i - 1, 26)
+            nombre = string.ascii_uppercase[resto] + nombre
+        return nombre
 
-    def _crear_plazas(self):
+    def _crear_plazas(self, capacidad=CAPACIDAD_MAXIMA, columnas=PLAZAS_POR_FILA):
         plazas = []
-        total = CAPACIDAD_MAXIMA
+        total = capacidad
         num_minus = int(total * PORCENTAJE_MINUSVALIDOS)
         num_electric = int(total * PORCENTAJE_ELECTRICOS)
+        num_filas = -(-total // columnas)
 
         todas = []
-        for fila in "ABCDEFG":
-            for col in range(1, 9):
+        filas = {}
+        for i in range(num_filas):
+            fila = self._nombre_fila(i)
+            for col in range(1, min(columnas, total - i * columnas) + 1):
                 todas.append(f"{fila}{col}")
+                filas[todas[-1]] = i
 
         minus_ids = set(random.sample(todas, num_minus))
         # Las eléctricas no pueden ser de minusválidos
         disponibles_electric = [p for p in todas if p not in minus_ids]
         electric_ids = set(random.sample(disponibles_electric, num_electric))
 
+        # 2 de cada 7 filas al principio son privadas y otras 2 al final exteriores
+        filas_extremo = round(num_filas * 2 / 7)
         for pid in todas:
             # Distribución realista de tipos de parking
-            if pid[0] in ['A', 'B']:  # Primeras filas
+            if filas[pid] < filas_extremo:  # Primeras filas
                 tipo = "AREA_PRIVADA"
-            elif pid[0] in ['F', 'G']:  # Últimas filas
+            elif filas[pid] >= num_filas - filas_extremo:  # Últimas filas
                 tipo = "EXTERIOR"
             else:
                 tipo = "SUBTERRANEO"
@@ -306,148 +2602,463 @@ class Parking:
 
     def _obtener_multiplicador_trafico(self):
         """Retorna el multiplicador de tráfico según la hora actual"""
-        hora = datetime.now().hour
+        hora = hora_actual().hour
         for rango, mult in PATRONES_TRAFICO.items():
             if hora in rango:
                 return mult
         return 1.0
 
-    def entrada(self, reserva=False):
+    @medido("entrada")
+    def entrada(self, reserva=False, matricula=None, tipo=None, nivel_bateria=None, carril=None):
+        # Se comprueba antes de tocar nada: GestorCarga lo usaría con la plaza ya ocupada
+        if nivel_bateria is not None and not (
+            isinstance(nivel_bateria, (int, float)) and not isinstance(nivel_bateria, bool)
+            and 0 <= nivel_bateria <= 1
+        ):
+            return False, f"⚠️ Nivel de batería inválido: {nivel_bateria!r} (debe estar entre 0 y 1)"
+
         # Distribución realista de tipos de vehículos
-        tipo = random.choices(
-            ["NORMAL", "MINUSVALIDO", "MOTO", "ELECTRICO"],
-            weights=[0.5, 0.2, 0.15, 0.15]
-        )[0]
+        if tipo is None:
+            tipo = random.choices(
+                ["NORMAL", "MINUSVALIDO", "MOTO", "ELECTRICO"],
+                weights=[0.5, 0.2, 0.15, 0.15]
+            )[0]
+
+        registro = self._plazas.registro
+        if matricula is None:
+            matricula = self._generar_matricula()
+        elif not registro.reclamar(matricula):
+            # La misma matrícula no puede entrar dos veces
+            plaza = self._plazas.localizar(matricula)
+            with METRICAS.bloqueo(self._lock_stats, "estadisticas"):
+                self._estadisticas['rechazos'] += 1
+            self._notificar("rechazo", matricula=matricula, tipo_vehiculo=tipo)
+            return False, f"🚫 {matricula} ya está dentro ({plaza.id if plaza else 'en cola'})"
+
+        # Una reserva vigente libera su plaza retenida para este coche (se consume al aparcar)
+        reservada = self._agenda.vigente(matricula)
+        if reservada:
+            reserva = True
 
-        coche = Coche(self._generar_matricula(), tipo)
-        plaza = self._plazas.asignar(coche)
+        coche = Coche(matricula, tipo)
+        coche.reserva = reserva
+        if tipo == "ELECTRICO":
+            coche.nivel_bateria = random.uniform(0.1, 0.8) if nivel_bateria is None else nivel_bateria
+        plaza = self._plazas.asignar(coche, reservada, self._factores(), carril)
 
-        with self._lock_stats:
-            if not plaza:
+        if not plaza:
+            self._dimensionar_cola()
+            with METRICAS.bloqueo(self._lock_stats, "estadisticas"):
                 # Intentar agregar a la cola
-                if self._cola.agregar(coche):
-                    self._estadisticas['rechazos'] += 1
-                    return False, f"⏳ {coche.matricula} en cola de espera ({self._cola.tamaño()})"
+                coche.hora_cola = hora_actual()
+                METRICAS.contar("rechazo")
+                self._estadisticas['rechazos'] += 1
+                encolado = self._cola.agregar(coche)
+                if encolado:
+                    METRICAS.nivel("cola", self._cola.tamaño())
                 else:
-                    self._estadisticas['rechazos'] += 1
-                    return False, f"❌ {coche.matricula} rechazado - Parking lleno y cola completa"
+                    registro.soltar(coche.matricula)
+            self._notificar("encolado" if encolado else "rechazo", matricula=coche.matricula, tipo_vehiculo=tipo)
+            if encolado:
+                return False, f"⏳ {coche.matricula} en cola de espera ({self._cola.tamaño()})"
+            return False, f"❌ {coche.matricula} rechazado - Parking lleno y cola completa"
 
-            self._estadisticas['total_entradas'] += 1
-            if reserva:
-                self._reservas.add(coche.matricula)
+        self._aparcado(coche, plaza)
 
         simbolo = "♿" if tipo == "MINUSVALIDO" else "🏍️" if tipo == "MOTO" else "⚡" if tipo == "ELECTRICO" else "🚗"
         return True, f"{simbolo} {coche.matricula} → {plaza.id} ({plaza.tipo_parking})"
 
+    @medido("salida")
     def salida(self, pid):
         resultado, plaza = self._plazas.liberar(pid)
         if not resultado:
             return False, "Plaza inválida o vacía"
 
         coche, tiempo = resultado
+        energia = self._carga.finalizar(coche.matricula)
+
+        # El coche ya ha salido: su reserva deja de tener sentido aunque no pague
+        reserva = coche.matricula in self._reservas
+        self._reservas.discard(coche.matricula)
         
         # Verificar tiempo mínimo de estancia
         if tiempo.total_seconds() < TIEMPO_MINIMO_ESTANCIA:
+            self._notificar(
+                "salida", matricula=coche.matricula, tipo_vehiculo=coche.tipo, plaza=plaza.id,
+                tipo_parking=plaza.tipo_parking, precio=0.0, duracion=tiempo.total_seconds(), energia=energia
+            )
             return False, f"⚠️ Estancia demasiado corta ({int(tiempo.total_seconds())}s)"
 
-        reserva = coche.matricula in self._reservas
-        self._reservas.discard(coche.matricula)
-
         precio = self._tarifas.calcular(
-            tiempo, coche.tipo, plaza.tipo_parking, reserva
+            tiempo, coche.tipo, plaza.tipo_parking, reserva, coche.factor_tarifa
         )
+        if energia:
+            precio = round(precio + self._tarifas.precio_energia(energia), 2)
 
-        with self._lock_stats:
+        with METRICAS.bloqueo(self._lock_stats, "estadisticas"):
             self._estadisticas['total_salidas'] += 1
+            METRICAS.contar("salida")
             self._estadisticas['recaudacion_total'] += precio
+            hora = coche.hora_entrada.hour
+            self._distribuciones.registrar("estancia", tiempo.total_seconds() / 60, coche.tipo, plaza.tipo_parking, hora)
+            self._distribuciones.registrar("precio", precio, coche.tipo, plaza.tipo_parking, hora)
+            if energia is not None:
+                self._distribuciones.registrar("energia", energia, coche.tipo, plaza.tipo_parking, hora)
+
+        self._notificar(
+            "salida", matricula=coche.matricula, tipo_vehiculo=coche.tipo, plaza=plaza.id,
+            tipo_parking=plaza.tipo_parking, precio=precio, duracion=tiempo.total_seconds(), energia=energia
+        )
 
         minutos = int(tiempo.total_seconds() / 60)
         
         # Intentar meter un coche de la cola
-        coche_cola = self._cola.sacar()
-        if coche_cola:
-            self.entrada()  # Intenta meter el siguiente de la cola
+        self._atender_cola()
         
-        return True, f"💰 {coche.matricula} → {precio}€ ({minutos}min)"
+        carga = f" ⚡{energia:.1f}kWh" if energia else ""
+        return True, f"💰 {coche.matricula} → {precio}€ ({minutos}min){carga}"
+
+    def _aparcado(self, coche, plaza):
+        """Contabiliza y notifica la entrada de un coche que ya ocupa su plaza"""
+        with METRICAS.bloqueo(self._lock_stats, "estadisticas"):
+            self._estadisticas['total_entradas'] += 1
+            METRICAS.contar("entrada")
+            if coche.reserva:
+                self._reservas.add(coche.matricula)
+            if coche.hora_cola is not None:
+                # Solo cuenta la espera de quien llega a aparcar, en la zona en la que aparca
+                espera = (coche.hora_entrada - coche.hora_cola).total_seconds()
+                self._distribuciones.registrar(
+                    "espera_cola", espera, coche.tipo, plaza.tipo_parking, coche.hora_cola.hour
+                )
+        self._iniciar_carga(coche, plaza)
+        self._notificar(
+            "entrada", matricula=coche.matricula, tipo_vehiculo=coche.tipo,
+            plaza=plaza.id, tipo_parking=plaza.tipo_parking, reserva=coche.reserva
+        )
+
+    def _atender_cola(self):
+        """Aparca al primero de la cola si cabe en lo que haya libre
+
+        Si no cabe (la plaza que ha quedado libre no es compatible) vuelve a la
+        cabeza de la cola y sigue esperando.
+        """
+        coche = self._cola.sacar()
+        if not coche:
+            return
+        reservada = self._agenda.vigente(coche.matricula)
+        coche.reserva = coche.reserva or reservada is not None
+        plaza = self._plazas.asignar(coche, reservada, self._factores())
+        if not plaza:
+            self._cola.devolver(coche)
+            return
+        METRICAS.nivel("cola", self._cola.tamaño())
+        self._aparcado(coche, plaza)
 
     def salida_aleatoria(self):
-        ocupadas = self._plazas.ocupadas_ids()
-        if not ocupadas:
+        """Saca el coche que elija la política de salida automática"""
+        # Se trabaja sobre una instantánea para no ver plazas a medio actualizar
+        plazas_ocupadas = [p for p in self._plazas.instantanea() if p.ocupada]
+        if not plazas_ocupadas:
             return False, "Sin coches"
-        
-        # Selección ponderada: coches que llevan más tiempo tienen más probabilidad de salir
-        plazas_ocupadas = [p for p in self._plazas.estado() if p.ocupada]
-        
-        # Filtrar solo los que han estado el tiempo mínimo
-        candidatas = []
-        for plaza in plazas_ocupadas:
-            tiempo_estancia = (datetime.now() - plaza.entrada).total_seconds()
-            if tiempo_estancia >= TIEMPO_MINIMO_ESTANCIA:
-                # Calcular probabilidad según tiempo estimado
-                tiempo_transcurrido = (datetime.now() - plaza.coche.hora_entrada).total_seconds() / 60
-                duracion_estimada = plaza.coche.duracion_estimada
-                
-                # Mayor probabilidad si ya pasó el tiempo estimado
-                if tiempo_transcurrido >= duracion_estimada:
-                    candidatas.extend([plaza] * 5)  # 5x más probable
-                elif tiempo_transcurrido >= duracion_estimada * 0.8:
-                    candidatas.extend([plaza] * 3)  # 3x más probable
-                else:
-                    candidatas.append(plaza)
-        
-        if not candidatas:
+
+        plaza = self._eleccion_salida.elegir(plazas_ocupadas, hora_actual())
+        if plaza is None:
             return False, "Ningún coche listo para salir"
-        
-        plaza = random.choice(candidatas)
         return self.salida(plaza.id)
 
     def obtener_estado(self):
-        return self._plazas.estado()
+        """Instantánea inmutable y versionada de las plazas"""
+        return self._plazas.instantanea()
+
+    def cambios_desde(self, version, instantanea=None):
+        """(versión actual, plazas que cambiaron desde version)"""
+        return self._plazas.cambios_desde(version, instantanea)
+
+    def aplicar_cambios(self, estados, eventos=(), estadisticas=None):
+        """Aplica lo que hizo otro parking con las mismas plazas (réplica, ver replicacion.py)
+
+        estados son las plazas cambiadas (EstadoPlaza); de los eventos se toman las
+        reservas y las distribuciones, y estadisticas sustituye a los contadores.
+        """
+        for anterior, estado in self._plazas.aplicar(estados):
+            if anterior.ocupada:
+                self._carga.finalizar(anterior.matricula)
+            if estado.ocupada and estado.es_electrica and estado.tipo_vehiculo == "ELECTRICO":
+                self._iniciar_carga(self._plazas.localizar(estado.matricula).coche, estado)
+
+        for evento in eventos:
+            matricula = evento.get('matricula')
+            if evento['evento'] == "entrada" and evento.get('reserva'):
+                self._agenda.consumir(matricula, evento['momento'])
+            elif evento['evento'] == "reserva" and evento.get('cancelada'):
+                self._agenda.cancelar(matricula)
+            elif evento['evento'] == "reserva":
+                self._agenda.reservar(
+                    matricula, evento['tipo_parking'], evento['inicio'], evento['fin'],
+                    evento.get('categoria', "GENERAL")
+                )
+
+        with METRICAS.bloqueo(self._lock_stats, "estadisticas"):
+            for evento in eventos:
+                matricula = evento.get('matricula')
+                if evento['evento'] == "entrada" and evento.get('reserva'):
+                    self._reservas.add(matricula)
+                elif evento['evento'] == "salida":
+                    self._reservas.discard(matricula)
+                    duracion = evento['duracion']
+                    if duracion < TIEMPO_MINIMO_ESTANCIA:
+                        continue
+                    hora = (evento['momento'] - timedelta(seconds=duracion)).hour
+                    vehiculo, zona = evento['tipo_vehiculo'], evento['tipo_parking']
+                    self._distribuciones.registrar("estancia", duracion / 60, vehiculo, zona, hora)
+                    self._distribuciones.registrar("precio", evento['precio'], vehiculo, zona, hora)
+                    if evento.get('energia') is not None:
+                        self._distribuciones.registrar("energia", evento['energia'], vehiculo, zona, hora)
+            if estadisticas is not None:
+                self._estadisticas = dict(estadisticas)
+        self.muestrear()
 
     def obtener_estadisticas(self):
-        with self._lock_stats:
+        with METRICAS.bloqueo(self._lock_stats, "estadisticas"):
             return self._estadisticas.copy()
 
+    def percentil(self, metrica, p, tipo_vehiculo=None, tipo_parking=None, horas=None):
+        """Percentil p de una métrica (ej: p95 de estancia de ELECTRICO entre 17 y 20h)"""
+        with METRICAS.bloqueo(self._lock_stats, "estadisticas"):
+            return self._distribuciones.consultar(metrica, tipo_vehiculo, tipo_parking, horas).percentil(p)
+
+    def total(self, metrica, tipo_vehiculo=None, tipo_parking=None, horas=None):
+        """Suma de una métrica (ej: recaudación por tipo de plaza)"""
+        with METRICAS.bloqueo(self._lock_stats, "estadisticas"):
+            return self._distribuciones.consultar(metrica, tipo_vehiculo, tipo_parking, horas).suma
+
+    def exportar_distribuciones(self):
+        with METRICAS.bloqueo(self._lock_stats, "estadisticas"):
+            return self._distribuciones.to_dict()
+
+    def fusionar_distribuciones(self, datos):
+        """Incorpora distribuciones exportadas por otro parking o proceso"""
+        with METRICAS.bloqueo(self._lock_stats, "estadisticas"):
+            self._distribuciones.fusionar(EstadisticasStream.from_dict(datos))
+
     def obtener_info_cola(self):
         return self._cola.tamaño()
 
+    def _iniciar_carga(self, coche, plaza):
+        if plaza.es_electrica and coche.tipo == "ELECTRICO":
+            salida = coche.hora_entrada + timedelta(minutes=coche.duracion_estimada)
+            nivel = NIVEL_BATERIA_DEFECTO if coche.nivel_bateria is None else coche.nivel_bateria
+            self._carga.iniciar(coche.matricula, plaza.id, salida, nivel)
+
+    def _reanudar_cargas(self):
+        """Tras cargar un estado, abre de nuevo las sesiones de los eléctricos que cargaban
+
+        La energía entregada antes de guardar no se conserva.
+        """
+        plazas = self._plazas.estado()
+        for posicion in self._plazas.cargas_iniciales:
+            plaza = plazas[posicion]
+            self._iniciar_carga(plaza.coche, plaza)
+
+    def obtener_info_carga(self, matricula=None):
+        """Potencia en uso y energía entregada, o la sesión de carga de una matrícula"""
+        if matricula is not None:
+            return self._carga.sesion(matricula)
+        return self._carga.resumen()
+
+    def _factores(self):
+        """Factor de la tarifa dinámica de cada zona con la ocupación y la cola actuales"""
+        cola = self._cola.tamaño()
+        return {
+            tipo: self._tarifas.factor_demanda(self._plazas.ocupacion_tipo(tipo), cola)
+            for tipo in self._plazas.libres_por_tipo()
+        }
+
+    def cotizar(self, tipo_vehiculo="NORMAL", matricula=None, carril=None):
+        """Precio por hora si se entra ahora en las zonas que le tocarían: {zona: (precio_hora, factor)}
+
+        Si la política de asignación ya determina la plaza (la más cercana al carril,
+        con el índice construido) hay una sola zona; si elige al azar, las zonas
+        posibles dan el rango de precios. Con la matrícula se tiene en cuenta su
+        reserva vigente. Vacío si ahora no hay plaza para el coche.
+        """
+        coche = Coche(matricula or "", tipo_vehiculo)
+        reserva = self._agenda.vigente(matricula) if matricula else None
+        zonas = self._plazas.zonas_posibles(coche, reserva, carril)
+        factores = self._factores()
+        return {
+            tipo: (self._tarifas.precio_hora(tipo_vehiculo, tipo, factores[tipo]), factores[tipo])
+            for tipo in sorted(zonas)
+        }
+
+    def usar_prevision(self, previsor, minutos=30):
+        """Admisión y tamaño de cola según la ocupación prevista dentro de minutos
+
+        previsor debe ofrecer prever(minutos) -> {'tasa': ..., 'salidas': ...}
+        (ver prevision.Previsor); None vuelve a usar solo la ocupación actual.
+        """
+        self._prevision = (previsor, minutos) if previsor else None
+
+    def ocupacion_prevista(self):
+        """La mayor entre la ocupación actual y la prevista"""
+        actual = self._plazas.tasa_ocupacion()
+        if not self._prevision:
+            return actual
+        previsor, minutos = self._prevision
+        return max(actual, previsor.prever(minutos)['tasa'])
+
+    def _dimensionar_cola(self):
+        # Solo tiene sentido esperar si se prevé que salgan coches dentro del horizonte
+        if self._prevision:
+            previsor, minutos = self._prevision
+            salidas = previsor.prever(minutos)['salidas']
+            self._cola.redimensionar(max(MIN_COLA, min(MAX_COLA, round(salidas))))
+
+    def muestrear(self):
+        """Añade a las series la ocupación, la cola y la recaudación actuales
+
+        Se llama en cada cambio de estado; llamarla también periódicamente da
+        puntos en los periodos sin actividad (y cierra las cargas ya completas).
+        """
+        self._carga.actualizar()
+        ahora = hora_actual()
+        self._series["ocupacion"].registrar(ahora, self._plazas.tasa_ocupacion())
+        self._series["cola"].registrar(ahora, self._cola.tamaño())
+        self._series["recaudacion"].registrar(ahora, self._estadisticas['recaudacion_total'])
+
+    def serie(self, metrica, resolucion="segundo"):
+        """Puntos (inicio, mínimo, máximo, media) de ocupacion, cola o recaudacion"""
+        return self._series[metrica].puntos(resolucion)
+
+    def localizar(self, matricula):
+        """Busca en qué plaza está un coche (cajeros de pago)"""
+        return self._plazas.localizar(matricula)
+
+    def reservar(self, matricula, tipo_parking, inicio, fin, tipo_vehiculo="NORMAL"):
+        """Reserva una plaza del tipo indicado para la franja [inicio, fin)
+
+        Se retiene una plaza que el vehículo pueda usar: de minusválidos para
+        MINUSVALIDO, eléctrica para ELECTRICO y general para el resto.
+        """
+        categoria = GestorReservas.categoria(tipo_vehiculo)
+        exito, mensaje = self._agenda.reservar(matricula, tipo_parking, inicio, fin, categoria)
+        if exito:
+            self._notificar(
+                "reserva", matricula=matricula, tipo_parking=tipo_parking, inicio=inicio, fin=fin, categoria=categoria
+            )
+        return exito, mensaje
+
+    def cancelar_reserva(self, matricula):
+        cancelada = self._agenda.cancelar(matricula)
+        if cancelada:
+            self._notificar("reserva", matricula=matricula, cancelada=True)
+        return cancelada
+
+    def plazas_comprometidas(self, tipo_parking, inicio, fin, tipo_vehiculo="NORMAL"):
+        """Cuántas plazas del tipo, de las que usaría ese vehículo, están reservadas a la vez durante [inicio, fin)"""
+        return self._agenda.comprometidas(tipo_parking, inicio, fin, GestorReservas.categoria(tipo_vehiculo))
+
     def _generar_matricula(self):
-        return f"{random.randint(1000,9999)}{''.join(random.choices(string.ascii_uppercase,k=3))}"
+        """Matrícula única, ya reclamada en el registro"""
+        return self._plazas.registro.emitir()
 
-    def guardar_estado(self, archivo='parking_estado.json'):
-        """Guarda el estado completo del parking en un archivo JSON"""
-        estado = {
-            'timestamp': datetime.now().isoformat(),
-            'plazas': [plaza.to_dict() for plaza in self._plazas.estado()],
+    def to_dict(self, instantanea=None):
+        """Estado completo serializable; con una instantánea, las plazas salen de ella
+
+        Leer las plazas de una instantánea da un corte consistente sin parar los
+        carriles, pero no conserva la batería con la que llegaron los eléctricos.
+        """
+        plazas = self._plazas.estado() if instantanea is None else map(Plaza.desde_estado, instantanea)
+        return {
+            'timestamp': hora_actual().isoformat(),
+            'plazas': [plaza.to_dict() for plaza in plazas],
             'reservas': list(self._reservas),
-            'estadisticas': self._estadisticas.copy()
+            'agenda': [r.to_dict() for r in self._agenda.pendientes()],
+            'estadisticas': self.obtener_estadisticas(),
+            'distribuciones': self.exportar_distribuciones()
         }
+
+    @staticmethod
+    def from_dict(estado):
+        """Crea un parking desde el estado de to_dict (o de un JSON de guardar_estado)"""
+        parking = Parking(
+            plazas=[Plaza.from_dict(p) for p in estado['plazas']],
+            reservas=[Reserva.from_dict(r) for r in estado.get('agenda', [])]
+        )
+
+        # Restaurar reservas (solo de coches que siguen dentro)
+        parking._reservas = {m for m in estado['reservas'] if m in parking._plazas.registro}
+
+        # Restaurar estadísticas
+        parking._estadisticas = estado['estadisticas']
+        parking._distribuciones = EstadisticasStream.from_dict(estado.get('distribuciones', []))
+        parking._reanudar_cargas()
+        return parking
+
+    @medido("guardar_estado")
+    def guardar_estado(self, archivo='parking_estado.json'):
+        """Guarda el estado completo del parking en un archivo JSON"""
+        estado = self.to_dict()
         
         with open(archivo, 'w', encoding='utf-8') as f:
             json.dump(estado, f, indent=2, ensure_ascii=False)
         
         return True, f"Estado guardado en {archivo}"
     
+    @medido("guardar_instantanea")
+    def guardar_instantanea(self, archivo='parking_estado.snap'):
+        """Guarda el estado en formato binario por columnas (ver PlazasDiferidas)"""
+        PlazasDiferidas.guardar(archivo, list(self._plazas.instantanea()), {
+            'timestamp': hora_actual().isoformat(),
+            'reservas': list(self._reservas),
+            'agenda': [r.to_dict() for r in self._agenda.pendientes()],
+            'estadisticas': self.obtener_estadisticas(),
+            'distribuciones': self.exportar_distribuciones()
+        })
+        return True, f"Estado guardado en {archivo}"
+
+    @staticmethod
+    def abrir_instantanea(archivo='parking_estado.snap', calentar=True):
+        """Abre una instantánea binaria sin decodificar ni crear las plazas por adelantado
+
+        Los índices salen de las columnas del archivo (ver PlazasDiferidas) y el
+        parking admite tráfico nada más volver; cada fila se decodifica y cada plaza
+        se crea al usarse por primera vez y, con calentar, un hilo en segundo plano
+        crea el resto.
+        """
+        try:
+            plazas, estado = PlazasDiferidas.abrir(archivo)
+
+            parking = Parking(plazas=plazas, reservas=[Reserva.from_dict(r) for r in estado['agenda']])
+            parking._reservas = {m for m in estado['reservas'] if m in parking._plazas.registro}
+            parking._estadisticas = estado['estadisticas']
+            parking._distribuciones = EstadisticasStream.from_dict(estado['distribuciones'])
+
+            parking._reanudar_cargas()
+
+            # El índice de cercanía también se construye en segundo plano
+            if parking._asignacion.indice_cercania:
+                threading.Thread(target=parking._plazas.indexar_cercania, daemon=True).start()
+            if calentar:
+                threading.Thread(target=plazas.calentar, daemon=True).start()
+            return parking, f"Estado cargado desde {archivo} ({estado['timestamp']})"
+        except FileNotFoundError:
+            return None, f"Archivo {archivo} no encontrado"
+        except Exception as e:
+            return None, f"Error al cargar: {str(e)}"
+
     @staticmethod
     def cargar_estado(archivo='parking_estado.json'):
-        """Carga el estado del parking desde un archivo JSON"""
+        """Carga el estado del parking desde un archivo JSON (o una instantánea binaria)"""
         try:
+            with open(archivo, 'rb') as f:
+                if f.read(len(PlazasDiferidas.MAGIA)) == PlazasDiferidas.MAGIA:
+                    return Parking.abrir_instantanea(archivo)
             with open(archivo, 'r', encoding='utf-8') as f:
                 estado = json.load(f)
             
-            # Crear parking vacío
-            parking = Parking()
-            
-            # Restaurar plazas
-            plazas_restauradas = [Plaza.from_dict(p) for p in estado['plazas']]
-            parking._plazas = GestorPlazas(plazas_restauradas)
-            
-            # Restaurar reservas
-            parking._reservas = set(estado['reservas'])
-            
-            # Restaurar estadísticas
-            parking._estadisticas = estado['estadisticas']
-            
+            parking = Parking.from_dict(estado)
             return parking, f"Estado cargado desde {archivo} ({estado['timestamp']})"
         except FileNotFoundError:
             return None, f"Archivo {archivo} no encontrado"
@@ -458,11 +3069,285 @@ class Parking:
 # INTERFAZ + AUTOMATIZACIÓN REALISTA
 # ======================================================
 
+class SimulacionTrafico:
+    """Carriles de entrada y salida automática, sin interfaz gráfica
+
+    Un único hilo planificador atiende todos los carriles con un montículo de
+    plazos, así que cientos de carriles no son cientos de hilos durmiendo. En pausa
+    el hilo espera sin plazo. Con el parking casi lleno los carriles se aparcan hasta
+    que una salida baja la ocupación, y la salida automática se aparca con el parking
+    vacío hasta que entra algún coche. Cambiar la velocidad reescala los plazos.
+    """
+    OCUPACION_MAXIMA = 0.9  # Desde aquí los carriles no intentan entradas
+    SALIDA = -1             # Plazo de la salida automática en el montículo
+
+    def __init__(self, parking, carriles=NUM_CARRILES_ENTRADA):
+        self.carriles = carriles
+        self._cond = threading.Condition()
+        self._plazos = []        # (instante, orden, carril) en tiempo de time.monotonic
+        self._orden = 0
+        self._aparcados = set()  # Carriles (o SALIDA) esperando un evento del parking
+        self._entradas = 0       # Eventos vistos: un aparcamiento no se pierde un despertar
+        self._salidas = 0
+        self._automatico = True
+        self._velocidad = 1.0  # Factor de velocidad de simulación
+        self._pausa = None
+        self._en_turno = False
+        self._hilo = None
+        self._parking = None
+        self.errores = 0
+        self.parking = parking
+
+    @property
+    def parking(self):
+        return self._parking
+
+    @parking.setter
+    def parking(self, parking):
+        """Cambia de parking (al cargar un estado) y despierta a los aparcados"""
+        if self._parking is not None:
+            self._parking.quitar_observador(self._al_evento)
+        capacidad = len(parking.obtener_estado())
+        with self._cond:
+            self._parking = parking
+            self._capacidad = capacidad
+            self._despertar(self._aparcados)
+        parking.añadir_observador(self._al_evento)
+
+    @property
+    def automatico(self):
+        return self._automatico
+
+    @automatico.setter
+    def automatico(self, valor):
+        with self._cond:
+            if valor == self._automatico:
+                return
+            ahora = time.monotonic()
+            if valor and self._pausa is not None:
+                # Los turnos retoman lo que les quedaba al pausar
+                desfase = ahora - self._pausa
+                self._plazos = [(t + desfase, orden, carril) for t, orden, carril in self._plazos]
+            self._pausa = None if valor else ahora
+            self._automatico = valor
+            self._cond.notify_all()
+
+    @property
+    def velocidad(self):
+        return self._velocidad
+
+    @velocidad.setter
+    def velocidad(self, valor):
+        with self._cond:
+            ahora = self._pausa or time.monotonic()
+            factor = self._velocidad / valor
+            # Transformación creciente: el montículo sigue siendo válido
+            self._plazos = [(ahora + (t - ahora) * factor, orden, carril) for t, orden, carril in self._plazos]
+            self._velocidad = valor
+            self._cond.notify_all()
+
+    def iniciar(self):
+        with self._cond:
+            if self._hilo is not None:
+                return
+            ahora = time.monotonic()
+            for carril in [*range(self.carriles), self.SALIDA]:
+                self._programar(carril, ahora)
+            self._hilo = threading.Thread(target=self._planificar, daemon=True, name="planificador-carriles")
+        self._hilo.start()
+
+    def detener(self):
+        with self._cond:
+            hilo, self._hilo = self._hilo, None
+            self._cond.notify_all()
+        if hilo and hilo is not threading.current_thread():
+            hilo.join()
+        self._parking.quitar_observador(self._al_evento)
+
+    def pausar(self):
+        """Pausa y espera a que termine el turno en curso (para guardar o cargar estado)"""
+        self.automatico = False
+        with self._cond:
+            while self._en_turno and self._hilo is not threading.current_thread():
+                self._cond.wait()
+
+    def _programar(self, carril, instante):
+        self._orden += 1
+        heapq.heappush(self._plazos, (instante, self._orden, carril))
+
+    def _despertar(self, carriles):
+        ahora = time.monotonic()
+        for carril in list(carriles):
+            self._aparcados.discard(carril)
+            self._programar(carril, ahora)
+        self._cond.notify_all()
+
+    def _al_evento(self, evento):
+        """Observador del parking: despierta a quien esperaba este cambio"""
+        tipo = evento['evento']
+        if tipo == "entrada":
+            with self._cond:
+                self._entradas += 1
+                if self.SALIDA in self._aparcados:
+                    self._despertar([self.SALIDA])
+        elif tipo == "salida":
+            with self._cond:
+                self._salidas += 1
+                if self._aparcados and evento['ocupadas'] < self._capacidad * self.OCUPACION_MAXIMA:
+                    self._despertar(self._aparcados - {self.SALIDA})
+
+    def _planificar(self):
+        with self._cond:
+            while self._hilo is threading.current_thread():
+                if not self._automatico or not self._plazos:
+                    self._cond.wait()
+                    continue
+                espera = self._plazos[0][0] - time.monotonic()
+                if espera > 0:
+                    self._cond.wait(espera)
+                    continue
+                _, _, carril = heapq.heappop(self._plazos)
+                vistos = self._entradas if carril == self.SALIDA else self._salidas
+
+                # El turno se ejecuta sin el cerrojo: sus eventos llaman a _al_evento
+                self._en_turno = True
+                self._cond.release()
+                try:
+                    with PERFIL.etiqueta("salida" if carril == self.SALIDA else f"carril-{carril}"):
+                        siguiente = self.turno_salida() if carril == self.SALIDA else self.carril_entrada(carril)
+                except Exception:
+                    # Un turno fallido no debe parar al resto de carriles
+                    self.errores += 1
+                    siguiente = random.uniform(ENTRADA_MIN, ENTRADA_MAX)
+                finally:
+                    self._cond.acquire()
+                    self._en_turno = False
+                    self._cond.notify_all()
+
+                if siguiente is not None:
+                    self._programar(carril, time.monotonic() + siguiente / self._velocidad)
+                elif vistos != (self._entradas if carril == self.SALIDA else self._salidas):
+                    self._programar(carril, time.monotonic())  # El evento llegó durante el turno
+                else:
+                    self._aparcados.add(carril)
+
+    def carril_entrada(self, carril=0):
+        """Un turno del carril: segundos hasta el siguiente (a velocidad 1) o None si está casi lleno"""
+        if self.parking._plazas.num_ocupadas() >= self._capacidad * self.OCUPACION_MAXIMA:
+            return None
+        mult = self.parking._obtener_multiplicador_trafico()
+        # Ajustar probabilidad de entrada según tráfico y ocupación (prevista, si hay previsión)
+        ocupacion = self.parking.ocupacion_prevista()
+
+        if ocupacion < self.OCUPACION_MAXIMA:
+            probabilidad = mult * (1 - ocupacion * 0.5)
+            if random.random() < probabilidad:
+                self.parking.entrada(reserva=random.random() < 0.15, carril=carril)
+        return random.uniform(ENTRADA_MIN, ENTRADA_MAX)
+
+    def turno_salida(self):
+        """Un turno de la salida automática; None si no queda ningún coche"""
+        if not self.parking._plazas.num_ocupadas():
+            return None
+        self.parking.salida_aleatoria()
+        return random.uniform(SALIDA_MIN, SALIDA_MAX)
+
+class MallaOcupacion:
+    """Plazas ocupadas por fila y columna con sumas de rectángulos en O(log filas · log columnas)
+
+    Árbol de Fenwick 2D: la vista alejada suma teselas sin recorrer sus plazas.
+    """
+    def __init__(self, filas, columnas):
+        self.filas = filas
+        self.columnas = columnas
+        self._ocupada = bytearray(filas * columnas)
+        self._arbol = [0] * (filas * columnas)
+        self._existe = [0] * ((filas + 1) * (columnas + 1))  # Prefijos de plazas existentes (fijos)
+
+    def cargar(self, celdas, ocupadas):
+        """celdas: (fila, columna) de cada plaza; ocupadas: booleanos en el mismo orden"""
+        filas, columnas = self.filas, self.columnas
+        arbol = [0] * (filas * columnas)
+        existe = [0] * ((filas + 1) * (columnas + 1))
+        for (f, c), ocupada in zip(celdas, ocupadas):
+            k = f * columnas + c
+            self._ocupada[k] = ocupada
+            arbol[k] = int(ocupada)
+            existe[(f + 1) * (columnas + 1) + c + 1] = 1
+
+        # Construcción lineal: Fenwick dentro de cada fila y luego entre filas
+        for f in range(filas):
+            base = f * columnas
+            for c in range(columnas):
+                p = c | (c + 1)
+                if p < columnas:
+                    arbol[base + p] += arbol[base + c]
+        for f in range(filas):
+            p = f | (f + 1)
+            if p < filas:
+                origen, destino = f * columnas, p * columnas
+                for c in range(columnas):
+                    arbol[destino + c] += arbol[origen + c]
+
+        ancho = columnas + 1
+        for f in range(1, filas + 1):
+            for c in range(1, ancho):
+                k = f * ancho + c
+                existe[k] += existe[k - ancho] + existe[k - 1] - existe[k - ancho - 1]
+        self._arbol = arbol
+        self._existe = existe
+
+    def actualizar(self, fila, columna, ocupada):
+        """Marca la plaza; devuelve si ha cambiado"""
+        k = fila * self.columnas + columna
+        if self._ocupada[k] == ocupada:
+            return False
+        self._ocupada[k] = ocupada
+        delta = 1 if ocupada else -1
+        i = fila
+        while i < self.filas:
+            base = i * self.columnas
+            j = columna
+            while j < self.columnas:
+                self._arbol[base + j] += delta
+                j |= j + 1
+            i |= i + 1
+        return True
+
+    def ocupadas_hasta(self, fila, columna):
+        """Ocupadas en las filas [0, fila) y columnas [0, columna)"""
+        total = 0
+        i = fila - 1
+        while i >= 0:
+            base = i * self.columnas
+            j = columna - 1
+            while j >= 0:
+                total += self._arbol[base + j]
+                j = (j & (j + 1)) - 1
+            i = (i & (i + 1)) - 1
+        return total
+
+    def plazas_hasta(self, fila, columna):
+        """Plazas existentes en las filas [0, fila) y columnas [0, columna)"""
+        return self._existe[fila * (self.columnas + 1) + columna]
+
 class InterfazParking:
-    def __init__(self, parking):
+    VENTANAS = {"Última hora": "segundo", "Último día": "minuto", "Último mes": "hora"}
+    ANCHO_PLAZA, ALTO_PLAZA = 130, 80  # Celda de cada plaza a escala 1
+    MARGEN = 20
+    ESCALAS = [1.0, 0.75, 0.5, 0.35, 0.25, 0.15, 0.1, 0.06, 0.04, 0.025, 0.015, 0.01]
+    ESCALA_TEXTO = 0.75    # Desde aquí se rotulan zona, matrícula y estancia
+    ESCALA_TESELAS = 0.35  # Por debajo se dibujan teselas agregadas en vez de plazas
+    TESELA_PX = 40         # Lado mínimo de una tesela en pantalla
+    COLORES_ZONA = {"AREA_PRIVADA": "#8e44ad", "SUBTERRANEO": "#2c3e50", "EXTERIOR": "#e67e22"}
+
+    def __init__(self, parking, consumidores=()):
+        # consumidores: histórico, archivador, previsor, replicador... con reconectar(parking)
         self.parking = parking
-        self.automatico = True
-        self.velocidad = 1.0  # Factor de velocidad de simulación
+        self.consumidores = list(consumidores)
+        self.simulacion = SimulacionTrafico(parking)
+        self._suscripcion = None
+        PERFIL.etiquetar("interfaz")
 
         self.root = tk.Tk()
         self.root.title("🅿️ Sistema de Parking Inteligente")
@@ -482,9 +3367,40 @@ class InterfazParking:
         )
         self.label_stats.pack()
 
-        # Canvas para el parking
-        self.canvas = tk.Canvas(self.root, bg="#ecf0f1")
-        self.canvas.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        # Gráfica de ocupación (media y rango mín-máx por intervalo)
+        frame_grafica = tk.Frame(frame_stats, bg="#2c3e50")
+        frame_grafica.pack(fill=tk.X, padx=10)
+        self.ventana_var = tk.StringVar(value="Última hora")
+        ventana_menu = tk.OptionMenu(frame_grafica, self.ventana_var, *self.VENTANAS, command=lambda _: self.dibujar_grafica())
+        ventana_menu.config(bg="#16a085", fg="white", font=("Arial", 9))
+        ventana_menu.pack(side=tk.LEFT)
+        self.grafica = tk.Canvas(frame_grafica, height=60, bg="#34495e", highlightthickness=0)
+        self.grafica.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(10, 0))
+
+        # Leyenda fija (no se desplaza con el plano)
+        self.leyenda = tk.Canvas(self.root, height=24, bg="#f0f0f0", highlightthickness=0)
+        self.leyenda.pack(fill=tk.X, padx=10, pady=(10, 0))
+        self.dibujar_leyenda()
+
+        # Canvas para el parking: desplazable y con zoom; solo se dibuja lo visible
+        frame_plano = tk.Frame(self.root)
+        frame_plano.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+        self.canvas = tk.Canvas(frame_plano, bg="#ecf0f1")
+        barra_x = tk.Scrollbar(frame_plano, orient=tk.HORIZONTAL, command=self.desplazar_x)
+        barra_y = tk.Scrollbar(frame_plano, orient=tk.VERTICAL, command=self.desplazar_y)
+        self.canvas.config(xscrollcommand=barra_x.set, yscrollcommand=barra_y.set)
+        barra_x.pack(side=tk.BOTTOM, fill=tk.X)
+        barra_y.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self._escala = 1.0
+        self._dibujo_programado = None
+        self.canvas.bind("<Configure>", lambda e: self.programar_dibujo())
+        self.canvas.bind("<MouseWheel>", self._rueda)
+        self.canvas.bind("<Shift-MouseWheel>", self._rueda)
+        self.canvas.bind("<Control-MouseWheel>", self._rueda)
+        for boton in ("<Button-4>", "<Button-5>", "<Shift-Button-4>", "<Shift-Button-5>",
+                      "<Control-Button-4>", "<Control-Button-5>"):
+            self.canvas.bind(boton, self._rueda)
 
         # Frame de controles
         frame_controles = tk.Frame(self.root, bg="#34495e", pady=10)
@@ -556,6 +3472,28 @@ class InterfazParking:
             pady=5
         ).pack(side=tk.LEFT, padx=5)
 
+        tk.Button(
+            frame_controles,
+            text="🔥 Perfil",
+            command=self.perfil_cpu,
+            bg="#c0392b",
+            fg="white",
+            font=("Arial", 10, "bold"),
+            padx=15,
+            pady=5
+        ).pack(side=tk.LEFT, padx=5)
+
+        tk.Button(
+            frame_controles,
+            text="🧠 Memoria",
+            command=self.perfil_memoria,
+            bg="#7f8c8d",
+            fg="white",
+            font=("Arial", 10, "bold"),
+            padx=15,
+            pady=5
+        ).pack(side=tk.LEFT, padx=5)
+
         # Frame de velocidad
         tk.Label(
             frame_controles,
@@ -571,54 +3509,134 @@ class InterfazParking:
         speed_menu.config(bg="#16a085", fg="white", font=("Arial", 9))
         speed_menu.pack(side=tk.LEFT)
 
-        # Iniciar hilos de simulación
-        for _ in range(NUM_CARRILES_ENTRADA):
-            threading.Thread(target=self.carril_entrada, daemon=True).start()
+        # Zoom del plano
+        tk.Label(
+            frame_controles,
+            text="Zoom:",
+            bg="#34495e",
+            fg="white",
+            font=("Arial", 9)
+        ).pack(side=tk.LEFT, padx=(20, 5))
+        for texto, paso in (("➖", -1), ("➕", 1)):
+            tk.Button(
+                frame_controles,
+                text=texto,
+                command=lambda paso=paso: self.zoom(paso),
+                bg="#16a085",
+                fg="white",
+                font=("Arial", 9),
+                padx=8
+            ).pack(side=tk.LEFT, padx=2)
+
+        # Iniciar la simulación y el latido de la interfaz (en el hilo de Tk)
+        self.simulacion.iniciar()
+        self.conectar(parking)
+        self.root.after(0, self.actualizar_interfaz)
 
-        threading.Thread(target=self.bucle_salida, daemon=True).start()
-        threading.Thread(target=self.actualizar_interfaz, daemon=True).start()
+    @property
+    def automatico(self):
+        return self.simulacion.automatico
 
-        self.dibujar()
+    @automatico.setter
+    def automatico(self, valor):
+        self.simulacion.automatico = valor
+
+    @property
+    def velocidad(self):
+        return self.simulacion.velocidad
+
+    @velocidad.setter
+    def velocidad(self, valor):
+        self.simulacion.velocidad = valor
 
     def cambiar_velocidad(self, valor):
         self.velocidad = float(valor.replace('x', ''))
 
-    def carril_entrada(self):
-        while True:
-            if self.automatico:
-                mult = self.parking._obtener_multiplicador_trafico()
-                # Ajustar probabilidad de entrada según tráfico y ocupación
-                ocupacion = self.parking._plazas.tasa_ocupacion()
-                
-                if ocupacion < 0.9:  # Solo intentar entradas si no está casi lleno
-                    probabilidad = mult * (1 - ocupacion * 0.5)
-                    if random.random() < probabilidad:
-                        self.parking.entrada(reserva=random.random() < 0.15)
-            
-            tiempo_espera = random.uniform(ENTRADA_MIN, ENTRADA_MAX) / self.velocidad
-            time.sleep(tiempo_espera)
+    def actualizar_interfaz(self):
+        """Latido de la interfaz: muestrea y solo refresca si llegaron eventos o cambió el minuto"""
+        self.parking.muestrear()
+        if (len(self._suscripcion) or self._suscripcion.descartados != self._descartados
+                or (hora_actual() - self._ultimo_dibujo).total_seconds() >= 60):
+            self.refrescar()
+        self.root.after(max(1, int(1000 / self.velocidad)), self.actualizar_interfaz)
 
-    def bucle_salida(self):
-        while True:
-            if self.automatico:
-                self.parking.salida_aleatoria()
-            
-            tiempo_espera = random.uniform(SALIDA_MIN, SALIDA_MAX) / self.velocidad
-            time.sleep(tiempo_espera)
+    def conectar(self, parking):
+        """Muestra otro parking: cambia la suscripción al bus y redibuja todo
 
-    def actualizar_interfaz(self):
-        """Actualiza la interfaz periódicamente"""
-        while True:
-            self.root.after(0, self.dibujar)
-            time.sleep(1 / self.velocidad)
+        Los consumidores siguen al parking nuevo; si no, seguirían escuchando al anterior.
+        """
+        if self._suscripcion is not None:
+            self._suscripcion.cancelar(esperar=False)
+        if parking is not self.parking:
+            for consumidor in self.consumidores:
+                consumidor.reconectar(parking)
+        self.parking = parking
+        self.simulacion.parking = parking
+        # Una entrada pendiente por plaza basta para redibujarla: se fusionan por plaza
+        self._suscripcion = parking.bus.suscribir(
+            tipos=("entrada", "salida"), politica="fusionar", capacidad=len(parking.obtener_estado())
+        )
+        self._construir_plano()
+        self.dibujar()
 
-    def dibujar(self):
-        self.canvas.delete("all")
-        
-        # Actualizar estadísticas
+    def _construir_plano(self):
+        """Fila y columna de cada plaza a partir de su id (A1, A2, ..., B1, ...)"""
+        estado = self.parking.obtener_estado()
+        self._celdas = []
+        self._indices = {}
+        for i, plaza in enumerate(estado):
+            # Sin el formato de fila y número se coloca por orden
+            self._celdas.append(celda_plaza(plaza.id) or divmod(i, PLAZAS_POR_FILA))
+            self._indices[plaza.id] = i
+        num_filas = max((f for f, _ in self._celdas), default=0) + 1
+        num_columnas = max((c for _, c in self._celdas), default=0) + 1
+        self._en_celda = array('l', [-1]) * (num_filas * num_columnas)
+        self._zona_fila = [None] * num_filas
+        for i, (f, c) in enumerate(self._celdas):
+            self._en_celda[f * num_columnas + c] = i
+            if self._zona_fila[f] is None:
+                self._zona_fila[f] = estado[i].tipo_parking
+        self._malla = MallaOcupacion(num_filas, num_columnas)
+        self._cargar_malla()
+        self._ajustar_region()
+
+    def _cargar_malla(self):
+        # Primero se vacía la suscripción: lo que llegue después se aplicará encima
+        self._suscripcion.vaciar()
+        self._descartados = self._suscripcion.descartados
+        estado = self.parking.obtener_estado()
+        self._malla.cargar(self._celdas, (plaza.ocupada for plaza in estado))
+
+    def dibujar_grafica(self):
+        """Ocupación de la ventana elegida; lee solo la serie, no las plazas"""
+        self.grafica.delete("all")
+        puntos = self.parking.serie("ocupacion", self.VENTANAS[self.ventana_var.get()])
+        if not puntos:
+            return
+        ancho = max(self.grafica.winfo_width(), 100)
+        alto = int(self.grafica["height"])
+        segundos, casillas = SerieTemporal.RESOLUCIONES[self.VENTANAS[self.ventana_var.get()]]
+        duracion = casillas * segundos
+        inicio = hora_actual().timestamp() - duracion
+
+        def xy(momento, valor):
+            return ancho * (momento.timestamp() - inicio) / duracion, alto - 4 - valor * (alto - 8)
+
+        linea = []
+        for momento, minimo, maximo, media in puntos:
+            x, y_min = xy(momento, minimo)
+            self.grafica.create_line(x, y_min, x, xy(momento, maximo)[1], fill="#7f8c8d")
+            linea += xy(momento, media)
+        if len(linea) >= 4:
+            self.grafica.create_line(*linea, fill="#2ecc71", width=2)
+        self.grafica.create_text(ancho - 5, 8, text=f"{puntos[-1][3]*100:.0f}%", anchor="e",
+                                 fill="white", font=("Arial", 8, "bold"))
+
+    def dibujar_resumen(self):
         stats = self.parking.obtener_estadisticas()
         ocupacion = self.parking._plazas.tasa_ocupacion()
         cola = self.parking.obtener_info_cola()
+        carga = self.parking.obtener_info_carga()
         
         stats_text = (
             f"📊 Ocupación: {ocupacion*100:.1f}% | "
@@ -626,110 +3644,326 @@ class InterfazParking:
             f"🚪 Salidas: {stats['total_salidas']} | "
             f"❌ Rechazos: {stats['rechazos']} | "
             f"💰 Recaudación: {stats['recaudacion_total']:.2f}€ | "
-            f"⏳ Cola: {cola}"
+            f"⏳ Cola: {cola} | "
+            f"⚡ Carga: {carga['potencia_kw']:.0f}/{carga['potencia_maxima_kw']:.0f}kW ({carga['cargando']} coches)"
         )
         self.label_stats.config(text=stats_text)
+        self.leyenda.itemconfig("zonas", text=" | ".join(
+            f"{tipo}: {self.parking._plazas.ocupacion_tipo(tipo)*100:.0f}%" for tipo in TIPOS_PARKING
+        ) + f" | 🔍 {self._escala*100:.0f}%")
+        self.dibujar_grafica()
+
+    @medido("refrescar")
+    def refrescar(self):
+        """Aplica los eventos pendientes a la malla y redibuja solo lo visible que cambió
+
+        Una vez por minuto (para los minutos de estancia) se redibuja la vista; si la
+        suscripción perdió eventos se recarga antes la malla.
+        """
+        if self._suscripcion.descartados != self._descartados:
+            self._cargar_malla()
+            self.dibujar()
+            return
+        eventos = self._suscripcion.vaciar()
+        # El estado se lee después de vaciar para no quedarse con uno anterior al evento
+        estado = self.parking.obtener_estado()
+        cambiadas = []
+        for evento in eventos:
+            i = self._indices.get(evento['plaza'])
+            if i is not None:
+                fila, columna = self._celdas[i]
+                self._malla.actualizar(fila, columna, estado[i].ocupada)
+                cambiadas.append(i)
+        if (hora_actual() - self._ultimo_dibujo).total_seconds() >= 60:
+            self.dibujar()
+            return
+        self.dibujar_resumen()
+        if self._teselas:
+            f0, f1, paso_f, c0, c1, paso_c = self._teselas
+            teselas = set()
+            for i in cambiadas:
+                fila, columna = self._celdas[i]
+                if f0 <= fila < f1 and c0 <= columna < c1:
+                    teselas.add((fila - fila % paso_f, columna - columna % paso_c))
+            for fila, columna in teselas:
+                self.canvas.delete(f"tesela:{fila}:{columna}")
+                self.dibujar_tesela(fila, columna, paso_f, paso_c)
+        else:
+            for i in cambiadas:
+                if i in self._visibles:
+                    x, y = self._visibles[i]
+                    self.canvas.delete(f"plaza:{estado[i].id}")
+                    self.dibujar_plaza(estado[i], x, y)
+
+    # --------------------------------------------------
+    # Plano: desplazamiento, zoom y vista
+    # --------------------------------------------------
+
+    def _ajustar_region(self):
+        ancho = 2 * self.MARGEN + self._malla.columnas * self.ANCHO_PLAZA * self._escala
+        alto = 2 * self.MARGEN + self._malla.filas * self.ALTO_PLAZA * self._escala
+        self.canvas.config(scrollregion=(0, 0, ancho, alto))
+        return ancho, alto
+
+    def programar_dibujo(self):
+        """Redibuja cuando Tk quede libre; varios desplazamientos seguidos dan un solo dibujo"""
+        if self._dibujo_programado is None:
+            self._dibujo_programado = self.root.after_idle(self.dibujar)
+
+    def desplazar_x(self, *args):
+        self.canvas.xview(*args)
+        self.programar_dibujo()
+
+    def desplazar_y(self, *args):
+        self.canvas.yview(*args)
+        self.programar_dibujo()
+
+    def _rueda(self, evento):
+        paso = 1 if evento.num == 4 or evento.delta > 0 else -1
+        if evento.state & 0x0004:  # Control: zoom hacia el cursor
+            self.zoom(paso, evento.x, evento.y)
+        elif evento.state & 0x0001:  # Mayúsculas: horizontal
+            self.desplazar_x("scroll", -paso, "units")
+        else:
+            self.desplazar_y("scroll", -paso, "units")
+
+    def zoom(self, paso, x=None, y=None):
+        """Acerca (paso > 0) o aleja manteniendo fijo el punto (x, y) de la vista"""
+        i = self.ESCALAS.index(self._escala)
+        escala = self.ESCALAS[min(max(i - paso, 0), len(self.ESCALAS) - 1)]
+        if escala == self._escala:
+            return
+        if x is None:
+            x, y = self.canvas.winfo_width() / 2, self.canvas.winfo_height() / 2
+        # Punto del plano bajo (x, y) en coordenadas a escala 1
+        plano_x = (self.canvas.canvasx(x) - self.MARGEN) / self._escala
+        plano_y = (self.canvas.canvasy(y) - self.MARGEN) / self._escala
+        self._escala = escala
+        ancho, alto = self._ajustar_region()
+        self.canvas.xview_moveto((plano_x * escala + self.MARGEN - x) / ancho)
+        self.canvas.yview_moveto((plano_y * escala + self.MARGEN - y) / alto)
+        self.dibujar()
+
+    def _vista(self):
+        """Filas [f0, f1) y columnas [c0, c1) que caben en la ventana"""
+        x0, y0 = self.canvas.canvasx(0), self.canvas.canvasy(0)
+        ancho = self.ANCHO_PLAZA * self._escala
+        alto = self.ALTO_PLAZA * self._escala
+        f0 = max(int((y0 - self.MARGEN) // alto), 0)
+        f1 = min(int((y0 + self.canvas.winfo_height() - self.MARGEN) // alto) + 1, self._malla.filas)
+        c0 = max(int((x0 - self.MARGEN) // ancho), 0)
+        c1 = min(int((x0 + self.canvas.winfo_width() - self.MARGEN) // ancho) + 1, self._malla.columnas)
+        return f0, f1, c0, c1
+
+    def _xy(self, fila, columna):
+        return (self.MARGEN + columna * self.ANCHO_PLAZA * self._escala,
+                self.MARGEN + fila * self.ALTO_PLAZA * self._escala)
+
+    def dibujar_leyenda(self):
+        y_leyenda = 12
+        self.leyenda.create_text(10, y_leyenda, text="Leyenda:", anchor="w", font=("Arial", 9, "bold"))
+        self.leyenda.create_rectangle(80, y_leyenda-8, 100, y_leyenda+8, fill="#ff4757")
+        self.leyenda.create_text(105, y_leyenda, text="Ocupada", anchor="w", font=("Arial", 8))
+        self.leyenda.create_rectangle(170, y_leyenda-8, 190, y_leyenda+8, fill="#5bc0de")
+        self.leyenda.create_text(195, y_leyenda, text="Minusválido", anchor="w", font=("Arial", 8))
+        self.leyenda.create_rectangle(280, y_leyenda-8, 300, y_leyenda+8, fill="#ffd700")
+        self.leyenda.create_text(305, y_leyenda, text="Eléctrica", anchor="w", font=("Arial", 8))
+        self.leyenda.create_rectangle(380, y_leyenda-8, 400, y_leyenda+8, fill="#2ecc71")
+        self.leyenda.create_text(405, y_leyenda, text="Libre", anchor="w", font=("Arial", 8))
+        x = 470
+        for tipo, color in self.COLORES_ZONA.items():
+            self.leyenda.create_rectangle(x, y_leyenda-8, x+20, y_leyenda+8, outline=color, width=3)
+            self.leyenda.create_text(x+25, y_leyenda, text=tipo, anchor="w", font=("Arial", 8))
+            x += 130
+        self.leyenda.create_text(x + 20, y_leyenda, text="", anchor="w", font=("Arial", 8, "bold"), tags="zonas")
+
+    @medido("dibujar")
+    def dibujar(self):
+        """Dibuja solo la vista: plazas si el zoom lo permite, teselas agregadas si no
+
+        El número de elementos depende del tamaño de la ventana, no de la capacidad.
+        """
+        if self._dibujo_programado is not None:
+            self.root.after_cancel(self._dibujo_programado)
+            self._dibujo_programado = None
+        self.canvas.delete("all")
+        self._ultimo_dibujo = hora_actual()
+        self._visibles = {}
+        self._teselas = None
+        self.dibujar_resumen()
+
+        f0, f1, c0, c1 = self._vista()
+        if self._escala < self.ESCALA_TESELAS:
+            self.dibujar_teselas(f0, f1, c0, c1)
+            return
+        estado = self.parking.obtener_estado()
+        columnas = self._malla.columnas
+        for fila in range(f0, f1):
+            for columna in range(c0, c1):
+                i = self._en_celda[fila * columnas + columna]
+                if i >= 0:
+                    x, y = self._xy(fila, columna)
+                    self._visibles[i] = (x, y)
+                    self.dibujar_plaza(estado[i], x, y)
+
+    def dibujar_teselas(self, f0, f1, c0, c1):
+        """Agrupa plazas en teselas de al menos TESELA_PX con su porcentaje de ocupación"""
+        paso_f = max(1, math.ceil(self.TESELA_PX / (self.ALTO_PLAZA * self._escala)))
+        paso_c = max(1, math.ceil(self.TESELA_PX / (self.ANCHO_PLAZA * self._escala)))
+        # Alineadas a una rejilla fija para que no cambien al desplazarse
+        f0 -= f0 % paso_f
+        c0 -= c0 % paso_c
+        self._teselas = (f0, f1, paso_f, c0, c1, paso_c)
+        # Las esquinas se comparten entre teselas vecinas: una consulta por esquina
+        cortes_f = [min(f, self._malla.filas) for f in range(f0, f1 + paso_f, paso_f)]
+        cortes_c = [min(c, self._malla.columnas) for c in range(c0, c1 + paso_c, paso_c)]
+        ocupadas = [[self._malla.ocupadas_hasta(f, c) for c in cortes_c] for f in cortes_f]
+        for a in range(len(cortes_f) - 1):
+            for b in range(len(cortes_c) - 1):
+                self.dibujar_tesela(
+                    cortes_f[a], cortes_c[b], paso_f, paso_c,
+                    ocupadas[a+1][b+1] - ocupadas[a][b+1] - ocupadas[a+1][b] + ocupadas[a][b]
+                )
+
+    def dibujar_tesela(self, fila, columna, paso_f, paso_c, ocupadas=None):
+        malla = self._malla
+        fin_f = min(fila + paso_f, malla.filas)
+        fin_c = min(columna + paso_c, malla.columnas)
+        if ocupadas is None:
+            ocupadas = (malla.ocupadas_hasta(fin_f, fin_c) - malla.ocupadas_hasta(fila, fin_c)
+                        - malla.ocupadas_hasta(fin_f, columna) + malla.ocupadas_hasta(fila, columna))
+        plazas = (malla.plazas_hasta(fin_f, fin_c) - malla.plazas_hasta(fila, fin_c)
+                  - malla.plazas_hasta(fin_f, columna) + malla.plazas_hasta(fila, columna))
+        if not plazas:
+            return
+        etiqueta = f"tesela:{fila}:{columna}"
+        x0, y0 = self._xy(fila, columna)
+        x1, y1 = self._xy(fin_f, fin_c)
+        tasa = ocupadas / plazas
+        self.canvas.create_rectangle(
+            x0 + 1, y0 + 1, x1 - 1, y1 - 1,
+            fill=self._color_ocupacion(tasa),
+            outline=self.COLORES_ZONA.get(self._zona_fila[fila], "#7f8c8d"),
+            width=2,
+            tags=etiqueta
+        )
+        if x1 - x0 >= 30 and y1 - y0 >= 14:
+            self.canvas.create_text(
+                (x0 + x1) / 2, (y0 + y1) / 2,
+                text=f"{tasa*100:.0f}%",
+                font=("Arial", 8),
+                fill="#2c3e50",
+                tags=etiqueta
+            )
+
+    @staticmethod
+    def _color_ocupacion(tasa):
+        """Verde libre → amarillo → rojo lleno"""
+        if tasa < 0.5:
+            r, g, b = 0x2e + (0xff - 0x2e) * tasa * 2, 0xcc + (0xd7 - 0xcc) * tasa * 2, 0x71 * (1 - tasa * 2)
+        else:
+            t = (tasa - 0.5) * 2
+            r, g, b = 0xff, 0xd7 + (0x47 - 0xd7) * t, 0x57 * t
+        return f"#{int(r):02x}{int(g):02x}{int(b):02x}"
+
+    def dibujar_plaza(self, plaza, x, y):
+        etiqueta = f"plaza:{plaza.id}"
+        e = self._escala
+
+        # Determinar color
+        if plaza.ocupada:
+            color = "#ff4757"
+            borde = "#c23616"
+        elif plaza.exclusiva_minusvalido:
+            color = "#5bc0de"
+            borde = "#3498db"
+        elif plaza.es_electrica:
+            color = "#ffd700"
+            borde = "#f39c12"
+        else:
+            color = "#2ecc71"
+            borde = "#27ae60"
+
+        # Dibujar plaza
+        self.canvas.create_rectangle(
+            x, y, x+120*e, y+65*e,
+            fill=color,
+            outline=borde,
+            width=2 if e >= self.ESCALA_TEXTO else 1,
+            tags=etiqueta
+        )
+        if e < 0.5:
+            return
+
+        # ID de plaza
+        self.canvas.create_text(
+            x+60*e, y+10*e,
+            text=plaza.id,
+            font=("Arial", max(int(11*e), 6), "bold"),
+            fill="#2c3e50",
+            tags=etiqueta
+        )
+        if e < self.ESCALA_TEXTO:
+            return
+
+        # Tipo de parking
+        tipo_abrev = {
+            "SUBTERRANEO": "🌙 SUB",
+            "AREA_PRIVADA": "🏢 PRIV",
+            "EXTERIOR": "🌤️ EXT"
+        }
+        self.canvas.create_text(
+            x+60*e, y+25*e,
+            text=tipo_abrev.get(plaza.tipo_parking, plaza.tipo_parking),
+            font=("Arial", max(int(7*e), 6)),
+            fill="#34495e",
+            tags=etiqueta
+        )
         
-        # Leyenda
-        y_leyenda = 10
-        self.canvas.create_text(10, y_leyenda, text="Leyenda:", anchor="w", font=("Arial", 9, "bold"))
-        self.canvas.create_rectangle(80, y_leyenda-8, 100, y_leyenda+8, fill="#ff4757")
-        self.canvas.create_text(105, y_leyenda, text="Ocupada", anchor="w", font=("Arial", 8))
-        self.canvas.create_rectangle(170, y_leyenda-8, 190, y_leyenda+8, fill="#5bc0de")
-        self.canvas.create_text(195, y_leyenda, text="Minusválido", anchor="w", font=("Arial", 8))
-        self.canvas.create_rectangle(280, y_leyenda-8, 300, y_leyenda+8, fill="#ffd700")
-        self.canvas.create_text(305, y_leyenda, text="Eléctrica", anchor="w", font=("Arial", 8))
-        self.canvas.create_rectangle(380, y_leyenda-8, 400, y_leyenda+8, fill="#2ecc71")
-        self.canvas.create_text(405, y_leyenda, text="Libre", anchor="w", font=("Arial", 8))
-        
-        # Dibujar plazas
-        x, y = 50, 50
-        
-        for plaza in self.parking.obtener_estado():
-            # Determinar color
-            if plaza.ocupada:
-                color = "#ff4757"
-                borde = "#c23616"
-            elif plaza.exclusiva_minusvalido:
-                color = "#5bc0de"
-                borde = "#3498db"
-            elif plaza.es_electrica:
-                color = "#ffd700"
-                borde = "#f39c12"
-            else:
-                color = "#2ecc71"
-                borde = "#27ae60"
-
-            # Dibujar plaza
-            self.canvas.create_rectangle(
-                x, y, x+120, y+65,
-                fill=color,
-                outline=borde,
-                width=2
+        # Matrícula o estado
+        if plaza.matricula:
+            simbolo = "♿" if plaza.tipo_vehiculo == "MINUSVALIDO" else "🏍️" if plaza.tipo_vehiculo == "MOTO" else "⚡" if plaza.tipo_vehiculo == "ELECTRICO" else "🚗"
+            self.canvas.create_text(
+                x+60*e, y+40*e,
+                text=f"{simbolo} {plaza.matricula}",
+                font=("Arial", max(int(9*e), 6)),
+                tags=etiqueta
             )
             
-            # ID de plaza
+            # Tiempo de estancia
+            tiempo = (hora_actual() - plaza.entrada).total_seconds() / 60
             self.canvas.create_text(
-                x+60, y+10,
-                text=plaza.id,
-                font=("Arial", 11, "bold"),
-                fill="#2c3e50"
+                x+60*e, y+55*e,
+                text=f"{int(tiempo)}min",
+                font=("Arial", max(int(8*e), 6)),
+                fill="#555",
+                tags=etiqueta
             )
-            
-            # Tipo de parking
-            tipo_abrev = {
-                "SUBTERRANEO": "🌙 SUB",
-                "AREA_PRIVADA": "🏢 PRIV",
-                "EXTERIOR": "🌤️ EXT"
-            }
+        else:
+            tipo_texto = "MINUS" if plaza.exclusiva_minusvalido else "⚡ELEC" if plaza.es_electrica else "LIBRE"
             self.canvas.create_text(
-                x+60, y+25,
-                text=tipo_abrev.get(plaza.tipo_parking, plaza.tipo_parking),
-                font=("Arial", 7),
-                fill="#34495e"
+                x+60*e, y+45*e,
+                text=tipo_texto,
+                font=("Arial", max(int(9*e), 6)),
+                fill="#555",
+                tags=etiqueta
             )
-            
-            # Matrícula o estado
-            if plaza.coche:
-                simbolo = "♿" if plaza.coche.tipo == "MINUSVALIDO" else "🏍️" if plaza.coche.tipo == "MOTO" else "⚡" if plaza.coche.tipo == "ELECTRICO" else "🚗"
-                self.canvas.create_text(
-                    x+60, y+40,
-                    text=f"{simbolo} {plaza.coche.matricula}",
-                    font=("Arial", 9)
-                )
-                
-                # Tiempo de estancia
-                tiempo = (datetime.now() - plaza.entrada).total_seconds() / 60
-                self.canvas.create_text(
-                    x+60, y+55,
-                    text=f"{int(tiempo)}min",
-                    font=("Arial", 8),
-                    fill="#555"
-                )
-            else:
-                tipo_texto = "MINUS" if plaza.exclusiva_minusvalido else "⚡ELEC" if plaza.es_electrica else "LIBRE"
-                self.canvas.create_text(
-                    x+60, y+45,
-                    text=tipo_texto,
-                    font=("Arial", 9),
-                    fill="#555"
-                )
-
-            x += 130
-            if x > 1200:
-                x = 50
-                y += 80
 
     def entrada_manual(self):
-        self.parking.entrada(reserva=messagebox.askyesno("Reserva", "¿Tiene reserva?"))
-        self.dibujar()
+        tarifas = "\n".join(
+            f"   {zona}: {precio:.2f}€/h" + (f" (x{factor:.2f})" if factor != 1 else "")
+            for zona, (precio, factor) in self.parking.cotizar().items()
+        ) or "   Sin plaza libre ahora (entraría en cola)"
+        reserva = messagebox.askyesno("Reserva", f"Tarifa actual:\n{tarifas}\n\n¿Tiene reserva?")
+        self.parking.entrada(reserva=reserva)
+        self.refrescar()
 
     def salida_manual(self):
         pid = simpledialog.askstring("Salida", "ID de plaza (ej: A1):")
         if pid:
             exito, msg = self.parking.salida(pid.upper())
             messagebox.showinfo("Resultado", msg)
-            self.dibujar()
+            self.refrescar()
 
     def toggle_auto(self):
         self.automatico = not self.automatico
@@ -739,6 +3973,17 @@ class InterfazParking:
     def mostrar_estadisticas(self):
         stats = self.parking.obtener_estadisticas()
         ocupacion = self.parking._plazas.tasa_ocupacion()
+
+        estancias = ""
+        for tipo in TIPOS_VEHICULO:
+            p50 = self.parking.percentil("estancia", 50, tipo_vehiculo=tipo)
+            if p50 is not None:
+                p95 = self.parking.percentil("estancia", 95, tipo_vehiculo=tipo)
+                estancias += f"\n   {tipo}: p50 {p50:.0f}min / p95 {p95:.0f}min"
+        recaudacion = "".join(
+            f"\n   {tipo}: {self.parking.total('precio', tipo_parking=tipo):.2f}€"
+            for tipo in TIPOS_PARKING
+        )
         
         mensaje = f"""
 📊 ESTADÍSTICAS DEL PARKING
@@ -753,6 +3998,9 @@ class InterfazParking:
 ⏳ Cola de Espera: {self.parking.obtener_info_cola()} vehículos
 
 💵 Media por vehículo: {stats['recaudacion_total']/max(stats['total_salidas'],1):.2f}€
+
+⏱️ Estancia por vehículo:{estancias or " sin datos"}
+🅿️ Recaudación por tipo de plaza:{recaudacion}
         """
         
         messagebox.showinfo("Estadísticas Detalladas", mensaje)
@@ -761,8 +4009,7 @@ class InterfazParking:
         """Guarda el estado actual del parking en JSON"""
         # Pausar modo automático temporalmente
         automatico_prev = self.automatico
-        self.automatico = False
-        time.sleep(0.5)  # Esperar a que terminen operaciones en curso
+        self.simulacion.pausar()  # Espera a que termine el turno en curso
         
         exito, mensaje = self.parking.guardar_estado()
         
@@ -778,8 +4025,7 @@ class InterfazParking:
         """Carga el estado del parking desde JSON"""
         # Pausar modo automático
         automatico_prev = self.automatico
-        self.automatico = False
-        time.sleep(0.5)
+        self.simulacion.pausar()
         
         respuesta = messagebox.askyesno(
             "📂 Cargar Estado",
@@ -790,15 +4036,42 @@ class InterfazParking:
             parking_nuevo, mensaje = Parking.cargar_estado()
             
             if parking_nuevo:
-                self.parking = parking_nuevo
+                # El estado guardado no incluye si la tarifa es dinámica: se conserva la actual
+                parking_nuevo._tarifas.dinamica = self.parking._tarifas.dinamica
+                self.conectar(parking_nuevo)
                 messagebox.showinfo("✅ Carga Exitosa", mensaje)
-                self.dibujar()
             else:
                 messagebox.showerror("❌ Error", mensaje)
         
         # Restaurar modo automático
         self.automatico = automatico_prev
 
+    def perfil_cpu(self, archivo="perfil.folded"):
+        """Inicia el perfil por muestreo o lo detiene, lo vuelca y muestra el resumen"""
+        if PERFIL.alternar():
+            messagebox.showinfo("🔥 Perfil", f"Muestreando los hilos a {PERFIL.hz}Hz.\nPulse de nuevo para parar.")
+            return
+        PERFIL.volcar(archivo)
+        messagebox.showinfo("🔥 Perfil", f"{PERFIL.resumen(top=8)}\n\nPilas plegadas en {archivo}")
+        PERFIL.reiniciar()
+
+    def perfil_memoria(self):
+        """Activa el perfil de memoria o muestra lo que creció desde la muestra anterior"""
+        if not MEMORIA.activo:
+            MEMORIA.activar()
+            MEMORIA.muestrear("inicio")
+            messagebox.showinfo(
+                "🧠 Memoria",
+                "Perfil de memoria activado (la simulación irá más lenta).\n"
+                "Pulse de nuevo para ver lo que creció desde ahora."
+            )
+            return
+        automatico_prev = self.automatico
+        self.simulacion.pausar()  # Que la muestra no vea un turno a medias
+        MEMORIA.muestrear(RELOJ.ahora().strftime("%H:%M:%S"))
+        self.automatico = automatico_prev
+        messagebox.showinfo("🧠 Memoria", MEMORIA.informe(-2, -1, top=8))
+
     def iniciar(self):
         self.root.mainloop()
 
@@ -807,5 +4080,82 @@ class InterfazParking:
 # ======================================================
 
 if __name__ == "__main__":
-    parking = Parking()
-    InterfazParking(parking).iniciar()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Sistema de Parking Inteligente")
+    parser.add_argument("--metricas", metavar="ARCHIVO",
+                        help="Activa la instrumentación y la vuelca en ARCHIVO (.prom o .json) cada 10s")
+    parser.add_argument("--historico", metavar="CARPETA",
+                        help="Guarda las entradas y salidas en un histórico columnar")
+    parser.add_argument("--archivado", metavar="CARPETA",
+                        help="Archiva eventos y una instantánea de estado por hora en segmentos comprimidos")
+    parser.add_argument("--prevision", metavar="MINUTOS", type=int,
+                        help="Admisión y cola según la ocupación prevista a MINUTOS (aprende de --historico)")
+    parser.add_argument("--estado", metavar="ARCHIVO",
+                        help="Arranca desde un estado guardado (JSON o instantánea .snap)")
+    parser.add_argument("--memoria", metavar="SEGUNDOS", type=int, nargs="?", const=60,
+                        help="Perfil de memoria: una muestra cada SEGUNDOS y un informe al cerrar")
+    parser.add_argument("--perfil", metavar="ARCHIVO",
+                        help="Perfil por muestreo de los hilos en formato plegado (kill -USR1 lo para y reanuda)")
+    parser.add_argument("--perfil-hz", metavar="HZ", type=int, default=PerfilMuestreo.HZ)
+    parser.add_argument("--replica", metavar="DIRECCION",
+                        help="Envía cada cambio a una réplica en caliente (host:puerto o socket Unix)")
+    parser.add_argument("--replica-sincrona", action="store_true",
+                        help="Cada entrada y salida espera a que la réplica la confirme")
+    parser.add_argument("--tarifa-dinamica", action="store_true",
+                        help="Descuento en zonas vacías y recargo cerca del lleno y con cola")
+    args = parser.parse_args()
+
+    if args.metricas:
+        METRICAS.activar()
+        METRICAS.exportar_periodicamente(args.metricas)
+    if args.perfil:
+        PERFIL.iniciar(args.perfil_hz)
+        PERFIL.alternar_con_senal(args.perfil)
+    if args.memoria:
+        MEMORIA.activar()
+        MEMORIA.muestrear("inicio")
+        MEMORIA.muestrear_periodicamente(args.memoria)
+
+    historico = None
+    consumidores = []  # Siguen al parking que cargue la interfaz (ver InterfazParking.conectar)
+    parking = Parking(tarifa_dinamica=args.tarifa_dinamica)
+    if args.estado:
+        parking, mensaje = Parking.cargar_estado(args.estado)
+        print(mensaje)
+        if not parking:
+            raise SystemExit(1)
+        parking._tarifas.dinamica = args.tarifa_dinamica  # El estado guardado no la incluye
+    if args.historico:
+        from historico import Historico
+        historico = Historico(args.historico)
+        historico.conectar(parking)
+        consumidores.append(historico)
+    archivador = None
+    if args.archivado:
+        from archivado import Archivador
+        archivador = Archivador(args.archivado).conectar(parking)
+        consumidores.append(archivador)
+    if args.prevision:
+        from prevision import Previsor
+        previsor = Previsor()
+        if historico:
+            previsor.aprender_historico(historico)
+        consumidores.append(previsor.conectar(parking, args.prevision))
+    replicador = None
+    if args.replica:
+        from replicacion import Replicador
+        replicador = Replicador(args.replica, sincrona=args.replica_sincrona, metricas=METRICAS).conectar(parking)
+        consumidores.append(replicador)
+    InterfazParking(parking, consumidores).iniciar()
+    if replicador:
+        replicador.cerrar()
+    if historico:
+        historico.cerrar()
+    if archivador:
+        archivador.cerrar()
+    if args.perfil:
+        PERFIL.detener()
+        print(PERFIL.resumen())
+        print(f"Pilas plegadas en {PERFIL.volcar(args.perfil)}")
+    if args.memoria:
+        MEMORIA.muestrear("cierre")
+        print(MEMORIA.informe(0, -1))
\ No newline at end of file
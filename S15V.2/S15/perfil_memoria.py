@@ -0,0 +1,100 @@
+"""Perfil de memoria del motor sin interfaz gráfica
+
+Recorre las fases de la vida de un parking para cada capacidad: crearlo, llenarlo,
+sacar coches con la salida automática, guardar y cargar el estado y montar la malla
+de ocupación con la que dibuja la interfaz. Tras cada fase toma una instantánea de
+tracemalloc (ver PerfilMemoria) e informa de lo que creció en cada fase por
+subsistema, línea y clase.
+
+Uso:
+    python perfil_memoria.py --capacidades 1000,20000 --top 8
+    python perfil_memoria.py --capacidades 50000 --desde inicio --hasta lleno
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+from parking_privado import Parking, MallaOcupacion, MEMORIA, RELOJ, TIEMPO_MINIMO_ESTANCIA, PLAZAS_POR_FILA, celda_plaza
+
+OCUPACION = 0.9
+SALIDAS = 0.3  # Fracción de los coches que sale en la fase de salidas
+
+def fases(capacidad, columnas, censo, directorio):
+    """Ejecuta las fases tomando una muestra tras cada una; devuelve sus etiquetas"""
+    etiquetas = ["inicio", "creado", "lleno", "salidas", "persistencia", "dibujo"]
+    inicio = datetime(2026, 1, 5, 9)
+    RELOJ.fijar(inicio)
+    try:
+        MEMORIA.muestrear("inicio", censo)
+        parking = Parking(capacidad, columnas)
+        MEMORIA.muestrear("creado", censo)
+
+        for _ in range(int(capacidad * OCUPACION)):
+            parking.entrada()
+        MEMORIA.muestrear("lleno", censo)
+
+        RELOJ.fijar(inicio + timedelta(seconds=TIEMPO_MINIMO_ESTANCIA * 30))
+        for _ in range(int(capacidad * OCUPACION * SALIDAS)):
+            parking.salida_aleatoria()
+        MEMORIA.muestrear("salidas", censo)
+
+        archivo = os.path.join(directorio, f"estado_{capacidad}.json")
+        parking.guardar_estado(archivo)
+        cargado, _ = Parking.cargar_estado(archivo)
+        MEMORIA.muestrear("persistencia", censo)
+
+        # Lo que la interfaz construye para dibujar: celda de cada plaza y malla de ocupación
+        estado = cargado.obtener_estado()
+        celdas = [celda_plaza(p.id) or divmod(i, PLAZAS_POR_FILA) for i, p in enumerate(estado)]
+        malla = MallaOcupacion(max(f for f, _ in celdas) + 1, max(c for _, c in celdas) + 1)
+        malla.cargar(celdas, [p.ocupada for p in estado])
+        MEMORIA.muestrear("dibujo", censo)
+
+        # Se mantienen vivos hasta la última muestra
+        del parking, cargado, malla
+    finally:
+        RELOJ.soltar()
+    return etiquetas
+
+def main():
+    parser = argparse.ArgumentParser(description="Perfil de memoria por subsistema del motor")
+    parser.add_argument("--capacidades", default="1000,5000", help="Separadas por comas")
+    parser.add_argument("--columnas", type=int, default=PLAZAS_POR_FILA)
+    parser.add_argument("--top", type=int, default=10, help="Líneas y clases en cada informe")
+    parser.add_argument("--desde", help="Fase inicial del informe (por defecto, cada fase frente a la anterior)")
+    parser.add_argument("--hasta", help="Fase final del informe")
+    parser.add_argument("--sin-censo", action="store_true", help="Sin recuento por clase (mucho más rápido)")
+    parser.add_argument("--semilla", type=int, default=1234)
+    parser.add_argument("--json", action="store_true", help="Imprime los informes en JSON")
+    args = parser.parse_args()
+
+    informes = {}
+    with tempfile.TemporaryDirectory() as directorio:
+        for capacidad in (int(c) for c in args.capacidades.split(",")):
+            random.seed(args.semilla)
+            MEMORIA.activar()
+            etiquetas = fases(capacidad, args.columnas, not args.sin_censo, directorio)
+            if args.desde or args.hasta:
+                pares = [(args.desde or etiquetas[0], args.hasta or etiquetas[-1])]
+            else:
+                pares = list(zip(etiquetas, etiquetas[1:]))
+            informes[capacidad] = [
+                MEMORIA.comparar(desde, hasta, args.top) if args.json else MEMORIA.informe(desde, hasta, args.top)
+                for desde, hasta in pares
+            ]
+            MEMORIA.desactivar()
+
+    if args.json:
+        print(json.dumps(informes, indent=2, ensure_ascii=False))
+        return
+    for capacidad, textos in informes.items():
+        print(f"{'=' * 20} {capacidad} plazas {'=' * 20}")
+        for texto in textos:
+            print(texto)
+            print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""Previsión de ocupación a partir del histórico
+
+Aprende, por hora del día y tipo de vehículo, la tasa de llegadas (entradas,
+rechazos y encolados: la demanda, no solo lo que cupo) y la distribución de las
+estancias. Con eso predice las plazas ocupadas dentro de N minutos como:
+
+    coches que ya están dentro × probabilidad de seguir, dado lo que llevan
+  + llegadas esperadas hasta entonces × probabilidad de seguir dentro
+
+Las curvas de permanencia se precalculan al aprender y los coches de dentro se
+agrupan por tipo y franja de entrada, así que prever() suma unas decenas de
+términos y se puede llamar en cada llegada.
+
+Uso:
+    python prevision.py --historico historico --minutos 30
+"""
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from historico import EVENTOS
+from parking_privado import (
+    TIPOS_VEHICULO, DURACIONES_ESTANCIA, PESOS_ESTANCIA, MINUTOS_POR_FRANJA, hora_actual
+)
+
+MINUTOS_MAX_ESTANCIA = 24 * 60  # Las estancias más largas cuentan como de un día
+MIN_MUESTRAS = 30  # Por debajo se usa la curva del tipo de vehículo o la global
+PASO_LLEGADAS = 5  # Minutos por término al integrar las llegadas
+
+CODIGOS_VEHICULO = list(TIPOS_VEHICULO)
+EVENTOS_LLEGADA = ("entrada", "rechazo", "encolado")
+CODIGOS_LLEGADA = {EVENTOS.index(e) for e in EVENTOS_LLEGADA}
+CODIGO_SALIDA = EVENTOS.index("salida")
+
+def _curva(histograma):
+    """Probabilidad de seguir dentro tras m minutos, m = 0..MINUTOS_MAX_ESTANCIA"""
+    total = sum(histograma)
+    if not total:
+        return None
+    salidos = accumulate(histograma)
+    return [1 - n / total for n in salidos][:MINUTOS_MAX_ESTANCIA + 1]
+
+def _curva_a_priori():
+    """Sin datos: las duraciones estimadas con las que se simulan las estancias"""
+    histograma = [0] * (MINUTOS_MAX_ESTANCIA + 2)
+    for minutos, peso in zip(DURACIONES_ESTANCIA, PESOS_ESTANCIA):
+        histograma[minutos] += peso
+    return _curva(histograma)
+
+class Previsor:
+    """Predice la ocupación a N minutos con lo aprendido del histórico"""
+    def __init__(self, capacidad=None):
+        self.capacidad = capacidad
+        self._lock = threading.Lock()
+        # Acumuladores del aprendizaje
+        self._llegadas = Counter()  # (tipo, hora) -> llegadas
+        self._dias = set()
+        self._estancias = {}  # (tipo, hora de entrada) -> histograma por minuto
+        # Resultado del ajuste
+        self._tasas = {}  # (tipo, hora) -> llegadas por minuto
+        self._curvas = {}  # (tipo, hora) -> curva de permanencia
+        self._a_priori = _curva_a_priori()
+        # Coches dentro: (tipo, franja de entrada) -> número de coches
+        self._dentro = Counter()
+        self._coches = {}  # matrícula -> (tipo, franja)
+        self._parking = None
+        self._minutos = None
+
+    # --------------------------------------------------
+    # Aprendizaje
+    # --------------------------------------------------
+
+    @property
+    def dias(self):
+        return len(self._dias)
+
+    def _histograma(self, tipo, hora):
+        clave = (tipo, hora)
+        if clave not in self._estancias:
+            self._estancias[clave] = [0] * (MINUTOS_MAX_ESTANCIA + 2)
+        return self._estancias[clave]
+
+    def _acumular(self, momento, evento, tipo, duracion):
+        if evento in EVENTOS_LLEGADA:
+            self._llegadas[(tipo, momento.hour)] += 1
+        elif evento == "salida" and duracion:
+            hora = (momento - timedelta(seconds=duracion)).hour
+            minutos = min(int(duracion // 60), MINUTOS_MAX_ESTANCIA + 1)
+            self._histograma(tipo, hora)[minutos] += 1
+
+    def aprender(self, eventos):
+        """Acumula eventos con momento, evento, tipo_vehiculo y duracion (diccionarios)"""
+        for e in eventos:
+            self._dias.add(e['momento'].date())
+            self._acumular(e['momento'], e['evento'], e.get('tipo_vehiculo'), e.get('duracion'))
+        self.ajustar()
+        return self
+
+    def aprender_historico(self, historico, desde=None, hasta=None):
+        """Acumula directamente sobre las columnas del histórico, sin crear un registro por fila"""
+        nombres = ("momento", "evento", "tipo_vehiculo", "duracion")
+        for dia, (momentos, eventos, tipos, duraciones) in historico.columnas(nombres, desde, hasta):
+            self._dias.add(dia)
+            # Segundos desde el inicio del día; la hora sale con aritmética, sin crear datetimes
+            inicio_dia = datetime.fromisoformat(dia).timestamp()
+            segundos = [m / 1_000_000 - inicio_dia for m in momentos]
+            for t, evento, tipo in zip(segundos, eventos, tipos):
+                if evento in CODIGOS_LLEGADA and tipo < len(CODIGOS_VEHICULO):
+                    self._llegadas[(CODIGOS_VEHICULO[tipo], min(int(t // 3600), 23))] += 1
+            for t, evento, tipo, duracion in zip(segundos, eventos, tipos, duraciones):
+                if evento == CODIGO_SALIDA and duracion and tipo < len(CODIGOS_VEHICULO):
+                    hora_entrada = int((t - duracion) // 3600) % 24
+                    minutos = min(int(duracion // 60), MINUTOS_MAX_ESTANCIA + 1)
+                    self._histograma(CODIGOS_VEHICULO[tipo], hora_entrada)[minutos] += 1
+        self.ajustar()
+        return self
+
+    def ajustar(self):
+        """Recalcula tasas y curvas a partir de lo acumulado"""
+        dias = max(len(self._dias), 1)
+        tasas = {clave: n / (dias * 60) for clave, n in self._llegadas.items()}
+
+        # Curvas con suficientes muestras; si no, las del tipo de vehículo o la global
+        por_tipo = {}
+        total = [0] * (MINUTOS_MAX_ESTANCIA + 2)
+        for (tipo, hora), histograma in self._estancias.items():
+            acumulado = por_tipo.setdefault(tipo, [0] * (MINUTOS_MAX_ESTANCIA + 2))
+            for i, n in enumerate(histograma):
+                if n:
+                    acumulado[i] += n
+                    total[i] += n
+        global_ = _curva(total) if sum(total) >= MIN_MUESTRAS else self._a_priori
+        curvas_tipo = {
+            tipo: _curva(h) if sum(h) >= MIN_MUESTRAS else global_ for tipo, h in por_tipo.items()
+        }
+        curvas = {}
+        for tipo in CODIGOS_VEHICULO:
+            for hora in range(24):
+                histograma = self._estancias.get((tipo, hora))
+                if histograma and sum(histograma) >= MIN_MUESTRAS:
+                    curvas[(tipo, hora)] = _curva(histograma)
+                else:
+                    curvas[(tipo, hora)] = curvas_tipo.get(tipo, global_)
+
+        with self._lock:
+            self._tasas = tasas
+            self._curvas = curvas
+
+    def tasa_llegadas(self, tipo, hora):
+        """Llegadas por minuto de un tipo de vehículo a esa hora"""
+        return self._tasas.get((tipo, hora), 0.0)
+
+    def permanencia(self, tipo, hora, minutos):
+        """Probabilidad de que un coche que entró a esa hora siga dentro tras minutos"""
+        return self._curvas.get((tipo, hora), self._a_priori)[min(int(minutos), MINUTOS_MAX_ESTANCIA)]
+
+    # --------------------------------------------------
+    # Coches dentro
+    # --------------------------------------------------
+
+    def conectar(self, parking, minutos=30):
+        """Sigue las entradas y salidas del parking y lo pone a admitir según la previsión"""
+        with self._lock:
+            self._dentro.clear()
+            self._coches.clear()
+        estado = parking.obtener_estado()
+        self.capacidad = len(estado)
+        for plaza in estado:
+            if plaza.ocupada:
+                self._entra(plaza.matricula, plaza.tipo_vehiculo, plaza.entrada)
+        # Observador síncrono: la actualización es O(1) y la previsión debe estar al día
+        parking.añadir_observador(self._observar)
+        parking.usar_prevision(self, minutos)
+        self._parking = parking
+        self._minutos = minutos
+        return self
+
+    def reconectar(self, parking):
+        """Deja de seguir el parking anterior y sigue a este con la misma antelación"""
+        if self._parking is not None:
+            self._parking.quitar_observador(self._observar)
+            self._parking.usar_prevision(None)
+        return self.conectar(parking, self._minutos)
+
+    def _franja(self, momento):
+        return int(momento.timestamp() // (MINUTOS_POR_FRANJA * 60))
+
+    def _entra(self, matricula, tipo, momento):
+        clave = (tipo, self._franja(momento))
+        with self._lock:
+            self._coches[matricula] = clave
+            self._dentro[clave] += 1
+
+    def _observar(self, evento):
+        if evento['evento'] == "entrada":
+            self._entra(evento['matricula'], evento['tipo_vehiculo'], evento['momento'])
+        elif evento['evento'] == "salida":
+            with self._lock:
+                clave = self._coches.pop(evento['matricula'], None)
+                if clave:
+                    self._dentro[clave] -= 1
+                    if not self._dentro[clave]:
+                        del self._dentro[clave]
+
+    # --------------------------------------------------
+    # Previsión
+    # --------------------------------------------------
+
+    def prever(self, minutos, momento=None):
+        """Plazas ocupadas previstas dentro de minutos y su desglose"""
+        ahora = (momento or hora_actual()).timestamp()
+        segundos_franja = MINUTOS_POR_FRANJA * 60
+        with self._lock:
+            dentro = list(self._dentro.items())
+            curvas = self._curvas
+            tasas = self._tasas
+
+        # Coches que ya están: se toma la mitad de su franja como momento de entrada
+        siguen = 0.0
+        total_dentro = 0
+        for (tipo, franja), n in dentro:
+            entrada = franja * segundos_franja + segundos_franja / 2
+            curva = curvas.get((tipo, datetime.fromtimestamp(entrada).hour), self._a_priori)
+            llevan = min(max(int((ahora - entrada) // 60), 0), MINUTOS_MAX_ESTANCIA)
+            if curva[llevan] > 0:
+                siguen += n * curva[min(llevan + minutos, MINUTOS_MAX_ESTANCIA)] / curva[llevan]
+            total_dentro += n
+
+        # Llegadas de aquí al horizonte que seguirán dentro al final
+        llegan = 0.0
+        for inicio in range(0, minutos, PASO_LLEGADAS):
+            paso = min(PASO_LLEGADAS, minutos - inicio)
+            hora = datetime.fromtimestamp(ahora + inicio * 60).hour
+            restante = min(int(minutos - inicio - paso / 2), MINUTOS_MAX_ESTANCIA)
+            for tipo in CODIGOS_VEHICULO:
+                tasa = tasas.get((tipo, hora))
+                if tasa:
+                    llegan += tasa * paso * curvas.get((tipo, hora), self._a_priori)[restante]
+
+        ocupadas = siguen + llegan
+        return {
+            'ocupadas': ocupadas,
+            'siguen': siguen,
+            'llegadas': llegan,
+            'salidas': total_dentro - siguen,
+            'tasa': min(ocupadas / self.capacidad, 1.0) if self.capacidad else 0.0,
+        }
+
+def main():
+    from historico import Historico
+
+    parser = argparse.ArgumentParser(description="Previsión de ocupación aprendida del histórico")
+    parser.add_argument("--historico", default="historico", help="Carpeta del histórico")
+    parser.add_argument("--minutos", type=int, default=30, help="Horizonte de la previsión")
+    args = parser.parse_args()
+
+    previsor = Previsor().aprender_historico(Historico(args.historico, solo_lectura=True))
+    print(f"📚 {previsor.dias} días de histórico")
+    print("Llegadas por hora (coches/hora):")
+    print("hora " + " ".join(f"{tipo:>12}" for tipo in CODIGOS_VEHICULO))
+    for hora in range(24):
+        print(f"{hora:>4} " + " ".join(
+            f"{previsor.tasa_llegadas(tipo, hora) * 60:>12.1f}" for tipo in CODIGOS_VEHICULO
+        ))
+    print(f"Probabilidad de seguir dentro tras {args.minutos} min (entrada a las 12h):")
+    for tipo in CODIGOS_VEHICULO:
+        print(f"   {tipo}: {previsor.permanencia(tipo, 12, args.minutos):.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,444 @@
+"""Réplica en caliente de un parking alimentada por sus cambios de estado
+
+El primario (Replicador) se suscribe al bus del Parking y, por cada lote de
+eventos, envía a la réplica las plazas que cambiaron desde el último envío
+(Parking.cambios_desde), los eventos y los contadores. La réplica (Replica) los
+aplica sobre su propio Parking (Parking.aplicar_cambios) y confirma cada lote,
+así que si el primario cae basta con promoverla: ya tiene todo lo confirmado.
+
+Mensajes (diccionarios por multiprocessing.connection, socket TCP local o Unix):
+    inicial     estado completo (Parking.to_dict) al conectar y al resincronizar
+    cambios     plazas cambiadas, eventos, contadores y, cada cierto tiempo, la
+                huella de la instantánea de la que salen para comprobar la réplica
+    fin         el primario se cierra de forma ordenada (la réplica no se promueve)
+La réplica contesta con confirmado (secuencia y si la huella coincide).
+
+Con sincrona el carril no termina la entrada o salida hasta que la réplica la
+confirma (no se pierde nada aunque el primario muera); sin ella, los eventos
+esperan en la suscripción y el retraso se mide en Replicador.estado().
+
+Uso:
+    python replicacion.py replica --direccion localhost:6150 --estado replica.json
+    python parking_privado.py --replica localhost:6150
+    python replicacion.py prueba --capacidad 2000 --operaciones 20000
+    python replicacion.py comprobar replica.json primario.json
+"""
+import argparse
+import hashlib
+import multiprocessing as mp
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from multiprocessing.connection import Listener, Client
+
+from parking_privado import Parking, EstadoPlaza, Histograma, METRICAS, RELOJ
+
+DIRECCION = "localhost:6150"
+CLAVE = b"parking-replica"
+LATIDO_SEGUNDOS = 1.0        # Sin eventos, el primario envía un lote vacío con esta frecuencia
+LATIDOS_PERDIDOS = 3         # La réplica da al primario por caído tras este silencio
+ESPERA_INICIAL = 60.0        # La réplica tarda en crear un parking grande desde el estado completo
+REINTENTO_SEGUNDOS = 5.0
+VERIFICACION_SEGUNDOS = 10.0
+CAPACIDAD_SUSCRIPCION = 4096
+
+def direccion(texto):
+    """"host:puerto" para TCP; cualquier otra cosa es la ruta de un socket Unix"""
+    host, _, puerto = texto.rpartition(":")
+    if host and puerto.isdigit():
+        return host, int(puerto)
+    return texto
+
+def huella(instantanea):
+    """Resumen de todas las plazas de una instantánea (igual en primario y réplica)"""
+    h = hashlib.blake2b(digest_size=16)
+    for estado in instantanea:
+        h.update(repr(tuple(estado)).encode())
+    return h.hexdigest()
+
+def diferencias(parking, otro):
+    """Plazas y contadores en los que difieren dos parkings: ([(id, a, b)], {contador: (a, b)})"""
+    estados = {e.id: e for e in otro.obtener_estado()}
+    plazas = [(e.id, e, estados.get(e.id)) for e in parking.obtener_estado() if estados.get(e.id) != e]
+    a, b = parking.obtener_estadisticas(), otro.obtener_estadisticas()
+    contadores = {k: (a.get(k), b.get(k)) for k in a.keys() | b.keys() if a.get(k) != b.get(k)}
+    return plazas, contadores
+
+class Replicador:
+    """Lado primario: envía los cambios de un Parking a una réplica y mide el retraso"""
+
+    def __init__(self, destino=DIRECCION, clave=CLAVE, sincrona=False,
+                 verificacion=VERIFICACION_SEGUNDOS, metricas=METRICAS):
+        self.destino = direccion(destino) if isinstance(destino, str) else destino
+        self.clave = clave
+        self.sincrona = sincrona
+        self.verificacion = verificacion
+        self._metricas = metricas  # El METRICAS de quien lo usa (parking_privado puede ser __main__)
+        self._lock = threading.Lock()  # Un lote en vuelo cada vez
+        self._parking = None
+        self._suscripcion = None
+        self._conexion = None
+        self._version = 0
+        self._secuencia = 0
+        self._ultimo_intento = 0.0
+        self._ultima_verificacion = time.monotonic()
+        self._activo = False
+        self._hilo = None
+        self.retrasos = Histograma()  # Milisegundos desde el evento hasta la confirmación
+        self.retraso = 0.0
+        self.confirmados = 0
+        self.verificaciones = 0
+        self.discrepancias = 0
+        self.resincronizaciones = 0
+        self.desconexiones = 0
+
+    def conectar(self, parking):
+        """Empieza a replicar el parking; sin réplica escuchando, reintenta en segundo plano"""
+        self._parking = parking
+        self._activo = True
+        if self.sincrona:
+            # Observador síncrono: el carril espera a la confirmación de la réplica
+            parking.añadir_observador(self._observar)
+        else:
+            self._suscripcion = parking.bus.suscribir(capacidad=CAPACIDAD_SUSCRIPCION, politica="bloquear")
+        with self._lock:
+            self._reconectar()
+        self._hilo = threading.Thread(target=self._bucle, daemon=True, name="replicador")
+        self._hilo.start()
+        return self
+
+    def reconectar(self, parking):
+        """Pasa a replicar otro parking (p. ej. tras cargar un estado): la réplica lo recibe entero"""
+        with self._lock:
+            if self.sincrona:
+                self._parking.quitar_observador(self._observar)
+                parking.añadir_observador(self._observar)
+            else:
+                anterior = self._suscripcion
+                self._suscripcion = parking.bus.suscribir(capacidad=CAPACIDAD_SUSCRIPCION, politica="bloquear")
+                anterior.cancelar(esperar=False)
+            self._parking = parking
+            if self._conexion is not None:
+                self._sincronizar()
+
+    def _observar(self, evento):
+        with self._lock:
+            if self._conexion is not None:
+                self._replicar([evento])
+
+    def _bucle(self):
+        while self._activo or (self._suscripcion is not None and len(self._suscripcion)):
+            if self._suscripcion is None:
+                time.sleep(LATIDO_SEGUNDOS)
+                lote = []
+            else:
+                suscripcion = self._suscripcion
+                evento = suscripcion.recibir(timeout=LATIDO_SEGUNDOS)
+                lote = ([evento] if evento else []) + suscripcion.vaciar()
+            with self._lock:
+                if self._suscripcion is not None and suscripcion is not self._suscripcion:
+                    continue  # Eventos del parking anterior a reconectar: ya se envió el estado entero
+                if self._conexion is None:
+                    # Al reconectar se envía el estado completo, que ya incluye el lote
+                    if time.monotonic() - self._ultimo_intento >= REINTENTO_SEGUNDOS:
+                        self._reconectar()
+                    continue
+                self._replicar(lote)
+
+    def _enviar(self, mensaje, espera=LATIDO_SEGUNDOS * LATIDOS_PERDIDOS):
+        """Envía y espera la confirmación (llamar con _lock); False si se perdió la réplica
+
+        Una réplica que no contesta a tiempo se da por perdida para no frenar a los
+        carriles; al volver se sincroniza entera.
+        """
+        try:
+            self._conexion.send(mensaje)
+            if not self._conexion.poll(espera):
+                raise TimeoutError
+            respuesta = self._conexion.recv()
+        except (OSError, EOFError):
+            self._conexion.close()
+            self._conexion = None
+            self.desconexiones += 1
+            return False
+        self.confirmados = respuesta['secuencia']
+        return respuesta
+
+    def _reconectar(self):
+        self._ultimo_intento = time.monotonic()
+        try:
+            self._conexion = Client(self.destino, authkey=self.clave)
+        except OSError:
+            self._conexion = None
+            return
+        self._sincronizar()
+
+    def _sincronizar(self):
+        """Envía el estado completo desde una instantánea"""
+        if self._suscripcion is not None:
+            self._suscripcion.vaciar()  # Ya están en el estado que se envía
+        instantanea = self._parking.obtener_estado()
+        self._secuencia += 1
+        self.resincronizaciones += 1
+        if self._enviar({
+            'tipo': "inicial", 'secuencia': self._secuencia, 'version': instantanea.version,
+            'estado': self._parking.to_dict(instantanea)
+        }, ESPERA_INICIAL):
+            self._version = instantanea.version
+
+    def _replicar(self, eventos):
+        """Envía las plazas cambiadas desde el último lote junto con sus eventos (llamar con _lock)"""
+        instantanea = self._parking.obtener_estado()
+        version, estados = self._parking.cambios_desde(self._version, instantanea)
+        verificar = time.monotonic() - self._ultima_verificacion >= self.verificacion
+        self._secuencia += 1
+        respuesta = self._enviar({
+            'tipo': "cambios",
+            'secuencia': self._secuencia,
+            'version': version,
+            'plazas': [tuple(e) for e in estados],  # Tuplas: EstadoPlaza puede ser de __main__
+            'eventos': eventos,
+            'estadisticas': self._parking.obtener_estadisticas(),
+            'huella': huella(instantanea) if verificar else None,
+        })
+        if not respuesta:
+            return
+        self._version = version
+        if eventos:
+            self.retraso = time.monotonic() - min(e['instante'] for e in eventos)
+            self.retrasos.añadir(self.retraso * 1000)
+        self._metricas.nivel("replica_retraso_ms", round(self.retraso * 1000, 3))
+        self._metricas.nivel("replica_pendientes", self.pendientes())
+        if verificar:
+            self._ultima_verificacion = time.monotonic()
+            self.verificaciones += 1
+            if not respuesta['coincide']:
+                self.discrepancias += 1
+                self._sincronizar()
+
+    def pendientes(self):
+        """Eventos aplicados en el primario que aún no se han enviado"""
+        return len(self._suscripcion) if self._suscripcion is not None else 0
+
+    def estado(self):
+        return {
+            'conectada': self._conexion is not None,
+            'sincrona': self.sincrona,
+            'enviados': self._secuencia,
+            'confirmados': self.confirmados,
+            'pendientes': self.pendientes(),
+            'retraso_ms': self.retraso * 1000,
+            'retraso_p50_ms': self.retrasos.percentil(50),
+            'retraso_p99_ms': self.retrasos.percentil(99),
+            'verificaciones': self.verificaciones,
+            'discrepancias': self.discrepancias,
+            'resincronizaciones': self.resincronizaciones,
+            'desconexiones': self.desconexiones,
+        }
+
+    def cerrar(self, avisar=True):
+        """Envía lo pendiente y se despide; sin avisar, la réplica lo toma como una caída"""
+        if self.sincrona:
+            self._parking.quitar_observador(self._observar)
+        self._activo = False
+        if self._suscripcion is not None:
+            self._suscripcion.cancelar()
+        if self._hilo:
+            self._hilo.join()
+        with self._lock:
+            if self._conexion is not None:
+                if avisar:
+                    try:
+                        self._conexion.send({'tipo': "fin"})
+                    except OSError:
+                        pass
+                self._conexion.close()
+                self._conexion = None
+
+class Replica:
+    """Lado de la réplica: aplica los lotes del primario y se promueve si este cae"""
+
+    def __init__(self, origen=DIRECCION, clave=CLAVE):
+        self.origen = direccion(origen) if isinstance(origen, str) else origen
+        self.clave = clave
+        self.parking = None
+        self.version = 0          # Versión del primario hasta la que se ha aplicado
+        self.secuencia = 0
+        self.aplicados = 0
+        self.verificaciones = 0
+        self.discrepancias = 0
+        self.ultimo_mensaje = None
+        self.aplicacion = Histograma()  # Microsegundos por lote
+
+    def servir(self, escuchando=None):
+        """Atiende al primario hasta que cae; devuelve el parking listo para promover
+
+        Tras un cierre ordenado (fin) espera a que el primario vuelva. escuchando,
+        si se da, se activa (threading/multiprocessing Event) al abrir el socket.
+        """
+        with Listener(self.origen, authkey=self.clave) as listener:
+            if escuchando is not None:
+                escuchando.set()
+            while True:
+                with listener.accept() as conexion:
+                    if not self._atender(conexion):
+                        return self.parking
+
+    def _atender(self, conexion):
+        """True si el primario se despidió; False si calla o corta la conexión"""
+        while True:
+            try:
+                if not conexion.poll(LATIDO_SEGUNDOS * LATIDOS_PERDIDOS):
+                    return False
+                mensaje = conexion.recv()
+            except (OSError, EOFError):
+                return False
+            if mensaje['tipo'] == "fin":
+                return True
+            self.ultimo_mensaje = time.monotonic()
+            conexion.send(self.aplicar(mensaje))
+
+    def aplicar(self, mensaje):
+        """Aplica un mensaje del primario y devuelve la confirmación"""
+        t = time.perf_counter()
+        coincide = None
+        if mensaje['tipo'] == "inicial":
+            self.parking = Parking.from_dict(mensaje['estado'])
+        else:
+            self.parking.aplicar_cambios(
+                [EstadoPlaza(*e) for e in mensaje['plazas']], mensaje['eventos'], mensaje['estadisticas']
+            )
+            self.aplicados += len(mensaje['eventos'])
+            if mensaje['huella'] is not None:
+                self.verificaciones += 1
+                coincide = huella(self.parking.obtener_estado()) == mensaje['huella']
+                self.discrepancias += not coincide
+        self.version = mensaje['version']
+        self.secuencia = mensaje['secuencia']
+        self.aplicacion.añadir((time.perf_counter() - t) * 1e6)
+        return {'tipo': "confirmado", 'secuencia': self.secuencia, 'coincide': coincide}
+
+    def estado(self):
+        return {
+            'secuencia': self.secuencia,
+            'version': self.version,
+            'eventos_aplicados': self.aplicados,
+            'verificaciones': self.verificaciones,
+            'discrepancias': self.discrepancias,
+            'aplicacion_p50_us': self.aplicacion.percentil(50),
+            'aplicacion_p99_us': self.aplicacion.percentil(99),
+        }
+
+def _replica_en_proceso(origen, clave, archivo, escuchando, promovida):
+    """Réplica de la prueba: al caer el primario se promueve y vuelca su estado"""
+    replica = Replica(origen, clave)
+    parking = replica.servir(escuchando)
+    promovida.value = (time.monotonic() - replica.ultimo_mensaje) * 1000
+    parking.guardar_estado(archivo)
+
+def prueba(capacidad, operaciones, sincrona, semilla):
+    """Tráfico sobre un primario con réplica en otro proceso, caída del primario y comparación"""
+    random.seed(semilla)
+    with tempfile.TemporaryDirectory() as carpeta:
+        origen = os.path.join(carpeta, "replica.sock")
+        archivo = os.path.join(carpeta, "replica.json")
+        escuchando, promovida = mp.Event(), mp.Value("d", -1.0)
+        proceso = mp.Process(target=_replica_en_proceso, args=(origen, CLAVE, archivo, escuchando, promovida))
+        proceso.start()
+        escuchando.wait()
+
+        inicio = datetime(2026, 1, 5, 8)
+        RELOJ.fijar(inicio)
+        try:
+            parking = Parking(capacidad)
+            replicador = Replicador(origen, sincrona=sincrona, verificacion=0.5).conectar(parking)
+            t = time.perf_counter()
+            for i in range(operaciones):
+                RELOJ.fijar(inicio + timedelta(seconds=i * 30))
+                if random.random() < 0.5 + 0.4 * (0.85 - parking._plazas.tasa_ocupacion()):
+                    parking.entrada()
+                else:
+                    parking.salida_aleatoria()
+            segundos = time.perf_counter() - t
+            replicador.cerrar(avisar=False)  # Como si el primario muriera: la réplica se promueve
+            proceso.join()
+        finally:
+            RELOJ.soltar()
+
+        replica, mensaje = Parking.cargar_estado(archivo)
+        if not replica:
+            raise SystemExit(f"❌ {mensaje}")
+        plazas, contadores = diferencias(parking, replica)
+        return {
+            'operaciones': operaciones,
+            'operaciones_por_segundo': operaciones / segundos,
+            'replicador': replicador.estado(),
+            'conmutacion_ms': promovida.value,
+            'plazas_distintas': len(plazas),
+            'contadores_distintos': contadores,
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Réplica en caliente del parking")
+    sub = parser.add_subparsers(dest="orden", required=True)
+
+    p = sub.add_parser("replica", help="Escucha al primario y se promueve si cae")
+    p.add_argument("--direccion", default=DIRECCION, help="host:puerto o ruta de socket Unix")
+    p.add_argument("--estado", metavar="ARCHIVO", help="Al promoverse, guarda aquí el estado")
+    p.add_argument("--interfaz", action="store_true", help="Al promoverse, abre la interfaz con el parking")
+
+    p = sub.add_parser("prueba", help="Primario y réplica locales, caída y comparación")
+    p.add_argument("--capacidad", type=int, default=2000)
+    p.add_argument("--operaciones", type=int, default=20000)
+    p.add_argument("--sincrona", action="store_true")
+    p.add_argument("--semilla", type=int, default=1234)
+
+    p = sub.add_parser("comprobar", help="Compara dos estados guardados (JSON o .snap)")
+    p.add_argument("archivos", nargs=2)
+    args = parser.parse_args()
+
+    if args.orden == "replica":
+        replica = Replica(args.direccion)
+        print(f"🪞 Réplica escuchando en {args.direccion}")
+        parking = replica.servir()
+        if parking is None:
+            raise SystemExit("❌ El primario cayó antes de enviar su estado")
+        t = time.monotonic()
+        print(f"🟢 Primario caído: réplica promovida {(t - replica.ultimo_mensaje)*1000:.0f}ms tras su último "
+              f"mensaje ({replica.estado()['eventos_aplicados']} eventos, versión {replica.version})")
+        if args.estado:
+            print(parking.guardar_estado(args.estado)[1])
+        if args.interfaz:
+            from parking_privado import InterfazParking
+            InterfazParking(parking).iniciar()
+    elif args.orden == "prueba":
+        r = prueba(args.capacidad, args.operaciones, args.sincrona, args.semilla)
+        e = r['replicador']
+        print(f"🔁 {r['operaciones']} operaciones ({r['operaciones_por_segundo']:.0f}/s, "
+              f"{'síncrona' if e['sincrona'] else 'asíncrona'}) | {e['confirmados']} lotes confirmados | "
+              f"retraso p50 {e['retraso_p50_ms'] or 0:.2f}ms / p99 {e['retraso_p99_ms'] or 0:.2f}ms")
+        print(f"🔍 {e['verificaciones']} verificaciones, {e['discrepancias']} discrepancias, "
+              f"{e['resincronizaciones']} sincronizaciones completas")
+        print(f"🟢 Conmutación {r['conmutacion_ms']:.0f}ms tras el último mensaje | "
+              f"plazas distintas: {r['plazas_distintas']} | contadores distintos: {r['contadores_distintos'] or 'ninguno'}")
+    else:
+        parkings = []
+        for archivo in args.archivos:
+            parking, mensaje = Parking.cargar_estado(archivo)
+            if not parking:
+                raise SystemExit(f"❌ {mensaje}")
+            parkings.append(parking)
+        plazas, contadores = diferencias(*parkings)
+        for pid, a, b in plazas[:20]:
+            print(f"   {pid}: {a.matricula if a.ocupada else 'libre'} ≠ {b.matricula if b and b.ocupada else 'libre'}")
+        for contador, (a, b) in contadores.items():
+            print(f"   {contador}: {a} ≠ {b}")
+        print(f"{'✅ Iguales' if not plazas and not contadores else '❌ Distintos'}: "
+              f"{len(plazas)} plazas y {len(contadores)} contadores difieren")
+        raise SystemExit(0 if not plazas and not contadores else 1)
+
+if __name__ == "__main__":
+    main()
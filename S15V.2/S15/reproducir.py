@@ -0,0 +1,299 @@
+"""Reproducción de trazas de tráfico sobre un Parking sin interfaz gráfica
+
+Acepta el parking.log de S15 o una traza estructurada JSONL (un evento por línea)
+y la lee en streaming, así que la memoria no depende del tamaño del archivo.
+
+Uso:
+    python reproducir.py ../../S15/parking.log
+    python reproducir.py traza.jsonl --velocidad 60      # 60 veces más rápido que en real
+    python reproducir.py ../../S15/parking.log --convertir traza.jsonl
+    python reproducir.py ../../S15/parking.log --plazas-traza --tarifa plana   # Mismo estado que la traza
+
+Formato JSONL:
+    {"momento": "2026-01-14T17:55:54", "evento": "entrada", "matricula": "2472YCF",
+     "tipo_vehiculo": "NORMAL", "plaza": "B5"}
+    evento ∈ inicio | entrada | rechazo | salida   (salida admite "precio")
+"""
+import argparse
+import json
+import re
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from parking_privado import (
+    Parking, PoliticaAsignacion, RELOJ, TIPOS_VEHICULO, CAPACIDAD_MAXIMA, PLAZAS_POR_FILA,
+    ASIGNACION, TARIFA, POLITICAS_ASIGNACION, POLITICAS_TARIFA, crear_politica
+)
+
+Evento = namedtuple(
+    "Evento",
+    ["momento", "evento", "matricula", "tipo_vehiculo", "plaza", "precio", "capacidad", "columnas"],
+    defaults=[None, None, None, None, None, None]
+)
+
+MAX_INTENTOS_PENDIENTES = 10000
+
+# ======================================================
+# LECTURA DE TRAZAS
+# ======================================================
+
+_LINEA_LOG = re.compile(r"^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d) - (.*)$")
+_INICIO = re.compile(r"SISTEMA INICIADO - Parking creado con (\d+) plazas \((\d+)x(\d+)\)")
+_INTENTO = re.compile(r"INTENTO DE ENTRADA - Veh\S*culo (\w+) \((\S+)\)")
+_EXITOSA = re.compile(r"ENTRADA EXITOSA - Veh\S*culo (\w+) estacionado en plaza (\w+)")
+_RECHAZADA = re.compile(r"ENTRADA RECHAZADA - Veh\S*culo (\w+)")
+_SALIDA = re.compile(r"SALIDA - Veh\S*culo (\w+) sale de plaza (\w+) - Tiempo: [\d.]+s - Tarifa: ([\d.]+)")
+
+def _tipo_vehiculo(texto):
+    if texto.startswith("MINUSV"):
+        return "MINUSVALIDO"
+    return texto if texto in TIPOS_VEHICULO else "NORMAL"
+
+def leer_log_s15(archivo):
+    """Genera eventos a partir de un parking.log de S15"""
+    intentos = {}  # matrícula -> tipo de vehículo, hasta conocer el resultado de la entrada
+    # El log se escribió con la codificación local; latin-1 nunca falla al decodificar
+    with open(archivo, 'r', encoding='latin-1') as f:
+        for linea in f:
+            m = _LINEA_LOG.match(linea.rstrip("\n"))
+            if not m:
+                continue
+            momento = datetime.strptime(m.group(1), "%Y-%m-%d %H:%M:%S")
+            mensaje = m.group(2)
+
+            if r := _INTENTO.match(mensaje):
+                intentos[r.group(1)] = _tipo_vehiculo(r.group(2))
+                if len(intentos) > MAX_INTENTOS_PENDIENTES:
+                    del intentos[next(iter(intentos))]
+            elif r := _EXITOSA.match(mensaje):
+                tipo = intentos.pop(r.group(1), "NORMAL")
+                yield Evento(momento, "entrada", r.group(1), tipo, r.group(2))
+            elif r := _RECHAZADA.match(mensaje):
+                tipo = intentos.pop(r.group(1), "NORMAL")
+                yield Evento(momento, "rechazo", r.group(1), tipo)
+            elif r := _SALIDA.match(mensaje):
+                yield Evento(momento, "salida", r.group(1), None, r.group(2), float(r.group(3)))
+            elif r := _INICIO.search(mensaje):
+                yield Evento(momento, "inicio", capacidad=int(r.group(1)), columnas=int(r.group(3)))
+
+def leer_jsonl(archivo):
+    """Genera eventos a partir de una traza JSONL"""
+    with open(archivo, 'r', encoding='utf-8') as f:
+        for linea in f:
+            if linea.strip():
+                datos = json.loads(linea)
+                datos['momento'] = datetime.fromisoformat(datos['momento'])
+                # Campos que no conoce esta versión (trazas de otras herramientas) se ignoran
+                yield Evento(**{k: v for k, v in datos.items() if k in Evento._fields})
+
+def leer_traza(archivo):
+    """Detecta el formato por el contenido de la primera línea"""
+    with open(archivo, 'r', encoding='latin-1') as f:
+        primera = f.readline().lstrip()
+    return leer_jsonl(archivo) if primera.startswith("{") else leer_log_s15(archivo)
+
+def escribir_jsonl(eventos, archivo):
+    n = 0
+    with open(archivo, 'w', encoding='utf-8') as f:
+        for evento in eventos:
+            datos = {k: v for k, v in evento._asdict().items() if v is not None}
+            datos['momento'] = evento.momento.isoformat()
+            f.write(json.dumps(datos, ensure_ascii=False) + "\n")
+            n += 1
+    return n
+
+# ======================================================
+# REPRODUCCIÓN
+# ======================================================
+
+class AsignacionTraza(PoliticaAsignacion):
+    """Política de la reproducción: anota qué plaza elegiría respaldo y, con seguir, usa la de la traza
+
+    Con seguir el coche va a la plaza de la traza si está libre, aunque aquí su
+    categoría no le corresponda (S15 sorteaba las plazas especiales en cada
+    arranque); si está ocupada o no hay plaza en la traza, decide respaldo.
+    """
+    nombre = "traza"
+
+    def __init__(self, respaldo=ASIGNACION, seguir=False):
+        self.respaldo = crear_politica(POLITICAS_ASIGNACION, respaldo)
+        self.indice_cercania = self.respaldo.indice_cercania
+        self.seguir = seguir
+        self.plaza = None       # Plaza de la traza para la entrada en curso
+        self.propuesta = None   # Plaza que eligió respaldo en la última asignación
+
+    def elegir(self, gestor, candidatas, preferido, carril):
+        propuesta = self.respaldo.elegir(gestor, candidatas, preferido, carril)
+        self.propuesta = gestor._plazas[propuesta].id if propuesta is not None else None
+        posicion = gestor._posicion.get(self.plaza) if self.seguir and self.plaza else None
+        if posicion is not None and not gestor._plazas[posicion].ocupada:
+            return posicion
+        return propuesta
+
+    def zonas(self, gestor, candidatas, preferido, carril):
+        return self.respaldo.zonas(gestor, candidatas, preferido, carril)
+
+class Reproductor:
+    """Aplica una traza a un Parking con el reloj de la traza y mide divergencias
+
+    Las divergencias son de estado: lo reproducido no coincide con la traza.
+    asignacion_distinta cuenta aparte las entradas en las que la política de
+    asignación habría elegido otra plaza; sin plazas_traza coincide con
+    plaza_distinta, con plazas_traza el coche va a la plaza de la traza.
+    """
+    def __init__(self, parking=None, velocidad=None, capacidad=None, columnas=None, tarifa_dinamica=False,
+                 asignacion=ASIGNACION, tarifa=TARIFA, plazas_traza=False):
+        self.parking = parking
+        self.tarifa_dinamica = tarifa_dinamica  # Las trazas de S15 se cobraron con tarifa fija
+        self.tarifa = tarifa
+        self.asignacion = AsignacionTraza(asignacion, plazas_traza)
+        self.velocidad = velocidad  # None = lo más rápido posible
+        self._capacidad = capacidad
+        self._columnas = columnas
+        self.contadores = {
+            'eventos': 0,
+            'entradas': 0,
+            'entradas_rechazadas': 0,   # En la traza entró, aquí no
+            'rechazos': 0,
+            'rechazos_admitidos': 0,    # En la traza se rechazó, aquí entró
+            'plaza_distinta': 0,        # Aparcó en otra plaza que en la traza
+            'asignacion_distinta': 0,   # La política habría elegido otra plaza que la traza
+            'salidas': 0,
+            'salidas_sin_coche': 0,     # El coche no está en el parking reproducido
+            'salidas_sin_cobro': 0,     # Estancia por debajo del mínimo
+            'cobro_distinto': 0,        # Cobrado aquí distinto que en la traza
+        }
+        # Contadores que cuentan como divergencia respecto a la traza
+        self.divergentes = ('entradas_rechazadas', 'rechazos_admitidos', 'plaza_distinta',
+                            'salidas_sin_coche', 'cobro_distinto')
+        self.recaudacion_original = 0.0
+
+    def _crear_parking(self, evento):
+        capacidad = self._capacidad or evento.capacidad or CAPACIDAD_MAXIMA
+        columnas = self._columnas or evento.columnas or PLAZAS_POR_FILA
+        self.parking = Parking(capacidad, columnas, self.tarifa_dinamica,
+                               asignacion=self.asignacion, tarifa=self.tarifa)
+
+    def _aplicar(self, evento):
+        c = self.contadores
+        if evento.evento == "inicio":
+            return
+
+        if evento.evento in ("entrada", "rechazo"):
+            self.asignacion.plaza = evento.plaza
+            self.asignacion.propuesta = None
+            exito, _ = self.parking.entrada(matricula=evento.matricula, tipo=evento.tipo_vehiculo)
+            self.asignacion.plaza = None  # Los coches de la cola que entren después deciden con respaldo
+            if evento.evento == "entrada":
+                c['entradas'] += 1
+                if not exito:
+                    c['entradas_rechazadas'] += 1
+                elif evento.plaza:
+                    plaza = self.parking.localizar(evento.matricula).id
+                    # Con un parking ajeno la política no es la nuestra: solo se ve la plaza final
+                    propuesta = self.asignacion.propuesta or plaza
+                    c['plaza_distinta'] += plaza != evento.plaza
+                    c['asignacion_distinta'] += propuesta != evento.plaza
+            else:
+                c['rechazos'] += 1
+                if exito:
+                    c['rechazos_admitidos'] += 1
+
+        elif evento.evento == "salida":
+            c['salidas'] += 1
+            self.recaudacion_original += evento.precio or 0.0
+            plaza = self.parking.localizar(evento.matricula)
+            if not plaza:
+                c['salidas_sin_coche'] += 1
+                return
+            antes = self.parking.obtener_estadisticas()['recaudacion_total']
+            exito, _ = self.parking.salida(plaza.id)
+            if not exito:
+                c['salidas_sin_cobro'] += 1
+            # Una estancia corta que la traza tampoco cobró no diverge
+            cobrado = self.parking.obtener_estadisticas()['recaudacion_total'] - antes
+            if evento.precio is not None and abs(cobrado - evento.precio) >= 0.005:
+                c['cobro_distinto'] += 1
+
+    def reproducir(self, eventos):
+        """Reproduce los eventos y devuelve el informe"""
+        inicio_real = time.perf_counter()
+        anterior = None
+        try:
+            for evento in eventos:
+                if self.velocidad and anterior is not None:
+                    espera = (evento.momento - anterior).total_seconds() / self.velocidad
+                    if espera > 0:
+                        time.sleep(espera)
+                anterior = evento.momento
+
+                RELOJ.fijar(evento.momento)
+                if self.parking is None:
+                    self._crear_parking(evento)
+                self._aplicar(evento)
+                self.contadores['eventos'] += 1
+        finally:
+            RELOJ.soltar()
+        return self.informe(time.perf_counter() - inicio_real)
+
+    def informe(self, segundos):
+        c = self.contadores
+        stats = self.parking.obtener_estadisticas() if self.parking else {'recaudacion_total': 0.0}
+        divergencias = sum(c[nombre] for nombre in self.divergentes)
+        return {
+            **c,
+            'divergencias': divergencias,
+            'segundos': segundos,
+            'eventos_por_segundo': c['eventos'] / segundos if segundos else None,
+            'recaudacion_original': round(self.recaudacion_original, 2),
+            'recaudacion_reproducida': round(stats['recaudacion_total'], 2),
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproduce una traza de tráfico sobre el parking")
+    parser.add_argument("traza", help="parking.log de S15 o traza JSONL")
+    parser.add_argument("--velocidad", type=float, default=None,
+                        help="Factor de velocidad respecto al tiempo real (por defecto, sin esperas)")
+    parser.add_argument("--capacidad", type=int, default=None, help="Plazas del parking reproducido")
+    parser.add_argument("--columnas", type=int, default=None, help="Plazas por fila")
+    parser.add_argument("--convertir", metavar="SALIDA", help="Solo convierte la traza a JSONL")
+    parser.add_argument("--json", action="store_true", help="Imprime el informe en JSON")
+    parser.add_argument("--tarifa-dinamica", action="store_true",
+                        help="Cobra con tarifa dinámica en lugar de la fija con la que se grabó la traza")
+    parser.add_argument("--tarifa", choices=list(POLITICAS_TARIFA), default=TARIFA,
+                        help="Política de tarifa (plana = la de S15)")
+    parser.add_argument("--asignacion", choices=list(POLITICAS_ASIGNACION), default=ASIGNACION,
+                        help="Política de asignación que se compara con las plazas de la traza")
+    parser.add_argument("--plazas-traza", action="store_true",
+                        help="Aparca cada coche en la plaza de la traza para reproducir su estado")
+    args = parser.parse_args()
+
+    if args.convertir:
+        n = escribir_jsonl(leer_traza(args.traza), args.convertir)
+        print(f"💾 {n} eventos escritos en {args.convertir}")
+        return
+
+    reproductor = Reproductor(velocidad=args.velocidad, capacidad=args.capacidad, columnas=args.columnas,
+                              tarifa_dinamica=args.tarifa_dinamica, asignacion=args.asignacion,
+                              tarifa=args.tarifa, plazas_traza=args.plazas_traza)
+    informe = reproductor.reproducir(leer_traza(args.traza))
+
+    if args.json:
+        print(json.dumps(informe, indent=2))
+        return
+    print(f"▶️ {informe['eventos']} eventos en {informe['segundos']:.3f}s "
+          f"({informe['eventos_por_segundo'] or 0:.0f} eventos/s)")
+    print(f"🚗 Entradas: {informe['entradas']} (rechazadas aquí: {informe['entradas_rechazadas']}, "
+          f"otra plaza: {informe['plaza_distinta']})")
+    print(f"🧭 Asignación {args.asignacion}: otra plaza que la traza en {informe['asignacion_distinta']} entradas")
+    print(f"❌ Rechazos: {informe['rechazos']} (admitidos aquí: {informe['rechazos_admitidos']})")
+    print(f"🚪 Salidas: {informe['salidas']} (sin coche: {informe['salidas_sin_coche']}, "
+          f"sin cobro: {informe['salidas_sin_cobro']}, cobro distinto: {informe['cobro_distinto']})")
+    print(f"💰 Recaudación: original {informe['recaudacion_original']:.2f}€, "
+          f"reproducida {informe['recaudacion_reproducida']:.2f}€")
+    detalle = ', '.join(f'{n}: {informe[n]}' for n in reproductor.divergentes if informe[n])
+    print(f"⚠️ Divergencias: {informe['divergencias']}" + (f" ({detalle})" if detalle else ""))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""Servidor local para las barreras: API sobre TCP con asyncio
+
+Protocolo: una petición JSON por línea y una respuesta JSON por línea, en el
+mismo orden. Las conexiones son persistentes y admiten peticiones encadenadas
+(el cliente puede enviar varias sin esperar respuesta); el campo "id" de la
+petición se devuelve tal cual para casarlas.
+
+    {"id": 1, "op": "entrada", "matricula": "1234ABC", "tipo": "NORMAL", "reserva": false}
+    {"id": 2, "op": "salida", "plaza": "B5"}            (o "matricula")
+    {"id": 3, "op": "estado"}                          (con "plaza" devuelve solo esa)
+    {"id": 4, "op": "cotizar", "tipo": "ELECTRICO"}    (admite "matricula" y "carril")
+
+    {"id": 1, "ok": true, "mensaje": "🚗 1234ABC → B5 (EXTERIOR)", "plaza": "B5"}
+
+Al entrar se puede indicar "carril" (entero: la barrera asigna la plaza libre más
+cercana) y, los eléctricos, "nivel_bateria" (número entre 0 y 1). Una petición mal
+formada o que falle dentro del motor se responde con "ok": false; la conexión
+sigue abierta.
+
+"cotizar" devuelve el precio de la zona que le tocaría al coche si entrase ahora
+(o de las zonas posibles si la plaza se elige al azar); vacío si no hay plaza.
+
+Las operaciones del motor duran microsegundos y se ejecutan en el propio bucle:
+pasarlas a un hilo costaría más que la operación.
+
+Uso:
+    python servidor.py --puerto 8765 --capacidad 1000 [--simulacion] [--tarifa-dinamica]
+"""
+import argparse
+import asyncio
+import json
+import sys
+import traceback
+
+try:
+    import resource
+except ImportError:  # Windows: el límite de descriptores no se toca
+    resource = None
+
+from parking_privado import (
+    Parking, SimulacionTrafico, CAPACIDAD_MAXIMA, TIPOS_VEHICULO, METRICAS, PERFIL, PerfilMuestreo, medido
+)
+
+PUERTO = 8765
+MAX_LINEA = 64 * 1024
+
+def _es_numero(valor):
+    # bool es subclase de int, pero true/false no son números en el protocolo
+    return isinstance(valor, (int, float)) and not isinstance(valor, bool)
+
+class ServidorParking:
+    """Atiende peticiones JSON de las barreras sobre un Parking"""
+    def __init__(self, parking):
+        self.parking = parking
+        self.conexiones = 0
+        self.peticiones = 0
+        self._operaciones = {
+            "entrada": self._entrada,
+            "salida": self._salida,
+            "estado": self._estado,
+            "cotizar": self._cotizar,
+        }
+
+    @staticmethod
+    def _validar_coche(peticion):
+        """Respuesta de error si "matricula" o "carril" no son válidos; None si lo son"""
+        matricula = peticion.get("matricula")
+        if matricula is not None and (not isinstance(matricula, str) or not matricula.strip()):
+            return {"ok": False, "mensaje": f"Matrícula inválida: {matricula!r}"}
+        carril = peticion.get("carril")
+        if carril is not None and not (_es_numero(carril) and isinstance(carril, int)):
+            return {"ok": False, "mensaje": f"Carril inválido: {carril!r} (debe ser un entero)"}
+        return None
+
+    def _entrada(self, peticion):
+        tipo = peticion.get("tipo")
+        if tipo is not None and tipo not in TIPOS_VEHICULO:
+            return {"ok": False, "mensaje": f"Tipo de vehículo desconocido: {tipo}"}
+        error = self._validar_coche(peticion)
+        if error:
+            return error
+        matricula, carril = peticion.get("matricula"), peticion.get("carril")
+        nivel = peticion.get("nivel_bateria")
+        if nivel is not None and not (_es_numero(nivel) and 0 <= nivel <= 1):
+            return {"ok": False, "mensaje": f"Nivel de batería inválido: {nivel!r} (debe estar entre 0 y 1)"}
+        exito, mensaje = self.parking.entrada(
+            reserva=bool(peticion.get("reserva")), matricula=matricula, tipo=tipo,
+            nivel_bateria=None if nivel is None else float(nivel), carril=carril
+        )
+        respuesta = {"ok": exito, "mensaje": mensaje}
+        if exito and matricula:
+            plaza = self.parking.localizar(matricula)
+            respuesta["plaza"] = plaza.id if plaza else None
+        return respuesta
+
+    def _salida(self, peticion):
+        pid = peticion.get("plaza")
+        if pid is not None and not isinstance(pid, str):
+            return {"ok": False, "mensaje": f"Plaza inválida: {pid!r}"}
+        if pid is None and peticion.get("matricula"):
+            plaza = self.parking.localizar(peticion["matricula"])
+            if not plaza:
+                return {"ok": False, "mensaje": f"{peticion['matricula']} no está en el parking"}
+            pid = plaza.id
+        exito, mensaje = self.parking.salida(pid)
+        return {"ok": exito, "mensaje": mensaje, "plaza": pid}
+
+    def _estado(self, peticion):
+        estado = self.parking.obtener_estado()
+        if peticion.get("plaza"):
+            for plaza in estado:
+                if plaza.id == peticion["plaza"]:
+                    datos = plaza._asdict()
+                    datos["entrada"] = plaza.entrada.isoformat() if plaza.entrada else None
+                    return {"ok": True, "plaza": datos}
+            return {"ok": False, "mensaje": f"Plaza desconocida: {peticion['plaza']}"}
+        return {
+            "ok": True,
+            "version": estado.version,
+            "capacidad": len(estado),
+            "libres": self.parking._plazas.libres_por_tipo(),
+            "cola": self.parking.obtener_info_cola(),
+            "estadisticas": self.parking.obtener_estadisticas(),
+            "carga": self.parking.obtener_info_carga(),
+        }
+
+    def _cotizar(self, peticion):
+        tipo = peticion.get("tipo", "NORMAL")
+        if tipo not in TIPOS_VEHICULO:
+            return {"ok": False, "mensaje": f"Tipo de vehículo desconocido: {tipo}"}
+        error = self._validar_coche(peticion)
+        if error:
+            return error
+        cotizacion = self.parking.cotizar(tipo, peticion.get("matricula"), peticion.get("carril"))
+        return {
+            "ok": True,
+            "tarifas": {
+                zona: {"precio_hora": precio, "factor": factor}
+                for zona, (precio, factor) in cotizacion.items()
+            },
+        }
+
+    @medido("api")
+    def procesar(self, linea):
+        """Procesa una línea de petición y devuelve la línea de respuesta"""
+        self.peticiones += 1
+        try:
+            peticion = json.loads(linea)
+        except ValueError as e:
+            return self._responder({"ok": False, "mensaje": f"Petición inválida: {e}", "id": None})
+        if not isinstance(peticion, dict):
+            return self._responder({"ok": False, "mensaje": "Petición inválida: se esperaba un objeto", "id": None})
+
+        try:
+            op = peticion.get("op")
+            operacion = self._operaciones.get(op) if isinstance(op, str) else None
+            if operacion is None:
+                respuesta = {"ok": False, "mensaje": f"Operación desconocida: {op}"}
+            else:
+                respuesta = operacion(peticion)
+        except Exception as e:
+            # Un fallo atendiendo una petición no debe cerrar la conexión (ni las
+            # demás peticiones encadenadas): se registra y se responde
+            METRICAS.contar("api_error")
+            print(f"⚠️ Error atendiendo {linea[:200]!r}", file=sys.stderr)
+            traceback.print_exc()
+            respuesta = {"ok": False, "mensaje": f"Error interno: {type(e).__name__}: {e}"}
+        respuesta["id"] = peticion.get("id")
+        return self._responder(respuesta)
+
+    @staticmethod
+    def _responder(respuesta):
+        return (json.dumps(respuesta, ensure_ascii=False) + "\n").encode("utf-8")
+
+    async def atender(self, reader, writer):
+        self.conexiones += 1
+        METRICAS.nivel("conexiones", self.conexiones)
+        pendiente = b""
+        try:
+            while True:
+                datos = await reader.read(MAX_LINEA)
+                if not datos:
+                    break
+                # Todas las peticiones encadenadas que ya han llegado se responden
+                # con una sola escritura
+                lineas = (pendiente + datos).split(b"\n")
+                pendiente = lineas.pop()
+                if len(pendiente) > MAX_LINEA:
+                    break
+                respuestas = [self.procesar(linea) for linea in lineas if linea.strip()]
+                if respuestas:
+                    writer.write(b"".join(respuestas))
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.conexiones -= 1
+            METRICAS.nivel("conexiones", self.conexiones)
+            writer.close()
+
+    async def servir(self, host="127.0.0.1", puerto=PUERTO, listo=None):
+        servidor = await asyncio.start_server(self.atender, host, puerto, limit=MAX_LINEA, backlog=4096)
+        if listo:
+            listo.set()
+        async with servidor:
+            await servidor.serve_forever()
+
+def ampliar_descriptores():
+    """Sube el límite de archivos abiertos al máximo permitido: cada barrera es un socket"""
+    if resource is None:
+        return None
+    blando, duro = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if duro != resource.RLIM_INFINITY and blando < duro:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (duro, duro))
+        return duro
+    return blando
+
+def servir(host="127.0.0.1", puerto=PUERTO, capacidad=CAPACIDAD_MAXIMA, simulacion=False, listo=None,
+           tarifa_dinamica=False):
+    """Crea el parking y atiende hasta que se interrumpa (también como destino de un proceso)"""
+    ampliar_descriptores()
+    parking = Parking(capacidad, tarifa_dinamica=tarifa_dinamica)
+    if simulacion:
+        SimulacionTrafico(parking).iniciar()
+    try:
+        asyncio.run(ServidorParking(parking).servir(host, puerto, listo))
+    except KeyboardInterrupt:
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="API local de barreras del parking")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=PUERTO)
+    parser.add_argument("--capacidad", type=int, default=CAPACIDAD_MAXIMA)
+    parser.add_argument("--simulacion", action="store_true", help="Mantiene también los carriles simulados")
+    parser.add_argument("--estado", metavar="ARCHIVO", help="Arranca desde un estado guardado")
+    parser.add_argument("--tarifa-dinamica", action="store_true",
+                        help="Descuento en zonas vacías y recargo cerca del lleno y con cola")
+    parser.add_argument("--metricas", metavar="ARCHIVO", help="Vuelca la instrumentación en ARCHIVO cada 10s")
+    parser.add_argument("--perfil", metavar="ARCHIVO",
+                        help="Perfil por muestreo en formato plegado; kill -USR1 lo inicia, lo para y lo vuelca")
+    parser.add_argument("--perfil-hz", metavar="HZ", type=int, default=PerfilMuestreo.HZ)
+    args = parser.parse_args()
+
+    ampliar_descriptores()
+    if args.metricas:
+        METRICAS.activar()
+        METRICAS.exportar_periodicamente(args.metricas)
+    if args.perfil:
+        # Arranca parado: se enciende con la señal cuando el sitio va lento
+        PERFIL.hz = args.perfil_hz
+        PERFIL.alternar_con_senal(args.perfil)
+
+    parking = Parking(args.capacidad, tarifa_dinamica=args.tarifa_dinamica)
+    if args.estado:
+        parking, mensaje = Parking.cargar_estado(args.estado)
+        print(mensaje)
+        if not parking:
+            raise SystemExit(1)
+        parking._tarifas.dinamica = args.tarifa_dinamica  # El estado guardado no la incluye
+    if args.simulacion:
+        SimulacionTrafico(parking).iniciar()
+    print(f"🔌 Escuchando en {args.host}:{args.puerto} ({len(parking.obtener_estado())} plazas)")
+    PERFIL.etiquetar("barreras")  # El bucle asyncio atiende todas las conexiones
+    try:
+        asyncio.run(ServidorParking(parking).servir(args.host, args.puerto))
+    except KeyboardInterrupt:
+        pass
+    if PERFIL.activo:
+        PERFIL.alternar(args.perfil)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Simulación del recorrido desde la barrera hasta la plaza según la política de asignación
+
+Pasa el mismo tráfico sintético (misma semilla, reloj simulado, llegadas según
+PATRONES_TRAFICO y repartidas entre los carriles) por dos parkings: uno que asigna
+una plaza compatible al azar y otro que da la libre más cercana al carril. Mide los
+metros recorridos hasta la plaza y el tiempo que cuesta cada asignación.
+
+Uso:
+    python simulacion_asignacion.py --dias 2 --capacidad 1000 --columnas 40
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from parking_privado import Parking, Histograma, RELOJ, NUM_CARRILES_ENTRADA, PLAZAS_POR_FILA
+
+PASO_SEGUNDOS = 30
+OCUPACION_OBJETIVO = 0.7   # Las salidas compensan las llegadas alrededor de esta ocupación
+ESTANCIA_MEDIA = 150       # Minutos
+VELOCIDAD_KMH = 10         # Dentro del parking
+TIPOS = ["NORMAL", "MINUSVALIDO", "MOTO", "ELECTRICO"]
+PESOS_TIPOS = [0.5, 0.2, 0.15, 0.15]
+
+def simular(asignacion, dias, capacidad, columnas, semilla, inicio):
+    """Recorre los días con el reloj fijado y devuelve las distancias a las plazas asignadas"""
+    random.seed(semilla)
+    trafico = random.Random(semilla)  # Mismo tráfico con las dos políticas
+    parking = Parking(capacidad, columnas, asignacion=asignacion)
+    distancias = Histograma()
+    dentro = []
+    llegadas = 0
+    segundos_asignacion = 0.0
+    # Llegadas por paso para mantener la ocupación objetivo con la estancia media
+    llegadas_por_paso = capacidad * OCUPACION_OBJETIVO / (ESTANCIA_MEDIA * 60 / PASO_SEGUNDOS)
+    try:
+        for paso in range(int(dias * 86400 / PASO_SEGUNDOS)):
+            RELOJ.fijar(inicio + timedelta(seconds=paso * PASO_SEGUNDOS))
+            esperadas = llegadas_por_paso * parking._obtener_multiplicador_trafico()
+            for _ in range(int(esperadas) + (trafico.random() < esperadas % 1)):
+                llegadas += 1
+                matricula = f"S{llegadas:07d}"
+                carril = trafico.randrange(NUM_CARRILES_ENTRADA)
+                tipo = trafico.choices(TIPOS, weights=PESOS_TIPOS)[0]
+                t = time.perf_counter()
+                exito, _ = parking.entrada(matricula=matricula, tipo=tipo, carril=carril)
+                segundos_asignacion += time.perf_counter() - t
+                if exito:
+                    plaza = parking.localizar(matricula)
+                    distancias.añadir(parking._plazas.distancia(plaza.id, carril))
+                    dentro.append(matricula)
+            # Salidas: cada coche dentro sale con la probabilidad de una estancia media de ESTANCIA_MEDIA
+            esperadas = len(dentro) * PASO_SEGUNDOS / (ESTANCIA_MEDIA * 60)
+            for _ in range(min(int(esperadas) + (trafico.random() < esperadas % 1), len(dentro))):
+                i = trafico.randrange(len(dentro))
+                dentro[i], dentro[-1] = dentro[-1], dentro[i]
+                plaza = parking.localizar(dentro.pop())
+                if plaza:
+                    parking.salida(plaza.id)
+    finally:
+        RELOJ.soltar()
+
+    media = distancias.media() or 0.0
+    return {
+        'asignacion': asignacion,
+        'llegadas': llegadas,
+        'entradas': distancias.cuenta,
+        'distancia_media_m': media,
+        'distancia_p50_m': distancias.percentil(50),
+        'distancia_p95_m': distancias.percentil(95),
+        'segundos_conduccion_medios': media / (VELOCIDAD_KMH / 3.6),
+        'asignacion_us': segundos_asignacion / max(llegadas, 1) * 1e6,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara la distancia recorrida con asignación aleatoria y cercana")
+    parser.add_argument("--dias", type=float, default=2)
+    parser.add_argument("--capacidad", type=int, default=1000)
+    parser.add_argument("--columnas", type=int, default=PLAZAS_POR_FILA, help="Plazas por fila")
+    parser.add_argument("--semilla", type=int, default=1234)
+    parser.add_argument("--json", action="store_true", help="Imprime el informe en JSON")
+    args = parser.parse_args()
+
+    inicio = datetime(2026, 1, 5)  # Un lunes a medianoche
+    resultados = [
+        simular(asignacion, args.dias, args.capacidad, args.columnas, args.semilla, inicio)
+        for asignacion in ("aleatoria", "cercana")
+    ]
+
+    if args.json:
+        print(json.dumps(resultados, indent=2, ensure_ascii=False))
+        return
+    for r in resultados:
+        print(f"🚗 Asignación {r['asignacion']}: {r['entradas']}/{r['llegadas']} entradas | "
+              f"distancia media {r['distancia_media_m']:.1f}m (p50 {r['distancia_p50_m']:.1f}m, "
+              f"p95 {r['distancia_p95_m']:.1f}m) | {r['segundos_conduccion_medios']:.1f}s al volante | "
+              f"{r['asignacion_us']:.1f}µs por entrada")
+    aleatoria, cercana = resultados
+    if aleatoria['distancia_media_m']:
+        cambio = (cercana['distancia_media_m'] - aleatoria['distancia_media_m']) / aleatoria['distancia_media_m']
+        print(f"📉 Recorrido con asignación cercana: {cambio*100:+.1f}%")
+
+if __name__ == "__main__":
+    main()
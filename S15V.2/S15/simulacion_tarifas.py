@@ -0,0 +1,96 @@
+"""Simulación del impacto de la tarifa dinámica en la recaudación
+
+Pasa el mismo tráfico sintético (misma semilla, reloj simulado, llegadas según
+PATRONES_TRAFICO) por dos parkings: uno con tarifa fija y otro con dinámica. En
+la barrera cada conductor ve la cotización y desiste con más probabilidad cuanto
+más sube el precio respecto a la tarifa fija (elasticidad).
+
+Uso:
+    python simulacion_tarifas.py --dias 7 --capacidad 56 --elasticidad 1.5
+"""
+import argparse
+import json
+import random
+from datetime import datetime, timedelta
+
+from parking_privado import Parking, RELOJ, TIPOS_PARKING, CAPACIDAD_MAXIMA
+
+PASO_SEGUNDOS = 30
+LLEGADAS_POR_MINUTO = 1.2  # Con multiplicador de tráfico 1
+SALIDAS_POR_MINUTO = 1.0   # Intentos de salida_aleatoria
+TIPOS = ["NORMAL", "MINUSVALIDO", "MOTO", "ELECTRICO"]
+PESOS_TIPOS = [0.5, 0.2, 0.15, 0.15]
+
+def simular(dinamica, dias, capacidad, elasticidad, semilla, inicio):
+    """Recorre los días con el reloj fijado y devuelve el resumen del parking"""
+    random.seed(semilla)
+    parking = Parking(capacidad, tarifa_dinamica=dinamica)
+    resumen = {'llegadas': 0, 'desistidos': 0, 'muestras_ocupacion': 0, 'suma_ocupacion': 0.0}
+    p_llegada = LLEGADAS_POR_MINUTO * PASO_SEGUNDOS / 60
+    p_salida = SALIDAS_POR_MINUTO * PASO_SEGUNDOS / 60
+    try:
+        for paso in range(int(dias * 86400 / PASO_SEGUNDOS)):
+            RELOJ.fijar(inicio + timedelta(seconds=paso * PASO_SEGUNDOS))
+            if random.random() < p_llegada * parking._obtener_multiplicador_trafico():
+                resumen['llegadas'] += 1
+                tipo = random.choices(TIPOS, weights=PESOS_TIPOS)[0]
+                # El conductor ve la zona que le tocaría (la más barata si puede tocarle más de una)
+                # y la compara con lo que pagaría con tarifa fija
+                factor = min((factor for _, factor in parking.cotizar(tipo).values()), default=1.0)
+                if random.random() < min(1.0, factor ** -elasticidad):
+                    parking.entrada(tipo=tipo)
+                else:
+                    resumen['desistidos'] += 1
+            if random.random() < p_salida:
+                parking.salida_aleatoria()
+            resumen['muestras_ocupacion'] += 1
+            resumen['suma_ocupacion'] += parking._plazas.tasa_ocupacion()
+    finally:
+        RELOJ.soltar()
+
+    stats = parking.obtener_estadisticas()
+    return {
+        'tarifa': "dinámica" if dinamica else "fija",
+        'recaudacion': round(stats['recaudacion_total'], 2),
+        'entradas': stats['total_entradas'],
+        'salidas': stats['total_salidas'],
+        'rechazos': stats['rechazos'],
+        'llegadas': resumen['llegadas'],
+        'desistidos': resumen['desistidos'],
+        'ocupacion_media': resumen['suma_ocupacion'] / max(resumen['muestras_ocupacion'], 1),
+        'recaudacion_por_zona': {
+            zona: round(parking.total("precio", tipo_parking=zona), 2) for zona in TIPOS_PARKING
+        },
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara la recaudación con tarifa fija y dinámica")
+    parser.add_argument("--dias", type=float, default=7)
+    parser.add_argument("--capacidad", type=int, default=CAPACIDAD_MAXIMA)
+    parser.add_argument("--elasticidad", type=float, default=1.5,
+                        help="Sensibilidad de la demanda al precio (0 = nadie desiste)")
+    parser.add_argument("--semilla", type=int, default=1234)
+    parser.add_argument("--json", action="store_true", help="Imprime el informe en JSON")
+    args = parser.parse_args()
+
+    inicio = datetime(2026, 1, 5)  # Un lunes a medianoche
+    resultados = [
+        simular(dinamica, args.dias, args.capacidad, args.elasticidad, args.semilla, inicio)
+        for dinamica in (False, True)
+    ]
+
+    if args.json:
+        print(json.dumps(resultados, indent=2, ensure_ascii=False))
+        return
+    fija, dinamica = resultados
+    for r in resultados:
+        print(f"💶 Tarifa {r['tarifa']}: {r['recaudacion']:.2f}€ | entradas {r['entradas']} | "
+              f"rechazos {r['rechazos']} | desistidos {r['desistidos']} | "
+              f"ocupación media {r['ocupacion_media']*100:.1f}%")
+        print("   " + " | ".join(f"{zona}: {total:.2f}€" for zona, total in r['recaudacion_por_zona'].items()))
+    if fija['recaudacion']:
+        cambio = (dinamica['recaudacion'] - fija['recaudacion']) / fija['recaudacion']
+        print(f"📈 Impacto de la tarifa dinámica: {cambio*100:+.1f}% de recaudación")
+
+if __name__ == "__main__":
+    main()
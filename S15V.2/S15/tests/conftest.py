@@ -0,0 +1,45 @@
+import os
+import random
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parking_privado import RELOJ, GestorPlazas, Plaza  # noqa: E402
+
+AHORA = datetime(2026, 3, 2, 12, 0, 0)  # Lunes a mediodía: factor horario 1.0
+
+@pytest.fixture(autouse=True)
+def reloj():
+    """Reloj fijado y semilla fija: las pruebas no dependen de la hora ni del azar"""
+    random.seed(1234)
+    RELOJ.fijar(AHORA)
+    yield RELOJ
+    RELOJ.soltar()
+
+def plazas_fila(tipos, minusvalido=(), electricas=()):
+    """Una fila A1..An con la zona de cada plaza; minusvalido y electricas son ids"""
+    return [
+        Plaza(f"A{i}", tipo, f"A{i}" in minusvalido, f"A{i}" in electricas)
+        for i, tipo in enumerate(tipos, 1)
+    ]
+
+def comprobar_indices(gestor):
+    """Los índices incrementales de GestorPlazas coinciden con recalcularlos desde las plazas"""
+    plazas = list(gestor.estado())
+    ocupadas = [p for p in plazas if p.ocupada]
+    assert gestor.num_ocupadas() == len(ocupadas)
+    assert len(gestor.registro) == len(ocupadas)
+    for clave, conjunto in gestor._libres.items():
+        esperadas = {
+            i for i, p in enumerate(plazas)
+            if not p.ocupada and (p.tipo_parking, GestorPlazas._categoria(p)) == clave
+        }
+        assert {conjunto[i] for i in range(len(conjunto))} == esperadas
+    for tipo, libres in gestor.libres_por_tipo().items():
+        assert libres == sum(1 for p in plazas if p.tipo_parking == tipo and not p.ocupada)
+    for plaza in ocupadas:
+        assert gestor.localizar(plaza.coche.matricula) is plaza
+    assert [tuple(e) for e in gestor.instantanea()] == [tuple(p.instantanea()) for p in plazas]
@@ -0,0 +1,153 @@
+import json
+import os
+import random
+from datetime import timedelta
+
+import pytest
+
+from archivado import (
+    Archivador, Segmento, _de_varints, _de_zigzag, _varints, _zigzag, escribir_segmento
+)
+from conftest import AHORA
+from historico import _a_micros
+
+def _eventos(n, semilla=1):
+    """Eventos como los que notifica Parking, uno cada pocos segundos"""
+    azar = random.Random(semilla)
+    momento = AHORA
+    for i in range(n):
+        momento += timedelta(seconds=azar.randint(0, 30))
+        evento = azar.choice(["entrada", "salida", "rechazo", "encolado"])
+        yield {
+            'evento': evento,
+            'momento': momento,
+            'matricula': f"{azar.randint(1000, 9999)}{'X' * azar.randint(3, 12)}",
+            'tipo_vehiculo': azar.choice(["NORMAL", "MINUSVALIDO", "MOTO", "ELECTRICO"]),
+            'tipo_parking': azar.choice(["AREA_PRIVADA", "SUBTERRANEO", "EXTERIOR"]),
+            'plaza': f"A{azar.randint(1, 300)}",
+            'precio': round(azar.uniform(0, 50), 2) if evento == "salida" else 0.0,
+            'duracion': round(azar.uniform(120, 9000), 3) if evento == "salida" else 0.0,
+            'ocupadas': azar.randint(0, 300),
+        }
+
+def _clave(registro):
+    return (registro.momento, registro.evento, registro.matricula, registro.plaza)
+
+# ======================================================
+# VARINTS Y SEGMENTOS DEL ARCHIVO
+# ======================================================
+
+def test_varints_y_zigzag_ida_y_vuelta():
+    valores = [0, 1, 127, 128, 300, 2 ** 32, 2 ** 63 - 1]
+    assert _de_varints(_varints(valores)) == valores
+    assert len(_varints([127])) == 1 and len(_varints([128])) == 2
+    for v in (0, -1, 1, -64, 64, -2 ** 40, 2 ** 40):
+        assert _de_zigzag(_zigzag(v)) == v
+        assert _zigzag(v) >= 0
+
+@pytest.mark.parametrize("compresion", ["zlib", "lzma"])
+def test_segmento_ida_y_vuelta(tmp_path, compresion):
+    eventos = list(_eventos(500))
+    archivador = Archivador(str(tmp_path), compresion=compresion, max_filas=10 ** 6)
+    for evento in eventos:
+        archivador.añadir(evento)
+    ruta = archivador.sellar()
+    archivador.cerrar()
+
+    segmento = Segmento(ruta)
+    assert len(segmento) == len(eventos)
+    for i, evento in enumerate(eventos):
+        fila = segmento.fila(i)
+        assert fila.momento == evento['momento']
+        assert (fila.evento, fila.matricula, fila.plaza) == (evento['evento'], evento['matricula'], evento['plaza'])
+        assert (fila.tipo_vehiculo, fila.tipo_parking) == (evento['tipo_vehiculo'], evento['tipo_parking'])
+        assert fila.precio == pytest.approx(evento['precio'])
+        assert fila.duracion == pytest.approx(evento['duracion'])
+        assert fila.ocupadas == evento['ocupadas']
+
+def test_segmento_bloom_sin_falsos_negativos(tmp_path):
+    eventos = list(_eventos(300))
+    ruta = str(tmp_path / "s.seg")
+    filas = [(_a_micros(e['momento']), 0, 0, 0, e['plaza'], e['matricula'], 0.0, 0.0, 0) for e in eventos]
+    escribir_segmento(ruta, filas)
+    segmento = Segmento(ruta)
+    assert all(segmento.puede_contener(e['matricula']) for e in eventos)
+    ajenas = sum(segmento.puede_contener(f"NO{i}") for i in range(1000))
+    assert ajenas < 50  # ~1% de falsos positivos
+
+def test_archivador_rango_y_filtros(tmp_path):
+    eventos = list(_eventos(400))
+    archivador = Archivador(str(tmp_path), max_filas=150)  # Varios segmentos y un resto sin sellar
+    for evento in eventos:
+        archivador.añadir(evento)
+    desde, hasta = eventos[100]['momento'], eventos[300]['momento']
+    esperados = [e for e in eventos if desde <= e['momento'] < hasta and e['evento'] == "salida"]
+    obtenidos = list(archivador.rango(desde, hasta, evento="salida"))
+    assert [(r.momento, r.matricula) for r in obtenidos] == [(e['momento'], e['matricula']) for e in esperados]
+
+    matricula = eventos[390]['matricula']
+    assert {r.momento for r in archivador.rango(matricula=matricula)} == \
+        {e['momento'] for e in eventos if e['matricula'] == matricula}
+    archivador.cerrar()
+
+# ======================================================
+# DIARIO DEL ARCHIVO: RECUPERACIÓN TRAS UNA CAÍDA
+# ======================================================
+
+def _todo(carpeta):
+    archivador = Archivador(carpeta)
+    filas = [_clave(r) for r in archivador.rango()]
+    archivador.cerrar()
+    return filas
+
+def test_diario_recupera_filas_sin_sellar(tmp_path):
+    eventos = list(_eventos(6))
+    archivador = Archivador(str(tmp_path))
+    for evento in eventos:
+        archivador.añadir(evento)
+    # Sin cerrar: el proceso muere aquí
+    archivador._diario.close()
+    assert [m for m, *_ in _todo(str(tmp_path))] == [e['momento'] for e in eventos]
+
+def test_diario_no_duplica_si_cae_tras_escribir_el_segmento(tmp_path):
+    eventos = list(_eventos(6))
+    archivador = Archivador(str(tmp_path))
+    for evento in eventos:
+        archivador.añadir(evento)
+    # Lo que hace _sellar hasta el segmento; cae antes de vaciar el diario
+    carpeta = os.path.join(archivador._eventos, "2026-03")
+    os.makedirs(carpeta)
+    ruta = os.path.join(carpeta, "2026-03-02.000.seg")
+    archivador._escribir_diario({'sellando': os.path.relpath(ruta, archivador._eventos)}, sincronizar=True)
+    escribir_segmento(ruta, archivador._filas)
+    archivador._diario.close()
+
+    assert len(_todo(str(tmp_path))) == len(eventos)
+    reabierto = Archivador(str(tmp_path))
+    assert len(reabierto.segmentos()) == 1 and reabierto._filas == []
+    reabierto.cerrar()
+
+def test_diario_sin_segmento_conserva_las_filas(tmp_path):
+    eventos = list(_eventos(5))
+    archivador = Archivador(str(tmp_path))
+    for evento in eventos:
+        archivador.añadir(evento)
+    # Cae tras escribir la marca pero antes de que el segmento exista
+    archivador._escribir_diario({'sellando': os.path.join("2026-03", "2026-03-02.000.seg")}, sincronizar=True)
+    archivador._diario.close()
+    assert len(_todo(str(tmp_path))) == len(eventos)
+
+def test_diario_descarta_la_linea_a_medio_escribir(tmp_path):
+    eventos = list(_eventos(5))
+    archivador = Archivador(str(tmp_path))
+    for evento in eventos:
+        archivador.añadir(evento)
+    archivador._diario.write('[1772449200000000, 0, 0')
+    archivador._diario.close()
+
+    recuperado = Archivador(str(tmp_path))
+    assert len(recuperado._filas) == len(eventos)
+    recuperado.añadir(next(_eventos(1, semilla=9)) | {'momento': eventos[-1]['momento'] + timedelta(seconds=1)})
+    recuperado._diario.close()
+    with open(recuperado._ruta_diario, encoding='utf-8') as f:
+        assert [len(json.loads(linea)) for linea in f] == [9] * (len(eventos) + 1)
@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+import pytest
+
+from conftest import AHORA, plazas_fila
+from parking_privado import GestorCarga, Parking, TarifaPlana
+
+def _parking(tipos, **kwargs):
+    return Parking(plazas=plazas_fila(tipos, kwargs.pop("minusvalido", ()), kwargs.pop("electricas", ())),
+                   **kwargs)
+
+def test_carga_reparte_la_potencia_por_urgencia(reloj):
+    carga = GestorCarga(potencia_maxima=50, potencia_cargador=22)
+    for i, horas in enumerate([4, 1, 3, 2]):
+        carga.iniciar(f"E{i}", f"A{i}", AHORA + timedelta(hours=horas), 0.0)
+    potencias = {f"E{i}": carga.sesion(f"E{i}")['potencia_kw'] for i in range(4)}
+    # Los dos más urgentes a la potencia del cargador, el tercero el resto y el último espera
+    assert potencias == {"E1": 22, "E3": 22, "E2": 6, "E0": 0}
+    assert carga.resumen()['potencia_kw'] == 50
+
+    assert carga.finalizar("E1") == 0
+    assert carga.sesion("E0")['estado'] == "cargando"
+    assert carga.resumen()['potencia_kw'] == 50
+    assert carga.finalizar("NO") is None
+
+def test_carga_completa_libera_su_potencia(reloj):
+    carga = GestorCarga(potencia_maxima=22, potencia_cargador=22)
+    carga.iniciar("E0", "A1", AHORA + timedelta(hours=1), 0.5)   # 30 kWh: 1h 22min a 22 kW
+    carga.iniciar("E1", "A2", AHORA + timedelta(hours=8), 0.5)
+    assert carga.sesion("E1")['estado'] == "esperando"
+
+    reloj.fijar(AHORA + timedelta(hours=2))
+    carga.actualizar()
+    assert carga.sesion("E0")['estado'] == "completa"
+    assert carga.sesion("E0")['entregada_kwh'] == pytest.approx(30)
+    assert carga.sesion("E1")['estado'] == "cargando"
+    assert carga.finalizar("E0") == pytest.approx(30)
+    assert carga.energia_entregada == pytest.approx(30)
+
+def test_parking_cobra_la_energia(reloj):
+    parking = _parking(["EXTERIOR"], electricas={"A1"}, tarifa="plana")
+    parking.entrada(matricula="E1", tipo="ELECTRICO", nivel_bateria=0.9)  # 6 kWh
+    assert parking.obtener_info_carga("E1")['necesaria_kwh'] == pytest.approx(6)
+    reloj.fijar(AHORA + timedelta(hours=1))
+    parking.salida("A1")
+    estancia = TarifaPlana().calcular(timedelta(hours=1), "ELECTRICO", "EXTERIOR", False)
+    assert parking.obtener_estadisticas()['recaudacion_total'] == pytest.approx(estancia + round(6 * 0.35, 2))
+
+@pytest.mark.parametrize("nivel", [-0.1, 1.5, float("nan"), True, "0.5"])
+def test_nivel_de_bateria_invalido_no_cambia_nada(nivel):
+    parking = _parking(["EXTERIOR"], electricas={"A1"})
+    exito, mensaje = parking.entrada(matricula="1111AAA", tipo="ELECTRICO", nivel_bateria=nivel)
+    assert not exito and "batería" in mensaje
+    assert parking.localizar("1111AAA") is None
+    assert "1111AAA" not in parking._plazas.registro
+    assert parking.obtener_info_carga()['sesiones'] == 0
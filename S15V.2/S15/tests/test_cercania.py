@@ -0,0 +1,44 @@
+import random
+
+from conftest import comprobar_indices, plazas_fila
+from parking_privado import AsignacionCercana, Coche, GestorPlazas, Plaza
+
+def _coche(matricula, tipo="NORMAL"):
+    return Coche(matricula, tipo)
+
+def test_cercana_elige_la_libre_mas_cercana_al_carril():
+    plazas = [Plaza(f"{fila}{c}", "EXTERIOR", False, False) for fila in "ABCD" for c in range(1, 13)]
+    gestor = GestorPlazas(plazas, asignacion=AsignacionCercana())
+    gestor.carriles = 3
+    gestor.indexar_cercania()
+    azar = random.Random(9)
+    for i in range(30):
+        carril = azar.randrange(3)
+        libres = [p.id for p in gestor.estado() if not p.ocupada]
+        mejor = min(gestor.distancia(pid, carril) for pid in libres)
+        plaza = gestor.asignar(_coche(f"C{i}"), carril=carril)
+        assert gestor.distancia(plaza.id, carril) == mejor
+        if azar.random() < 0.3:
+            gestor.liberar(azar.choice(gestor.ocupadas_ids()))
+
+def test_cercana_sin_indice_asigna_al_azar():
+    gestor = GestorPlazas(plazas_fila(["EXTERIOR"] * 4), asignacion=AsignacionCercana(), indexar=False)
+    assert gestor._cercanas is None
+    assert gestor.asignar(_coche("N1"), carril=2) is not None
+
+def test_indices_tras_muchas_operaciones():
+    tipos = ["AREA_PRIVADA", "SUBTERRANEO", "EXTERIOR"] * 20
+    plazas = plazas_fila(tipos, minusvalido={f"A{i}" for i in range(1, 61, 7)},
+                         electricas={f"A{i}" for i in range(3, 61, 9)})
+    gestor = GestorPlazas(plazas, asignacion=AsignacionCercana())
+    azar = random.Random(5)
+    dentro = []
+    for i in range(400):
+        if dentro and azar.random() < 0.45:
+            gestor.liberar(dentro.pop(azar.randrange(len(dentro))))
+        else:
+            tipo = azar.choice(["NORMAL", "MINUSVALIDO", "MOTO", "ELECTRICO"])
+            plaza = gestor.asignar(_coche(f"C{i}", tipo), carril=azar.randrange(3))
+            if plaza:
+                dentro.append(plaza.id)
+    comprobar_indices(gestor)
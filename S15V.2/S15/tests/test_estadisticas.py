@@ -0,0 +1,86 @@
+import random
+from datetime import timedelta
+
+import pytest
+
+from conftest import AHORA, plazas_fila
+from parking_privado import Coche, GestorCola, Histograma, Parking, TarifaPlana
+
+def _parking(tipos, **kwargs):
+    return Parking(plazas=plazas_fila(tipos, kwargs.pop("minusvalido", ()), kwargs.pop("electricas", ())),
+                   **kwargs)
+
+# ======================================================
+# HISTOGRAMA
+# ======================================================
+
+def test_histograma_percentiles_dentro_del_error_relativo():
+    azar = random.Random(3)
+    valores = sorted(azar.lognormvariate(3, 1) for _ in range(5000))
+    histograma = Histograma()
+    for v in valores:
+        histograma.añadir(v)
+    for p in (50, 90, 99):
+        exacto = valores[int(p / 100 * len(valores)) - 1]
+        assert histograma.percentil(p) == pytest.approx(exacto, rel=0.05)
+    assert histograma.percentil(100) <= histograma.maximo
+    assert histograma.media() == pytest.approx(sum(valores) / len(valores))
+
+def test_histograma_ceros_vacio_y_fusion():
+    assert Histograma().percentil(50) is None
+    assert Histograma().media() is None
+
+    a, b = Histograma(), Histograma()
+    for v in (0, 0, 0, 10):
+        a.añadir(v)
+    for v in (100, 200):
+        b.añadir(v)
+    assert a.percentil(50) == 0
+    a.fusionar(b)
+    assert (a.cuenta, a.minimo, a.maximo) == (6, 0, 200)
+    assert a.percentil(100) == pytest.approx(200, rel=0.05)
+
+    copia = Histograma.from_dict(a.to_dict())
+    assert copia.to_dict() == a.to_dict()
+    assert copia.percentil(80) == a.percentil(80)
+
+# ======================================================
+# ESTANCIAS Y ESPERAS
+# ======================================================
+
+def test_entrada_y_salida_cobran_la_estancia(reloj):
+    parking = _parking(["EXTERIOR"], tarifa="plana")
+    assert parking.entrada(matricula="1111AAA", tipo="NORMAL")[0]
+    reloj.fijar(AHORA + timedelta(minutes=10))
+    exito, _ = parking.salida(parking.localizar("1111AAA").id)
+    assert exito
+    esperado = TarifaPlana().calcular(timedelta(minutes=10), "NORMAL", "EXTERIOR", False)
+    stats = parking.obtener_estadisticas()
+    assert (stats['total_entradas'], stats['total_salidas']) == (1, 1)
+    assert stats['recaudacion_total'] == pytest.approx(esperado)
+    assert parking.percentil("estancia", 50) == pytest.approx(10, rel=0.05)
+
+def test_cola_limite_y_devolucion():
+    cola = GestorCola(max_cola=2)
+    a, b, c = Coche("A", "NORMAL"), Coche("B", "NORMAL"), Coche("C", "NORMAL")
+    assert cola.agregar(a) and cola.agregar(b)
+    assert not cola.agregar(c)
+    primero = cola.sacar()
+    assert primero is a
+    cola.devolver(primero)
+    assert cola.sacar() is a
+    cola.redimensionar(1)
+    assert cola.tamaño() == 1 and not cola.agregar(c)
+
+def test_cola_aparca_al_salir_alguien_y_mide_la_espera(reloj):
+    parking = _parking(["EXTERIOR"])
+    parking.entrada(matricula="DENTRO", tipo="NORMAL")
+    exito, mensaje = parking.entrada(matricula="ESPERA", tipo="NORMAL")
+    assert not exito and "cola" in mensaje
+    assert parking.obtener_info_cola() == 1
+
+    reloj.fijar(AHORA + timedelta(minutes=5))
+    assert parking.salida("A1")[0]
+    assert parking.localizar("ESPERA").id == "A1"
+    assert parking.obtener_info_cola() == 0
+    assert parking.percentil("espera_cola", 50) == pytest.approx(300, rel=0.05)
@@ -0,0 +1,130 @@
+import os
+import random
+import struct
+from datetime import timedelta
+
+import pytest
+
+from conftest import AHORA, plazas_fila
+from historico import COLUMNAS, Historico
+from parking_privado import Parking
+
+def _parking(tipos, **kwargs):
+    return Parking(plazas=plazas_fila(tipos, kwargs.pop("minusvalido", ()), kwargs.pop("electricas", ())),
+                   **kwargs)
+
+def _eventos(n, semilla=1):
+    """Eventos como los que notifica Parking, uno cada pocos segundos"""
+    azar = random.Random(semilla)
+    momento = AHORA
+    for i in range(n):
+        momento += timedelta(seconds=azar.randint(0, 30))
+        evento = azar.choice(["entrada", "salida", "rechazo", "encolado"])
+        yield {
+            'evento': evento,
+            'momento': momento,
+            'matricula': f"{azar.randint(1000, 9999)}{'X' * azar.randint(3, 12)}",
+            'tipo_vehiculo': azar.choice(["NORMAL", "MINUSVALIDO", "MOTO", "ELECTRICO"]),
+            'tipo_parking': azar.choice(["AREA_PRIVADA", "SUBTERRANEO", "EXTERIOR"]),
+            'plaza': f"A{azar.randint(1, 300)}",
+            'precio': round(azar.uniform(0, 50), 2) if evento == "salida" else 0.0,
+            'duracion': round(azar.uniform(120, 9000), 3) if evento == "salida" else 0.0,
+            'ocupadas': azar.randint(0, 300),
+        }
+
+def _clave(registro):
+    return (registro.momento, registro.evento, registro.matricula, registro.plaza)
+
+def test_historico_ida_y_vuelta_con_particiones(tmp_path):
+    eventos = list(_eventos(300))
+    # Cruza la medianoche: dos particiones
+    eventos += [dict(e, momento=e['momento'] + timedelta(hours=12)) for e in _eventos(50, semilla=2)]
+    historico = Historico(str(tmp_path))
+    for evento in eventos:
+        historico.añadir(evento)
+    assert len(historico.particiones()) == 2
+
+    registros = list(historico.rango())
+    assert [_clave(r) for r in registros] == [
+        (e['momento'], e['evento'], e['matricula'], e['plaza']) for e in eventos
+    ]
+    assert [r.precio for r in registros] == pytest.approx([e['precio'] for e in eventos], abs=1e-3)
+
+    matricula = eventos[10]['matricula']
+    esperadas = [e['momento'] for e in eventos if e['matricula'] == matricula]
+    assert [r.momento for r in historico.visitas(matricula)] == esperadas
+    historico.cerrar()
+    # Cerrado (con índice de matrículas) da lo mismo
+    assert [r.momento for r in Historico(str(tmp_path)).visitas(matricula)] == esperadas
+
+def test_historico_repara_una_fila_a_medias(tmp_path):
+    eventos = list(_eventos(20))
+    historico = Historico(str(tmp_path))
+    for evento in eventos:
+        historico.añadir(evento)
+    historico._vaciar_buffers()
+    dia = historico._dia
+    for archivo in historico._archivos.values():
+        archivo.close()
+    # La última fila solo llegó a escribirse en la columna momento
+    with open(os.path.join(str(tmp_path), dia, "momento.col"), 'ab') as f:
+        f.write(b"\0" * 8)
+
+    reabierto = Historico(str(tmp_path))
+    assert [r.momento for r in reabierto.rango()] == [e['momento'] for e in eventos]
+    reabierto.cerrar()
+
+def _filas_por_columna(carpeta, dia):
+    return {
+        nombre: os.path.getsize(os.path.join(carpeta, dia, f"{nombre}.col")) // struct.calcsize(formato)
+        for nombre, formato in COLUMNAS
+    }
+
+def test_consultar_en_solo_lectura_no_toca_el_dia_abierto(tmp_path):
+    carpeta = str(tmp_path)
+    eventos = list(_eventos(2010))
+    escritor = Historico(carpeta)
+    for evento in eventos[:2000]:
+        escritor.añadir(evento)
+    dia = escritor._dia
+
+    # Con los buffers a medio vaciar cada columna lleva en disco un número de filas distinto
+    lector = Historico(carpeta, solo_lectura=True)
+    leidos = [_clave(r) for r in lector.rango()]
+    assert leidos == [(e['momento'], e['evento'], e['matricula'], e['plaza']) for e in eventos[:len(leidos)]]
+    lector.cerrar()
+    assert not os.path.exists(os.path.join(carpeta, dia, "matricula.idx"))
+
+    escritor._vaciar_buffers()
+    lector = Historico(carpeta, solo_lectura=True)
+    assert len(list(lector.rango())) == 2000
+    matricula = eventos[1500]['matricula']
+    esperadas = [e['momento'] for e in eventos[:2000] if e['matricula'] == matricula]
+    assert [r.momento for r in lector.visitas(matricula)] == esperadas  # Sin índice: recorre la columna
+    with pytest.raises(ValueError):
+        lector.añadir(eventos[2000])
+    lector.cerrar()
+
+    for evento in eventos[2000:]:
+        escritor.añadir(evento)
+    escritor.cerrar()
+    assert set(_filas_por_columna(carpeta, dia).values()) == {2010}
+    assert [_clave(r) for r in Historico(carpeta).rango()] == [
+        (e['momento'], e['evento'], e['matricula'], e['plaza']) for e in eventos
+    ]
+
+def test_solo_lectura_sin_carpeta(tmp_path):
+    carpeta = str(tmp_path / "no_existe")
+    historico = Historico(carpeta, solo_lectura=True)
+    assert historico.particiones() == [] and list(historico.rango()) == []
+    historico.cerrar()
+    assert not os.path.exists(carpeta)
+
+def test_observadores_reciben_los_eventos():
+    parking = _parking(["EXTERIOR"])
+    eventos = []
+    parking.añadir_observador(eventos.append)
+    parking.entrada(matricula="1111AAA", tipo="NORMAL")
+    parking.entrada(matricula="2222BBB", tipo="NORMAL")
+    assert [(e['evento'], e['matricula']) for e in eventos] == [("entrada", "1111AAA"), ("encolado", "2222BBB")]
+    assert eventos[0]['plaza'] == "A1" and eventos[0]['ocupadas'] == 1
@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+from conftest import plazas_fila
+from parking_privado import EstadoPlaza, InstantaneaPlazas, Parking, PlazasDiferidas
+
+def _estado(i, ocupada=False):
+    return EstadoPlaza(f"A{i}", "EXTERIOR", False, False, ocupada, "M" if ocupada else None,
+                       "NORMAL" if ocupada else None, None, None)
+
+def test_instantanea_con_bloques_diferidos():
+    t = InstantaneaPlazas.TAM_BLOQUE
+    estados = [_estado(i) for i in range(2 * t)]
+    leidos = []
+
+    def fuente(nb):
+        leidos.append(nb)
+        return tuple(estados[nb * t:(nb + 1) * t])
+
+    instantanea = InstantaneaPlazas(0, (None, None), len(estados), fuente)
+    assert instantanea[t + 1] == estados[t + 1]
+    assert leidos == [1]
+    nueva = instantanea.con_cambio(3, _estado(3, True))
+    assert nueva._bloques[1] is None  # El bloque no tocado sigue sin leerse
+    assert nueva[3].ocupada and list(nueva)[t:] == estados[t:]
+
+# ======================================================
+# INSTANTÁNEA BINARIA (PlazasDiferidas)
+# ======================================================
+
+def _parking_ocupado(n=300):
+    tipos = ["AREA_PRIVADA", "SUBTERRANEO", "EXTERIOR"] * (n // 3)
+    parking = Parking(plazas=plazas_fila(tipos, {f"A{i}" for i in range(1, n, 11)},
+                                         {f"A{i}" for i in range(2, n, 7)}))
+    azar = random.Random(4)
+    for i in range(n // 2):
+        parking.entrada(matricula=f"M{i}-{'x' * azar.randint(0, 20)}",
+                        tipo=azar.choice(["NORMAL", "MINUSVALIDO", "MOTO", "ELECTRICO"]),
+                        nivel_bateria=0.5)
+    return parking
+
+def test_instantanea_binaria_ida_y_vuelta(tmp_path):
+    parking = _parking_ocupado()
+    archivo = str(tmp_path / "estado.snap")
+    parking.guardar_instantanea(archivo)
+
+    abierto, mensaje = Parking.abrir_instantanea(archivo, calentar=False)
+    assert abierto is not None, mensaje
+    assert list(abierto.obtener_estado()) == list(parking.obtener_estado())
+    assert abierto.obtener_estadisticas() == parking.obtener_estadisticas()
+    assert abierto._plazas.libres_por_categoria() == parking._plazas.libres_por_categoria()
+    assert abierto.obtener_info_carga()['sesiones'] == parking.obtener_info_carga()['sesiones']
+    for plaza in parking._plazas.estado():
+        if plaza.ocupada:
+            assert abierto.localizar(plaza.coche.matricula).id == plaza.id
+
+def test_instantanea_binaria_se_lee_por_bloques(tmp_path):
+    parking = _parking_ocupado(600)
+    archivo = str(tmp_path / "estado.snap")
+    parking.guardar_instantanea(archivo)
+
+    plazas, cabecera = PlazasDiferidas.abrir(archivo)
+    assert cabecera['n'] == 600
+    assert plazas._leidos.count(None) == len(plazas._leidos)  # Al abrir no se decodifica ninguna fila
+    estados = list(parking.obtener_estado())
+    assert plazas.estado(130) == estados[130]
+    assert plazas._leidos.count(None) == len(plazas._leidos)  # Una fila suelta no lee su bloque
+
+    t = InstantaneaPlazas.TAM_BLOQUE
+    assert plazas.instantanea[t + 3] == estados[t + 3]
+    assert [nb for nb, b in enumerate(plazas._leidos) if b is not None] == [1]
+    assert plazas[t + 3].id == estados[t + 3].id
+
+    plazas.calentar()
+    assert plazas._mapa.closed
+    assert list(plazas.instantanea) == estados
+
+def test_instantanea_binaria_truncada_o_ajena(tmp_path):
+    parking = _parking_ocupado(30)
+    archivo = str(tmp_path / "estado.snap")
+    parking.guardar_instantanea(archivo)
+    with open(archivo, 'rb') as f:
+        datos = f.read()
+    with open(archivo, 'wb') as f:
+        f.write(datos[:len(datos) - 100])
+    with pytest.raises(ValueError):
+        PlazasDiferidas.abrir(archivo)
+
+    ajeno = tmp_path / "ajeno.snap"
+    ajeno.write_bytes(b"no es una instantanea")
+    parking, mensaje = Parking.abrir_instantanea(str(ajeno))
+    assert parking is None and "Error" in mensaje
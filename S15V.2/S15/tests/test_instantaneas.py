@@ -0,0 +1,33 @@
+from conftest import plazas_fila
+from parking_privado import Coche, EstadoPlaza, GestorPlazas, InstantaneaPlazas
+
+def _estado(i, ocupada=False):
+    return EstadoPlaza(f"A{i}", "EXTERIOR", False, False, ocupada, "M" if ocupada else None,
+                       "NORMAL" if ocupada else None, None, None)
+
+def test_instantanea_versiones_comparten_bloques():
+    t = InstantaneaPlazas.TAM_BLOQUE
+    estados = [_estado(i) for i in range(3 * t + 5)]
+    v0 = InstantaneaPlazas.desde_estados(estados)
+    v1 = v0.con_cambio(t + 2, _estado(t + 2, True))
+
+    assert (v0.version, v1.version) == (0, 1)
+    assert not v0[t + 2].ocupada and v1[t + 2].ocupada  # La versión anterior no cambia
+    assert len(v1) == len(estados) and list(v0) == estados
+    assert v1._bloques[0] is v0._bloques[0] and v1._bloques[2] is v0._bloques[2]
+    assert v1._bloques[1] is not v0._bloques[1]
+
+def test_cambios_desde_versiones_fuera_de_rango():
+    gestor = GestorPlazas(plazas_fila(["EXTERIOR"] * 30))
+    plaza = gestor.asignar(Coche("N1", "NORMAL"))
+    version, estados = gestor.cambios_desde(0)
+    assert version == 1 and [e.id for e in estados] == [plaza.id]
+    assert gestor.cambios_desde(version) == (version, [])
+    # Una versión de otro parking (posterior a la actual) recibe todo
+    assert len(gestor.cambios_desde(version + 5)[1]) == 30
+
+    for i in range(GestorPlazas.MAX_CAMBIOS + 1):
+        gestor.liberar(plaza.id) if plaza.ocupada else gestor.asignar(Coche("N1", "NORMAL"))
+        plaza = gestor.localizar("N1") or plaza
+    # Demasiado antigua: ya no se recuerdan sus cambios
+    assert len(gestor.cambios_desde(1)[1]) == 30
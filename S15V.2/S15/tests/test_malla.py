@@ -0,0 +1,32 @@
+import random
+
+from parking_privado import MallaOcupacion
+
+def _sumas(ocupadas, existe, fila, columna):
+    o = sum(ocupadas[f][c] for f in range(fila) for c in range(columna))
+    e = sum(existe[f][c] for f in range(fila) for c in range(columna))
+    return o, e
+
+def test_malla_coincide_con_fuerza_bruta():
+    filas, columnas = 9, 13
+    azar = random.Random(11)
+    # La última fila está incompleta, como en un parking cuya capacidad no llena las filas
+    celdas = [(f, c) for f in range(filas) for c in range(columnas) if f < filas - 1 or c < 5]
+    ocupadas = [[0] * columnas for _ in range(filas)]
+    existe = [[0] * columnas for _ in range(filas)]
+    estado = []
+    for f, c in celdas:
+        existe[f][c] = 1
+        ocupadas[f][c] = azar.random() < 0.5
+        estado.append(ocupadas[f][c])
+
+    malla = MallaOcupacion(filas, columnas)
+    malla.cargar(celdas, estado)
+    for _ in range(200):
+        f, c = azar.choice(celdas)
+        nuevo = azar.random() < 0.5
+        assert malla.actualizar(f, c, nuevo) == (ocupadas[f][c] != nuevo)
+        ocupadas[f][c] = nuevo
+        fila, columna = azar.randint(0, filas), azar.randint(0, columnas)
+        assert (malla.ocupadas_hasta(fila, columna), malla.plazas_hasta(fila, columna)) == \
+            _sumas(ocupadas, existe, fila, columna)
@@ -0,0 +1,99 @@
+from datetime import timedelta
+
+from conftest import AHORA, comprobar_indices, plazas_fila
+from parking_privado import (
+    AsignacionAleatoria, AsignacionCercana, AsignacionSondeo, Coche, GestorPlazas, SalidaPonderada,
+    SalidaUniforme, TIEMPO_MINIMO_ESTANCIA
+)
+
+def _coche(matricula, tipo="NORMAL"):
+    return Coche(matricula, tipo)
+
+# ======================================================
+# ASIGNACIÓN
+# ======================================================
+
+def test_asignar_respeta_las_categorias():
+    gestor = GestorPlazas(plazas_fila(["EXTERIOR"] * 3, minusvalido={"A1"}, electricas={"A2"}))
+    assert gestor.asignar(_coche("N1")).id == "A3"
+    assert gestor.asignar(_coche("N2")) is None  # Solo quedan la de minusválidos y la eléctrica
+    assert gestor.asignar(_coche("E1", "ELECTRICO")).id == "A2"
+    assert gestor.asignar(_coche("M1", "MINUSVALIDO")).id == "A1"
+    assert gestor.tasa_ocupacion() == 1.0
+    comprobar_indices(gestor)
+
+def test_electricas_admiten_otros_coches_por_encima_del_80_por_ciento():
+    gestor = GestorPlazas(plazas_fila(["EXTERIOR"] * 6, electricas={"A6"}))
+    for i in range(4):
+        gestor.asignar(_coche(f"N{i}"))
+    # 4/6 ocupadas: la eléctrica sigue reservada a eléctricos
+    assert gestor.asignar(_coche("N4")).id != "A6"
+    assert gestor.tasa_ocupacion() > 0.8
+    assert gestor.asignar(_coche("N5")).id == "A6"
+    comprobar_indices(gestor)
+
+def test_prefiere_la_zona_habitual_del_vehiculo():
+    gestor = GestorPlazas(plazas_fila(["AREA_PRIVADA", "SUBTERRANEO", "EXTERIOR", "SUBTERRANEO"]))
+    assert gestor.asignar(_coche("N1")).tipo_parking == "EXTERIOR"
+    assert gestor.asignar(_coche("M1", "MOTO")).tipo_parking == "AREA_PRIVADA"
+    # Sin plazas en su zona habitual, cualquier otra
+    assert gestor.asignar(_coche("N2")).tipo_parking == "SUBTERRANEO"
+
+def test_sondeo_se_rinde_tras_los_intentos():
+    gestor = GestorPlazas(plazas_fila(["EXTERIOR"] * 100), asignacion=AsignacionSondeo(max_intentos=3))
+    for i in range(99):
+        gestor._marcar_ocupada(i, gestor.estado()[i])
+        gestor._ocupadas += 1
+    # Queda una libre entre cien: casi nunca se encuentra en tres intentos
+    fallos = sum(gestor.asignacion.elegir(gestor, gestor._candidatas(_coche("N"), {}, False), None, 0) is None
+                 for _ in range(200))
+    assert fallos > 180
+
+def test_zonas_posibles_por_politica():
+    tipos = ["AREA_PRIVADA", "SUBTERRANEO", "EXTERIOR"]
+    coche = _coche("N1")
+    aleatoria = GestorPlazas(plazas_fila(tipos), asignacion=AsignacionAleatoria())
+    assert aleatoria.zonas_posibles(coche) == {"EXTERIOR"}
+    sondeo = GestorPlazas(plazas_fila(tipos), asignacion=AsignacionSondeo())
+    assert sondeo.zonas_posibles(coche) == set(tipos)
+    cercana = GestorPlazas(plazas_fila(tipos), asignacion=AsignacionCercana())
+    assert cercana.zonas_posibles(coche) == {"EXTERIOR"}
+    # Sin zona habitual: la aleatoria puede acabar en cualquiera y la cercana sabe en cuál
+    minusvalido = _coche("M1", "MINUSVALIDO")
+    assert aleatoria.zonas_posibles(minusvalido) == set(tipos)
+    zonas = cercana.zonas_posibles(minusvalido, carril=0)
+    assert len(zonas) == 1 and cercana.asignar(minusvalido, carril=0).tipo_parking in zonas
+
+    lleno = GestorPlazas(plazas_fila(["EXTERIOR"]))
+    lleno.asignar(_coche("N2"))
+    assert lleno.zonas_posibles(coche) == set()
+
+def test_zonas_posibles_no_ocupa_nada():
+    gestor = GestorPlazas(plazas_fila(["EXTERIOR", "SUBTERRANEO"]), asignacion=AsignacionCercana())
+    version = gestor.instantanea().version
+    gestor.zonas_posibles(_coche("N1"))
+    assert gestor.num_ocupadas() == 0 and gestor.instantanea().version == version
+
+# ======================================================
+# SALIDA
+# ======================================================
+
+def test_salida_ponderada_respeta_la_estancia_minima():
+    gestor = GestorPlazas(plazas_fila(["EXTERIOR"] * 3))
+    for i in range(3):
+        gestor.asignar(_coche(f"N{i}"))
+    ocupadas = [e for e in gestor.instantanea() if e.ocupada]
+    politica = SalidaPonderada()
+    assert politica.elegir(ocupadas, AHORA + timedelta(seconds=TIEMPO_MINIMO_ESTANCIA - 1)) is None
+    assert politica.elegir(ocupadas, AHORA + timedelta(seconds=TIEMPO_MINIMO_ESTANCIA)) in ocupadas
+    assert SalidaUniforme().elegir(ocupadas, AHORA) in ocupadas
+
+def test_salida_ponderada_favorece_a_quien_supera_su_estancia():
+    gestor = GestorPlazas(plazas_fila(["EXTERIOR"] * 2))
+    gestor.asignar(_coche("CORTO"))
+    gestor.asignar(_coche("LARGO"))
+    ocupadas = [e._replace(duracion_estimada=10 if e.matricula == "CORTO" else 480)
+                for e in gestor.instantanea() if e.ocupada]
+    ahora = AHORA + timedelta(minutes=20)
+    elegidos = [SalidaPonderada().elegir(ocupadas, ahora).matricula for _ in range(600)]
+    assert elegidos.count("CORTO") > 3 * elegidos.count("LARGO")
@@ -0,0 +1,78 @@
+import random
+from datetime import timedelta
+
+from conftest import AHORA, comprobar_indices, plazas_fila
+from parking_privado import Coche, GestorPlazas, Parking, RegistroMatriculas
+
+def _parking(tipos):
+    return Parking(plazas=plazas_fila(tipos))
+
+def test_registro_reclama_vincula_y_suelta():
+    registro = RegistroMatriculas()
+    assert registro.reclamar("1111AAA")
+    assert not registro.reclamar("1111AAA")
+    assert "1111AAA" in registro and registro.buscar("1111AAA") is None  # Reclamada, aún sin plaza
+    registro.vincular("1111AAA", 4)
+    assert registro.buscar("1111AAA") == 4
+    assert registro.soltar("1111AAA") == 4
+    assert registro.soltar("1111AAA") is None
+    assert len(registro) == 0 and registro.reclamar("1111AAA")
+
+def test_registro_emite_matriculas_libres():
+    registro = RegistroMatriculas()
+    emitidas = {registro.emitir() for _ in range(500)}
+    assert len(emitidas) == 500 == len(registro)
+    assert all(not registro.reclamar(m) for m in emitidas)
+
+def test_la_misma_matricula_no_entra_dos_veces():
+    parking = _parking(["EXTERIOR", "EXTERIOR"])
+    assert parking.entrada(matricula="1111AAA", tipo="NORMAL")[0]
+    exito, mensaje = parking.entrada(matricula="1111AAA", tipo="NORMAL")
+    assert not exito and "ya está dentro" in mensaje
+    assert parking.obtener_estadisticas()['rechazos'] == 1
+
+def test_salida_suelta_la_matricula(reloj):
+    parking = _parking(["EXTERIOR"])
+    parking.entrada(matricula="1111AAA", tipo="NORMAL")
+    assert parking.localizar("1111AAA").id == "A1"
+    reloj.fijar(AHORA + timedelta(seconds=30))
+    exito, mensaje = parking.salida("A1")
+    assert not exito and "corta" in mensaje
+    assert parking.obtener_estadisticas()['recaudacion_total'] == 0
+    assert parking.localizar("1111AAA") is None
+    assert parking.salida("A1") == (False, "Plaza inválida o vacía")
+    assert parking.entrada(matricula="1111AAA", tipo="NORMAL")[0]  # Puede volver a entrar
+
+def test_cola_llena_rechaza_y_suelta_la_matricula():
+    parking = _parking(["EXTERIOR"])
+    parking._cola.redimensionar(0)
+    parking.entrada(matricula="DENTRO", tipo="NORMAL")
+    exito, mensaje = parking.entrada(matricula="FUERA", tipo="NORMAL")
+    assert not exito and "rechazado" in mensaje
+    assert "FUERA" not in parking._plazas.registro
+
+def test_liberar_devuelve_el_coche_y_rehace_los_indices(reloj):
+    gestor = GestorPlazas(plazas_fila(["EXTERIOR", "SUBTERRANEO"]))
+    plaza = gestor.asignar(Coche("1111AAA", "NORMAL"))
+    reloj.fijar(AHORA + timedelta(minutes=30))
+    (coche, tiempo), liberada = gestor.liberar(plaza.id)
+    assert (coche.matricula, tiempo, liberada) == ("1111AAA", timedelta(minutes=30), plaza)
+    assert gestor.localizar("1111AAA") is None
+    assert gestor.liberar(plaza.id) == (None, None)
+    assert gestor.liberar("Z99") == (None, None)
+    comprobar_indices(gestor)
+
+def test_localizar_tras_muchas_operaciones():
+    tipos = ["AREA_PRIVADA", "SUBTERRANEO", "EXTERIOR"] * 20
+    gestor = GestorPlazas(plazas_fila(tipos, minusvalido={f"A{i}" for i in range(1, 61, 7)},
+                                      electricas={f"A{i}" for i in range(3, 61, 9)}))
+    azar = random.Random(5)
+    dentro = []
+    for i in range(400):
+        if dentro and azar.random() < 0.45:
+            gestor.liberar(dentro.pop(azar.randrange(len(dentro))))
+        else:
+            plaza = gestor.asignar(Coche(f"C{i}", azar.choice(["NORMAL", "MINUSVALIDO", "MOTO", "ELECTRICO"])))
+            if plaza:
+                dentro.append(plaza.id)
+    comprobar_indices(gestor)
@@ -0,0 +1,203 @@
+import random
+import threading
+from datetime import timedelta
+
+import pytest
+
+from conftest import AHORA, comprobar_indices, plazas_fila
+from parking_privado import AsignacionCercana, Coche, GestorPlazas, Parking
+from replicacion import Replica, Replicador, diferencias, huella
+
+def _primario():
+    tipos = ["AREA_PRIVADA", "SUBTERRANEO", "EXTERIOR"] * 8
+    return Parking(plazas=plazas_fila(tipos, {"A1", "A11"}, {"A3", "A6", "A15"}))
+
+def _trafico(parking, reloj, operaciones, azar, desde=0):
+    for i in range(desde, desde + operaciones):
+        reloj.fijar(AHORA + timedelta(seconds=i * 90))
+        if azar.random() < 0.6:
+            parking.entrada(tipo=azar.choice(["NORMAL", "MINUSVALIDO", "MOTO", "ELECTRICO"]))
+        else:
+            parking.salida_aleatoria()
+
+class _Lotes:
+    """Hace de Replicador sin conexión: arma los mensajes como él a partir de los eventos"""
+    def __init__(self, parking):
+        self.parking = parking
+        self.eventos = []
+        self.version = 0
+        self.secuencia = 0
+        parking.añadir_observador(self._observar)
+
+    def _observar(self, evento):
+        self.eventos.append(evento)
+
+    def inicial(self):
+        self.secuencia += 1
+        instantanea = self.parking.obtener_estado()
+        self.version = instantanea.version
+        return {'tipo': "inicial", 'secuencia': self.secuencia, 'version': self.version,
+                'estado': self.parking.to_dict(instantanea)}
+
+    def cambios(self):
+        instantanea = self.parking.obtener_estado()
+        self.version, estados = self.parking.cambios_desde(self.version, instantanea)
+        self.secuencia += 1
+        eventos, self.eventos = self.eventos, []
+        return {'tipo': "cambios", 'secuencia': self.secuencia, 'version': self.version,
+                'plazas': [tuple(e) for e in estados], 'eventos': eventos,
+                'estadisticas': self.parking.obtener_estadisticas(), 'huella': huella(instantanea)}
+
+def _coche(matricula, tipo="NORMAL"):
+    return Coche(matricula, tipo)
+
+def _parking(tipos, **kwargs):
+    return Parking(plazas=plazas_fila(tipos, kwargs.pop("minusvalido", ()), kwargs.pop("electricas", ())),
+                   **kwargs)
+
+# ======================================================
+# GestorPlazas.aplicar
+# ======================================================
+
+def _par(asignacion=None):
+    tipos = ["AREA_PRIVADA", "SUBTERRANEO", "EXTERIOR"] * 10
+    minus, electricas = {"A1", "A8", "A15"}, {"A3", "A12", "A21"}
+    return (GestorPlazas(plazas_fila(tipos, minus, electricas), asignacion=asignacion),
+            GestorPlazas(plazas_fila(tipos, minus, electricas)))
+
+def test_aplicar_replica_el_estado_y_los_indices():
+    primario, replica = _par()
+    azar = random.Random(2)
+    version = 0
+    for lote in range(20):
+        for i in range(azar.randint(1, 8)):
+            ocupadas = primario.ocupadas_ids()
+            if ocupadas and azar.random() < 0.4:
+                primario.liberar(azar.choice(ocupadas))
+            else:
+                tipo = azar.choice(["NORMAL", "MINUSVALIDO", "MOTO", "ELECTRICO"])
+                primario.asignar(_coche(f"C{lote}-{i}", tipo))
+        version, estados = primario.cambios_desde(version)
+        replica.aplicar(estados)
+        assert list(replica.instantanea()) == list(primario.instantanea())
+        assert replica.libres_por_categoria() == primario.libres_por_categoria()
+        comprobar_indices(replica)
+
+def test_aplicar_un_coche_que_cambia_de_plaza_en_el_mismo_lote():
+    # Con la más cercana es determinista: MOVIL vuelve a la plaza que deja OTRO
+    primario, replica = _par(AsignacionCercana())
+    cercana = primario.asignar(_coche("OTRO"))
+    plaza = primario.asignar(_coche("MOVIL"))
+    replica.aplicar(primario.cambios_desde(0)[1])
+    version = primario.instantanea().version
+    primario.liberar(cercana.id)
+    primario.liberar(plaza.id)
+    nueva = primario.asignar(_coche("MOVIL"))
+    assert nueva.id == cercana.id
+    # La plaza nueva puede ir antes que la antigua en el lote: primero se vacían todas
+    _, estados = primario.cambios_desde(version)
+    cambios = replica.aplicar(list(reversed(estados)))
+    assert replica.localizar("MOVIL").id == nueva.id
+    assert len(replica.registro) == 1
+    assert all(anterior != estado for anterior, estado in cambios)
+    comprobar_indices(replica)
+
+def test_aplicar_ignora_plazas_sin_cambios():
+    primario, replica = _par()
+    version = replica.instantanea().version
+    assert replica.aplicar(list(primario.instantanea())) == []
+    assert replica.instantanea().version == version
+
+# ======================================================
+# ESTADO COMPLETO
+# ======================================================
+
+def test_to_dict_from_dict_conserva_plazas_reservas_y_cargas():
+    parking = _parking(["EXTERIOR", "EXTERIOR", "SUBTERRANEO"], electricas={"A2"}, minusvalido={"A3"})
+    parking.entrada(matricula="N1", tipo="NORMAL")
+    parking.entrada(matricula="E1", tipo="ELECTRICO", nivel_bateria=0.2)
+    parking.reservar("RES", "SUBTERRANEO", AHORA + timedelta(hours=1), AHORA + timedelta(hours=2), "MINUSVALIDO")
+
+    copia = Parking.from_dict(parking.to_dict())
+    assert list(copia.obtener_estado()) == list(parking.obtener_estado())
+    assert copia.localizar("N1").id == parking.localizar("N1").id
+    assert [r.matricula for r in copia._agenda.pendientes()] == ["RES"]
+    assert copia.obtener_info_carga("E1")['necesaria_kwh'] == pytest.approx(48)
+    assert copia.obtener_estadisticas() == parking.obtener_estadisticas()
+
+# ======================================================
+# RÉPLICA
+# ======================================================
+
+def test_replica_aplica_lotes_y_verifica_la_huella(reloj):
+    primario = _primario()
+    lotes = _Lotes(primario)
+    replica = Replica()
+    azar = random.Random(8)
+    _trafico(primario, reloj, 10, azar)
+    replica.aplicar(lotes.inicial())
+    lotes.eventos.clear()  # Ya están en el estado inicial
+
+    for lote in range(15):
+        _trafico(primario, reloj, azar.randint(0, 6), azar, desde=10 + lote * 6)
+        confirmacion = replica.aplicar(lotes.cambios())
+        assert confirmacion == {'tipo': "confirmado", 'secuencia': lotes.secuencia, 'coincide': True}
+        assert diferencias(primario, replica.parking) == ([], {})
+    assert replica.discrepancias == 0 and replica.version == primario.obtener_estado().version
+    assert replica.parking.exportar_distribuciones() == primario.exportar_distribuciones()
+
+def test_replica_aplica_reservas_y_cargas(reloj):
+    primario = _primario()
+    lotes = _Lotes(primario)
+    replica = Replica()
+    replica.aplicar(lotes.inicial())
+
+    primario.reservar("RES", "EXTERIOR", AHORA, AHORA + timedelta(hours=2))
+    primario.reservar("OTRA", "SUBTERRANEO", AHORA + timedelta(hours=1), AHORA + timedelta(hours=2))
+    primario.cancelar_reserva("OTRA")
+    primario.entrada(matricula="E1", tipo="ELECTRICO", nivel_bateria=0.2)
+    replica.aplicar(lotes.cambios())
+    assert [r.matricula for r in replica.parking._agenda.pendientes()] == ["RES"]
+    assert replica.parking.obtener_info_carga("E1") == primario.obtener_info_carga("E1")
+
+    primario.entrada(matricula="RES", tipo="NORMAL")
+    reloj.fijar(AHORA + timedelta(minutes=30))
+    primario.salida(primario.localizar("E1").id)
+    replica.aplicar(lotes.cambios())
+    assert replica.parking._agenda.pendientes() == []
+    assert replica.parking._reservas == {"RES"}
+    assert replica.parking.obtener_info_carga("E1") is None
+    assert diferencias(primario, replica.parking) == ([], {})
+
+def test_replica_detecta_discrepancias():
+    primario = _primario()
+    lotes = _Lotes(primario)
+    replica = Replica()
+    replica.aplicar(lotes.inicial())
+    primario.entrada(matricula="N1", tipo="NORMAL")
+    mensaje = lotes.cambios()
+    mensaje['plazas'] = []  # Se pierde el cambio de plaza
+    assert replica.aplicar(mensaje)['coincide'] is False
+    assert replica.discrepancias == 1
+
+def test_replicacion_sincrona_por_socket(tmp_path, reloj):
+    origen = str(tmp_path / "replica.sock")
+    replica = Replica(origen)
+    escuchando = threading.Event()
+    promovida = []
+    hilo = threading.Thread(target=lambda: promovida.append(replica.servir(escuchando)), daemon=True)
+    hilo.start()
+    assert escuchando.wait(5)
+
+    primario = _primario()
+    replicador = Replicador(origen, sincrona=True, verificacion=0).conectar(primario)
+    try:
+        _trafico(primario, reloj, 40, random.Random(6))
+        # Síncrona: cada evento está confirmado por la réplica al volver la operación
+        assert diferencias(primario, replica.parking) == ([], {})
+        assert replicador.estado()['discrepancias'] == 0
+        assert replicador.estado()['confirmados'] == replicador.estado()['enviados']
+    finally:
+        replicador.cerrar(avisar=False)  # Como una caída: la réplica se promueve
+    hilo.join(10)
+    assert promovida and promovida[0] is replica.parking
@@ -0,0 +1,78 @@
+import json
+import os
+from datetime import timedelta
+
+import pytest
+
+from conftest import AHORA
+from parking_privado import TIEMPO_MINIMO_ESTANCIA
+from reproducir import Reproductor, leer_traza
+
+LOG_S15 = os.path.join(os.path.dirname(__file__), "..", "..", "..", "S15", "parking.log")
+
+def _traza(tmp_path, eventos, capacidad=12, columnas=4):
+    """Traza JSONL con un inicio y los eventos (segundos desde AHORA, evento, matrícula, plaza, precio)"""
+    ruta = tmp_path / "traza.jsonl"
+    lineas = [{"momento": AHORA.isoformat(), "evento": "inicio", "capacidad": capacidad, "columnas": columnas}]
+    for segundos, evento, matricula, plaza, precio in eventos:
+        datos = {"momento": (AHORA + timedelta(seconds=segundos)).isoformat(), "evento": evento,
+                 "matricula": matricula, "tipo_vehiculo": "NORMAL", "plaza": plaza}
+        if precio is not None:
+            datos["precio"] = precio
+        lineas.append(datos)
+    ruta.write_text("".join(json.dumps(d) + "\n" for d in lineas), encoding="utf-8")
+    return str(ruta)
+
+def test_estancia_corta_sin_cobro_en_la_traza_no_diverge(tmp_path):
+    corta = TIEMPO_MINIMO_ESTANCIA // 2
+    traza = _traza(tmp_path, [
+        (0, "entrada", "A", None, None),
+        (0, "entrada", "B", None, None),
+        (corta, "salida", "A", None, 0.0),
+        (corta, "salida", "B", None, 1.5),  # La traza sí cobró: aquí no
+    ])
+    informe = Reproductor().reproducir(leer_traza(traza))
+    assert informe['salidas_sin_cobro'] == 2
+    assert informe['cobro_distinto'] == 1
+    assert informe['divergencias'] == 1
+
+def test_cobro_igual_al_de_la_traza_con_tarifa_plana(tmp_path):
+    traza = _traza(tmp_path, [(0, "entrada", "A", None, None), (600, "salida", "A", None, 42.75)])
+    informe = Reproductor(tarifa="plana").reproducir(leer_traza(traza))
+    assert informe['recaudacion_reproducida'] == informe['recaudacion_original'] == 42.75
+    assert informe['cobro_distinto'] == 0
+
+def test_plazas_de_la_traza_reproducen_el_estado(tmp_path):
+    plazas = ["C4", "A1", "B2", "C1", "A3"]
+    eventos = [(i, "entrada", f"M{i}", plaza, None) for i, plaza in enumerate(plazas)]
+    eventos.append((10, "salida", "M2", "B2", None))
+    eventos.append((11, "entrada", "M9", "B2", None))  # Vuelve a ocuparse la plaza que queda libre
+
+    sin_seguir = Reproductor()
+    informe = sin_seguir.reproducir(leer_traza(_traza(tmp_path, eventos)))
+    assert informe['plaza_distinta'] == informe['asignacion_distinta'] > 0
+
+    siguiendo = Reproductor(plazas_traza=True)
+    informe = siguiendo.reproducir(leer_traza(_traza(tmp_path, eventos)))
+    assert informe['plaza_distinta'] == 0 and informe['divergencias'] == 0
+    # La política se sigue midiendo aunque no decida la plaza
+    assert informe['asignacion_distinta'] > 0
+    ocupadas = {e.id: e.matricula for e in siguiendo.parking.obtener_estado() if e.ocupada}
+    assert ocupadas == {"C4": "M0", "A1": "M1", "C1": "M3", "A3": "M4", "B2": "M9"}
+
+def test_plaza_de_la_traza_ocupada_decide_la_politica(tmp_path):
+    traza = _traza(tmp_path, [(0, "entrada", "A", "A1", None), (1, "entrada", "B", "A1", None)])
+    reproductor = Reproductor(plazas_traza=True)
+    informe = reproductor.reproducir(leer_traza(traza))
+    assert informe['entradas_rechazadas'] == 0 and informe['plaza_distinta'] == 1
+    assert reproductor.parking.localizar("B").id != "A1"
+
+@pytest.mark.skipif(not os.path.exists(LOG_S15), reason="Sin el parking.log de S15")
+def test_log_de_s15_sin_falsas_divergencias():
+    informe = Reproductor().reproducir(leer_traza(LOG_S15))
+    assert informe['cobro_distinto'] == 0
+    assert informe['divergencias'] == informe['plaza_distinta']
+
+    informe = Reproductor(plazas_traza=True, tarifa="plana").reproducir(leer_traza(LOG_S15))
+    assert informe['divergencias'] == 0
+    assert informe['entradas'] > 0 and informe['salidas'] > 0
@@ -0,0 +1,159 @@
+import random
+from datetime import timedelta
+
+import pytest
+
+from conftest import AHORA, plazas_fila
+from parking_privado import (
+    ArbolFranjas, AsignacionSondeo, Coche, ConjuntoLibres, GestorPlazas, GestorReservas, Parking, TarifaPlana
+)
+
+def _coche(matricula, tipo="NORMAL"):
+    return Coche(matricula, tipo)
+
+def _parking(tipos, **kwargs):
+    return Parking(plazas=plazas_fila(tipos, kwargs.pop("minusvalido", ()), kwargs.pop("electricas", ())),
+                   **kwargs)
+
+# ======================================================
+# ÁRBOL DE FRANJAS
+# ======================================================
+
+def test_arbol_franjas_coincide_con_fuerza_bruta():
+    n = 37
+    arbol, franjas = ArbolFranjas(n), [0] * n
+    azar = random.Random(7)
+    altas = []
+    for _ in range(300):
+        # Como en GestorReservas: cada baja deshace un alta anterior
+        if altas and azar.random() < 0.4:
+            ini, fin = altas.pop(azar.randrange(len(altas)))
+            valor = -1
+        else:
+            ini, fin = sorted(azar.sample(range(n + 1), 2))
+            altas.append((ini, fin))
+            valor = 1
+        arbol.sumar(ini, fin, valor)
+        for i in range(ini, fin):
+            franjas[i] += valor
+        a, b = sorted(azar.sample(range(n + 1), 2))
+        assert arbol.maximo(a, b) == max(franjas[a:b])
+
+def test_arbol_franjas_rango_vacio():
+    arbol = ArbolFranjas(8)
+    arbol.sumar(3, 3, 5)
+    assert arbol.maximo(0, 8) == 0
+    assert arbol.maximo(4, 4) == 0
+
+def test_conjunto_libres():
+    conjunto = ConjuntoLibres()
+    for p in (5, 3, 9, 3):
+        conjunto.añadir(p)
+    assert len(conjunto) == 3
+    conjunto.quitar(5)
+    conjunto.quitar(42)
+    assert sorted(conjunto[i] for i in range(len(conjunto))) == [3, 9]
+    assert 9 in conjunto and 5 not in conjunto
+
+# ======================================================
+# AGENDA DE RESERVAS
+# ======================================================
+
+def test_reservas_respetan_la_capacidad_por_franja():
+    agenda = GestorReservas({("EXTERIOR", "GENERAL"): 2})
+    inicio = AHORA + timedelta(hours=1)
+    fin = inicio + timedelta(hours=2)
+    assert agenda.reservar("1111AAA", "EXTERIOR", inicio, fin)[0]
+    assert agenda.reservar("2222BBB", "EXTERIOR", inicio + timedelta(hours=1), fin + timedelta(hours=1))[0]
+    # La hora central ya tiene dos plazas comprometidas
+    assert not agenda.reservar("3333CCC", "EXTERIOR", inicio + timedelta(minutes=90), fin)[0]
+    # Justo después de la primera cabe otra
+    assert agenda.reservar("3333CCC", "EXTERIOR", fin, fin + timedelta(minutes=15))[0]
+    assert agenda.comprometidas("EXTERIOR", inicio, fin + timedelta(hours=1)) == 2
+
+    assert agenda.cancelar("1111AAA")
+    assert not agenda.cancelar("1111AAA")
+    assert agenda.comprometidas("EXTERIOR", inicio, inicio + timedelta(hours=1)) == 0
+
+def test_reservas_rechazan_peticiones_invalidas():
+    agenda = GestorReservas({("EXTERIOR", "GENERAL"): 1, ("EXTERIOR", "ELECTRICA"): 1})
+    inicio = AHORA + timedelta(hours=1)
+    fin = inicio + timedelta(hours=1)
+    assert not agenda.reservar("1111AAA", "SUBTERRANEO", inicio, fin)[0]
+    assert not agenda.reservar("1111AAA", "EXTERIOR", inicio, fin, "MINUSVALIDO")[0]
+    assert not agenda.reservar("1111AAA", "EXTERIOR", fin, inicio)[0]
+    assert not agenda.reservar("1111AAA", "EXTERIOR", AHORA + timedelta(days=30), AHORA + timedelta(days=31))[0]
+    assert agenda.reservar("1111AAA", "EXTERIOR", inicio, fin)[0]
+    assert not agenda.reservar("1111AAA", "EXTERIOR", inicio, fin, "ELECTRICA")[0]  # Ya tiene una
+
+def test_reserva_vigente_retenida_y_consumida(reloj):
+    agenda = GestorReservas({("EXTERIOR", "GENERAL"): 3})
+    inicio = AHORA + timedelta(hours=1)
+    agenda.reservar("1111AAA", "EXTERIOR", inicio, inicio + timedelta(hours=1))
+    assert agenda.vigente("1111AAA") is None
+    assert agenda.retenidas() == {("EXTERIOR", "GENERAL"): 0}
+
+    # Se admite llegar una franja antes; la plaza queda retenida desde la hora reservada
+    reloj.fijar(inicio - timedelta(minutes=10))
+    assert agenda.vigente("1111AAA").matricula == "1111AAA"
+    reloj.fijar(inicio + timedelta(minutes=10))
+    assert agenda.retenidas() == {("EXTERIOR", "GENERAL"): 1}
+    assert agenda.consumir("1111AAA").matricula == "1111AAA"
+    assert agenda.pendientes() == []
+    assert agenda.retenidas() == {("EXTERIOR", "GENERAL"): 0}
+
+def test_reservas_siguen_admitiendo_tras_medio_horizonte(reloj):
+    agenda = GestorReservas({("EXTERIOR", "GENERAL"): 1})
+    dias = GestorReservas.NUM_FRANJAS * GestorReservas.SEGUNDOS_FRANJA // 86400
+    lejos = AHORA + timedelta(days=dias - 1)
+    assert agenda.reservar("1111AAA", "EXTERIOR", lejos, lejos + timedelta(hours=1))[0]
+    reloj.fijar(AHORA + timedelta(days=dias // 2 + 1))
+    otra = lejos + timedelta(days=2)
+    assert agenda.reservar("2222BBB", "EXTERIOR", otra, otra + timedelta(hours=1))[0]
+    # La anterior sigue ocupando su franja tras desplazar la base
+    assert not agenda.reservar("3333CCC", "EXTERIOR", lejos, lejos + timedelta(minutes=15))[0]
+
+# ======================================================
+# PLAZAS RETENIDAS
+# ======================================================
+
+def test_plaza_retenida_solo_para_quien_reservo(reloj):
+    plazas = plazas_fila(["EXTERIOR", "EXTERIOR"])
+    agenda = GestorReservas.desde_plazas(plazas)
+    gestor = GestorPlazas(plazas, agenda)
+    agenda.reservar("RES", "EXTERIOR", AHORA, AHORA + timedelta(hours=1))
+
+    assert gestor.asignar(_coche("N1")) is not None
+    assert gestor.asignar(_coche("N2")) is None  # La otra está retenida
+    reserva = agenda.vigente("RES")
+    assert gestor.zonas_posibles(_coche("RES"), reserva) == {"EXTERIOR"}
+    assert gestor.asignar(_coche("RES"), reserva) is not None
+    assert agenda.pendientes() == []  # Se consume al aparcar
+
+def test_reserva_no_consumida_si_no_aparca():
+    plazas = plazas_fila(["EXTERIOR"])
+    agenda = GestorReservas.desde_plazas(plazas)
+    gestor = GestorPlazas(plazas, agenda, asignacion=AsignacionSondeo(max_intentos=0))
+    agenda.reservar("RES", "EXTERIOR", AHORA, AHORA + timedelta(hours=1))
+    assert gestor.asignar(_coche("RES"), agenda.vigente("RES")) is None
+    assert [r.matricula for r in agenda.pendientes()] == ["RES"]
+
+def test_reserva_retiene_plaza_y_se_cobra(reloj):
+    parking = _parking(["EXTERIOR", "EXTERIOR"], tarifa="plana")
+    assert parking.reservar("RES", "EXTERIOR", AHORA, AHORA + timedelta(hours=2))[0]
+    assert parking.entrada(matricula="N1", tipo="NORMAL")[0]
+    assert not parking.entrada(matricula="N2", tipo="NORMAL")[0]
+    assert parking.entrada(matricula="RES", tipo="NORMAL")[0]
+    reloj.fijar(AHORA + timedelta(minutes=10))
+    parking.salida(parking.localizar("RES").id)
+    sin_reserva = TarifaPlana().calcular(timedelta(minutes=10), "NORMAL", "EXTERIOR", False)
+    assert parking.obtener_estadisticas()['recaudacion_total'] == pytest.approx(sin_reserva + 2.5)
+
+def test_reserva_por_tipo_de_vehiculo():
+    parking = _parking(["EXTERIOR", "EXTERIOR"], electricas={"A2"})
+    fin = AHORA + timedelta(hours=1)
+    assert not parking.reservar("M1", "EXTERIOR", AHORA, fin, "MINUSVALIDO")[0]
+    assert parking.reservar("E1", "EXTERIOR", AHORA, fin, "ELECTRICO")[0]
+    assert parking.plazas_comprometidas("EXTERIOR", AHORA, fin, "ELECTRICO") == 1
+    assert parking.plazas_comprometidas("EXTERIOR", AHORA, fin) == 0
+    assert parking.cancelar_reserva("E1") and not parking.cancelar_reserva("E1")
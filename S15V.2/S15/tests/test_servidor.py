@@ -0,0 +1,133 @@
+import asyncio
+import json
+
+import pytest
+
+from conftest import plazas_fila
+from parking_privado import METRICAS, Parking
+from servidor import MAX_LINEA, ServidorParking
+
+@pytest.fixture
+def servidor():
+    return ServidorParking(Parking(plazas=plazas_fila(["EXTERIOR", "SUBTERRANEO"], electricas={"A2"})))
+
+def _pedir(servidor, peticion):
+    linea = peticion if isinstance(peticion, (str, bytes)) else json.dumps(peticion)
+    respuesta = servidor.procesar(linea)
+    assert respuesta.endswith(b"\n") and respuesta.count(b"\n") == 1
+    return json.loads(respuesta)
+
+# ======================================================
+# OPERACIONES
+# ======================================================
+
+def test_entrada_salida_y_estado(servidor):
+    respuesta = _pedir(servidor, {"op": "entrada", "matricula": "1111AAA", "tipo": "NORMAL", "id": 7})
+    assert respuesta["ok"] and respuesta["plaza"] == "A1" and respuesta["id"] == 7
+
+    estado = _pedir(servidor, {"op": "estado"})
+    assert estado["ok"] and estado["capacidad"] == 2 and estado["libres"] == {"EXTERIOR": 0, "SUBTERRANEO": 1}
+    plaza = _pedir(servidor, {"op": "estado", "plaza": "A1"})["plaza"]
+    assert plaza["matricula"] == "1111AAA" and plaza["entrada"]
+
+    salida = _pedir(servidor, {"op": "salida", "matricula": "1111AAA"})
+    assert salida["plaza"] == "A1"
+    assert not _pedir(servidor, {"op": "salida", "matricula": "1111AAA"})["ok"]
+
+def test_cotizar(servidor):
+    respuesta = _pedir(servidor, {"op": "cotizar", "tipo": "NORMAL"})
+    assert respuesta["ok"] and set(respuesta["tarifas"]) == {"EXTERIOR"}
+    assert set(respuesta["tarifas"]["EXTERIOR"]) == {"precio_hora", "factor"}
+
+# ======================================================
+# ERRORES
+# ======================================================
+
+@pytest.mark.parametrize("linea", ["{no es json", "[1, 2]", "42", '"texto"', b"\xff\xfe"])
+def test_peticiones_mal_formadas(servidor, linea):
+    respuesta = _pedir(servidor, linea)
+    assert not respuesta["ok"] and "Petición inválida" in respuesta["mensaje"] and respuesta["id"] is None
+
+@pytest.mark.parametrize("peticion, texto", [
+    ({"op": "volar"}, "Operación desconocida"),
+    ({"op": ["entrada"]}, "Operación desconocida"),
+    ({"op": "entrada", "tipo": "CAMION"}, "Tipo de vehículo desconocido"),
+    ({"op": "entrada", "matricula": 1234}, "Matrícula inválida"),
+    ({"op": "entrada", "matricula": "  "}, "Matrícula inválida"),
+    ({"op": "entrada", "carril": "1"}, "Carril inválido"),
+    ({"op": "entrada", "carril": True}, "Carril inválido"),
+    ({"op": "entrada", "tipo": "ELECTRICO", "nivel_bateria": 2}, "Nivel de batería inválido"),
+    ({"op": "entrada", "tipo": "ELECTRICO", "nivel_bateria": "0.5"}, "Nivel de batería inválido"),
+    ({"op": "salida", "plaza": 3}, "Plaza inválida"),
+    ({"op": "estado", "plaza": "Z9"}, "Plaza desconocida"),
+    ({"op": "cotizar", "tipo": "CAMION"}, "Tipo de vehículo desconocido"),
+    ({"op": "cotizar", "carril": 1.5}, "Carril inválido"),
+])
+def test_peticiones_invalidas_no_cambian_el_parking(servidor, peticion, texto):
+    version = servidor.parking.obtener_estado().version
+    respuesta = _pedir(servidor, dict(peticion, id="x"))
+    assert not respuesta["ok"] and texto in respuesta["mensaje"] and respuesta["id"] == "x"
+    assert servidor.parking.obtener_estado().version == version
+    assert servidor.parking.obtener_estadisticas()['rechazos'] == 0
+
+def test_error_interno_responde_y_sigue_atendiendo(servidor, monkeypatch, capsys):
+    def fallo(*args, **kwargs):
+        raise RuntimeError("disco lleno")
+    monkeypatch.setattr(servidor.parking, "obtener_estado", fallo)
+    errores = lambda: METRICAS.exportar_json()['eventos'].get("api_error", {}).get('total', 0)
+    activo = METRICAS.activo
+    METRICAS.activar()
+    try:
+        antes = errores()
+        respuesta = _pedir(servidor, {"op": "estado", "id": 3})
+        assert errores() == antes + 1
+    finally:
+        METRICAS.activar(activo)
+    assert not respuesta["ok"] and respuesta["id"] == 3
+    assert respuesta["mensaje"] == "Error interno: RuntimeError: disco lleno"
+    assert "RuntimeError" in capsys.readouterr().err
+
+    monkeypatch.undo()
+    assert _pedir(servidor, {"op": "estado"})["ok"]
+
+# ======================================================
+# PROTOCOLO JSON POR LÍNEAS
+# ======================================================
+
+async def _conversar(servidor, envios):
+    """Abre el servidor en un puerto libre, envía los trozos y devuelve las líneas recibidas"""
+    escucha = await asyncio.start_server(servidor.atender, "127.0.0.1", 0, limit=MAX_LINEA)
+    puerto = escucha.sockets[0].getsockname()[1]
+    async with escucha:
+        reader, writer = await asyncio.open_connection("127.0.0.1", puerto)
+        for trozo in envios:
+            writer.write(trozo)
+            await writer.drain()
+            await asyncio.sleep(0.01)
+        writer.write_eof()
+        datos = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+    return [json.loads(linea) for linea in datos.splitlines()]
+
+def test_peticiones_encadenadas_y_partidas(servidor):
+    peticiones = b"".join(
+        json.dumps({"op": "entrada", "matricula": m, "tipo": "NORMAL", "id": i}).encode() + b"\n"
+        for i, m in enumerate(["A", "B", "C"])
+    )
+    # Tres peticiones en un envío, una línea vacía y la última partida en dos
+    final = json.dumps({"op": "estado", "id": 9}).encode() + b"\n"
+    respuestas = asyncio.run(_conversar(servidor, [peticiones + b"\n" + final[:5], final[5:]]))
+    assert [r["id"] for r in respuestas] == [0, 1, 2, 9]
+    # A ocupa la única plaza que no es eléctrica: B y C van a la cola
+    assert [r["ok"] for r in respuestas[:3]] == [True, False, False]
+    assert respuestas[3]["cola"] == 2
+
+def test_linea_invalida_no_corta_la_conexion(servidor):
+    envios = [b"basura\n", json.dumps({"op": "estado", "id": 1}).encode() + b"\n"]
+    respuestas = asyncio.run(_conversar(servidor, envios))
+    assert [r["ok"] for r in respuestas] == [False, True]
+
+def test_linea_demasiado_larga_cierra_la_conexion(servidor):
+    respuestas = asyncio.run(_conversar(servidor, [b"x" * (MAX_LINEA + 10)]))
+    assert respuestas == []
+    assert servidor.conexiones == 0
@@ -0,0 +1,23 @@
+from conftest import plazas_fila
+from parking_privado import Parking
+
+def _parking(tipos, **kwargs):
+    return Parking(plazas=plazas_fila(tipos, kwargs.pop("minusvalido", ()), kwargs.pop("electricas", ())),
+                   **kwargs)
+
+def test_cotizar_solo_las_zonas_alcanzables():
+    parking = _parking(["AREA_PRIVADA", "SUBTERRANEO", "EXTERIOR"], asignacion="aleatoria")
+    assert set(parking.cotizar("NORMAL")) == {"EXTERIOR"}
+    assert set(parking.cotizar("MINUSVALIDO")) == {"AREA_PRIVADA", "SUBTERRANEO", "EXTERIOR"}
+    for matricula in ("A", "B", "C"):
+        parking.entrada(matricula=matricula, tipo="NORMAL")
+    assert parking.cotizar("NORMAL") == {}
+
+def test_cotizar_con_tarifa_dinamica():
+    parking = _parking(["EXTERIOR"] * 10, tarifa_dinamica=True)
+    (precio_vacio, factor_vacio), = parking.cotizar("NORMAL").values()
+    assert factor_vacio < 1
+    for i in range(9):
+        parking.entrada(matricula=f"N{i}", tipo="NORMAL")
+    (precio_lleno, factor_lleno), = parking.cotizar("NORMAL").values()
+    assert factor_lleno > 1 and precio_lleno > precio_vacio